@@ -0,0 +1,11 @@
+"""
+Hardware and database simulators for SandstoneDashboard collectors.
+Used by tests and the load generator to run the real collector code without a Pi or InfluxDB.
+"""
+
+from simulator.w1 import FakeW1Bus
+from simulator.i2c import FakeADS1115, FakeSMBus
+from simulator.influx_sink import InfluxSink
+from simulator.webhook import WebhookSink
+
+__all__ = ["FakeW1Bus", "FakeADS1115", "FakeSMBus", "InfluxSink", "WebhookSink"]
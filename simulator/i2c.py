@@ -0,0 +1,90 @@
+"""Fake ADS1115 ADC and smbus2.SMBus for the pressure and SHT30 collectors"""
+
+import random
+import time
+
+class FakeADS1115:
+    """
+    Stand-in for Adafruit_ADS1x15.ADS1115.
+    Each read waits one conversion (1 / data_rate) plus extra latency and may raise OSError like a stuck bus.
+    sleep waits for the conversion, a simulated clock's sleep makes reads instant.
+    """
+
+    def __init__(self, adc_values=None, data_rate=128, extra_latency=0.0, error_rate=0.0, seed=None,
+                 sleep=time.sleep):
+        self.adc_values = adc_values or {}
+        self.data_rate = data_rate
+        self.extra_latency = extra_latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.reads = 0
+        self.sleep = sleep
+
+    def read_adc(self, channel, gain=1, data_rate=None):
+        """Return a raw ADC count for the channel"""
+        self.reads += 1
+        self.sleep(1.0 / (data_rate or self.data_rate) + self.extra_latency)
+        if self.random.random() < self.error_rate:
+            raise OSError(121, "Remote I/O error")
+        base = self.adc_values.get(channel, 16000)
+        return base + self.random.randint(-20, 20)
+
+    @staticmethod
+    def channel_config(channel_count) -> dict:
+        """getPressures.json style channels for one host"""
+        return {f"channel{i}": {
+            "channel_ID": f"simLine{i}",
+            "channel_name": f"Sim Line {i} Pressure",
+            "channel": i,
+            "ch_gain": 1.0,
+            "ch_maxPSI": 100,
+            "ch_minPSI": 0,
+            "ch_minADC": 4000,
+            "ch_maxADC": 32760,
+            "ch_enabled": "Enabled",
+        } for i in range(channel_count)}
+
+def sht30_crc(data) -> int:
+    """CRC-8 used by the SHT30, polynomial 0x31, init 0xFF"""
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+class FakeSMBus:
+    """Stand-in for smbus2.SMBus with an SHT30 at 0x44"""
+
+    def __init__(self, temp_c=2.0, humidity=80.0, latency=0.0, error_rate=0.0, seed=None):
+        self.temp_c = temp_c
+        self.humidity = humidity
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.closed = False
+
+    def write_i2c_block_data(self, i2c_addr, register, data):
+        """Accept the measurement command"""
+        if self.random.random() < self.error_rate:
+            raise OSError(121, "Remote I/O error")
+        return (i2c_addr, register, data)
+
+    def read_i2c_block_data(self, i2c_addr, register, length):
+        """Return temp MSB, LSB, CRC, humidity MSB, LSB, CRC"""
+        del i2c_addr, register
+        if self.latency:
+            time.sleep(self.latency)
+        if self.random.random() < self.error_rate:
+            raise OSError(121, "Remote I/O error")
+
+        raw_temp = round((self.temp_c + 45) * 65535 / 175)
+        raw_hum = round(self.humidity * 65535 / 100)
+        temp_bytes = [raw_temp >> 8, raw_temp & 0xFF]
+        hum_bytes = [raw_hum >> 8, raw_hum & 0xFF]
+        block = temp_bytes + [sht30_crc(temp_bytes)] + hum_bytes + [sht30_crc(hum_bytes)]
+        return block[:length]
+
+    def close(self):
+        """Close the bus"""
+        self.closed = True
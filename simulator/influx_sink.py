@@ -0,0 +1,134 @@
+"""Local InfluxDB 1.x compatible HTTP sink that records writes and their latency"""
+
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+class InfluxSinkHandler(BaseHTTPRequestHandler):
+    """Handle /ping, /query and /write like InfluxDB 1.x"""
+
+    def _respond(self, code, body=b"", content_type="application/json"):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Influxdb-Version", "1.8-sim")
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Ping and queries"""
+        self._handle_query()
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """Ping"""
+        self._respond(204)
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Writes and queries"""
+        if urlparse(self.path).path == "/write":
+            self._handle_write()
+        else:
+            self._handle_query()
+
+    def _handle_query(self):
+        parsed = urlparse(self.path)
+        if parsed.path == "/ping":
+            self._respond(204)
+            return
+
+        query = parse_qs(parsed.query).get("q", [""])[0]
+        self.server.sink.queries.append(query)
+
+        if query.upper().startswith("SHOW DATABASES"):
+            values = [[name] for name in sorted(self.server.sink.databases)]
+            series = [{"name": "databases", "columns": ["name"], "values": values}]
+            result = {"results": [{"statement_id": 0, "series": series}]}
+        else:
+            if query.upper().startswith("CREATE DATABASE"):
+                self.server.sink.databases.add(query.split()[-1].strip('"'))
+            result = {"results": [{"statement_id": 0}]}
+        self._respond(200, json.dumps(result).encode("utf-8"))
+
+    def _handle_write(self):
+        sink = self.server.sink
+        if sink.fail_writes:
+            self._respond(503, b'{"error":"sink unavailable"}')
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        received = time.monotonic()
+
+        if sink.write_latency:
+            time.sleep(sink.write_latency)
+
+        lines = [line for line in body.decode("utf-8").split("\n") if line]
+        params = parse_qs(urlparse(self.path).query)
+        with sink.lock:
+            sink.writes.append({
+                "database": params.get("db", [""])[0],
+                "rp": params.get("rp", [None])[0],
+                "precision": params.get("precision", [None])[0],
+                "lines": lines,
+                "bytes": length,
+                "latency": time.monotonic() - received,
+            })
+        self._respond(204)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Keep output quiet"""
+
+class InfluxSink:
+    """
+    Run an InfluxDB compatible HTTP server on localhost in a background thread.
+    Point InfluxDBClient at 127.0.0.1:sink.port. write_latency slows every write, like a busy server. fail_writes answers writes with 503, like an outage.
+    """
+
+    def __init__(self, write_latency=0.0, port=0):
+        self.write_latency = write_latency
+        self.fail_writes = False
+        self.writes = []
+        self.queries = []
+        self.databases = set()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), InfluxSinkHandler)
+        self.server.sink = self
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        """Listening port"""
+        return self.server.server_port
+
+    def start(self):
+        """Start serving in a daemon thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def point_count(self) -> int:
+        """Points written so far"""
+        with self.lock:
+            return sum(len(write["lines"]) for write in self.writes)
+
+    def reset(self):
+        """Forget recorded writes and queries"""
+        with self.lock:
+            self.writes.clear()
+            self.queries.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,150 @@
+"""
+Load generator for the collectors.
+Runs the real getTemps and getPressures cycle code against FakeW1Bus, FakeADS1115 and InfluxSink,
+and reports cycle time and throughput as the sensor count grows.
+
+Run from the repo root:
+python -m simulator.loadgen --sensors 10 50 100 200 --cycles 5 --conversion-latency 0.005 --write-latency 0.02
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+# pylint: disable=wrong-import-position
+import getTemps
+import getPressures
+from common_functions import database_connect
+from sensor_registry import SensorRegistry
+from simulator.w1 import FakeW1Bus
+from simulator.i2c import FakeADS1115
+from simulator.influx_sink import InfluxSink
+
+HOSTNAME = "SimHost"
+DATABASE = "loadgen"
+
+def summarize(collector, sensor_count, cycle_times, points):
+    """Summarize one run"""
+    total = sum(cycle_times)
+    return {
+        "collector": collector,
+        "sensors": sensor_count,
+        "cycles": len(cycle_times),
+        "mean_ms": statistics.mean(cycle_times) * 1000,
+        "max_ms": max(cycle_times) * 1000,
+        "points_per_sec": points / total if total else 0.0,
+    }
+
+def run_temps(sink, sensor_count, cycles, args):
+    """Run getTemps cycles against a fake 1-Wire bus"""
+
+    with tempfile.TemporaryDirectory() as root:
+        bus = FakeW1Bus(root, sensor_count,
+                        conversion_latency=args.conversion_latency,
+                        crc_error_rate=args.crc_error_rate,
+                        reset_rate=args.reset_rate,
+                        missing_rate=args.missing_rate,
+                        seed=args.seed)
+        config = bus.room_config(HOSTNAME, assigned=sensor_count // 2)
+
+        saved_path = getTemps.W1_DEVICES_PATH
+        getTemps.W1_DEVICES_PATH = bus.devices_path
+        getTemps.open = bus.open  # shadow builtins.open inside getTemps only
+        client = database_connect("127.0.0.1", sink.port, "", "", DATABASE)
+        registry = SensorRegistry(None, HOSTNAME)
+        registry.set_config(config)
+
+        try:
+            cycle_times = []
+            points = 0
+            for _ in range(cycles):
+                start = time.perf_counter()
+                rooms = registry.update(getTemps.list_attached_sensors())
+                series = getTemps.write_points_to_series(rooms, HOSTNAME)
+                client.write_points(series)
+                cycle_times.append(time.perf_counter() - start)
+                points += len(series)
+                bus.drift()
+        finally:
+            del getTemps.open
+            getTemps.W1_DEVICES_PATH = saved_path
+            client.close()
+
+    return summarize("getTemps", sensor_count, cycle_times, points)
+
+def run_pressures(sink, channel_count, cycles, args):
+    """Run getPressures cycles against a fake ADC with channel_count channels"""
+
+    adc = FakeADS1115(data_rate=args.data_rate, extra_latency=args.i2c_latency,
+                      error_rate=args.i2c_error_rate, seed=args.seed)
+    reader = getPressures.PressureSensorReader(
+        adc=adc,
+        channels=FakeADS1115.channel_config(channel_count),
+        hostname=HOSTNAME,
+        sensor_id=getPressures.PRESSURE_SENSOR_ID,
+        sensor_type=getPressures.PRESSURE_SENSOR_TYPE,
+    )
+    client = database_connect("127.0.0.1", sink.port, "", "", DATABASE)
+
+    try:
+        cycle_times = []
+        points = 0
+        for _ in range(cycles):
+            start = time.perf_counter()
+            series = reader.construct_points(reader.read_channels())
+            client.write_points(series)
+            cycle_times.append(time.perf_counter() - start)
+            points += len(series)
+    finally:
+        client.close()
+
+    return summarize("getPressures", channel_count, cycle_times, points)
+
+def print_report(results):
+    """Print a table of results"""
+    print(f"{'collector':<14}{'sensors':>8}{'cycles':>8}{'mean ms':>10}{'max ms':>10}{'points/s':>11}")
+    for result in results:
+        print(f"{result['collector']:<14}{result['sensors']:>8}{result['cycles']:>8}"
+              f"{result['mean_ms']:>10.1f}{result['max_ms']:>10.1f}{result['points_per_sec']:>11.1f}")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Run the collectors against simulated hardware and InfluxDB")
+    parser.add_argument("--collectors", nargs="+", default=["getTemps", "getPressures"],
+                        choices=["getTemps", "getPressures"])
+    parser.add_argument("--sensors", nargs="+", type=int, default=[10, 50, 100, 200])
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--conversion-latency", type=float, default=0.0, help="Seconds per w1_slave read")
+    parser.add_argument("--crc-error-rate", type=float, default=0.0)
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="Rate of 85 C power on reset readings")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="Rate of missing w1_slave files")
+    parser.add_argument("--data-rate", type=int, default=860, help="ADS1115 samples per second")
+    parser.add_argument("--i2c-latency", type=float, default=0.0)
+    parser.add_argument("--i2c-error-rate", type=float, default=0.0)
+    parser.add_argument("--write-latency", type=float, default=0.0, help="Seconds added to every InfluxDB write")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the load generator, return the results"""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    runners = {"getTemps": run_temps, "getPressures": run_pressures}
+    results = []
+    with InfluxSink(write_latency=args.write_latency) as sink:
+        for collector in args.collectors:
+            for sensor_count in args.sensors:
+                results.append(runners[collector](sink, sensor_count, args.cycles, args))
+    print_report(results)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Replay a recording made by a collector with RECORDING_DIR set (see src/recording.py).
+Every reading goes back through the collector code: w1_slave text through TempUtils.read_temp,
+ADC counts through PressureSensorReader, SHT30 blocks through SHT30Utils and weather responses
+through the weather_utils parsers. Reports readings, recorded errors, parse failures and parse time per kind.
+
+Run from the repo root, at recorded speed or as fast as possible:
+python -m simulator.replay recordings/getTemps-20250115.rec
+python -m simulator.replay recordings/getPressures-20250115.rec --speed 0 \
+    --pressures-config src/config/getPressures.json --hostname SandstoneHost1
+"""
+
+import argparse
+import io
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+# pylint: disable=wrong-import-position
+import getTemps
+import getPressures
+from getSHT30 import SHT30Utils
+from recording import KIND_ADC, KIND_NAMES, KIND_SHT30, KIND_W1, KIND_WEATHER, error_from_text, read_recording
+from weather_utils import construct_forecast_points, construct_weather_point
+from simulator.i2c import FakeADS1115
+
+HOSTNAME = "ReplayHost"
+
+class ReplayADC:
+    """ADS1115 stand-in returning the counts recorded in one cycle, keyed by channel"""
+
+    def __init__(self):
+        self.readings = {}
+
+    def read_adc(self, channel, gain=1, data_rate=None):
+        """Return the recorded count or raise the recorded error"""
+        del gain, data_rate
+        reading = self.readings.get(channel)
+        if reading is None:
+            raise OSError(f"Channel {channel} not in the recorded cycle")
+        if reading.error:
+            raise error_from_text(reading.error)
+        return reading.value
+
+    def channels_from_keys(self) -> dict:
+        """getPressures.json style channels for the recorded channel:gain keys"""
+        channels = FakeADS1115.channel_config(max(self.readings) + 1 if self.readings else 0)
+        for channel, reading in self.readings.items():
+            channels[f"channel{channel}"]["ch_gain"] = float(reading.key.split(":")[1])
+        return {name: cfg for name, cfg in channels.items() if cfg["channel"] in self.readings}
+
+class KindStats:
+    """Counts and timings for one kind of reading"""
+
+    def __init__(self):
+        self.readings = 0
+        self.recorded_errors = 0
+        self.parse_failures = 0
+        self.points = 0
+        self.parse_secs = []
+        self.read_secs = []
+
+    def add(self, reading, parse_secs, points, failed):
+        """Add one replayed reading"""
+        self.readings += 1
+        self.recorded_errors += reading.error is not None
+        self.parse_failures += failed
+        self.points += len(points)
+        self.parse_secs.append(parse_secs)
+        self.read_secs.append(reading.latency)
+
+    def summary(self, kind) -> dict:
+        """Summary row for the report"""
+        return {
+            "kind": kind,
+            "readings": self.readings,
+            "errors": self.recorded_errors,
+            "failed": self.parse_failures,
+            "points": self.points,
+            "parse_us_mean": statistics.mean(self.parse_secs) * 1e6 if self.parse_secs else 0.0,
+            "parse_us_max": max(self.parse_secs, default=0.0) * 1e6,
+            "read_ms_mean": statistics.mean(self.read_secs) * 1000 if self.read_secs else 0.0,
+            "read_ms_max": max(self.read_secs, default=0.0) * 1000,
+        }
+
+def parse_w1(reading):
+    """Parse w1_slave text with TempUtils.read_temp, return (points, failed)"""
+
+    def open_recorded(*args, **kwargs):
+        del args, kwargs
+        if reading.error:
+            raise error_from_text(reading.error)
+        return io.StringIO(reading.value)
+
+    getTemps.open = open_recorded  # shadow builtins.open inside getTemps only
+    try:
+        temp = getTemps.TempUtils.read_temp(f"{getTemps.W1_DEVICES_PATH}{reading.key}/{getTemps.W1_SLAVE_FILE}")
+    finally:
+        del getTemps.open
+
+    status = "On" if temp else "OFF"
+    point = getTemps.TempUtils.construct_data_point(reading.key, reading.key, "Replay", status, HOSTNAME,
+                                                    temp or getTemps.NO_TEMP)
+    return [point], not temp and reading.error is None
+
+def parse_adc_cycle(adc, channels):
+    """Read one recorded cycle through PressureSensorReader, return (points, channel numbers that failed to parse)"""
+
+    reader = getPressures.PressureSensorReader(
+        adc=adc,
+        channels=channels or adc.channels_from_keys(),
+        hostname=HOSTNAME,
+        sensor_id=getPressures.PRESSURE_SENSOR_ID,
+        sensor_type=getPressures.PRESSURE_SENSOR_TYPE,
+    )
+    readings = reader.read_channels()
+    failed = {reader.channels[channel]["channel"] for channel, psi in readings.items() if psi == getPressures.NO_PSI}
+    failed = {channel for channel in failed if channel in adc.readings and adc.readings[channel].error is None}
+    return reader.construct_points(readings), failed
+
+def parse_sht30(reading):
+    """Convert an SHT30 block, return (points, failed)"""
+    if reading.error:
+        return [], False
+    try:
+        temp_f, humidity = SHT30Utils.convert(reading.value)
+    except (ValueError, IndexError):
+        return [], True
+    return [SHT30Utils.construct_data_point(reading.key, reading.key, "Replay", HOSTNAME, temp_f, humidity)], False
+
+def parse_weather(reading):
+    """Parse a weather response into the current and forecast points, return (points, failed)"""
+    if reading.error:
+        return [], False
+    try:
+        return [construct_weather_point(reading.value, reading.key)] + \
+            construct_forecast_points(reading.value, reading.key), False
+    except Exception as e:
+        logging.warning(f"Failure parsing weather for {reading.key}: {e}")
+        return [], True
+
+class Replayer:
+    """Feed the readings of a recording through the collector parsers, paced by the recorded timestamps"""
+
+    def __init__(self, speed=1.0, channels=None, collect_points=False, sleep=time.sleep, clock=time.monotonic):
+        """
+        speed          -> 1.0 replays at recorded speed, 2.0 twice as fast, 0 as fast as possible
+        channels       -> getPressures.json channels for the host, built from the recorded keys if None
+        collect_points -> keep every constructed point in self.points, a long recording makes a lot of points
+        """
+        self.speed = speed
+        self.channels = channels
+        self.sleep = sleep
+        self.clock = clock
+        self.stats = {kind: KindStats() for kind in KIND_NAMES}
+        self.points = [] if collect_points else None
+        self.adc = ReplayADC()
+        self.adc_pending = []
+
+    def _pace(self, reading, started):
+        if not self.speed:
+            return
+        first_timestamp, started_at = started
+        wait = (reading.timestamp - first_timestamp) / self.speed - (self.clock() - started_at)
+        if wait > 0:
+            self.sleep(wait)
+
+    def _flush_adc(self):
+        if not self.adc_pending:
+            return
+        parse_started = time.perf_counter()
+        points, failed = parse_adc_cycle(self.adc, self.channels)
+        parse_secs = (time.perf_counter() - parse_started) / len(self.adc_pending)
+        for i, reading in enumerate(self.adc_pending):
+            channel = int(reading.key.split(":")[0])
+            self.stats[KIND_ADC].add(reading, parse_secs, points if i == 0 else [], channel in failed)
+        if self.points is not None:
+            self.points.extend(points)
+        self.adc.readings = {}
+        self.adc_pending = []
+
+    def feed(self, reading):
+        """Parse one reading, ADC readings are parsed a cycle at a time"""
+
+        if reading.kind == KIND_ADC:
+            channel = int(reading.key.split(":")[0])
+            if channel in self.adc.readings:
+                self._flush_adc()
+            self.adc.readings[channel] = reading
+            self.adc_pending.append(reading)
+            return
+
+        parsers = {KIND_W1: parse_w1, KIND_SHT30: parse_sht30, KIND_WEATHER: parse_weather}
+        parse_started = time.perf_counter()
+        points, failed = parsers[reading.kind](reading)
+        self.stats[reading.kind].add(reading, time.perf_counter() - parse_started, points, failed)
+        if self.points is not None:
+            self.points.extend(points)
+
+    def run(self, path) -> list:
+        """Replay a recording, return the summary rows of the kinds it holds"""
+
+        started = None
+        for reading in read_recording(path):
+            if started is None:
+                started = (reading.timestamp, self.clock())
+            self._pace(reading, started)
+            self.feed(reading)
+        self._flush_adc()
+        return [stats.summary(KIND_NAMES[kind]) for kind, stats in self.stats.items() if stats.readings]
+
+def print_report(results):
+    """Print a table of results"""
+    print(f"{'kind':<9}{'readings':>9}{'errors':>8}{'failed':>8}{'points':>8}"
+          f"{'parse us':>10}{'max us':>9}{'read ms':>9}{'max ms':>9}")
+    for result in results:
+        print(f"{result['kind']:<9}{result['readings']:>9}{result['errors']:>8}{result['failed']:>8}"
+              f"{result['points']:>8}{result['parse_us_mean']:>10.1f}{result['parse_us_max']:>9.1f}"
+              f"{result['read_ms_mean']:>9.1f}{result['read_ms_max']:>9.1f}")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Replay a raw reading recording through the collector parsers")
+    parser.add_argument("recordings", nargs="+", help="Recording files, replayed one after the other")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 is recorded speed, 0 as fast as possible")
+    parser.add_argument("--pressures-config", help="getPressures.json for the ADC channel conversion")
+    parser.add_argument("--hostname", help="Host in --pressures-config")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Replay the recordings, return the results"""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    channels = None
+    if args.pressures_config:
+        with open(args.pressures_config, encoding="utf-8") as config_file:
+            channels = json.load(config_file)[args.hostname]
+
+    results = []
+    for path in args.recordings:
+        replayer = Replayer(args.speed, channels)
+        results.extend(replayer.run(path))
+    print_report(results)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Accelerated soak runs of the collector cycles.
+Runs run_cycle of getTemps, getPressures, getSHT30 or getWeather against the simulators, an in memory writer
+and a simulated clock, with deadband, sensor health, freeze risk and the edge API store turned on.
+Sleeps return at once, so weeks of cycles run in seconds to minutes.
+Reports cycles per wall second, points written, memory growth after warm up and schedule drift.
+
+Run from the repo root:
+python -m simulator.soak --collectors getPressures getSHT30 --days 30
+python -m simulator.soak --collectors getTemps --days 7 --sensors 20 --trace-memory
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+# pylint: disable=wrong-import-position
+import getTemps
+import getPressures
+import getSHT30
+import getWeather
+from collector_cycle import CycleState
+from deadband import DeadbandFilter
+from edge_api import ReadingStore
+from freeze_risk import FreezeRiskEstimator
+from sensor_health import SensorHealthTracker
+from sensor_registry import SensorRegistry
+from weather_utils import WeatherCache, cache_file_for
+from simulator.w1 import FakeW1Bus
+from simulator.i2c import FakeADS1115, FakeSMBus
+
+HOSTNAME = "SimHost"
+START = 1735732800.0
+COLLECTORS = {"getTemps": (getTemps, 5), "getPressures": (getPressures, 5), "getSHT30": (getSHT30, 10),
+              "getWeather": (getWeather, getWeather.GET_WEATHER_SLEEP_SECS)}
+
+class SimClock:
+    """Simulated time for CycleState, sleep() returns at once and moves the clock"""
+
+    def __init__(self, start=START):
+        self.now = start
+
+    def time(self) -> float:
+        """Simulated epoch seconds"""
+        return self.now
+
+    def monotonic(self) -> float:
+        """Simulated monotonic seconds, the same as time()"""
+        return self.now
+
+    def sleep(self, secs):
+        """Move the clock forward"""
+        self.now += secs
+
+class MemoryWriter:
+    """In memory stand-in for DeferredInfluxWriter, counts writes and points and keeps the last series"""
+
+    client = None
+    pending_points = 0
+
+    def __init__(self):
+        self.writes = 0
+        self.points = 0
+        self.last_series = []
+
+    def write_points(self, series, **kwargs) -> bool:
+        """Count the series"""
+        del kwargs
+        self.writes += 1
+        self.points += len(series)
+        self.last_series = series
+        return True
+
+    def close(self):
+        """Nothing to close"""
+
+class FakeWeatherFetcher:
+    """Stand-in for WeatherFetcher, One Call style responses whose forecast moves on every hour"""
+
+    def __init__(self, locations, clock, seed=None):
+        self.locations = locations
+        self.clock = clock
+        self.random = random.Random(seed)
+
+    def fetch_all(self) -> dict:
+        """Response for every location"""
+        return {location: self.response() for location in self.locations}
+
+    def response(self) -> dict:
+        """One Call response with 48 hours and 8 days of forecast from the current hour"""
+        hour = int(self.clock.time()) // 3600 * 3600
+        temp = 20.0 + self.random.uniform(-5, 5)
+        hourly = [{"dt": hour + 3600 * i, "temp": temp, "feels_like": temp - 5, "humidity": 80, "pop": 0.2,
+                   "wind_speed": 8.0, "weather": [{"main": "Snow"}]} for i in range(48)]
+        daily = [{"dt": hour + 86400 * i, "temp": {"min": temp - 8, "max": temp + 4}, "humidity": 75,
+                  "wind_speed": 9.0, "wind_gust": 15.0, "weather": [{"main": "Clouds"}]} for i in range(8)]
+        return {"current": {"humidity": 80, "feels_like": temp - 5, "wind_deg": 270, "wind_speed": 8.0,
+                            "weather": [{"main": "Snow"}]}, "hourly": hourly, "daily": daily}
+
+def write_config(work_dir, name, json_config) -> str:
+    """Write a config file for the cycle to load, return its path"""
+    path = work_dir / name
+    path.write_text(json.dumps(json_config), encoding="utf-8")
+    return str(path)
+
+def sensor_features(collector, clock, units, noise_limit, slow_secs, delta) -> dict:
+    """Deadband, sensor health, freeze risk and edge API store on the simulated clock"""
+    return {
+        "deadband": DeadbandFilter(600, delta, clock=clock.monotonic),
+        "sensor_health": SensorHealthTracker(collector, noise_limit, slow_secs, clock=clock.time),
+        "freeze_risk": FreezeRiskEstimator(collector, clock=clock.time),
+        "reading_store": ReadingStore(collector, HOSTNAME, units, capacity=2160, clock=clock.time),
+    }
+
+@contextlib.contextmanager
+def temps_cycle(clock, writer, work_dir, sensors, seed):
+    """getTemps on a fake 1-Wire bus with half the sensors assigned, temperatures random walk between cycles"""
+
+    bus = FakeW1Bus(work_dir / "w1", sensors, seed=seed)
+    config_file = write_config(work_dir, "getTemps.json", bus.room_config(HOSTNAME, assigned=sensors // 2))
+    saved_path = getTemps.W1_DEVICES_PATH
+    getTemps.W1_DEVICES_PATH = bus.devices_path
+    getTemps.open = bus.open  # shadow builtins.open inside getTemps only
+    features = sensor_features("getTemps", clock, "F", 1.0, 2.0, 0.5)
+    features["registry"] = SensorRegistry(None, HOSTNAME, clock.time)
+    try:
+        yield CycleState(HOSTNAME, writer, getTemps.list_attached_sensors, config_file, features=features,
+                         clock=clock), bus.drift
+    finally:
+        del getTemps.open
+        getTemps.W1_DEVICES_PATH = saved_path
+
+@contextlib.contextmanager
+def pressures_cycle(clock, writer, work_dir, sensors, seed):
+    """getPressures on a fake ADS1115 with one enabled channel per sensor"""
+
+    adc = FakeADS1115(seed=seed, sleep=clock.sleep)
+    config_file = write_config(work_dir, "getPressures.json", {HOSTNAME: FakeADS1115.channel_config(sensors)})
+    yield CycleState(HOSTNAME, writer, adc, config_file, features=sensor_features(
+        "getPressures", clock, "PSI", 2.0, 0.5, 1.0), clock=clock), lambda: None
+
+@contextlib.contextmanager
+def sht30_cycle(clock, writer, work_dir, sensors, seed):
+    """getSHT30 on a fake SMBus, sensors is ignored, a host reads one SHT30"""
+
+    del sensors
+    bus = FakeSMBus(seed=seed)
+    config_file = write_config(work_dir, "getSHT30.json",
+                               {HOSTNAME: {"simSHT30": {"id": "i2c:0x44", "title": "Sim SHT30"}}})
+    features = {"sensor_health": SensorHealthTracker("getSHT30", 1.0, 1.5, clock=clock.time)}
+    yield CycleState(HOSTNAME, writer, bus, config_file, features=features, clock=clock), lambda: None
+
+@contextlib.contextmanager
+def weather_cycle(clock, writer, work_dir, sensors, seed):
+    """getWeather with forecasts for one location per sensor, caches written to the work dir"""
+
+    locations = [f"SimLocation{i}" for i in range(1, sensors + 1)]
+    caches = {location: WeatherCache(cache_file_for(str(work_dir / "weather_cache.json"), location))
+              for location in locations}
+    yield CycleState(HOSTNAME, writer, FakeWeatherFetcher(locations, clock, seed), features={
+        "forecast_enabled": True, "caches": caches, "forecast_hashes": {}}, clock=clock), lambda: None
+
+CYCLE_BUILDERS = {"getTemps": temps_cycle, "getPressures": pressures_cycle, "getSHT30": sht30_cycle,
+                  "getWeather": weather_cycle}
+
+def memory_in_use(trace_memory) -> int:
+    """Traced bytes with tracemalloc, else allocated memory blocks"""
+    return tracemalloc.get_traced_memory()[0] if trace_memory else sys.getallocatedblocks()
+
+def soak(collector, days, sensors=8, seed=1, trace_memory=False) -> dict:
+    """
+    Run a collector's cycles for days of simulated time and summarize.
+    After every cycle the clock moves by the collector's sleep plus the wall time of the cycle,
+    like the main loop, so time spent inside a cycle shows up as schedule drift.
+    Memory growth is measured from the end of the first tenth of the cycles, after windows have filled.
+    """
+
+    module, cycle_secs = COLLECTORS[collector]
+    cycles = max(1, int(days * 86400 / cycle_secs))
+    warmup = cycles // 10
+    clock = SimClock()
+    writer = MemoryWriter()
+    logging_disabled = logging.root.manager.disable
+    logging.disable(logging.WARNING)  # millions of INFO lines would be the slowest and biggest part of the run
+    if trace_memory:
+        tracemalloc.start()
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir, \
+                CYCLE_BUILDERS[collector](clock, writer, Path(work_dir), sensors, seed) as (state, between_cycles):
+            baseline = memory_in_use(trace_memory)
+            started = time.perf_counter()
+            for cycle in range(cycles):
+                if cycle == warmup:
+                    baseline = memory_in_use(trace_memory)
+                cycle_started = time.perf_counter()
+                module.run_cycle(state)
+                between_cycles()
+                clock.sleep(cycle_secs + time.perf_counter() - cycle_started)
+            wall_secs = time.perf_counter() - started
+            growth = memory_in_use(trace_memory) - baseline
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        logging.disable(logging_disabled)
+
+    return {
+        "collector": collector,
+        "sensors": sensors,
+        "days": days,
+        "cycles": cycles,
+        "wall_secs": wall_secs,
+        "cycles_per_sec": cycles / wall_secs if wall_secs else 0.0,
+        "points": writer.points,
+        "memory_growth": growth,
+        "drift_secs_per_day": (clock.now - START - cycles * cycle_secs) / days,
+    }
+
+def print_report(results, trace_memory):
+    """Print a table of results"""
+    growth = "growth KB" if trace_memory else "growth blk"
+    print(f"{'collector':<14}{'sensors':>8}{'days':>6}{'cycles':>9}{'wall s':>8}{'cycles/s':>10}{'points':>10}"
+          f"{growth:>12}{'drift s/day':>12}")
+    for result in results:
+        memory_growth = result["memory_growth"] / 1024 if trace_memory else result["memory_growth"]
+        print(f"{result['collector']:<14}{result['sensors']:>8}{result['days']:>6g}{result['cycles']:>9}"
+              f"{result['wall_secs']:>8.1f}{result['cycles_per_sec']:>10.0f}{result['points']:>10}"
+              f"{memory_growth:>12.0f}{result['drift_secs_per_day']:>12.1f}")
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Run collector cycles for days of simulated time")
+    parser.add_argument("--collectors", nargs="+", default=["getPressures", "getSHT30"], choices=list(COLLECTORS))
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--sensors", type=int, default=8, help="Sensors, channels or weather locations")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Measure growth in bytes with tracemalloc instead of memory blocks, runs slower")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Run the soak, return the results"""
+    args = parse_args(argv)
+    results = [soak(collector, args.days, args.sensors, args.seed, args.trace_memory) for collector in args.collectors]
+    print_report(results, args.trace_memory)
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Fake /sys/bus/w1/devices tree for DS18B20 temperature sensors"""
+
+import io
+import os
+import random
+import time
+
+W1_SLAVE_FILE = "w1_slave"
+POWER_ON_RESET_MILLI_C = 85000
+
+class FakeW1Bus:
+    """
+    Directory tree that looks like /sys/bus/w1/devices with one 28-* directory per sensor.
+    Reads go through open(), which adds conversion latency and injects faults:
+    crc_error_rate   -> "crc=.. NO" on line 1 with a garbage reading
+    reset_rate       -> the 85 C power on reset value
+    missing_rate     -> FileNotFoundError, like a sensor that dropped off the bus
+    """
+
+    def __init__(self, root, sensor_count, conversion_latency=0.0,
+                 crc_error_rate=0.0, reset_rate=0.0, missing_rate=0.0, seed=None):
+        self.root = str(root)
+        self.conversion_latency = conversion_latency
+        self.crc_error_rate = crc_error_rate
+        self.reset_rate = reset_rate
+        self.missing_rate = missing_rate
+        self.random = random.Random(seed)
+        self.sensor_ids = [f"28-{i:012x}" for i in range(1, sensor_count + 1)]
+        self.temps_milli_c = {sensor_id: 2000 + self.random.randint(0, 8000) for sensor_id in self.sensor_ids}
+        self.reads = 0
+
+        os.makedirs(self.root, exist_ok=True)
+        for sensor_id in self.sensor_ids:
+            sensor_dir = os.path.join(self.root, sensor_id)
+            os.makedirs(sensor_dir, exist_ok=True)
+            with open(os.path.join(sensor_dir, W1_SLAVE_FILE), "w", encoding="utf-8") as w1_slave:
+                w1_slave.write(self.w1_slave_text(self.temps_milli_c[sensor_id]))
+
+        # Non temperature devices are on real buses too
+        os.makedirs(os.path.join(self.root, "w1_bus_master1"), exist_ok=True)
+
+    @property
+    def devices_path(self) -> str:
+        """Path with a trailing slash, like getTemps.W1_DEVICES_PATH"""
+        return os.path.join(self.root, "")
+
+    @staticmethod
+    def w1_slave_text(milli_c, crc_ok=True) -> str:
+        """w1_slave file contents for a temperature in thousandths of a degree C"""
+        raw = int(milli_c / 62.5) & 0xFFFF
+        data = f"{raw & 0xFF:02x} {raw >> 8:02x} 4b 46 7f ff 0c 10 1c"
+        return f"{data} : crc=1c {'YES' if crc_ok else 'NO'}\n{data} t={milli_c}\n"
+
+    def room_config(self, hostname, assigned=None) -> dict:
+        """getTemps.json style config assigning the first `assigned` sensors to rooms"""
+        assigned = len(self.sensor_ids) if assigned is None else assigned
+        return {hostname: {f"simRoom{i}": {"id": sensor_id, "title": f"Sim Room {i}"}
+                           for i, sensor_id in enumerate(self.sensor_ids[:assigned], start=1)}}
+
+    def drift(self, max_step_milli_c=125):
+        """Random walk every sensor's temperature"""
+        for sensor_id in self.sensor_ids:
+            self.temps_milli_c[sensor_id] += self.random.randint(-max_step_milli_c, max_step_milli_c)
+
+    def open(self, path, mode="r", *args, **kwargs):
+        """Drop-in for builtins.open on w1_slave files, other paths are opened normally"""
+
+        path = str(path)
+        if not path.startswith(self.root) or not path.endswith(W1_SLAVE_FILE):
+            return open(path, mode, *args, **kwargs)
+
+        self.reads += 1
+        if self.conversion_latency:
+            time.sleep(self.conversion_latency)
+
+        sensor_id = os.path.basename(os.path.dirname(path))
+        if sensor_id not in self.temps_milli_c or self.random.random() < self.missing_rate:
+            raise FileNotFoundError(2, "No such file or directory", path)
+
+        if self.random.random() < self.crc_error_rate:
+            return io.StringIO(self.w1_slave_text(self.random.randint(-55000, 125000), crc_ok=False))
+        if self.random.random() < self.reset_rate:
+            return io.StringIO(self.w1_slave_text(POWER_ON_RESET_MILLI_C))
+        return io.StringIO(self.w1_slave_text(self.temps_milli_c[sensor_id]))
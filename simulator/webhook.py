@@ -0,0 +1,73 @@
+"""Local Slack/Discord style webhook that records every post, for testing alert delivery"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class WebhookSinkHandler(BaseHTTPRequestHandler):
+    """Accept JSON posts on any path"""
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Record the post, or answer 503 while failing"""
+        sink = self.server.sink
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if sink.fail_posts:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with sink.lock:
+            sink.posts.append({"path": self.path, "body": json.loads(body), "received": time.monotonic()})
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Keep output quiet"""
+
+class WebhookSink:
+    """
+    Run a webhook on localhost in a background thread, post to sink.url.
+    fail_posts answers with 503, like a webhook service outage.
+    """
+
+    def __init__(self, port=0):
+        self.fail_posts = False
+        self.posts = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), WebhookSinkHandler)
+        self.server.sink = self
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """Webhook URL"""
+        return f"http://127.0.0.1:{self.server.server_port}/hooks/alerts"
+
+    def start(self):
+        """Start serving in a daemon thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait_for_posts(self, count, timeout=5.0) -> list:
+        """Wait until count posts arrived, return the posts"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if len(self.posts) >= count:
+                    break
+            time.sleep(0.01)
+        with self.lock:
+            return list(self.posts)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
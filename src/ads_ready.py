@@ -0,0 +1,144 @@
+"""
+ADS1115 reads paced by the ALERT/RDY pin instead of a fixed sleep.
+Adafruit_ADS1x15 sleeps 1 / data_rate after starting a conversion, whatever the chip's real conversion time.
+Here the comparator thresholds turn ALERT/RDY into a conversion ready signal, wired to a GPIO pin with a pull up.
+The falling edge ends the wait, and a scan starts the next channel's conversion before reading the finished one,
+so the chip converts while the result goes over I2C.
+"""
+
+import logging
+import os
+import threading
+import time
+import smbus2
+
+REG_CONVERSION = 0x00
+REG_CONFIG = 0x01
+REG_LO_THRESH = 0x02
+REG_HI_THRESH = 0x03
+
+CONFIG_OS_SINGLE = 0x8000
+CONFIG_MODE_SINGLE = 0x0100
+CONFIG_COMP_QUE_ONE = 0x0000  # assert ALERT/RDY after one conversion, active low, non latching
+CONFIG_GAIN = {2/3: 0x0000, 1: 0x0200, 2: 0x0400, 4: 0x0600, 8: 0x0800, 16: 0x0A00}
+CONFIG_DATA_RATE = {8: 0x0000, 16: 0x0020, 32: 0x0040, 64: 0x0060, 128: 0x0080, 250: 0x00A0, 475: 0x00C0,
+                    860: 0x00E0}
+
+DATA_RATE = 128
+
+def config_word(channel, gain, data_rate) -> int:
+    """Config register value starting a single shot conversion of a single ended channel"""
+    return (CONFIG_OS_SINGLE | (channel + 0x04) << 12 | CONFIG_GAIN[gain] | CONFIG_MODE_SINGLE |
+            CONFIG_DATA_RATE[data_rate] | CONFIG_COMP_QUE_ONE)
+
+class ReadyPinADS1115:
+    """ADS1115 on an smbus2.SMBus with ALERT/RDY on a GPIO pin, read_adc works like Adafruit_ADS1x15.ADS1115"""
+
+    def __init__(self, bus, address, gpio, pin, data_rate=DATA_RATE, timeout_secs=None):
+        """
+        bus          -> smbus2.SMBus, or anything with its write_i2c_block_data and read_i2c_block_data
+        address      -> I2C address of the ADS1115, like 0x48
+        gpio         -> RPi.GPIO, or anything with its setmode, setup, add_event_detect and cleanup
+        pin          -> BCM number of the GPIO pin ALERT/RDY is wired to
+        data_rate    -> samples per second, one of CONFIG_DATA_RATE
+        timeout_secs -> wait for an edge before checking the config register, default twice the conversion time
+        """
+        if data_rate not in CONFIG_DATA_RATE:
+            raise ValueError(f"ADS1115 data rate {data_rate} not one of {sorted(CONFIG_DATA_RATE)}")
+        self.bus = bus
+        self.address = address
+        self.gpio = gpio
+        self.pin = pin
+        self.data_rate = data_rate
+        self.timeout_secs = timeout_secs or 2.0 / data_rate + 0.005
+        self.ready = threading.Event()
+        self.missed_edges = 0
+
+    def open(self):
+        """Set the thresholds for conversion ready mode and watch the pin for falling edges"""
+        self.bus.write_i2c_block_data(self.address, REG_HI_THRESH, [0x80, 0x00])
+        self.bus.write_i2c_block_data(self.address, REG_LO_THRESH, [0x00, 0x00])
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(self.pin, self.gpio.IN, pull_up_down=self.gpio.PUD_UP)
+        self.gpio.add_event_detect(self.pin, self.gpio.FALLING, callback=self._on_edge)
+        logging.info(f"ADS1115 conversion ready on GPIO {self.pin}, {self.data_rate} samples per second")
+        return self
+
+    def _on_edge(self, pin):
+        del pin
+        self.ready.set()
+
+    def start_conversion(self, channel, gain):
+        """Start a single shot conversion"""
+        config = config_word(channel, gain, self.data_rate)
+        self.ready.clear()
+        self.bus.write_i2c_block_data(self.address, REG_CONFIG, [config >> 8, config & 0xFF])
+
+    def wait_ready(self):
+        """
+        Wait for the conversion ready edge.
+        Without one, the OS bit of the config register says if the conversion finished anyway, an edge can be
+        missed if the pin is slow to pull up. Raise TimeoutError if it didn't.
+        """
+        if self.ready.wait(self.timeout_secs):
+            return
+        config = self.bus.read_i2c_block_data(self.address, REG_CONFIG, 2)
+        if not config[0] & 0x80:
+            raise TimeoutError(f"ADS1115 conversion not ready after {self.timeout_secs * 1000:.0f} ms")
+        self.missed_edges += 1
+        logging.warning(f"No conversion ready edge on GPIO {self.pin}, {self.missed_edges} missed")
+
+    def read_conversion(self) -> int:
+        """Last conversion result, signed"""
+        msb, lsb = self.bus.read_i2c_block_data(self.address, REG_CONVERSION, 2)
+        value = msb << 8 | lsb
+        return value - 0x10000 if value & 0x8000 else value
+
+    def read_adc(self, channel, gain=1, data_rate=None) -> int:
+        """Convert one channel. data_rate is set once for the pin's timeout, it is accepted for compatibility."""
+        del data_rate
+        self.start_conversion(channel, gain)
+        self.wait_ready()
+        return self.read_conversion()
+
+    def scan(self, reads):
+        """
+        Convert (channel, gain) reads back to back.
+        When a conversion is ready the next one is started before its result is read, the conversion register
+        keeps the finished result until the next conversion ends.
+        Yield (ADC value or the OSError reading it, seconds) per read.
+        """
+        reads = list(reads)
+        started = False
+        for index, (channel, gain) in enumerate(reads):
+            read_started = time.monotonic()
+            try:
+                if not started:
+                    self.start_conversion(channel, gain)
+                started = False
+                self.wait_ready()
+                if index + 1 < len(reads):
+                    self.start_conversion(*reads[index + 1])
+                    started = True
+                value = self.read_conversion()
+            except OSError as e:
+                value = e
+            yield value, time.monotonic() - read_started
+
+    def close(self):
+        """Stop watching the pin and close the bus"""
+        self.gpio.cleanup(self.pin)
+        self.bus.close()
+
+def ready_pin_adc_from_env(address, busnum):
+    """
+    Open a ReadyPinADS1115 if ADS1115_READY_PIN is set to the BCM number of the pin ALERT/RDY is wired to.
+    Return None to read with Adafruit_ADS1x15 and its fixed sleep.
+    """
+    pin = os.getenv("ADS1115_READY_PIN", "").strip()
+    if not pin:
+        return None
+
+    from RPi import GPIO  # pylint: disable=import-outside-toplevel,import-error
+    return ReadyPinADS1115(smbus2.SMBus(busnum), address, GPIO, int(pin),
+                           data_rate=int(os.getenv("ADS1115_DATA_RATE", str(DATA_RATE)))).open()
@@ -0,0 +1,289 @@
+"""
+Alert rules evaluated in the collectors, pushed straight to a Slack, Discord or plain JSON webhook.
+Alerts don't wait for InfluxDB and Grafana, and still go out when either is down.
+
+Rules are listed per sensor in the config files, "alerts" in getTemps.json and "ch_alerts" in getPressures.json:
+{"below": 34, "cycles": 3}             -> value below 34 for 3 readings in a row
+{"above": 90}                          -> value above 90
+{"drop_pct": 20, "window_secs": 60}    -> value dropped 20% from the highest reading in the last 60 seconds
+{"off": 6}                             -> sensor OFF for 6 readings in a row
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+
+REPEAT_SECS = 3600      # a rule that keeps firing is sent again after this long
+RATE_PER_MIN = 6        # webhook posts per minute, alerts waiting past the rate are sent together
+BURST = 3               # posts allowed back to back before the rate applies
+MAX_QUEUED = 100        # oldest alerts are dropped past this many waiting
+MAX_PER_POST = 20
+RETRIES = 3
+RETRY_SECS = 10
+TIMEOUT_SECS = 5
+WEBHOOK_FORMATS = ("slack", "discord", "json")
+
+class RuleState:
+    """One rule of one sensor: consecutive matches, the drop window and whether it is firing"""
+
+    __slots__ = ("rule", "matches", "window", "firing", "last_sent")
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.matches = 0
+        self.window = deque()  # (time, value), values decreasing, the first is the window's highest
+        self.firing = False
+        self.last_sent = 0.0
+
+    def drop_pct(self, now, value) -> float:
+        """Drop from the highest value in the window, amortized O(1) with a monotonic deque"""
+        window_secs = self.rule.get("window_secs", 60)
+        while self.window and self.window[-1][1] <= value:
+            self.window.pop()
+        self.window.append((now, value))
+        while self.window[0][0] < now - window_secs:
+            self.window.popleft()
+        highest = self.window[0][1]
+        return (highest - value) / highest * 100 if highest > 0 else 0.0
+
+    def check(self, now, value) -> bool:
+        """Add a reading, None for an OFF reading. Return True if the rule matches."""
+
+        rule = self.rule
+        if value is None:
+            if "off" not in rule:
+                return self.firing  # an OFF sensor neither fires nor resolves a value rule
+            self.matches += 1
+            return self.matches >= rule["off"]
+
+        if "off" in rule:
+            matched = False
+        elif "below" in rule:
+            matched = value < rule["below"]
+        elif "above" in rule:
+            matched = value > rule["above"]
+        else:
+            matched = self.drop_pct(now, value) >= rule["drop_pct"]
+
+        self.matches = self.matches + 1 if matched else 0
+        return self.matches >= rule.get("cycles", 1)
+
+def describe_rule(rule, units) -> str:
+    """Rule as text for alert messages"""
+    if "off" in rule:
+        return f"OFF for {rule['off']} readings"
+    if "drop_pct" in rule:
+        text = f"dropped {rule['drop_pct']}% in {rule.get('window_secs', 60)} seconds"
+    elif "below" in rule:
+        text = f"below {rule['below']} {units}"
+    else:
+        text = f"above {rule['above']} {units}"
+    cycles = rule.get("cycles", 1)
+    return f"{text} for {cycles} readings" if cycles > 1 else text
+
+def valid_rule(rule) -> bool:
+    """True if the rule has exactly one of below, above, drop_pct or off"""
+    return isinstance(rule, dict) and sum(key in rule for key in ("below", "above", "drop_pct", "off")) == 1
+
+class AlertEngine:
+    """Evaluate each sensor's rules on every reading and hand firing, repeated and resolved alerts to a notifier"""
+
+    def __init__(self, source, hostname, notifier, units, repeat_secs=REPEAT_SECS, clock=time.time):
+        """
+        source      -> collector name used in messages, like getTemps
+        hostname    -> host name used in messages
+        notifier    -> object with send(alert), like WebhookNotifier
+        units       -> units of the readings, like F or PSI
+        repeat_secs -> seconds before a rule that is still firing is sent again
+        clock       -> callable returning epoch seconds
+        """
+        self.source = source
+        self.hostname = hostname
+        self.notifier = notifier
+        self.units = units
+        self.repeat_secs = repeat_secs
+        self.clock = clock
+        self.states = {}  # (location, rule index) -> RuleState
+
+    def add(self, location, value, rules):
+        """Evaluate a sensor's rules against a reading, value None for an OFF reading"""
+
+        if not rules:
+            return
+        now = self.clock()
+        for index, rule in enumerate(rules):
+            state = self.states.get((location, index))
+            if state is None or state.rule != rule:
+                if not valid_rule(rule):
+                    logging.error(f"Invalid alert rule for {location}: {rule}")
+                    continue
+                state = self.states[(location, index)] = RuleState(rule)
+
+            matched = state.check(now, value)
+            if matched and not state.firing:
+                self._send(state, "firing", location, value, now)
+            elif matched and now - state.last_sent >= self.repeat_secs:
+                self._send(state, "repeat", location, value, now)
+            elif not matched and state.firing:
+                self._send(state, "resolved", location, value, now)
+            state.firing = matched
+
+    def _send(self, state, event, location, value, now):
+        state.last_sent = now
+        alert = {
+            "event": event,
+            "source": self.source,
+            "hostname": self.hostname,
+            "location": location,
+            "value": value,
+            "units": self.units,
+            "rule": state.rule,
+            "time": now,
+        }
+        logging.warning(f"Alert {event}: {format_alert(alert)}")
+        self.notifier.send(alert)
+
+    def firing(self) -> list:
+        """(location, rule) of every rule that is firing"""
+        return [(location, state.rule) for (location, _), state in self.states.items() if state.firing]
+
+    def close(self):
+        """Close the notifier"""
+        self.notifier.close()
+
+def format_alert(alert) -> str:
+    """One line message for an alert"""
+    value = "OFF" if alert["value"] is None else f"{alert['value']:.1f} {alert['units']}"
+    prefix = {"firing": "ALERT", "repeat": "STILL ALERTING", "resolved": "RESOLVED"}[alert["event"]]
+    return (f"{prefix} {alert['location']} {describe_rule(alert['rule'], alert['units'])}, now {value} "
+            f"({alert['source']} on {alert['hostname']})")
+
+def webhook_payload(alerts, webhook_format) -> dict:
+    """Request body for a batch of alerts"""
+    text = "\n".join(format_alert(alert) for alert in alerts)
+    if webhook_format == "discord":
+        return {"content": text[:2000]}
+    if webhook_format == "json":
+        return {"text": text, "alerts": alerts}
+    return {"text": text}
+
+class WebhookNotifier:
+    """
+    Post alerts to a webhook from a background thread, so a slow or unreachable webhook never delays a cycle.
+    Posts are rate limited with a token bucket. Alerts waiting while the bucket is empty go out together in the next post.
+    """
+
+    def __init__(self, url, webhook_format="slack", rate_per_min=RATE_PER_MIN, burst=BURST,
+                 max_queued=MAX_QUEUED, clock=time.monotonic):
+        """
+        url            -> webhook URL
+        webhook_format -> slack, discord or json
+        rate_per_min   -> posts per minute once the burst is spent
+        burst          -> posts allowed back to back
+        max_queued     -> oldest alerts are dropped past this many waiting
+        clock          -> callable returning seconds
+        """
+        self.url = url
+        self.webhook_format = webhook_format
+        self.rate = (rate_per_min / 60, burst)  # (tokens per second, bucket size)
+        self.clock = clock
+        self.tokens = (float(burst), clock())  # (tokens, refilled at)
+        self.queue = deque(maxlen=max_queued)
+        self.wakeup = threading.Condition()
+        self.stopping = False
+        self.thread = None
+
+    def start(self):
+        """Start the delivery thread"""
+        self.thread = threading.Thread(target=self._deliver_loop, name="alert-webhook", daemon=True)
+        self.thread.start()
+        return self
+
+    def send(self, alert):
+        """Queue an alert, returns immediately"""
+        with self.wakeup:
+            if len(self.queue) == self.queue.maxlen:
+                logging.error(f"Alert queue full, dropped: {format_alert(self.queue[0])}")
+            self.queue.append(alert)
+            self.wakeup.notify()
+
+    def _take_token(self) -> float:
+        """Take a token, return 0. If there is none, return the seconds until there is one."""
+        rate_per_sec, burst = self.rate
+        tokens, refilled = self.tokens
+        now = self.clock()
+        tokens = min(burst, tokens + (now - refilled) * rate_per_sec)
+        if tokens >= 1:
+            self.tokens = (tokens - 1, now)
+            return 0.0
+        self.tokens = (tokens, now)
+        return (1 - tokens) / rate_per_sec
+
+    def post(self, alerts) -> bool:
+        """Post a batch of alerts, return True if the webhook took it"""
+        body = json.dumps(webhook_payload(alerts, self.webhook_format)).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=TIMEOUT_SECS) as response:
+                response.read()
+            return True
+        except OSError as e:
+            logging.error(f"Failure posting {len(alerts)} alerts to the webhook: {e}")
+            return False
+
+    def _deliver_loop(self):
+        attempts = 0
+        while True:
+            with self.wakeup:
+                while not self.queue and not self.stopping:
+                    self.wakeup.wait()
+                if not self.queue:
+                    return
+                wait = self._take_token()
+                if wait:
+                    self.wakeup.wait(wait)
+                    continue
+                batch = [self.queue.popleft() for _ in range(min(MAX_PER_POST, len(self.queue)))]
+
+            if self.post(batch):
+                attempts = 0
+                continue
+            attempts += 1
+            if attempts > RETRIES:
+                logging.error(f"Giving up on {len(batch)} alerts after {RETRIES} retries")
+                attempts = 0
+                continue
+            with self.wakeup:
+                self.queue.extendleft(reversed(batch))
+                if not self.stopping:
+                    self.wakeup.wait(RETRY_SECS)
+
+    def close(self, timeout=TIMEOUT_SECS):
+        """Stop after posting what is waiting, if the rate allows it within timeout seconds"""
+        with self.wakeup:
+            self.stopping = True
+            self.wakeup.notify()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        if self.queue:
+            logging.warning(f"Closing with {len(self.queue)} alerts not sent")
+
+def alert_engine_from_env(source, hostname, units):
+    """Create an AlertEngine posting to ALERT_WEBHOOK_URL if it is set, otherwise return None"""
+
+    url = os.getenv("ALERT_WEBHOOK_URL", "").strip()
+    if not url:
+        return None
+    webhook_format = os.getenv("ALERT_WEBHOOK_FORMAT", "slack").strip().lower()
+    if webhook_format not in WEBHOOK_FORMATS:
+        logging.error(f"Unknown ALERT_WEBHOOK_FORMAT {webhook_format}, using slack")
+        webhook_format = "slack"
+    notifier = WebhookNotifier(url, webhook_format,
+                               rate_per_min=float(os.getenv("ALERT_RATE_PER_MIN", str(RATE_PER_MIN)))).start()
+    repeat_secs = float(os.getenv("ALERT_REPEAT_SECS", str(REPEAT_SECS)))
+    logging.info(f"Alert rules on, posting to a {webhook_format} webhook")
+    return AlertEngine(source, hostname, notifier, units, repeat_secs)
@@ -0,0 +1,86 @@
+"""
+Build the 1 minute and 1 hour rollups for existing history in InfluxDB.
+History is processed in time chunks so each query stays small.
+Requires .env or .env.<hostname> file for InfluxDB.
+
+Example:
+python backfill_rollups.py --start 2024-11-01 --end 2025-04-01 --source-rp autogen
+python backfill_rollups.py --start 2024-11-01 --end 2025-04-01 --source-rp autogen --database <TEMP_SENSOR_DATABASE>
+"""
+
+import argparse
+import logging
+import os
+import socket
+import sys
+from datetime import datetime, timedelta, timezone
+from common_functions import choose_dotenv, database_connect
+from influx_schema import ROLLUP_FIELDS, ROLLUP_TIERS, RAW_RP, provision_schema, rollup_measurements, rollup_select
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Backfill InfluxDB rollups in time chunks")
+    parser.add_argument("--start", required=True, help="Start date, YYYY-MM-DD (UTC)")
+    parser.add_argument("--end", help="End date, YYYY-MM-DD (UTC), default now")
+    parser.add_argument("--chunk-hours", type=int, default=24, help="Hours of history per query, default 24")
+    parser.add_argument("--source-rp", default="autogen",
+                        help="Retention policy holding the raw history, default autogen")
+    parser.add_argument("--measurements", nargs="+", choices=list(ROLLUP_FIELDS),
+                        help="Measurements to backfill, default those written to the database")
+    parser.add_argument("--database", help="Database name, default SENSOR_DATABASE from the dotenv file")
+    return parser.parse_args()
+
+def time_chunks(start, end, chunk_hours):
+    """Yield (start, end) RFC3339 string pairs covering start to end"""
+    chunk = timedelta(hours=chunk_hours)
+    chunk_start = start
+    while chunk_start < end:
+        chunk_end = min(chunk_start + chunk, end)
+        yield chunk_start.strftime("%Y-%m-%dT%H:%M:%SZ"), chunk_end.strftime("%Y-%m-%dT%H:%M:%SZ")
+        chunk_start = chunk_end
+
+def backfill(client, database, measurements, source_rp, start, end, chunk_hours):
+    """Run the rollup queries for every chunk, tier and measurement"""
+
+    for time_range in time_chunks(start, end, chunk_hours):
+        for measurement in measurements:
+            for rollup_rp, interval, tier_source_rp in ROLLUP_TIERS:
+                # The first tier reads the raw history from the chosen retention policy
+                if tier_source_rp == RAW_RP:
+                    tier_source_rp = source_rp
+                query = rollup_select(database, measurement, rollup_rp, interval, tier_source_rp, time_range)
+                client.query(query, database=database)
+                logging.info(f"{measurement} {interval} rollup done: {time_range[0]} - {time_range[1]}")
+
+if __name__ == "__main__":
+
+    HOSTNAME = socket.gethostname()
+    choose_dotenv(HOSTNAME)
+
+    FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format=FORMAT)
+
+    args = parse_args()
+    DATABASE = args.database or os.getenv("SENSOR_DATABASE")
+
+    START = datetime.strptime(args.start, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    END = (datetime.strptime(args.end, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+           if args.end else datetime.now(timezone.utc))
+
+    db_client = database_connect(os.getenv("INFLUXDB_HOST"),
+                                 os.getenv("INFLUXDB_PORT"),
+                                 os.getenv("USERNAME"),
+                                 os.getenv("PASSWORD"),
+                                 DATABASE)
+
+    try:
+        if not provision_schema(db_client, DATABASE):
+            sys.exit(1)
+        backfill(db_client, DATABASE, args.measurements or rollup_measurements(DATABASE), args.source_rp, START, END,
+                 args.chunk_hours)
+        logging.info("Backfill complete")
+    except KeyboardInterrupt:
+        logging.info("Exiting gracefully")
+        print()
+    finally:
+        db_client.close()
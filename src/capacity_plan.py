@@ -0,0 +1,292 @@
+"""
+Capacity planner for InfluxDB series cardinality and write load, from the sensor config files.
+Points are built with the collectors' own point constructors for every sensor in getTemps.json, getPressures.json,
+getSHT30.json and getWeather.json, so tag sets and line sizes follow the code.
+Reports series, points/s, bytes/day on disk and HTTP write requests/s per measurement, and the upload of each host.
+What-if options scale sensors, add hosts, change cadences, and model deadband and gateway batching.
+Requires .env or .env.<hostname> file for the weather location without getWeather.json.
+
+Examples:
+python capacity_plan.py --config-dir config
+python capacity_plan.py --config-dir config --scale getTemps=2 --add-hosts getPressures=1 --cadence getTemps=2
+python capacity_plan.py --config-dir config --deadband-keep 0.2 --gateway-flush-secs 10
+"""
+
+import argparse
+import copy
+import logging
+import math
+import os
+import socket
+import sys
+from common_functions import choose_dotenv, load_json_file
+from gateway import BATCH_POINTS
+from getPressures import NO_PSI, PRESSURE_SENSOR_ID, PRESSURE_SENSOR_TYPE, PressureSensorReader
+from getSHT30 import SHT30Utils
+from getTemps import NO_TEMP, TempUtils
+from weather_utils import construct_weather_point, construct_forecast_points
+
+# Sleep between cycles of each collector
+CADENCE_SECS = {"getTemps": 5, "getPressures": 5, "getSHT30": 10, "getWeather": 600}
+# TSM stores a slowly changing reading and its regular timestamp in about 2-3 bytes after compression
+DISK_BYTES_PER_VALUE = 3
+SAMPLE_TIME_NS = 1735732800000000000
+DEADBAND_COLLECTORS = ("getTemps", "getPressures")
+
+# One Call response with every field the weather points use, for the line sizes
+SAMPLE_HOUR = {"dt": 1735743600, "temp": 25.0, "feels_like": 18.2, "humidity": 85, "pop": 0.4,
+               "wind_speed": 9.0, "wind_gust": 15.0, "weather": [{"main": "Snow"}]}
+SAMPLE_DAY = {"dt": 1735754400, "temp": {"min": 10.0, "max": 26.0}, "humidity": 80, "pop": 0.6, "snow": 2.5,
+              "rain": 0.0, "wind_speed": 10.0, "wind_gust": 20.0, "weather": [{"main": "Clouds"}]}
+SAMPLE_ONE_CALL = {
+    "current": {"humidity": 80, "feels_like": 20.5, "wind_deg": 270, "wind_speed": 8.1, "weather": [{"main": "Snow"}]},
+    "hourly": [SAMPLE_HOUR] * 48,
+    "daily": [SAMPLE_DAY] * 8,
+}
+
+def line_bytes(point) -> int:
+    """Bytes of a point in line protocol, with a nanosecond timestamp"""
+    from influxdb.line_protocol import make_lines  # pylint: disable=import-outside-toplevel
+    return len(make_lines({"points": [{**point, "time": SAMPLE_TIME_NS}]}).encode("utf-8"))
+
+class Workload:
+    """Points one collector on one host writes to one measurement"""
+
+    __slots__ = ("collector", "hostname", "measurement", "series", "points_per_cycle", "cycle_secs",
+                 "line_bytes", "values_per_point", "stored_per_day")
+
+    def __init__(self, collector, hostname, points, series=None, stored_per_day=None):
+        """
+        points         -> points written every cycle, built by the collector's constructor
+        series         -> series the points make over time, default one per point
+        stored_per_day -> points kept on disk per day when points overwrite earlier ones, default all written
+        """
+        self.collector = collector
+        self.hostname = hostname
+        self.measurement = points[0]["measurement"]
+        self.series = len(points) if series is None else series
+        self.points_per_cycle = len(points)
+        self.cycle_secs = CADENCE_SECS[collector]
+        self.line_bytes = sum(line_bytes(point) for point in points) / len(points)
+        self.values_per_point = sum(len(point["fields"]) for point in points) / len(points)
+        self.stored_per_day = stored_per_day
+
+    def points_per_sec(self) -> float:
+        """Points written per second"""
+        return self.points_per_cycle / self.cycle_secs
+
+    def stored_points_per_day(self) -> float:
+        """Points kept on disk per day"""
+        return self.points_per_sec() * 86400 if self.stored_per_day is None else self.stored_per_day
+
+    def scaled(self, factor, hostname=None):
+        """Copy with factor times the sensors, on another host if hostname is given"""
+        scaled = copy.copy(self)
+        scaled.series = math.ceil(self.series * factor)
+        scaled.points_per_cycle = self.points_per_cycle * factor
+        if self.stored_per_day is not None:
+            scaled.stored_per_day = self.stored_per_day * factor
+        if hostname is not None:
+            scaled.hostname = hostname
+        return scaled
+
+def temps_workloads(json_config) -> list[Workload]:
+    """getTemps, one series per sensor and status, On and OFF"""
+    workloads = []
+    for hostname, rooms in (json_config or {}).items():
+        points = [TempUtils.construct_data_point(room_id, room.get("id"), room.get("title") or "Untitled", "On",
+                                                 hostname, NO_TEMP) for room_id, room in rooms.items()]
+        if points:
+            workloads.append(Workload("getTemps", hostname, points, series=2 * len(points)))
+    return workloads
+
+def pressures_workloads(json_config) -> list[Workload]:
+    """getPressures, every configured channel gets a point, disabled channels too, enabled ones with adc_raw"""
+    workloads = []
+    for hostname, channels in (json_config or {}).items():
+        reader = PressureSensorReader(None, channels, hostname, PRESSURE_SENSOR_ID, PRESSURE_SENSOR_TYPE)
+        reader.adc_counts = {channel: 0 for channel, ch_cfg in channels.items() if ch_cfg.get("ch_enabled") == "Enabled"}
+        points = reader.construct_points({channel: NO_PSI for channel in channels})
+        if points:
+            workloads.append(Workload("getPressures", hostname, points))
+    return workloads
+
+def sht30_workloads(json_config) -> list[Workload]:
+    """getSHT30, only the first sensor of a host is read"""
+    workloads = []
+    for hostname, sensors in (json_config or {}).items():
+        for location, sensor in list(sensors.items())[:1]:
+            point = SHT30Utils.construct_data_point(location, sensor["id"], sensor["title"], hostname, 0.0, 0.0)
+            workloads.append(Workload("getSHT30", hostname, [point]))
+    return workloads
+
+def weather_workloads(json_config, forecast_enabled, env_location=None) -> list[Workload]:
+    """
+    getWeather, current weather per location and, with forecasts, 48 hourly and 8 daily points per location.
+    Forecast points are stamped with the forecast time, so a day only keeps 24 hourly and 1 daily point.
+    """
+
+    hosts = json_config or ({"getWeather": {env_location: {}}} if env_location else {})
+    workloads = []
+    for hostname, locations in hosts.items():
+        current = [construct_weather_point(SAMPLE_ONE_CALL, location) for location in locations]
+        if not current:
+            continue
+        workloads.append(Workload("getWeather", hostname, current))
+        if forecast_enabled:
+            forecasts = [point for location in locations
+                         for point in construct_forecast_points(SAMPLE_ONE_CALL, location)]
+            for measurement, per_day in (("weather_hourly", 24), ("weather_daily", 1)):
+                points = [point for point in forecasts if point["measurement"] == measurement]
+                workloads.append(Workload("getWeather", hostname, points, series=len(locations),
+                                          stored_per_day=per_day * len(locations)))
+    return workloads
+
+def load_workloads(config_dir, forecast_enabled, env_location=None) -> list[Workload]:
+    """Workloads of every collector from the config files in config_dir, collectors without a file are left out"""
+
+    def config(name):
+        path = os.path.join(config_dir, name)
+        return load_json_file(path) if os.path.exists(path) else None
+
+    return (temps_workloads(config("getTemps.json")) + pressures_workloads(config("getPressures.json")) +
+            sht30_workloads(config("getSHT30.json")) +
+            weather_workloads(config("getWeather.json"), forecast_enabled, env_location))
+
+def apply_scenario(workloads, scale=None, add_hosts=None, cadence=None, deadband_keep=None,
+                   heartbeat_secs=None) -> list[Workload]:
+    """
+    What-if copy of workloads.
+    scale          -> {collector: factor} more or fewer sensors on every host
+    add_hosts      -> {collector: hosts} more hosts like the average host of the collector
+    cadence        -> {collector: seconds} another sleep between cycles
+    deadband_keep  -> share of readings that change enough to be written, for getTemps and getPressures
+    heartbeat_secs -> deadband heartbeat, every series is written at least this often
+    """
+
+    planned = [workload.scaled((scale or {}).get(workload.collector, 1.0)) for workload in workloads]
+
+    for collector, hosts in (add_hosts or {}).items():
+        existing = [workload for workload in planned if workload.collector == collector]
+        host_count = len({workload.hostname for workload in existing})
+        for i in range(1, hosts + 1 if host_count else 1):
+            planned.extend(workload.scaled(1 / host_count, f"planned-{collector}-{i}") for workload in existing)
+
+    for workload in planned:
+        workload.cycle_secs = (cadence or {}).get(workload.collector, workload.cycle_secs)
+        if deadband_keep is not None and workload.collector in DEADBAND_COLLECTORS:
+            floor = workload.cycle_secs / heartbeat_secs if heartbeat_secs else 0.0
+            workload.points_per_cycle *= min(1.0, max(deadband_keep, floor))
+    return planned
+
+def plan(workloads, bytes_per_value=DISK_BYTES_PER_VALUE, gateway_flush_secs=None, batch_points=BATCH_POINTS):
+    """
+    Totals per measurement and per host.
+    Every collector sends one write request per cycle. Through the gateway, InfluxDB gets one request per
+    flush, more when a flush holds more than batch_points.
+    Return (measurements, hosts, influxdb requests/s).
+    """
+
+    measurements, hosts = {}, {}
+    for workload in workloads:
+        points_per_sec = workload.points_per_sec()
+        row = measurements.setdefault(workload.measurement, {"hosts": set(), "series": 0, "points_per_sec": 0.0,
+                                                             "disk_bytes_per_day": 0.0})
+        row["hosts"].add(workload.hostname)
+        row["series"] += workload.series
+        row["points_per_sec"] += points_per_sec
+        row["disk_bytes_per_day"] += workload.stored_points_per_day() * workload.values_per_point * bytes_per_value
+
+        host = hosts.setdefault(workload.hostname, {"points_per_sec": 0.0, "upload_bytes_per_sec": 0.0,
+                                                    "requests": {}})
+        host["points_per_sec"] += points_per_sec
+        host["upload_bytes_per_sec"] += points_per_sec * workload.line_bytes
+        host["requests"][workload.collector] = 1 / workload.cycle_secs
+    for host in hosts.values():
+        host["requests_per_sec"] = sum(host.pop("requests").values())
+
+    if gateway_flush_secs:
+        points_per_flush = sum(row["points_per_sec"] for row in measurements.values()) * gateway_flush_secs
+        requests_per_sec = max(1, math.ceil(points_per_flush / batch_points)) / gateway_flush_secs
+    else:
+        requests_per_sec = sum(host["requests_per_sec"] for host in hosts.values())
+    return measurements, hosts, requests_per_sec
+
+def format_plan(measurements, hosts, requests_per_sec) -> str:
+    """Report tables"""
+
+    lines = [f"{'Measurement':<16}{'Hosts':>7}{'Series':>9}{'Points/s':>11}{'Points/day':>13}{'Disk MB/day':>13}"]
+    total_series = total_points = total_disk = 0
+    for measurement, row in sorted(measurements.items()):
+        lines.append(f"{measurement:<16}{len(row['hosts']):>7}{row['series']:>9}{row['points_per_sec']:>11.2f}"
+                     f"{row['points_per_sec'] * 86400:>13,.0f}{row['disk_bytes_per_day'] / 1e6:>13.2f}")
+        total_series += row["series"]
+        total_points += row["points_per_sec"]
+        total_disk += row["disk_bytes_per_day"]
+    lines.append(f"{'Total':<16}{len(hosts):>7}{total_series:>9}{total_points:>11.2f}"
+                 f"{total_points * 86400:>13,.0f}{total_disk / 1e6:>13.2f}")
+    lines.append(f"InfluxDB write requests/s: {requests_per_sec:.2f}, disk per 365 days: {total_disk * 365 / 1e9:.2f} GB")
+    lines.append("")
+    lines.append(f"{'Host':<32}{'Points/s':>11}{'Upload KB/s':>13}{'Upload MB/day':>15}{'Requests/s':>12}")
+    for hostname, host in sorted(hosts.items()):
+        lines.append(f"{hostname:<32}{host['points_per_sec']:>11.2f}{host['upload_bytes_per_sec'] / 1e3:>13.2f}"
+                     f"{host['upload_bytes_per_sec'] * 86400 / 1e6:>15.1f}{host['requests_per_sec']:>12.2f}")
+    return "\n".join(lines)
+
+def collector_value(value_type):
+    """argparse type for COLLECTOR=VALUE arguments, parsed to (collector, value)"""
+
+    def parse(text):
+        collector, _, value = text.partition("=")
+        if collector not in CADENCE_SECS:
+            raise argparse.ArgumentTypeError(f"unknown collector {collector}, one of {', '.join(CADENCE_SECS)}")
+        try:
+            return collector, value_type(value)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(f"invalid value in {text}") from e
+    return parse
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Model InfluxDB series and write load from the sensor config files")
+    parser.add_argument("--config-dir", default="config", help="Directory with the get*.json files, default config")
+    parser.add_argument("--forecast", action="store_true", default=None,
+                        help="Model weather forecasts, default WEATHER_FORECAST_ENABLED from the dotenv file")
+    parser.add_argument("--scale", nargs="+", default=[], type=collector_value(float), metavar="COLLECTOR=FACTOR",
+                        help="More or fewer sensors per host")
+    parser.add_argument("--add-hosts", nargs="+", default=[], type=collector_value(int), metavar="COLLECTOR=HOSTS",
+                        help="Hosts like the average host")
+    parser.add_argument("--cadence", nargs="+", default=[], type=collector_value(float), metavar="COLLECTOR=SECS",
+                        help="Seconds between cycles")
+    parser.add_argument("--deadband-keep", type=float,
+                        help="Share of getTemps and getPressures readings written with deadband, like 0.2")
+    parser.add_argument("--heartbeat-secs", type=float, default=600,
+                        help="Deadband heartbeat, default 600")
+    parser.add_argument("--gateway-flush-secs", type=float, help="Write through gateway.py, flushing this often")
+    parser.add_argument("--batch-points", type=int, default=BATCH_POINTS,
+                        help=f"Gateway batch size, default {BATCH_POINTS}")
+    parser.add_argument("--bytes-per-value", type=float, default=DISK_BYTES_PER_VALUE,
+                        help=f"Compressed bytes per field value on disk, default {DISK_BYTES_PER_VALUE}")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Print the plan for the config files and the what-if options"""
+
+    args = parse_args(argv)
+    forecast_enabled = args.forecast
+    if forecast_enabled is None:
+        forecast_enabled = os.getenv("WEATHER_FORECAST_ENABLED", "false").strip().lower() == "true"
+    workloads = apply_scenario(load_workloads(args.config_dir, forecast_enabled, os.getenv("LOCATION")),
+                               scale=dict(args.scale), add_hosts=dict(args.add_hosts), cadence=dict(args.cadence),
+                               deadband_keep=args.deadband_keep, heartbeat_secs=args.heartbeat_secs)
+    if not workloads:
+        logging.error(f"No config files found in {args.config_dir}")
+        return 1
+    print(format_plan(*plan(workloads, args.bytes_per_value, args.gateway_flush_secs, args.batch_points)))
+    return 0
+
+if __name__ == "__main__":
+
+    choose_dotenv(socket.gethostname())
+    logging.basicConfig(stream=sys.stderr, level=logging.WARNING, format='%(asctime)-15s %(levelname)s %(message)s')
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Per cycle API of the collectors.
+getTemps, getPressures, getSHT30 and getWeather each have run_cycle(state), one pass of their main loop:
+reload the config if it changed, read the hardware, construct the points and write them.
+The main blocks build a CycleState from the dotenv file, the real hardware and InfluxDB, and add the
+watchdog, profilers and sleeping around run_cycle. Tests and simulator/soak.py build one from the simulators,
+an in memory writer and a simulated clock, and run a month of cycles in seconds.
+"""
+
+import logging
+import time
+from common_functions import load_json_file
+
+def run_inline(phase, func, *args, **kwargs):
+    """Run a phase without a deadline, for tests and soak runs. LoopWatchdog.run has the same signature."""
+    del phase
+    return func(*args, **kwargs)
+
+class CycleState:
+    """What a collector cycle reads from and writes to, and what it keeps between cycles"""
+
+    def __init__(self, hostname, writer, hardware, config_file=None, config_listener=None, features=None,
+                 run_phase=run_inline, clock=time):
+        """
+        hostname        -> host name for the config lookup and the hostname tags
+        writer          -> write_points(series, **kwargs) -> bool, client and pending_points, like DeferredInfluxWriter
+        hardware        -> what the collector reads, see each collector's run_cycle
+        config_file     -> json config file, None for collectors without one
+        config_listener -> ConfigListener reloading the config when it changed, None loads it once
+        features        -> {name: optional feature or None}, see each collector's run_cycle
+        run_phase       -> LoopWatchdog.run for phase deadlines, or run_inline
+        clock           -> time, or an object with the same time(), monotonic() and sleep()
+        """
+        self.hostname = hostname
+        self.writer = writer
+        self.hardware = hardware
+        self.config_file = config_file
+        self.config_listener = config_listener
+        self.features = features or {}
+        self.run_phase = run_phase
+        self.clock = clock
+        self.json_config = None
+
+    def load_config(self) -> bool:
+        """Load the json config on the first cycle and when the listener says it changed. Return True if loaded."""
+
+        if self.json_config is not None and (self.config_listener is None or not self.config_listener.changed()):
+            return False
+        logging.info(f"Loading {self.config_file}")
+        self.json_config = self.run_phase("config", load_json_file, self.config_file)
+        return True
+
+    def write(self, series, **kwargs) -> bool:
+        """Write the series in the write phase and log where it went, return True if written"""
+
+        if self.run_phase("write", self.writer.write_points, series, **kwargs):
+            logging.info(f"Series written to InfluxDB: {len(series)} points")
+            return True
+        logging.info(f"InfluxDB not connected, {self.writer.pending_points} points buffered")
+        return False
@@ -3,15 +3,11 @@
 import json
 import logging
 import os
+import time
 from pathlib import Path
-import shutil
-import tempfile
-from datetime import datetime
-import smbclient
 from dotenv import load_dotenv
-from influxdb import InfluxDBClient
+from influx_schema import provision_schema
 
-logging.getLogger("smbprotocol").setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 def choose_dotenv(hostname):
@@ -26,11 +22,20 @@ def choose_dotenv(hostname):
         print("Using .env")
         load_dotenv(override=True)
 
-def database_connect(influxdb_host, influxdb_port, username, password, database):
-    """Connect to the database, create if it doesn't exist"""
+def database_connect(influxdb_host, influxdb_port, username, password, database, provision=False, gzip=False):
+    """
+    Connect to the database, create if it doesn't exist.
+    If provision is True, create the retention policies and continuous queries for rollups.
+    If gzip is True, request and response bodies are gzip compressed.
+    influxdb (and requests) is imported here, not at module level, so services start sampling before paying for it.
+    """
+
+    from influxdb import InfluxDBClient  # pylint: disable=import-outside-toplevel
+
+    timeout = float(os.getenv("INFLUXDB_TIMEOUT_SECS", "10"))
 
     logger.info(f"Connecting InfluxDB: {influxdb_host}")
-    client = InfluxDBClient(influxdb_host, influxdb_port, username, password, database)
+    client = InfluxDBClient(influxdb_host, influxdb_port, username, password, database, timeout=timeout, gzip=gzip)
     databases = client.get_list_database()
 
     if not any(db['name'] == database for db in databases):
@@ -38,10 +43,24 @@ def database_connect(influxdb_host, influxdb_port, username, password, database)
         client.create_database(database)
         client.switch_database(database)
 
+    if provision:
+        provision_schema(client, database)
+
     logger.info(f"InfluxDB client ok! Using {database}")
 
     return client
 
+def provision_enabled() -> bool:
+    """Return True if INFLUXDB_PROVISION_SCHEMA is set to true in the dotenv file"""
+    return os.getenv("INFLUXDB_PROVISION_SCHEMA", "false").strip().lower() == "true"
+
+def fast_start_enabled() -> bool:
+    """
+    Return True if FAST_START is set to true in the dotenv file.
+    Services then take the first reading before InfluxDB is connected and buffer points until it is.
+    """
+    return os.getenv("FAST_START", "false").strip().lower() == "true"
+
 def load_json_file(json_file):
     """Load json file, handle exceptions"""
     try:
@@ -57,75 +76,44 @@ def load_json_file(json_file):
         logger.error(f"An unexpected error has occurred: {e}")
     return None
 
-class SMBFileTransfer:
-    """Create connection to SMB share and copy files"""
-
-    def __init__(self, server, port, share, remote_dir, username, password, config_file_name, config_file):
-        self.server = server
-        self.port = port
-        self.share = share
-        self.remote_dir = remote_dir
-        self.username = username
-        self.password = password
-        self.config_file_name = config_file_name
-        self.config_file = config_file
-        self.remote_file = f"\\\\{self.server}\\{self.share}\\{self.remote_dir}\\{self.config_file_name}"
-
-    def connect(self):
-        """Connect to the SMB server"""
-
-        try:
-            smbclient.register_session(
-                self.server,
-                port = self.port,
-                username=self.username,
-                password=self.password
-                )
-            logger.info(f"Connected to SMB server: {self.server}")
-            return True
-
-        except (OSError, PermissionError) as e:
-            logger.error(f"Connection error to {self.server}: {e}")
-        except Exception as e:
-            logger.error(f"Unknown error while connecting to {self.server}: {e}")
-        return False
-
-    def get_json_config(self):
-        """
-        Get JSON config via smbclient.
-        Only overwrite local file if remote is newer or local is missing,
-        and JSON is valid.
-        """
-
-        try:
-            stat = smbclient.stat(self.remote_file)
-            remote_mtime = datetime.fromtimestamp(stat.st_mtime)
-
-            update_needed = (
-                remote_mtime > datetime.fromtimestamp(os.path.getmtime(self.config_file))
-                if os.path.exists(self.config_file)
-                else True
-            )
-
-            if not update_needed:
-                logger.info(f"Local {self.config_file_name} is already up to date")
-                return True
-
-            with smbclient.open_file(self.remote_file, "r", encoding="utf-8") as open_smb_file:
-                smb_file_content = open_smb_file.read()
-
-            json.loads(smb_file_content) # validate json
-
-            with tempfile.NamedTemporaryFile("w", encoding="utf-8", delete=False) as tmp:
-                tmp.write(smb_file_content)
-
-            shutil.move(tmp.name, self.config_file)
-
-            logger.info("Local config updated from remote")
-            return True
-
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON: {self.remote_file} - {e}")
-        except Exception as e:
-            logger.error(f"Error fetching config: {e}")
-        return False
+def process_age_secs():
+    """Seconds since this process started, from /proc. None where /proc isn't available."""
+    try:
+        with open("/proc/self/stat", encoding="utf-8") as open_stat:
+            start_ticks = int(open_stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", encoding="utf-8") as open_uptime:
+            uptime = float(open_uptime.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StartupTimer:
+    """Log how long each startup phase takes, from process start to the first reading"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.last = self.started
+        self.phases = {}
+        self.done = False
+        self.age_at_start = process_age_secs()
+
+    def mark(self, phase):
+        """Record the time since the previous mark as phase"""
+        if self.done:
+            return
+        now = self.clock()
+        if not self.phases and self.age_at_start is not None:
+            self.phases["interpreter and imports"] = self.age_at_start
+            logger.info(f"Startup interpreter and imports: {self.age_at_start * 1000:.0f} ms")
+        self.phases[phase] = now - self.last
+        self.last = now
+        logger.info(f"Startup {phase}: {self.phases[phase] * 1000:.0f} ms")
+
+    def finish(self, phase):
+        """Record the last phase and log the total, later marks are ignored"""
+        if self.done:
+            return
+        self.mark(phase)
+        self.done = True
+        logger.info(f"Startup total: {sum(self.phases.values()) * 1000:.0f} ms")
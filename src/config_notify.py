@@ -0,0 +1,77 @@
+"""
+Config update notifications between config_sync.py and the collectors, over unix datagram sockets.
+Kept apart from config_sync.py so collectors don't import smbclient.
+"""
+
+import logging
+import os
+import socket
+
+NOTIFY_DIR = os.path.join("config", "notify")
+
+def notify_listeners(updated, notify_dir=NOTIFY_DIR):
+    """Send the updated file names to every collector listening in the notify dir"""
+
+    if not updated or not os.path.isdir(notify_dir):
+        return
+
+    message = "\n".join(updated).encode("utf-8")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as notify_socket:
+        for name in os.listdir(notify_dir):
+            if not name.endswith(".sock"):
+                continue
+            try:
+                notify_socket.sendto(message, os.path.join(notify_dir, name))
+                logging.info(f"Notified {name}: {', '.join(updated)}")
+            except OSError as e:
+                logging.debug(f"No listener on {name}: {e}")
+
+class ConfigListener:
+    """
+    Collector side of the config sync agent.
+    Binds a unix datagram socket in the notify dir, changed() drains it without blocking.
+    Falls back to reloading every cycle if the socket can't be created.
+    """
+
+    def __init__(self, config_file_name, notify_dir=NOTIFY_DIR):
+        self.config_file_name = config_file_name
+        self.socket_path = os.path.join(notify_dir, f"{os.path.splitext(config_file_name)[0]}.sock")
+        self.listen_socket = None
+
+        try:
+            os.makedirs(notify_dir, exist_ok=True)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.listen_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.listen_socket.bind(self.socket_path)
+            self.listen_socket.setblocking(False)
+            logging.info(f"Listening for config updates on {self.socket_path}")
+        except OSError as e:
+            logging.warning(f"Cannot listen for config updates, reloading every cycle: {e}")
+            self.close()
+
+    def changed(self) -> bool:
+        """Return True if the sync agent updated the config file since the last call"""
+
+        if self.listen_socket is None:
+            return True
+
+        changed = False
+        while True:
+            try:
+                message = self.listen_socket.recv(4096)
+            except BlockingIOError:
+                return changed
+            except OSError as e:
+                logging.error(f"Error reading config update: {e}")
+                return True
+            if self.config_file_name in message.decode("utf-8", "replace").split("\n"):
+                changed = True
+
+    def close(self):
+        """Close and remove the socket"""
+        if self.listen_socket is not None:
+            self.listen_socket.close()
+            self.listen_socket = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
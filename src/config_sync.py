@@ -0,0 +1,159 @@
+"""
+Per host config sync agent.
+Holds one SMB session, pulls every changed get*.json file from the share in one directory listing,
+writes them to the config dir atomically and notifies the running collectors over a unix socket.
+The collectors only read local files, so a slow or unreachable NAS doesn't stall sensor sampling.
+"""
+
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import time
+import smbclient
+from common_functions import choose_dotenv
+from config_notify import NOTIFY_DIR, notify_listeners
+
+CONFIG_DIR = "config"
+CONFIG_PATTERN = "get*.json"
+SYNC_INTERVAL_SECS = 30
+
+logging.getLogger("smbprotocol").setLevel(logging.WARNING)
+
+class ConfigSyncAgent:
+    """Pull changed config files from the SMB share and notify the collectors"""
+
+    def __init__(self, server, port, share, remote_dir, username, password,
+                 config_dir=CONFIG_DIR, notify_dir=NOTIFY_DIR):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.remote_path = f"\\\\{server}\\{share}\\{remote_dir}"
+        self.config_dir = config_dir
+        self.notify_dir = notify_dir
+        self.connected = False
+
+    def connect(self):
+        """Register the SMB session, shared by every file"""
+
+        try:
+            smbclient.register_session(self.server, port=self.port, username=self.username, password=self.password)
+            logging.info(f"Connected to SMB server: {self.server}")
+            self.connected = True
+        except Exception as e:
+            logging.error(f"Connection error to {self.server}: {e}")
+            self.connected = False
+        return self.connected
+
+    def _is_current(self, name, remote_stat) -> bool:
+        """Local copies are stamped with the remote mtime, so equal mtime and size means unchanged"""
+
+        local_file = os.path.join(self.config_dir, name)
+        try:
+            local_stat = os.stat(local_file)
+        except FileNotFoundError:
+            return False
+        return int(local_stat.st_mtime) == int(remote_stat.st_mtime) and local_stat.st_size == remote_stat.st_size
+
+    def _pull(self, entry, remote_stat) -> bool:
+        """Copy one remote file to the config dir if it is valid JSON"""
+
+        with smbclient.open_file(entry.path, "r", encoding="utf-8") as open_smb_file:
+            content = open_smb_file.read()
+
+        try:
+            json.loads(content)
+        except json.JSONDecodeError as e:
+            logging.error(f"Invalid JSON, keeping local copy: {entry.path} - {e}")
+            return False
+
+        local_file = os.path.join(self.config_dir, entry.name)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.config_dir, delete=False) as tmp:
+            tmp.write(content)
+        os.chmod(tmp.name, 0o644)
+        os.utime(tmp.name, (remote_stat.st_mtime, remote_stat.st_mtime))
+        os.replace(tmp.name, local_file)
+
+        logging.info(f"Local {entry.name} updated from remote")
+        return True
+
+    def sync_once(self):
+        """
+        Pull every config file that differs from the local copy.
+        One directory listing returns the mtime and size of every file, so unchanged files cost no extra calls.
+        Return the names of the updated files, None if the share couldn't be read.
+        """
+
+        if not self.connected and not self.connect():
+            return None
+
+        updated = []
+        try:
+            for entry in smbclient.scandir(self.remote_path, search_pattern=CONFIG_PATTERN):
+                if not entry.is_file():
+                    continue
+                remote_stat = entry.stat()
+                if self._is_current(entry.name, remote_stat):
+                    logging.debug(f"Local {entry.name} is already up to date")
+                    continue
+                if self._pull(entry, remote_stat):
+                    updated.append(entry.name)
+
+        except Exception as e:
+            logging.error(f"Error syncing config from {self.remote_path}: {e}")
+            self.connected = False
+            return None
+
+        return updated
+
+    def notify(self, updated):
+        """Send the updated file names to every collector listening in the notify dir"""
+        notify_listeners(updated, self.notify_dir)
+
+    def close(self):
+        """Drop the SMB session"""
+        try:
+            smbclient.delete_session(self.server, port=self.port)
+        except Exception as e:
+            logging.debug(f"Error closing SMB session: {e}")
+
+if __name__ == "__main__":
+
+    HOSTNAME = socket.gethostname()
+    choose_dotenv(HOSTNAME)
+
+    LOG_LEVEL = os.getenv("LOG_LEVEL_CONFIG_SYNC", "INFO").upper()
+    LOG_FILE = os.getenv("LOG_FILE_CONFIG_SYNC", "/var/log/configSync.log")
+    FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+    numeric_level = getattr(logging, LOG_LEVEL, logging.INFO)
+    logging.basicConfig(filename=LOG_FILE, level=numeric_level, format=FORMAT)
+    print(f"Logging to {LOG_FILE}")
+
+    logging.info(f"Python version: {sys.version}")
+
+    SYNC_SECS = int(os.getenv("CONFIG_SYNC_INTERVAL_SECS", str(SYNC_INTERVAL_SECS)))
+
+    agent = ConfigSyncAgent(os.getenv("SMB_SERVER_IP"),
+                            int(os.getenv("SMB_SERVER_PORT") or "445"),
+                            os.getenv("SMB_SHARE_NAME"),
+                            os.getenv("SMB_CONFIG_DIR"),
+                            os.getenv("SMB_USERNAME"),
+                            os.getenv("SMB_PASSWORD"))
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+
+    try:
+        while True:
+            logging.info(f"Syncing {CONFIG_PATTERN} from {agent.remote_path}")
+            updated_files = agent.sync_once()
+            if updated_files:
+                agent.notify(updated_files)
+            time.sleep(SYNC_SECS)
+
+    except KeyboardInterrupt:
+        logging.info("Exiting gracefully")
+        print()
+    finally:
+        agent.close()
@@ -0,0 +1,144 @@
+"""
+On-demand CPU profiling for the long running collectors.
+SIGUSR1 starts sampling the stacks of every thread for a few seconds, without restarting the collector.
+The samples are written as collapsed stacks, one "thread;outer;...;inner count" line per stack,
+ready for flamegraph.pl or speedscope, and the time spent in each cycle phase is logged.
+
+    sudo systemctl kill -s USR1 getTemps.service
+    flamegraph.pl /var/log/SandstoneDashboard/getTemps-1234-1735732800.collapsed > getTemps.svg
+"""
+
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+DURATION_SECS = 30
+INTERVAL_SECS = 0.01
+
+def frame_label(frame) -> str:
+    """Function, file and line of a frame, like read_temp (getTemps.py:95)"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def collapse_stack(thread_name, frame) -> str:
+    """Collapsed stack of a thread, outermost frame first"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+class CpuProfiler:
+    """Sample stacks of every thread on SIGUSR1 and write them as collapsed stacks"""
+
+    def __init__(self, source, out_dir, duration_secs=DURATION_SECS, interval_secs=INTERVAL_SECS):
+        """
+        source        -> collector name used in file names, like getTemps
+        out_dir       -> directory for the collapsed stack files
+        duration_secs -> seconds sampled per signal
+        interval_secs -> seconds between samples, 0.01 costs a few percent of one core
+        """
+        self.source = source
+        self.out_dir = out_dir
+        self.duration_secs = duration_secs
+        self.interval_secs = interval_secs
+        self.stacks = Counter()
+        self.phases = {}  # phase -> [cycles, total seconds, max seconds] while sampling
+        self.thread = None
+        self.stopped = threading.Event()
+
+    @property
+    def sampling(self) -> bool:
+        """True while a profile is being taken"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def install(self):
+        """Start a profile on SIGUSR1"""
+        signal.signal(signal.SIGUSR1, self._on_signal)
+        logging.info(f"CPU profiling on SIGUSR1, {self.duration_secs:g} seconds to {self.out_dir}")
+        return self
+
+    def _on_signal(self, signum, frame):
+        del signum, frame
+        self.start()
+
+    def start(self) -> bool:
+        """Start sampling in a background thread, False if a profile is already being taken"""
+
+        if self.sampling:
+            logging.warning("CPU profile already running")
+            return False
+        self.stacks = Counter()
+        self.phases = {}
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._sample, name="cpu-profile", daemon=True)
+        self.thread.start()
+        logging.info(f"CPU profile started for {self.duration_secs:g} seconds")
+        return True
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + self.duration_secs
+        samples = 0
+        while time.monotonic() < deadline and not self.stopped.is_set():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if ident != own_ident:
+                    self.stacks[collapse_stack(names.get(ident, str(ident)), frame)] += 1
+            samples += 1
+            self.stopped.wait(self.interval_secs)
+        self.write(samples)
+
+    def add_cycle(self, phase_secs):
+        """Add the phase times of a finished cycle while sampling, phase_secs is {phase: seconds}"""
+
+        if not self.sampling:
+            return
+        for phase, secs in phase_secs.items():
+            totals = self.phases.setdefault(phase, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += secs
+            totals[2] = max(totals[2], secs)
+
+    def write(self, samples) -> str:
+        """Write the collapsed stacks and log the busiest frames and the phase times. Return the file path."""
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"{self.source}-{os.getpid()}-{int(time.time())}.collapsed")
+        with open(path, "w", encoding="utf-8") as collapsed_file:
+            for stack, count in sorted(self.stacks.items()):
+                collapsed_file.write(f"{stack} {count}\n")
+        logging.info(f"CPU profile of {samples} samples written to {path}")
+
+        inner = Counter()
+        for stack, count in self.stacks.items():
+            inner[stack.rpartition(";")[2]] += count
+        for label, count in inner.most_common(5):
+            logging.info(f"On CPU or waiting: {label} in {count / max(samples, 1):.0%} of samples")
+        for phase, (cycles, total, longest) in list(self.phases.items()):
+            logging.info(f"Phase {phase}: {total / cycles * 1000:.0f} ms mean, {longest * 1000:.0f} ms max "
+                         f"over {cycles} cycles")
+        return path
+
+    def stop(self):
+        """Stop a running profile, it is still written, and restore the default SIGUSR1 handler"""
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+def cpu_profiler_from_env(source, log_file):
+    """Install a CpuProfiler if CPU_PROFILE_ENABLED is true, otherwise return None. Profiles go next to log_file."""
+
+    if os.getenv("CPU_PROFILE_ENABLED", "false").strip().lower() != "true":
+        return None
+    return CpuProfiler(source,
+                       out_dir=os.getenv("CPU_PROFILE_DIR") or os.path.dirname(os.path.abspath(log_file)),
+                       duration_secs=float(os.getenv("CPU_PROFILE_SECS", str(DURATION_SECS))),
+                       interval_secs=float(os.getenv("CPU_PROFILE_INTERVAL_SECS", str(INTERVAL_SECS)))
+                       ).install()
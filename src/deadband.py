@@ -0,0 +1,62 @@
+"""Report-by-exception (deadband) filtering for sensor data points"""
+
+import os
+import logging
+import time
+
+class DeadbandFilter:
+    """
+    Decide if a reading needs to be written to InfluxDB.
+    A reading is sent when it moves more than the sensor's delta from the last sent value,
+    when its status changes, or when the heartbeat interval has passed since the last send.
+    The last sent state is only kept in memory.
+    """
+
+    def __init__(self, heartbeat_secs, default_delta=0.0, clock=time.monotonic):
+        """
+        heartbeat_secs -> seconds before an unchanged reading is sent again
+        default_delta  -> delta used for sensors without their own delta in the config file
+        clock          -> callable returning seconds, monotonic by default
+        """
+        self.heartbeat_secs = heartbeat_secs
+        self.default_delta = default_delta
+        self.clock = clock
+        self.last_sent = {}
+
+    def should_send(self, key, value, status, delta=None) -> bool:
+        """Return True if the reading should be written. Sent readings are remembered."""
+
+        if delta is None:
+            delta = self.default_delta
+
+        now = self.clock()
+        last = self.last_sent.get(key)
+
+        send = (
+            last is None
+            or status != last[1]
+            or abs(value - last[0]) > delta
+            or now - last[2] >= self.heartbeat_secs
+        )
+
+        if send:
+            self.last_sent[key] = (value, status, now)
+        return send
+
+    def reset(self):
+        """Forget all sent state so every sensor is written on the next cycle, use after a failed write"""
+        logging.info("Resetting deadband state")
+        self.last_sent.clear()
+
+def deadband_from_env(default_delta_env_var):
+    """
+    Create a DeadbandFilter if DEADBAND_HEARTBEAT_SECS is set to a positive number.
+    Return None if deadband mode is off.
+    """
+    heartbeat_secs = float(os.getenv("DEADBAND_HEARTBEAT_SECS", "0") or 0)
+    if heartbeat_secs <= 0:
+        return None
+
+    default_delta = float(os.getenv(default_delta_env_var, "0") or 0)
+    logging.info(f"Deadband mode on, heartbeat {heartbeat_secs}s, default delta {default_delta}")
+    return DeadbandFilter(heartbeat_secs, default_delta)
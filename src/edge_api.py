@@ -0,0 +1,202 @@
+"""
+Local HTTP/JSON endpoint serving the latest reading and recent history of every sensor from memory.
+Dashboards and operators on site get current values without a last() query to the central InfluxDB,
+and still get them while the uplink is down.
+
+GET /latest                                -> latest reading of every sensor
+GET /latest?location=pumpHouse             -> latest reading of one sensor
+GET /history?location=pumpHouse&minutes=60 -> readings of the last 60 minutes, oldest first
+GET /health                                -> sensor count and seconds since the last reading
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from rolling import TimeSeriesWindow
+
+HISTORY_SECS = 3 * 3600
+JSON_HEADERS = {"Content-Type": "application/json", "Cache-Control": "no-store"}
+
+class SensorReadings:
+    """Latest reading and a fixed size window of good readings of one sensor"""
+
+    __slots__ = ("latest", "window")
+
+    def __init__(self, capacity):
+        self.latest = {}
+        self.window = TimeSeriesWindow(capacity)
+
+    def add(self, latest, value):
+        """Replace the latest reading, add value to the window unless it is None"""
+        self.latest = latest
+        if value is not None:
+            self.window.add(latest["time"], value)
+
+    def since(self, start) -> dict:
+        """Times and values at or after start, oldest first"""
+        times, values = [], []
+        for timestamp, value in zip(self.window.times, self.window.values):
+            if timestamp >= start:
+                times.append(timestamp)
+                values.append(value)
+        return {"times": times, "values": values}
+
+class ReadingStore:
+    """Readings of every sensor of a collector, written by the collector loop and read by the HTTP threads"""
+
+    def __init__(self, source, hostname, units, capacity, clock=time.time):
+        """
+        source   -> collector name, like getTemps
+        hostname -> host name returned with the readings
+        units    -> units of the readings, like F or PSI
+        capacity -> readings kept per sensor, 8 bytes each for the time and the value
+        clock    -> callable returning epoch seconds
+        """
+        self.info = {"source": source, "hostname": hostname, "units": units}
+        self.capacity = capacity
+        self.clock = clock
+        self.sensors = {}  # location -> SensorReadings
+        self.last_added = None
+        self.latest_body = None  # /latest response, rebuilt after the next add
+        self.lock = threading.Lock()
+
+    def add(self, location, sensor_id, title, value):
+        """Add a reading, value None for an OFF reading. The window only keeps good readings."""
+
+        now = self.clock()
+        with self.lock:
+            sensor = self.sensors.get(location)
+            if sensor is None:
+                sensor = self.sensors[location] = SensorReadings(self.capacity)
+            sensor.add({"location": location, "id": sensor_id, "title": title, "value": value,
+                        "status": "OFF" if value is None else "On", "time": now}, value)
+            self.last_added = now
+            self.latest_body = None
+
+    def latest(self, location=None):
+        """JSON body with the latest reading of every sensor, or of one sensor. None for an unknown location."""
+
+        with self.lock:
+            if location is not None:
+                sensor = self.sensors.get(location)
+                return None if sensor is None else json.dumps({**self.info, **sensor.latest}).encode("utf-8")
+            if self.latest_body is None:
+                readings = [sensor.latest for sensor in self.sensors.values()]
+                self.latest_body = json.dumps({**self.info, "readings": readings}).encode("utf-8")
+            return self.latest_body
+
+    def history(self, location, minutes):
+        """JSON body with the readings of the last minutes, None for an unknown location"""
+
+        with self.lock:
+            sensor = self.sensors.get(location)
+            if sensor is None:
+                return None
+            body = {**self.info, "location": location, **sensor.since(self.clock() - minutes * 60)}
+        return json.dumps(body).encode("utf-8")
+
+    def health(self) -> bytes:
+        """JSON body with the sensor count and the age of the last reading"""
+        with self.lock:
+            age = None if self.last_added is None else round(self.clock() - self.last_added, 1)
+            body = {**self.info, "sensors": len(self.sensors), "last_reading_age_secs": age}
+        return json.dumps(body).encode("utf-8")
+
+class EdgeApiHandler(BaseHTTPRequestHandler):
+    """Read only JSON endpoints over a ReadingStore"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, code, body):
+        self.send_response(code)
+        for name, value in JSON_HEADERS.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, code, message):
+        self._respond(code, json.dumps({"error": message}).encode("utf-8"))
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Latest readings, history and health"""
+
+        store = self.server.store
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        location = params.get("location", [None])[0]
+
+        if parsed.path == "/latest":
+            body = store.latest(location)
+        elif parsed.path == "/history":
+            if location is None:
+                self._error(400, "location is required")
+                return
+            try:
+                minutes = float(params.get("minutes", ["60"])[0])
+            except ValueError:
+                self._error(400, "minutes must be a number")
+                return
+            body = store.history(location, minutes)
+        elif parsed.path == "/health":
+            body = store.health()
+        else:
+            self._error(404, f"Unknown path {parsed.path}")
+            return
+
+        if body is None:
+            self._error(404, f"Unknown location {location}")
+            return
+        self._respond(200, body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Log requests at debug level"""
+        logging.debug(f"{self.address_string()} {format % args}")
+
+class EdgeApi:
+    """Serve a ReadingStore over HTTP from a daemon thread"""
+
+    def __init__(self, store, port, host="0.0.0.0"):
+        self.store = store
+        self.server = ThreadingHTTPServer((host, port), EdgeApiHandler)
+        self.server.daemon_threads = True
+        self.server.store = store
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        """Listening port"""
+        return self.server.server_port
+
+    def start(self):
+        """Start serving, returns immediately"""
+        self.thread = threading.Thread(target=self.server.serve_forever, name="edge-api", daemon=True)
+        self.thread.start()
+        logging.info(f"Edge API listening on port {self.port}")
+        return self
+
+    def close(self):
+        """Stop serving"""
+        self.server.shutdown()
+        self.server.server_close()
+
+def edge_api_from_env(source, hostname, units, port_env_var, default_port, cycle_secs):
+    """
+    Start an EdgeApi if EDGE_API_ENABLED is true, otherwise return None.
+    Its store keeps EDGE_API_HISTORY_SECS of readings at one reading per cycle_secs.
+    """
+
+    if os.getenv("EDGE_API_ENABLED", "false").strip().lower() != "true":
+        return None
+    history_secs = float(os.getenv("EDGE_API_HISTORY_SECS", str(HISTORY_SECS)))
+    store = ReadingStore(source, hostname, units, capacity=max(1, int(history_secs / cycle_secs)))
+    port = int(os.getenv(port_env_var) or default_port)
+    try:
+        return EdgeApi(store, port, os.getenv("EDGE_API_BIND", "0.0.0.0")).start()
+    except OSError as e:
+        logging.error(f"Edge API can't listen on port {port}: {e}")
+        return None
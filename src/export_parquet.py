@@ -0,0 +1,295 @@
+"""
+Export sensor history from InfluxDB to Parquet files for offline analysis with pandas or DuckDB.
+Each measurement and day is one partition: <out>/<measurement>/date=YYYY-MM-DD/part-0.parquet
+Rollups are exported with their _min, _mean and _max fields to <out>/<rollup rp>/<measurement>/date=YYYY-MM-DD/
+Partitions are read one series and time chunk per query and written in row groups, so memory stays bounded.
+Finished partitions are recorded in <out>/export_state.json and skipped when the export is run again.
+Days without rows aren't recorded unless the measurement doesn't exist, so late points are picked up by the next run.
+Requires .env or .env.<hostname> file for InfluxDB and pyarrow (pip install pyarrow).
+
+Example:
+python export_parquet.py --start 2024-11-01 --end 2025-04-01 --out ~/sandstone_archive
+python export_parquet.py --start 2024-11-01 --end 2025-04-01 --out ~/sandstone_archive --rp rollup_1h
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import socket
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from backfill_rollups import time_chunks
+from common_functions import choose_dotenv, database_connect
+from influx_schema import RAW_RP, ROLLUP_1H_RP, ROLLUP_1M_RP, ROLLUP_FIELDS
+
+STATE_FILE = "export_state.json"
+PART_FILE = "part-0.parquet"
+ROW_GROUP_ROWS = 100000
+
+# InfluxDB field type -> (pyarrow type function name, python types)
+FIELD_TYPES = {
+    "float": ("float64", (float, int)),
+    "integer": ("int64", (int,)),
+    "string": ("string", (str,)),
+    "boolean": ("bool_", (bool,)),
+}
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Export InfluxDB history to Parquet files partitioned by day")
+    parser.add_argument("--start", required=True, help="Start date, YYYY-MM-DD (UTC)")
+    parser.add_argument("--end", help="End date, YYYY-MM-DD (UTC), not included, default today")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--chunk-hours", type=int, default=24, choices=[1, 2, 3, 4, 6, 8, 12, 24],
+                        help="Hours of one series per query, default 24")
+    parser.add_argument("--rp", default=RAW_RP,
+                        help=f"Retention policy to export, {RAW_RP}, {ROLLUP_1M_RP} or {ROLLUP_1H_RP}, default {RAW_RP}")
+    parser.add_argument("--measurements", nargs="+", default=list(ROLLUP_FIELDS))
+    parser.add_argument("--row-group-rows", type=int, default=ROW_GROUP_ROWS,
+                        help=f"Rows buffered before a row group is written, default {ROW_GROUP_ROWS}")
+    parser.add_argument("--database", help="Database name, default SENSOR_DATABASE from the dotenv file")
+    return parser.parse_args()
+
+def load_pyarrow():
+    """Import pyarrow only when exporting, the collectors don't need it"""
+    import pyarrow  # pylint: disable=import-outside-toplevel
+    import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+    return pyarrow, pyarrow.parquet
+
+def _split_unescaped(text, separator) -> list:
+    """Split on separator where it isn't escaped with a backslash, escapes are kept"""
+    parts, start, escaped = [], 0, False
+    for i, char in enumerate(text):
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == separator:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+def parse_series_key(key) -> dict:
+    """
+    Tags of a SHOW SERIES key.
+    Example: 'temps,location=stage\\ wall,sensor=28-1' -> {'location': 'stage wall', 'sensor': '28-1'}
+    """
+    tags = {}
+    for tag in _split_unescaped(key, ",")[1:]:
+        tag_key, *tag_value = _split_unescaped(tag, "=")
+        tags[re.sub(r"\\(.)", r"\1", tag_key)] = re.sub(r"\\(.)", r"\1", "=".join(tag_value))
+    return tags
+
+def quote_identifier(name) -> str:
+    """Double quoted InfluxQL identifier"""
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def quote_string(value) -> str:
+    """Single quoted InfluxQL string literal"""
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def day_partitions(start, end):
+    """Yield (YYYY-MM-DD, day start, day end) for every UTC day from start up to end"""
+    day_start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day_start < end:
+        day_end = day_start + timedelta(days=1)
+        yield day_start.strftime("%Y-%m-%d"), day_start, day_end
+        day_start = day_end
+
+def partition_dir(rp, measurement) -> str:
+    """Output directory of a measurement relative to --out, rollups are kept apart from the raw points"""
+    return f"{rp}/{measurement}" if rp in (ROLLUP_1M_RP, ROLLUP_1H_RP) else measurement
+
+def series_select(database, rp, measurement, fields, tags, tag_keys, time_range) -> str:
+    """
+    SELECT for one series and time chunk.
+    Tags the series doesn't have must be empty, so a series isn't mixed with series that have more tags.
+    """
+    conditions = [f"{quote_identifier(tag_key)} = {quote_string(tags.get(tag_key, ''))}" for tag_key in tag_keys]
+    conditions.append(f"time >= '{time_range[0]}' AND time < '{time_range[1]}'")
+    return (
+        f"SELECT {', '.join(quote_identifier(field) for field in fields)}"
+        f" FROM {quote_identifier(database)}.{quote_identifier(rp)}.{quote_identifier(measurement)}"
+        f" WHERE {' AND '.join(conditions)}"
+    )
+
+def measurement_schema(client, database, rp, measurement):
+    """Return (sorted tag keys, {field: InfluxDB field type}) of a measurement"""
+
+    source = f"{quote_identifier(database)}.{quote_identifier(rp)}.{quote_identifier(measurement)}"
+    tag_keys = sorted(point["tagKey"] for point in
+                      client.query(f"SHOW TAG KEYS FROM {source}", database=database).get_points())
+    fields = {}
+    for point in client.query(f"SHOW FIELD KEYS FROM {source}", database=database).get_points():
+        # A field written with different types in different shards keeps the first type
+        fields.setdefault(point["fieldKey"], point["fieldType"])
+    return tag_keys, fields
+
+def list_series(client, database, rp, measurement, start, end) -> list:
+    """Tags of every series with points from start up to end"""
+    query = (f"SHOW SERIES FROM {quote_identifier(rp)}.{quote_identifier(measurement)}"
+             f" WHERE time >= '{start:%Y-%m-%dT%H:%M:%SZ}' AND time < '{end:%Y-%m-%dT%H:%M:%SZ}'")
+    return [parse_series_key(point["key"]) for point in client.query(query, database=database).get_points()]
+
+class ExportState:
+    """Finished partitions, saved after each one so an interrupted export resumes where it stopped"""
+
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, STATE_FILE)
+        self.finished = set()
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as state_file:
+                self.finished = set(json.load(state_file)["finished"])
+
+    def is_done(self, measurement, day) -> bool:
+        """True if the partition was exported by an earlier run"""
+        return f"{measurement}/{day}" in self.finished
+
+    def mark_done(self, measurement, day):
+        """Record a finished partition, the state file is replaced atomically"""
+        self.finished.add(f"{measurement}/{day}")
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=os.path.dirname(self.path),
+                                         delete=False) as tmp:
+            json.dump({"finished": sorted(self.finished)}, tmp, indent=2)
+        os.replace(tmp.name, self.path)
+
+class PartitionWriter:
+    """
+    Columns of one partition, written to Parquet a row group at a time.
+    The file is written under a temporary name and renamed on close, so a partial file is never left behind.
+    """
+
+    def __init__(self, path, tag_keys, fields, row_group_rows=ROW_GROUP_ROWS):
+        self.pa, _ = load_pyarrow()
+        self.path = path
+        self.tag_keys = tag_keys
+        self.fields = fields
+        self.row_group_rows = row_group_rows
+        self.schema = self.pa.schema(
+            [("time", self.pa.timestamp("ns", tz="UTC"))]
+            + [(tag_key, self.pa.string()) for tag_key in tag_keys]
+            + [(field, getattr(self.pa, FIELD_TYPES[field_type][0])()) for field, field_type in fields.items()])
+        self.columns = {name: [] for name in self.schema.names}
+        self.writer = None
+        self.rows = 0
+
+    def add(self, tags, points):
+        """Append the points of one series, write a row group when enough rows are buffered"""
+        for point in points:
+            self.columns["time"].append(point["time"])
+            for tag_key in self.tag_keys:
+                self.columns[tag_key].append(tags.get(tag_key))
+            for field in self.fields:
+                self.columns[field].append(point.get(field))
+            self.rows += 1
+            if len(self.columns["time"]) >= self.row_group_rows:
+                self._flush()
+
+    def _array(self, name, values, arrow_type):
+        try:
+            return self.pa.array(values, type=arrow_type)
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError) as e:
+            # Values of another type, from a field type conflict between shards, are written as nulls
+            logging.warning(f"{self.path} {name}: {e}")
+            python_types = FIELD_TYPES[self.fields[name]][1]
+            return self.pa.array([value if isinstance(value, python_types) else None for value in values],
+                                 type=arrow_type)
+
+    def _flush(self):
+        if not self.columns["time"]:
+            return
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            _, parquet = load_pyarrow()
+            self.writer = parquet.ParquetWriter(self.path + ".tmp", self.schema, compression="zstd")
+        arrays = [self._array(field.name, self.columns[field.name], field.type) for field in self.schema]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.columns = {name: [] for name in self.schema.names}
+
+    def close(self) -> int:
+        """Write the last row group and move the file into place, return the number of rows"""
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.path + ".tmp", self.path)
+        return self.rows
+
+def export_partition(client, database, rp, measurement, day_range, chunk_hours, path, row_group_rows):
+    """
+    Export one measurement for one day, series by series and chunk by chunk.
+    Return the number of rows, None if the measurement has no fields in the retention policy.
+    """
+
+    tag_keys, fields = measurement_schema(client, database, rp, measurement)
+    if not fields:
+        return None
+
+    writer = PartitionWriter(path, tag_keys, fields, row_group_rows)
+    for tags in list_series(client, database, rp, measurement, *day_range[1:]):
+        for time_range in time_chunks(*day_range[1:], chunk_hours):
+            query = series_select(database, rp, measurement, fields, tags, tag_keys, time_range)
+            writer.add(tags, client.query(query, database=database, epoch="ns").get_points())
+    return writer.close()
+
+def export(client, database, rp, measurements, start, end, out_dir, chunk_hours=24, row_group_rows=ROW_GROUP_ROWS):
+    """Export every measurement and day that isn't already finished"""
+
+    os.makedirs(out_dir, exist_ok=True)
+    state = ExportState(out_dir)
+    for day_range in day_partitions(start, end):
+        day = day_range[0]
+        for measurement in measurements:
+            name = partition_dir(rp, measurement)
+            if state.is_done(name, day):
+                logging.debug(f"{name} {day} already exported")
+                continue
+            rows = export_partition(client, database, rp, measurement, day_range, chunk_hours,
+                                    os.path.join(out_dir, name, f"date={day}", PART_FILE), row_group_rows)
+            if rows == 0:
+                # The measurement has points on other days, these may still arrive from a buffering host
+                logging.info(f"{name} {day}: no rows, retried on the next run")
+                continue
+            state.mark_done(name, day)
+            logging.info(f"{name} {day}: {rows or 0} rows exported")
+
+if __name__ == "__main__":
+
+    HOSTNAME = socket.gethostname()
+    choose_dotenv(HOSTNAME)
+
+    FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format=FORMAT)
+
+    args = parse_args()
+    DATABASE = args.database or os.getenv("SENSOR_DATABASE")
+
+    try:
+        load_pyarrow()
+    except ImportError:
+        logging.error("pyarrow is required for the export: pip install pyarrow")
+        sys.exit(1)
+
+    START = datetime.strptime(args.start, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    # Today is still being written, so the default end is the start of today
+    END = (datetime.strptime(args.end, "%Y-%m-%d").replace(tzinfo=timezone.utc) if args.end
+           else datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0))
+
+    db_client = database_connect(os.getenv("INFLUXDB_HOST"),
+                                 os.getenv("INFLUXDB_PORT"),
+                                 os.getenv("USERNAME"),
+                                 os.getenv("PASSWORD"),
+                                 DATABASE)
+
+    try:
+        export(db_client, DATABASE, args.rp, args.measurements, START, END, os.path.expanduser(args.out),
+               args.chunk_hours, args.row_group_rows)
+        logging.info("Export complete")
+    except KeyboardInterrupt:
+        logging.info("Exiting gracefully, run again to resume")
+        print()
+    finally:
+        db_client.close()
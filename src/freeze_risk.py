@@ -0,0 +1,194 @@
+"""
+Streaming freeze risk estimator for the water lines.
+Keeps a rolling temperature and pressure window per sensor, combines the sensors of each line into its
+worst case and emits a freeze_risk point every cycle, so alerts can be simple threshold checks instead of
+windowed queries against InfluxDB.
+"""
+
+import os
+import logging
+import time
+from export_parquet import quote_string
+from rolling import TimeSeriesWindow
+
+FREEZE_F = 32.0
+FREEZE_HORIZON_MINS = 120        # time to freeze at or past this horizon adds no risk
+PRESSURE_DROP_PCT_PER_MIN = 5.0  # a steady drop this fast is full risk
+FORECAST_RANGE_F = 20.0          # forecast low this far below freezing is full forecast risk
+FORECAST_WEIGHT = 0.5            # the forecast alone never pushes risk above this
+STALE_SECS = 600                 # lines without a reading for this long are not reported
+
+def _clip(value) -> float:
+    return max(0.0, min(1.0, value))
+
+def _temp_fields(window) -> dict:
+    """temp, temp_slope_f_per_hr and time_to_freeze_min of one sensor, empty without a slope"""
+
+    slope = window.slope()
+    if slope is None:
+        return {}
+    temp = window.latest()
+    fields = {"temp": temp, "temp_slope_f_per_hr": slope * 3600}
+    if temp <= FREEZE_F:
+        fields["time_to_freeze_min"] = 0.0
+    elif slope < 0:
+        fields["time_to_freeze_min"] = (temp - FREEZE_F) / -slope / 60
+    return fields
+
+def _temp_risk(fields) -> float:
+    if "time_to_freeze_min" not in fields:
+        return 0.0
+    return _clip(1 - fields["time_to_freeze_min"] / FREEZE_HORIZON_MINS)
+
+def _pressure_fields(window) -> dict:
+    """pressure_psi and pressure_trend_psi_per_min of one sensor, empty without a slope"""
+
+    slope = window.slope()
+    if slope is None:
+        return {}
+    return {"pressure_psi": window.latest(), "pressure_trend_psi_per_min": slope * 60}
+
+def _pressure_risk(fields) -> float:
+    if fields["pressure_psi"] <= 0:
+        return 0.0
+    drop_pct_per_min = -fields["pressure_trend_psi_per_min"] / fields["pressure_psi"] * 100
+    return _clip(drop_pct_per_min / PRESSURE_DROP_PCT_PER_MIN)
+
+class FreezeRiskEstimator:
+    """Incremental per line freeze risk from temperature slope, pressure trend and the weather forecast"""
+
+    def __init__(self, source, window_size=120, forecast_refresh_secs=600, clock=time.time):
+        """
+        source                -> collector name written as a tag, like getTemps
+        window_size           -> samples kept per sensor
+        forecast_refresh_secs -> minimum seconds between forecast queries
+        clock                 -> callable returning epoch seconds
+        """
+        self.source = source
+        self.window_size = window_size
+        self.forecast_refresh_secs = forecast_refresh_secs
+        self.clock = clock
+        self.lines = {}  # line -> ({sensor: temperature window}, {sensor: pressure window})
+        self.forecast_low = None
+        self.forecast_refreshed = None
+
+    def _add(self, line, kind, sensor, value):
+        windows = self.lines.setdefault(line, ({}, {}))[kind]
+        if sensor not in windows:
+            windows[sensor] = TimeSeriesWindow(self.window_size)
+        windows[sensor].add(self.clock(), value)
+
+    def add_temp(self, line, temp_f, sensor=None):
+        """Add a temperature reading (F) of a sensor on a line, sensor defaults to the line"""
+        self._add(line, 0, line if sensor is None else sensor, temp_f)
+
+    def add_pressure(self, line, psi, sensor=None):
+        """Add a pressure reading (PSI) of a sensor on a line, sensor defaults to the line"""
+        self._add(line, 1, line if sensor is None else sensor, psi)
+
+    def set_forecast_low(self, temp_low_f):
+        """Set the forecast low (F) for the coming hours, None if unknown"""
+        self.forecast_low = temp_low_f
+
+    def refresh_forecast(self, client, database, location):
+        """Update the forecast low from the weather_hourly measurement if the last refresh is old"""
+        now = self.clock()
+        if self.forecast_refreshed is not None and now - self.forecast_refreshed < self.forecast_refresh_secs:
+            return
+        self.forecast_refreshed = now
+        self.set_forecast_low(latest_forecast_low(client, database, location))
+
+    def _fresh(self, windows) -> list:
+        """Windows of the sensors read in the last STALE_SECS"""
+        now = self.clock()
+        return [window for window in windows.values() if now - window.times.newest() <= STALE_SECS]
+
+    def prune(self):
+        """Drop the windows of sensors not read in the last STALE_SECS, and lines left without any"""
+        now = self.clock()
+        for line, line_windows in list(self.lines.items()):
+            for windows in line_windows:
+                for sensor in [sensor for sensor, window in windows.items()
+                               if now - window.times.newest() > STALE_SECS]:
+                    del windows[sensor]
+            if not any(line_windows):
+                del self.lines[line]
+
+    def estimate(self, line) -> dict:
+        """
+        Return the freeze_risk fields for a line, empty if there aren't enough samples.
+        With several sensors on a line, the temperature and pressure fields are those of its riskiest sensor.
+        """
+
+        if line not in self.lines:
+            return {}
+        temps, pressures = self.lines[line]
+
+        temp_fields = max(filter(None, map(_temp_fields, self._fresh(temps))),
+                          key=lambda fields: (_temp_risk(fields), -fields["temp"]), default={})
+        pressure_fields = max(filter(None, map(_pressure_fields, self._fresh(pressures))),
+                              key=lambda fields: (_pressure_risk(fields), -fields["pressure_trend_psi_per_min"]),
+                              default={})
+        if not temp_fields and not pressure_fields:
+            return {}
+
+        fields = {**temp_fields, **pressure_fields}
+        risks = []
+        if temp_fields:
+            risks.append(_temp_risk(temp_fields))
+        if pressure_fields:
+            risks.append(_pressure_risk(pressure_fields))
+
+        if self.forecast_low is not None:
+            fields["forecast_low"] = float(self.forecast_low)
+            risks.append(FORECAST_WEIGHT * _clip((FREEZE_F - self.forecast_low) / FORECAST_RANGE_F))
+
+        fields["risk"] = max(risks) if risks else 0.0
+        return fields
+
+    def construct_points(self, hostname) -> list[dict]:
+        """Construct a freeze_risk point for every line with enough samples, stale lines are dropped first"""
+
+        self.prune()
+        series = []
+        for line in self.lines:
+            fields = self.estimate(line)
+            if not fields:
+                continue
+            point = {
+                "measurement": "freeze_risk",
+                "tags": {
+                    "line": line,
+                    "source": self.source,
+                    "hostname": hostname,
+                },
+                "fields": fields,
+            }
+            logging.debug(f"Point: {point}")
+            series.append(point)
+        return series
+
+def latest_forecast_low(client, database, location, hours=6):
+    """Query the lowest hourly forecast temperature for the next hours, None if there is none"""
+
+    query = (
+        f'SELECT min("temp") FROM "weather_hourly" WHERE "location" = {quote_string(location)} '
+        f"AND time >= now() AND time < now() + {int(hours)}h"
+    )
+    try:
+        points = list(client.query(query, database=database).get_points())
+        if points and points[0].get("min") is not None:
+            return float(points[0]["min"])
+        logging.warning(f"No forecast for {location} in the next {hours} hours")
+    except Exception as e:
+        logging.error(f"Failure reading forecast from InfluxDB: {e}")
+    return None
+
+def freeze_risk_from_env(source):
+    """Create a FreezeRiskEstimator if FREEZE_RISK_ENABLED is true, otherwise return None"""
+
+    if os.getenv("FREEZE_RISK_ENABLED", "false").strip().lower() != "true":
+        return None
+    window_size = int(os.getenv("FREEZE_RISK_WINDOW", "120"))
+    logging.info(f"Freeze risk estimator on, window {window_size} samples")
+    return FreezeRiskEstimator(source, window_size)
@@ -0,0 +1,469 @@
+"""
+LAN ingestion gateway for InfluxDB 1.x.
+Collectors on every Pi point their InfluxDB client at the gateway (INFLUXDB_GATEWAY in the dotenv file)
+and keep one HTTP keep-alive connection to it. The gateway merges line protocol from all hosts,
+drops duplicate points, and writes large gzip batches to InfluxDB. Batches that can't be written are
+spooled to disk and replayed in order when InfluxDB is back.
+/query and /ping are passed through, so database_connect and schema provisioning work unchanged.
+Clients must send the gateway's USERNAME and PASSWORD, like InfluxDB with auth enabled, /ping is open.
+"""
+
+import base64
+import gzip
+import hmac
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+import requests
+from common_functions import choose_dotenv
+
+LISTEN_PORT = 8087
+BIND = "127.0.0.1"
+FLUSH_SECS = 10
+BATCH_POINTS = 5000
+SPOOL_DIR = "spool"
+SPOOL_MAX_MB = 100
+
+# Line protocol timestamp precision -> nanoseconds
+PRECISION_NS = {"n": 1, "ns": 1, "u": 1_000, "ms": 1_000_000, "s": 1_000_000_000,
+                "m": 60_000_000_000, "h": 3_600_000_000_000}
+
+def _unescaped(line, char=" ") -> int:
+    """Index of the first char not escaped with a backslash, -1 if there is none"""
+    i = 0
+    while True:
+        i = line.find(char, i)
+        if i <= 0 or line[i - 1] != "\\":
+            return i
+        i += 1
+
+def parse_line(line):
+    """
+    Split a line protocol line into (series and fields, timestamp or None).
+    Example: 'temps,id=28-1 temp_flt=40.1 1735743600' -> ('temps,id=28-1 temp_flt=40.1', 1735743600)
+    """
+
+    series_end = _unescaped(line)
+    if series_end < 0:
+        raise ValueError(f"Invalid line protocol: {line}")
+
+    head, _, last = line.rpartition(" ")
+    # A trailing integer is the timestamp unless the space before it is inside a quoted string field
+    if head and last.lstrip("-").isdigit() and len(head) > series_end and head[series_end + 1:].count('"') % 2 == 0:
+        return head, int(last)
+    return line, None
+
+def series_key(line_without_time) -> str:
+    """Measurement and tag set, the part of the line before the fields"""
+    return line_without_time[:_unescaped(line_without_time)]
+
+def split_fields(field_set) -> dict:
+    """
+    Field set of a line into {field key: field value as written}, commas inside quoted strings don't split.
+    Example: 'temp_flt=40.1,status="a,b"' -> {'temp_flt': '40.1', 'status': '"a,b"'}
+    """
+
+    fields, start, quoted, escaped = {}, 0, False, False
+    for i, char in enumerate(field_set + ","):
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == "," and not quoted:
+            field = field_set[start:i]
+            key_end = _unescaped(field, "=")
+            fields[field[:key_end]] = field[key_end + 1:]
+            start = i + 1
+    return fields
+
+class PointBuffer:
+    """
+    Merge points from every collector, keyed by (database, retention policy).
+    Points without a timestamp are stamped with the time they arrived.
+    Points for the same series and timestamp are merged into one, a later value of a field replaces the earlier
+    one and other fields are kept, like InfluxDB does.
+    """
+
+    def __init__(self, clock=time.time_ns):
+        self.clock = clock
+        self.batches = {}  # (database, rp) -> {(series key, timestamp ns): {field key: value}}
+        self.points = 0
+        self.duplicates = 0
+        self.lock = threading.Lock()
+
+    def add(self, database, rp, body, precision="n") -> int:
+        """Add line protocol, return the number of lines accepted"""
+
+        multiplier = PRECISION_NS.get(precision or "n")
+        if multiplier is None:
+            raise ValueError(f"Unknown precision: {precision}")
+
+        received = self.clock()
+        accepted = 0
+        with self.lock:
+            batch = self.batches.setdefault((database, rp), {})
+            for line in body.splitlines():
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                point, timestamp = parse_line(line)
+                timestamp = received if timestamp is None else timestamp * multiplier
+                series = series_key(point)
+                fields = split_fields(point[len(series) + 1:])
+                key = (series, timestamp)
+                if key in batch:
+                    self.duplicates += 1
+                    batch[key].update(fields)
+                else:
+                    self.points += 1
+                    batch[key] = fields
+                accepted += 1
+        return accepted
+
+    def restore(self, database, rp, lines):
+        """Put back drained lines that weren't written, fields received since drain() take precedence"""
+        with self.lock:
+            batch = self.batches.setdefault((database, rp), {})
+            for line in lines:
+                point, timestamp = parse_line(line)
+                series = series_key(point)
+                fields = split_fields(point[len(series) + 1:])
+                key = (series, timestamp)
+                if key in batch:
+                    fields.update(batch[key])
+                else:
+                    self.points += 1
+                batch[key] = fields
+
+    def __len__(self):
+        return self.points
+
+    def drain(self) -> dict:
+        """Take every buffered point, return {(database, rp): [lines]}"""
+        with self.lock:
+            batches, self.batches, self.points = self.batches, {}, 0
+        return {key: [f"{series} {','.join(f'{name}={value}' for name, value in fields.items())} {timestamp}"
+                      for (series, timestamp), fields in batch.items()]
+                for key, batch in batches.items() if batch}
+
+class DiskSpool:
+    """Gzip line protocol files on disk for batches InfluxDB didn't take, replayed oldest first"""
+
+    def __init__(self, spool_dir, max_bytes):
+        self.spool_dir = spool_dir
+        self.max_bytes = max_bytes
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def files(self) -> list[str]:
+        """Spool files, oldest first"""
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".lp.gz"))
+
+    def size(self) -> int:
+        """Bytes on disk"""
+        return sum(os.path.getsize(os.path.join(self.spool_dir, name)) for name in self.files())
+
+    def save(self, database, rp, lines):
+        """Write a batch to a new spool file, drop the oldest files past max_bytes"""
+
+        name = f"{time.time_ns()}+{quote(database, safe='')}+{quote(rp or '', safe='')}.lp.gz"
+        path = os.path.join(self.spool_dir, name)
+        with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as spool_file:
+            spool_file.write("\n".join(lines))
+        os.replace(f"{path}.tmp", path)
+        logging.warning(f"Spooled {len(lines)} points to {path}")
+
+        files = self.files()
+        while len(files) > 1 and self.size() > self.max_bytes:
+            oldest = files.pop(0)
+            os.remove(os.path.join(self.spool_dir, oldest))
+            logging.error(f"Spool over {self.max_bytes} bytes, dropped {oldest}")
+
+    def load(self, name):
+        """Return (database, rp, lines) for a spool file"""
+        _, database, rp = name[:-len(".lp.gz")].split("+", 2)
+        with gzip.open(os.path.join(self.spool_dir, name), "rt", encoding="utf-8") as spool_file:
+            lines = spool_file.read().splitlines()
+        return unquote(database), unquote(rp) or None, lines
+
+    def remove(self, name):
+        """Remove a replayed spool file"""
+        os.remove(os.path.join(self.spool_dir, name))
+
+class UpstreamInflux:
+    """One keep-alive HTTP session to InfluxDB for gzip batch writes and passed through queries"""
+
+    def __init__(self, url, username, password, timeout=30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        if username:
+            self.session.auth = (username, password)
+
+    def write(self, database, rp, lines) -> bool:
+        """
+        Write lines with nanosecond timestamps. Return False if InfluxDB couldn't be reached or failed,
+        True if the batch was written or rejected as invalid (4xx), so it isn't retried forever.
+        """
+
+        params = {"db": database, "precision": "ns"}
+        if rp:
+            params["rp"] = rp
+        body = gzip.compress("\n".join(lines).encode("utf-8"))
+        headers = {"Content-Encoding": "gzip", "Content-Type": "text/plain; charset=utf-8"}
+
+        try:
+            response = self.session.post(f"{self.url}/write", params=params, data=body,
+                                         headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            logging.error(f"InfluxDB write failed: {e}")
+            return False
+
+        if response.status_code < 300:
+            logging.info(f"Wrote {len(lines)} points to {database}, {len(body)} bytes gzip")
+            return True
+        if response.status_code < 500:
+            logging.error(f"InfluxDB rejected {len(lines)} points for {database}: {response.text.strip()}")
+            return True
+        logging.error(f"InfluxDB write error {response.status_code}: {response.text.strip()}")
+        return False
+
+    def forward(self, method, path, query, body, content_type):
+        """
+        Pass a /query or /ping request through with the gateway's credentials, the handler checked the client's.
+        Return (status, headers, body).
+        """
+        params = {name: values for name, values in parse_qs(query).items() if name not in ("u", "p")}
+        response = self.session.request(method, f"{self.url}{path}", params=params, data=body or None,
+                                        headers={"Content-Type": content_type} if content_type else None,
+                                        timeout=self.timeout)
+        return response.status_code, response.headers, response.content
+
+    def close(self):
+        """Close the session"""
+        self.session.close()
+
+class IngestGateway:
+    """Buffer points from collectors, flush them in batches and spool what can't be written"""
+
+    def __init__(self, upstream, spool, flush_secs=FLUSH_SECS, batch_points=BATCH_POINTS):
+        self.upstream = upstream
+        self.spool = spool
+        self.flush_secs = flush_secs
+        self.batch_points = batch_points
+        self.buffer = PointBuffer()
+        self.flush_requested = threading.Event()
+        self.stopping = threading.Event()
+        self.flush_lock = threading.Lock()
+
+    def receive(self, database, rp, body, precision):
+        """Buffer a /write body, ask for an early flush when a full batch is waiting"""
+        accepted = self.buffer.add(database, rp, body, precision)
+        if len(self.buffer) >= self.batch_points:
+            self.flush_requested.set()
+        return accepted
+
+    def replay_spool(self) -> bool:
+        """Write spooled batches oldest first, stop at the first failure. Return True if the spool is empty."""
+        for name in self.spool.files():
+            database, rp, lines = self.spool.load(name)
+            if not self.upstream.write(database, rp, lines):
+                return False
+            self.spool.remove(name)
+            logging.info(f"Replayed {name}")
+        return True
+
+    def flush(self):
+        """
+        Write buffered points in batches of batch_points, spool batches that fail.
+        If spooling raises, the batches not written or spooled yet go back in the buffer for the next flush.
+        """
+
+        with self.flush_lock:
+            upstream_ok = self.replay_spool()
+            batches = [(database, rp, lines[start:start + self.batch_points])
+                       for (database, rp), lines in self.buffer.drain().items()
+                       for start in range(0, len(lines), self.batch_points)]
+            done = 0
+            try:
+                for database, rp, batch in batches:
+                    if upstream_ok:
+                        upstream_ok = self.upstream.write(database, rp, batch)
+                    if not upstream_ok:
+                        self.spool.save(database, rp, batch)
+                    done += 1
+            finally:
+                for database, rp, batch in batches[done:]:
+                    self.buffer.restore(database, rp, batch)
+
+    def run_flusher(self):
+        """Flush every flush_secs, or sooner when a full batch is waiting, until stop()"""
+        while not self.stopping.is_set():
+            self.flush_requested.wait(self.flush_secs)
+            self.flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Flush failed: {e}")
+        self.flush()
+
+    def stop(self):
+        """Stop the flusher after a last flush"""
+        self.stopping.set()
+        self.flush_requested.set()
+
+class GatewayHandler(BaseHTTPRequestHandler):
+    """InfluxDB 1.x /write, /query and /ping endpoints"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive for the collectors
+
+    def _respond(self, code, body=b"", headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return body
+
+    def _client_credentials(self):
+        """(username, password) from HTTP basic auth, or the u and p query parameters InfluxDB also accepts"""
+        scheme, _, encoded = self.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "basic":
+            try:
+                username, _, password = base64.b64decode(encoded).decode("utf-8").partition(":")
+                return username, password
+            except ValueError:
+                return None
+        params = parse_qs(urlparse(self.path).query)
+        return params.get("u", [""])[0], params.get("p", [""])[0]
+
+    def _authorized(self) -> bool:
+        """True if the gateway has no credentials, or the client sent them. Answer 401 if it didn't."""
+        credentials = self.server.credentials
+        if not credentials or urlparse(self.path).path == "/ping":
+            return True
+        client = self._client_credentials()
+        if client and all(hmac.compare_digest(sent.encode("utf-8"), expected.encode("utf-8"))
+                          for sent, expected in zip(client, credentials)):
+            return True
+        if self.command == "POST":
+            self._read_body()
+        self._respond(401, b'{"error":"authorization failed"}', {"Content-Type": "application/json"})
+        return False
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Ping and queries"""
+        if self._authorized():
+            self._forward("GET")
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """Ping"""
+        if self._authorized():
+            self._forward("HEAD")
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Writes and queries"""
+        if not self._authorized():
+            return
+        if urlparse(self.path).path == "/write":
+            self._write()
+        else:
+            self._forward("POST")
+
+    def _write(self):
+        params = parse_qs(urlparse(self.path).query)
+        database = params.get("db", [""])[0]
+        if not database:
+            self._respond(400, b'{"error":"database is required"}', {"Content-Type": "application/json"})
+            return
+        try:
+            self.server.gateway.receive(database, params.get("rp", [None])[0], self._read_body().decode("utf-8"),
+                                        params.get("precision", ["n"])[0])
+        except (ValueError, OSError) as e:
+            self._respond(400, f'{{"error":"{e}"}}'.encode("utf-8"), {"Content-Type": "application/json"})
+            return
+        self._respond(204)
+
+    def _forward(self, method):
+        parsed = urlparse(self.path)
+        body = self._read_body() if method == "POST" else b""
+        try:
+            status, headers, content = self.server.gateway.upstream.forward(
+                method, parsed.path, parsed.query, body, self.headers.get("Content-Type"))
+        except requests.RequestException as e:
+            self._respond(503, f'{{"error":"{e}"}}'.encode("utf-8"), {"Content-Type": "application/json"})
+            return
+        passed = {name: value for name, value in headers.items()
+                  if name.lower() in ("content-type", "x-influxdb-version", "x-influxdb-build")}
+        self._respond(status, b"" if method == "HEAD" else content, passed)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Log requests at debug level"""
+        logging.debug(f"{self.address_string()} {format % args}")
+
+def serve(gateway, port, host=BIND, credentials=None):
+    """
+    Create the HTTP server for a gateway, call serve_forever() on the result.
+    credentials -> (username, password) clients must send, None accepts every client
+    """
+    server = ThreadingHTTPServer((host, port), GatewayHandler)
+    server.daemon_threads = True
+    server.gateway = gateway
+    server.credentials = credentials
+    return server
+
+if __name__ == "__main__":
+
+    HOSTNAME = socket.gethostname()
+    choose_dotenv(HOSTNAME)
+
+    LOG_LEVEL = os.getenv("LOG_LEVEL_GATEWAY", "INFO").upper()
+    LOG_FILE = os.getenv("LOG_FILE_GATEWAY", "/var/log/gateway.log")
+    FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+    numeric_level = getattr(logging, LOG_LEVEL, logging.INFO)
+    logging.basicConfig(filename=LOG_FILE, level=numeric_level, format=FORMAT)
+    print(f"Logging to {LOG_FILE}")
+
+    logging.info(f"Python version: {sys.version}")
+
+    UPSTREAM_URL = f"http://{os.getenv('INFLUXDB_HOST')}:{os.getenv('INFLUXDB_PORT') or 8086}"
+    PORT = int(os.getenv("GATEWAY_LISTEN_PORT", str(LISTEN_PORT)))
+    HOST = os.getenv("GATEWAY_BIND", BIND)
+    CREDENTIALS = (os.getenv("USERNAME"), os.getenv("PASSWORD") or "") if os.getenv("USERNAME") else None
+
+    upstream_influx = UpstreamInflux(UPSTREAM_URL, os.getenv("USERNAME"), os.getenv("PASSWORD"))
+    disk_spool = DiskSpool(os.getenv("GATEWAY_SPOOL_DIR", SPOOL_DIR),
+                           int(os.getenv("GATEWAY_SPOOL_MAX_MB", str(SPOOL_MAX_MB))) * 1024 * 1024)
+    ingest_gateway = IngestGateway(upstream_influx, disk_spool,
+                                   flush_secs=float(os.getenv("GATEWAY_FLUSH_SECS", str(FLUSH_SECS))),
+                                   batch_points=int(os.getenv("GATEWAY_BATCH_POINTS", str(BATCH_POINTS))))
+
+    flusher = threading.Thread(target=ingest_gateway.run_flusher, name="flusher")
+    flusher.start()
+
+    http_server = serve(ingest_gateway, PORT, HOST, CREDENTIALS)
+    logging.info(f"Gateway listening on {HOST}:{PORT}, writing to {UPSTREAM_URL}")
+
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Exiting gracefully")
+        print()
+    finally:
+        http_server.server_close()
+        ingest_gateway.stop()
+        flusher.join()
+        upstream_influx.close()
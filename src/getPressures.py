@@ -10,10 +10,20 @@ import socket
 import sys
 import time
 import Adafruit_ADS1x15
-from requests.exceptions import Timeout
-from requests.exceptions import ConnectionError as RequestsConnectionError
-from influxdb.exceptions import InfluxDBServerError, InfluxDBClientError
-from common_functions import choose_dotenv, database_connect, SMBFileTransfer, load_json_file
+from ads_ready import ready_pin_adc_from_env
+from alerts import alert_engine_from_env
+from collector_cycle import CycleState
+from common_functions import choose_dotenv, provision_enabled, fast_start_enabled, StartupTimer
+from config_notify import ConfigListener
+from cpu_profile import cpu_profiler_from_env
+from deadband import deadband_from_env
+from edge_api import edge_api_from_env
+from freeze_risk import freeze_risk_from_env
+from memory_profile import memory_profiler_from_env
+from recording import recorder_from_env, RecordingADC
+from sensor_health import sensor_health_from_env
+from watchdog import LoopWatchdog, PhaseTimeout
+from writers import DeferredInfluxWriter
 
 PRESSURE_SENSOR_TYPE = "ADS1115"
 
@@ -21,6 +31,10 @@ PRESSURE_SENSOR_ID = "i2c:0x48"
 I2C_ADDR = int(PRESSURE_SENSOR_ID.split(':')[1], 16)
 NO_PSI = -999.9
 
+# Watchdog latency budget for a cycle, and deadlines per phase, in seconds
+CYCLE_BUDGET_SECS = 15
+PHASE_DEADLINES = {"config": 2, "read": 5, "write": 10}
+
 CONFIG_FILE_TRY_AGAIN_SECS = 60
 CONFIG_FILE_NAME = "getPressures.json"
 CONFIG_FILE = f"config/{CONFIG_FILE_NAME}"
@@ -40,14 +54,19 @@ class PressureSensorReader:
         self.hostname = hostname
         self.sensor_id = sensor_id
         self.sensor_type = sensor_type
+        self.adc_counts = {}
 
-    def read_channels(self):
+    def read_channels(self, health_tracker=None):
         """
         Read all enabled channels in config.
         Return {channel: psi_float or NO_PSI}
         Example: {'channel0': 4.8, 'channel1': NO_PSI}
+        The raw ADC counts of the channels read are kept in self.adc_counts for construct_points.
+        If a SensorHealthTracker is given, every enabled channel's reading and read time is added to it.
         """
         results = {}
+        enabled = {}
+        self.adc_counts = {}
 
         for channel, ch_cfg in self.channels.items():
             results[channel] = NO_PSI
@@ -59,9 +78,19 @@ class PressureSensorReader:
                     logging.info(f"Channel {ch_num} disabled")
                     continue
 
-                logging.info(f"Reading channel {ch_num}...")
+                enabled[channel] = (ch_num, ch_cfg["ch_gain"])
+
+            except Exception as e:
+                logging.error(f"Error reading {channel}: {e}")
+                if health_tracker and "channel_ID" in ch_cfg:
+                    health_tracker.add(ch_cfg["channel_ID"], self.sensor_id, None)
+
+        for channel, (value, read_secs) in zip(enabled, self.read_raw(enabled.values())):
+            ch_cfg = self.channels[channel]
 
-                value = self.adc.read_adc(ch_num, gain=ch_cfg["ch_gain"])
+            try:
+                if isinstance(value, Exception):
+                    raise value
 
                 psi = (
                     (float(value) - ch_cfg["ch_minADC"]) *
@@ -70,21 +99,58 @@ class PressureSensorReader:
                     ch_cfg["ch_minPSI"]
                 )
 
-                logging.info(f"Channel {ch_num}, ADC {value}, PSI {psi}")
+                logging.info(f"Channel {ch_cfg['channel']}, ADC {value}, PSI {psi}")
                 results[channel] = psi
+                self.adc_counts[channel] = int(value)
+                if health_tracker:
+                    health_tracker.add(ch_cfg["channel_ID"], self.sensor_id, psi, read_secs)
 
             except Exception as e:
                 logging.error(f"Error reading {channel}: {e}")
+                if health_tracker and "channel_ID" in ch_cfg:
+                    health_tracker.add(ch_cfg["channel_ID"], self.sensor_id, None)
 
         return results
 
-    def construct_points(self, readings):
-        """Construct points for InfluxDB from readings. Return series."""
+    def read_raw(self, reads):
+        """
+        Read (channel, gain) reads, yield (ADC value or the exception reading it, seconds) per read.
+        An ADC with scan, like ReadyPinADS1115, converts them back to back, otherwise read_adc reads one at a time.
+        """
+
+        if hasattr(self.adc, "scan"):
+            yield from self.adc.scan(reads)
+            return
+
+        for ch_num, gain in reads:
+            logging.info(f"Reading channel {ch_num}...")
+            read_started = time.monotonic()
+            try:
+                value = self.adc.read_adc(ch_num, gain=gain)
+            except Exception as e:
+                value = e
+            yield value, time.monotonic() - read_started
+
+    def construct_points(self, readings, deadband_filter=None):
+        """
+        Construct points for InfluxDB from readings. Return series.
+        Channels read have their raw ADC count in adc_raw, so pressure_flt can be recomputed after a calibration
+        change, see reprocess_pressures.py.
+        If a DeadbandFilter is given, channels that haven't changed enough and aren't due a heartbeat are skipped.
+        """
 
         series = []
         for channel, psi in readings.items():
 
             ch_cfg = self.channels[channel]
+
+            if deadband_filter:
+                status = "OFF" if psi == NO_PSI else "On"
+                if not deadband_filter.should_send(
+                        (ch_cfg["channel_ID"], ch_cfg["channel"]), psi, status, ch_cfg.get("ch_deadband")):
+                    logging.debug(f"Deadband suppressed {channel}")
+                    continue
+
             point = {
                 "measurement": "pressures",
                 "tags": {
@@ -99,12 +165,87 @@ class PressureSensorReader:
                     "pressure_flt": psi
                 },
             }
+            if channel in self.adc_counts:
+                point["fields"]["adc_raw"] = self.adc_counts[channel]
             logging.debug(f"Point: {point}")
             series.append(point)
         return series
 
+def host_channels(state):
+    """Channels of this host from the config, reloaded if it changed. None or {} if there are none."""
+
+    state.load_config()
+    if state.json_config is None:
+        return None
+    channels = state.json_config.get(state.hostname)
+    if channels is None:
+        logging.warning(f"Hostname not found in {CONFIG_FILE_NAME}")
+    elif not channels:
+        logging.warning(f"No sensors for {state.hostname} found in {CONFIG_FILE_NAME}")
+    return channels
+
+def run_cycle(state):
+    """
+    One getPressures cycle. Return the points written, None if the config has no channels for this host.
+    state.hardware  -> ADS1115 or ReadyPinADS1115, or anything with its read_adc
+    state.features  -> deadband, freeze_risk, sensor_health, alerts, reading_store, memory_profiler,
+                       and forecast, (database, location) of the freeze risk forecast
+    """
+
+    features = state.features
+    channels = host_channels(state)
+    if not channels:
+        logging.warning(f"Trying again in {CONFIG_FILE_TRY_AGAIN_SECS} seconds")
+        return None
+
+    logging.debug(f"Channels in {CONFIG_FILE_NAME}: {channels}")
+    logging.info("Reading ADC")
+
+    pressure_sensor_reader = PressureSensorReader(
+        adc=state.hardware,
+        channels=channels,
+        hostname=state.hostname,
+        sensor_id=PRESSURE_SENSOR_ID,
+        sensor_type=PRESSURE_SENSOR_TYPE,
+    )
+
+    pressure_readings = state.run_phase("read", pressure_sensor_reader.read_channels, features.get("sensor_health"))
+    pressure_series = pressure_sensor_reader.construct_points(pressure_readings, features.get("deadband"))
+
+    alert_engine, reading_store = features.get("alerts"), features.get("reading_store")
+    for reading_channel, reading_psi in pressure_readings.items():
+        reading_cfg = channels[reading_channel]
+        if reading_cfg.get("ch_enabled") != "Enabled":
+            continue
+        if alert_engine:
+            alert_engine.add(reading_cfg["channel_ID"], None if reading_psi == NO_PSI else reading_psi,
+                             reading_cfg.get("ch_alerts"))
+        if reading_store:
+            reading_store.add(reading_cfg["channel_ID"], PRESSURE_SENSOR_ID, reading_cfg["channel_name"],
+                              None if reading_psi == NO_PSI else reading_psi)
+
+    risk_estimator = features.get("freeze_risk")
+    if risk_estimator:
+        for reading_channel, reading_psi in pressure_readings.items():
+            if reading_psi != NO_PSI:
+                reading_cfg = channels[reading_channel]
+                risk_estimator.add_pressure(reading_cfg.get("line", reading_cfg["channel_ID"]), reading_psi,
+                                            reading_cfg["channel_ID"])
+        if state.writer.client:
+            state.run_phase("write", risk_estimator.refresh_forecast, state.writer.client, *features["forecast"])
+        pressure_series.extend(risk_estimator.construct_points(state.hostname))
+
+    for reporter in ("sensor_health", "memory_profiler"):
+        if features.get(reporter):
+            pressure_series.extend(features[reporter].construct_points(state.hostname))
+
+    state.write(pressure_series)
+    return pressure_series
+
 if __name__ == "__main__":
 
+    startup = StartupTimer()
+
     HOSTNAME = socket.gethostname()
     choose_dotenv(HOSTNAME)
 
@@ -123,82 +264,85 @@ if __name__ == "__main__":
     PASSWORD = os.getenv("PASSWORD")
     DATABASE = os.getenv("SENSOR_DATABASE")
 
-    SMB_SERVER_PORT = int(os.getenv("SMB_SERVER_PORT", "445"))
+    startup.mark("dotenv and logging")
 
-    smb_client = SMBFileTransfer(os.getenv("SMB_SERVER_IP"),
-                                SMB_SERVER_PORT,
-                                os.getenv("SMB_SHARE_NAME"),
-                                os.getenv("SMB_CONFIG_DIR"),
-                                os.getenv("SMB_USERNAME"),
-                                os.getenv("SMB_PASSWORD"),
-                                CONFIG_FILE_NAME,
-                                CONFIG_FILE)
-    smb_client.connect()
+    db_writer = DeferredInfluxWriter.from_settings(INFLUXDB_HOST,
+                                                   INFLUXDB_PORT,
+                                                   USERNAME,
+                                                   PASSWORD,
+                                                   DATABASE,
+                                                   provision=provision_enabled()).start()
+    if not fast_start_enabled():
+        db_writer.wait_connected()
+    startup.mark("InfluxDB connect")
 
-    db_client = database_connect(INFLUXDB_HOST,
-                                INFLUXDB_PORT,
-                                USERNAME,
-                                PASSWORD,
-                                DATABASE)
+    config_listener = ConfigListener(CONFIG_FILE_NAME)
 
-    ADC = Adafruit_ADS1x15.ADS1115(address=I2C_ADDR, busnum=1)
+    ready_pin_adc = ready_pin_adc_from_env(I2C_ADDR, busnum=1)
+    ads1115 = ready_pin_adc or Adafruit_ADS1x15.ADS1115(address=I2C_ADDR, busnum=1)
 
-    try:
-        while True:
+    recorder = recorder_from_env("getPressures")
+    if recorder:
+        ads1115 = RecordingADC(ads1115, recorder)
 
-            logging.info(f"Updating {CONFIG_FILE_NAME} if missing or old")
-            get_json_successful = smb_client.get_json_config()
+    watchdog = LoopWatchdog(CYCLE_BUDGET_SECS, PHASE_DEADLINES)
 
-            logging.info(f"Loading {CONFIG_FILE_NAME}")
-            json_config = load_json_file(CONFIG_FILE)
+    memory_profiler = memory_profiler_from_env("getPressures")
+    cpu_profiler = cpu_profiler_from_env("getPressures", LOG_FILE)
 
-            if json_config is None:
-                logging.warning(f"Trying again in {CONFIG_FILE_TRY_AGAIN_SECS} seconds")
-                time.sleep(CONFIG_FILE_TRY_AGAIN_SECS)
-                continue
+    alerts = alert_engine_from_env("getPressures", HOSTNAME, "PSI")
+    edge_api = edge_api_from_env("getPressures", HOSTNAME, "PSI", "EDGE_API_PORT_GET_PRESSURES", 8092, cycle_secs=5)
 
-            CHANNELS = json_config.get(HOSTNAME)
+    cycle_state = CycleState(HOSTNAME, db_writer, ads1115, CONFIG_FILE, config_listener, features={
+        "deadband": deadband_from_env("DEADBAND_PRESSURES"),
+        "freeze_risk": freeze_risk_from_env("getPressures"),
+        "forecast": (os.getenv("TEMP_SENSOR_DATABASE"),
+                     os.getenv("FREEZE_RISK_FORECAST_LOCATION") or os.getenv("LOCATION")),
+        "sensor_health": sensor_health_from_env("getPressures", "SENSOR_HEALTH_NOISE_PRESSURES", 2.0, slow_secs=0.5),
+        "alerts": alerts,
+        "reading_store": edge_api.store if edge_api else None,
+        "memory_profiler": memory_profiler,
+    }, run_phase=watchdog.run)
 
-            if CHANNELS is None:
-                logging.warning(f"Hostname not found in {CONFIG_FILE_NAME}")
-                logging.warning(f"Trying again in {CONFIG_FILE_TRY_AGAIN_SECS} seconds")
-                time.sleep(CONFIG_FILE_TRY_AGAIN_SECS)
-                continue
-
-            if not CHANNELS:
-                logging.warning(f"No sensors for {HOSTNAME} found in {CONFIG_FILE_NAME}")
-                logging.warning(f"Trying again in {CONFIG_FILE_TRY_AGAIN_SECS} seconds")
-                time.sleep(CONFIG_FILE_TRY_AGAIN_SECS)
-                continue
-
-            channel_count = len(CHANNELS)
-            logging.debug(f"Channels in {CONFIG_FILE_NAME}: {CHANNELS}")
-
-            logging.info("Reading ADC")
-
-            pressure_sensor_reader = PressureSensorReader(
-                adc=ADC,
-                channels=CHANNELS,
-                hostname=HOSTNAME,
-                sensor_id=PRESSURE_SENSOR_ID,
-                sensor_type=PRESSURE_SENSOR_TYPE,
-            )
-
-            pressure_readings = pressure_sensor_reader.read_channels()
-            pressure_series = pressure_sensor_reader.construct_points(pressure_readings)
+    try:
+        while True:
+            watchdog.cycle_start()
+            if memory_profiler:
+                memory_profiler.cycle_start()
 
+            next_cycle_secs = 5
             try:
-                db_client.write_points(pressure_series)
-                logging.info("Series written to InfluxDB.")
+                if run_cycle(cycle_state) is None:
+                    next_cycle_secs = CONFIG_FILE_TRY_AGAIN_SECS
+                else:
+                    startup.finish("first reading")
 
-            except (InfluxDBServerError, InfluxDBClientError, RequestsConnectionError, Timeout) as e:
-                logging.error(f"Failure writing to or reading from InfluxDB: {e}")
-                db_client = database_connect(INFLUXDB_HOST, INFLUXDB_PORT, USERNAME, PASSWORD, DATABASE)
+            except PhaseTimeout as e:
+                logging.error(f"{e}, skipping the rest of the cycle")
 
-            time.sleep(5)
+            if memory_profiler:
+                memory_profiler.cycle_end()
+            watchdog.cycle_done()
+            if cpu_profiler:
+                cpu_profiler.add_cycle(watchdog.phase_secs())
+            watchdog.idle(next_cycle_secs)
 
     except KeyboardInterrupt:
         logging.info("Exiting gracefully")
         print()
     finally:
-        db_client.close()
+        if memory_profiler:
+            memory_profiler.stop()
+        if cpu_profiler:
+            cpu_profiler.stop()
+        watchdog.close()
+        config_listener.close()
+        if recorder:
+            recorder.close()
+        if ready_pin_adc:
+            ready_pin_adc.close()
+        if alerts:
+            alerts.close()
+        if edge_api:
+            edge_api.close()
+        db_writer.close()
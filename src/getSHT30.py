@@ -11,10 +11,13 @@ import struct
 import sys
 import time
 import smbus2
-from requests.exceptions import Timeout
-from requests.exceptions import ConnectionError as RequestsConnectionError
-from influxdb.exceptions import InfluxDBServerError, InfluxDBClientError
-from common_functions import choose_dotenv, database_connect, SMBFileTransfer, load_json_file
+from collector_cycle import CycleState
+from common_functions import choose_dotenv, provision_enabled, fast_start_enabled, StartupTimer
+from config_notify import ConfigListener
+from recording import recorder_from_env, RecordingSMBus
+from sensor_health import sensor_health_from_env
+from watchdog import LoopWatchdog, PhaseTimeout
+from writers import DeferredInfluxWriter
 
 SENSOR_TYPE = "sht30"
 
@@ -23,160 +26,206 @@ READ_REGISTER = 0x00
 WRITE_DATA = [0x06]
 LENGTH_BYTES = 6
 
+# Watchdog latency budget for a cycle, and deadlines per phase, in seconds
+CYCLE_BUDGET_SECS = 15
+PHASE_DEADLINES = {"config": 2, "read": 5, "write": 10}
+
 CONFIG_FILE_TRY_AGAIN_SECS = 60
 CONFIG_FILE_NAME = "getSHT30.json"
 CONFIG_FILE = f"config/{CONFIG_FILE_NAME}"
 
-HOSTNAME = socket.gethostname()
-choose_dotenv(HOSTNAME)
-
-LOG_LEVEL = os.getenv("LOG_LEVEL_GET_SHT30", "INFO").upper()
-LOG_FILE = os.getenv("LOG_FILE_GET_SHT30", "/var/log/getSHT30.log")
-FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
-numeric_level = getattr(logging, LOG_LEVEL, logging.INFO)
-logging.basicConfig(filename=LOG_FILE, level=numeric_level, format=FORMAT)
-print(f"Logging to {LOG_FILE}")
-
-logging.info(f"Python version: {sys.version}")
-
-INFLUXDB_HOST = os.getenv("INFLUXDB_HOST")
-INFLUXDB_PORT = os.getenv("INFLUXDB_PORT")
-USERNAME = os.getenv("USERNAME")
-PASSWORD = os.getenv("PASSWORD")
-DATABASE = os.getenv("SENSOR_DATABASE")
-
-SMB_SERVER_PORT = int(os.getenv("SMB_SERVER_PORT", "445"))
-
-smb_client = SMBFileTransfer(os.getenv("SMB_SERVER_IP"),
-                             SMB_SERVER_PORT,
-                             os.getenv("SMB_SHARE_NAME"),
-                             os.getenv("SMB_CONFIG_DIR"),
-                             os.getenv("SMB_USERNAME"),
-                             os.getenv("SMB_PASSWORD"),
-                             CONFIG_FILE_NAME,
-                             CONFIG_FILE)
-smb_client.connect()
-
-db_client = database_connect(INFLUXDB_HOST,
-                             INFLUXDB_PORT,
-                             USERNAME,
-                             PASSWORD,
-                             DATABASE)
-
-bus = smbus2.SMBus(1)
-
-try:
-    while True:
-
-        logging.info(f"Updating {CONFIG_FILE_NAME} if old or missing")
-        get_json_successful = smb_client.get_json_config()
-
-        logging.info(f"Loading {CONFIG_FILE_NAME}")
-        json_config = load_json_file(CONFIG_FILE)
-
-        if json_config is None:
-            logging.warning(f"Trying again in {CONFIG_FILE_TRY_AGAIN_SECS} seconds")
-            time.sleep(CONFIG_FILE_TRY_AGAIN_SECS)
-            continue
-
-        SENSORS = json_config.get(HOSTNAME)
-
-        if SENSORS is None:
-            logging.warning(f"Hostname not found in {CONFIG_FILE_NAME}")
-            logging.warning(f"Trying again in {CONFIG_FILE_TRY_AGAIN_SECS} seconds")
-            time.sleep(CONFIG_FILE_TRY_AGAIN_SECS)
-            continue
-
-        if not SENSORS:
-            logging.warning(f"No sensors for {HOSTNAME} found in {CONFIG_FILE_NAME}")
-            logging.warning(f"Trying again in {CONFIG_FILE_TRY_AGAIN_SECS} seconds")
-            time.sleep(CONFIG_FILE_TRY_AGAIN_SECS)
-            continue
-
-        sensor_count = len(SENSORS)
-        logging.info(f"Sensors in {CONFIG_FILE_NAME}: {sensor_count}")
-
-        if sensor_count > 1:
-            logging.warning(f"More than one sensor found for {HOSTNAME} in {CONFIG_FILE_NAME}")
-            logging.warning("Not currently handling multiple SHT30 sensors per host")
-            logging.warning(f"Trying again in {CONFIG_FILE_TRY_AGAIN_SECS} seconds")
-            time.sleep(CONFIG_FILE_TRY_AGAIN_SECS)
-            continue
-
-        SENSOR_LOCATION = list(SENSORS.keys())[0]
-        SENSOR_ID = SENSORS[SENSOR_LOCATION]["id"]
-        i2c_addr = int(SENSOR_ID.split(':')[1], 16)
-        SENSOR_TITLE = SENSORS[SENSOR_LOCATION]["title"]
-
-        series = []
-        logging.info("Reading SHT30 sensors")
-
-        try:
-            logging.info("Writing to I2C bus")
-            bus.write_i2c_block_data(i2c_addr, WRITE_REGISTER, WRITE_DATA)
-            time.sleep(0.5)
-            logging.info("Reading from I2C bus")
-            i2c_block_data = bus.read_i2c_block_data(i2c_addr, READ_REGISTER, LENGTH_BYTES)
-
-            logging.info(f"I2C block data: {i2c_block_data}")
-
-            if len(i2c_block_data) < 5:
-                logging.error("I2C block data has fewer than 4 items.")
-                continue
-
-            temp_MSB, temp_LSB = i2c_block_data[0:2]
-            humidity_MSB, humidity_LSB = i2c_block_data[3:5]
-
-            raw_temp = struct.unpack(">H", bytes([temp_MSB, temp_LSB]))[0]
-            temp_C = -45 + (175 * raw_temp / 65535.0)
-            temp_F = temp_C * 1.8 + 32
-
-            raw_hum = struct.unpack(">H", bytes([humidity_MSB, humidity_LSB]))[0]
-            humidity = 100 * raw_hum / 65535.0
-
-            point = {
-                "measurement": "temps",
-
-                "tags": {
-                    "sensor":   1,
-                    "location": SENSOR_LOCATION,
-                    "id":       SENSOR_ID,
-                    "type":     SENSOR_TYPE,
-                    "title":    SENSOR_TITLE,
-                    "hostname": HOSTNAME,
-                    "status":   "ON"
-                },
-                "fields": {
-                    "temp_flt": temp_F,
-                    "humidity_flt": humidity
-                }
+class SHT30Utils:
+    """Convert SHT30 I2C block data and construct data points"""
+
+    @staticmethod
+    def read_block_data(i2c_bus, address, sleep=time.sleep) -> list[int]:
+        """Start a single shot measurement and read the 6 byte result"""
+        logging.info("Writing to I2C bus")
+        i2c_bus.write_i2c_block_data(address, WRITE_REGISTER, WRITE_DATA)
+        sleep(0.5)
+        logging.info("Reading from I2C bus")
+        return i2c_bus.read_i2c_block_data(address, READ_REGISTER, LENGTH_BYTES)
+
+    @staticmethod
+    def convert(block_data) -> tuple[float, float]:
+        """
+        Convert I2C block data to (temp F, relative humidity %).
+        Exp block: [temp MSB, temp LSB, temp CRC, humidity MSB, humidity LSB, humidity CRC]
+        """
+        temp_msb, temp_lsb = block_data[0:2]
+        humidity_msb, humidity_lsb = block_data[3:5]
+
+        raw_temp = struct.unpack(">H", bytes([temp_msb, temp_lsb]))[0]
+        temp_c = -45 + (175 * raw_temp / 65535.0)
+
+        raw_hum = struct.unpack(">H", bytes([humidity_msb, humidity_lsb]))[0]
+
+        return temp_c * 1.8 + 32, 100 * raw_hum / 65535.0
+
+    @staticmethod
+    def construct_data_point(location, sensor_id, title, hostname, temp, rel_humidity) -> dict:
+        """Construct the data point"""
+        return {
+            "measurement": "temps",
+
+            "tags": {
+                "sensor":   1,
+                "location": location,
+                "id":       sensor_id,
+                "type":     SENSOR_TYPE,
+                "title":    title,
+                "hostname": hostname,
+                "status":   "ON"
+            },
+            "fields": {
+                "temp_flt": temp,
+                "humidity_flt": rel_humidity
             }
+        }
+
+def host_sensor(state):
+    """(location, sensor config) of the SHT30 of this host from the config, reloaded if it changed. None if not one."""
+
+    state.load_config()
+    if state.json_config is None:
+        return None
+    sensors = state.json_config.get(state.hostname)
+    if sensors is None:
+        logging.warning(f"Hostname not found in {CONFIG_FILE_NAME}")
+        return None
+    if not sensors:
+        logging.warning(f"No sensors for {state.hostname} found in {CONFIG_FILE_NAME}")
+        return None
+
+    logging.info(f"Sensors in {CONFIG_FILE_NAME}: {len(sensors)}")
+    if len(sensors) > 1:
+        logging.warning(f"More than one sensor found for {state.hostname} in {CONFIG_FILE_NAME}")
+        logging.warning("Not currently handling multiple SHT30 sensors per host")
+        return None
+    return next(iter(sensors.items()))
+
+def run_cycle(state):
+    """
+    One getSHT30 cycle. Return the points written, None if the config doesn't have one sensor for this host.
+    state.hardware  -> SMBus, or anything with its write_i2c_block_data and read_i2c_block_data
+    state.features  -> sensor_health
+    """
+
+    location_sensor = host_sensor(state)
+    if location_sensor is None:
+        logging.warning(f"Trying again in {CONFIG_FILE_TRY_AGAIN_SECS} seconds")
+        return None
+    location, sensor = location_sensor
+    i2c_addr = int(sensor["id"].split(':')[1], 16)
+
+    series = []
+    logging.info("Reading SHT30 sensors")
+
+    temp_f = None
+    read_started = state.clock.monotonic()
+    try:
+        i2c_block_data = state.run_phase("read", SHT30Utils.read_block_data, state.hardware, i2c_addr, state.clock.sleep)
+        logging.info(f"I2C block data: {i2c_block_data}")
+
+        if len(i2c_block_data) < 5:
+            logging.error("I2C block data has fewer than 4 items.")
+        else:
+            temp_f, humidity = SHT30Utils.convert(i2c_block_data)
+
+            point = SHT30Utils.construct_data_point(location, sensor["id"], sensor["title"], state.hostname,
+                                                    temp_f, humidity)
             logging.debug(f"Point: {point}")
             series.append(point)
 
-        except OSError as e:
-            logging.error(f"I2C read failed: {e}")
-            continue
-        except Exception as e:
-            logging.error(f"Unexpected error: {e}")
-            continue
-
-        try:
-            db_client.write_points(series)
-            logging.info("Series written to InfluxDB.")
-
-        except (InfluxDBServerError, InfluxDBClientError, RequestsConnectionError, Timeout) as e:
-            logging.error(f"Failure writing to or reading from InfluxDB: {e}")
-            db_client = database_connect(INFLUXDB_HOST, INFLUXDB_PORT, USERNAME, PASSWORD, DATABASE)
-
-        if get_json_successful is False:
-            smb_client.connect()
-
-        time.sleep(10)
-
-except KeyboardInterrupt:
-    logging.info("Exiting gracefully")
-    print()
-finally:
-    bus.close()
-    db_client.close()
+    except OSError as e:
+        logging.error(f"I2C read failed: {e}")
+    except ValueError as e:
+        logging.error(f"Invalid I2C block data: {e}")
+    except PhaseTimeout:
+        raise
+    except Exception as e:
+        logging.error(f"Unexpected error: {e}")
+
+    sensor_health = state.features.get("sensor_health")
+    if sensor_health:
+        sensor_health.add(location, sensor["id"], temp_f, state.clock.monotonic() - read_started)
+        series.extend(sensor_health.construct_points(state.hostname))
+
+    state.write(series)
+    return series
+
+if __name__ == "__main__":
+
+    startup = StartupTimer()
+
+    HOSTNAME = socket.gethostname()
+    choose_dotenv(HOSTNAME)
+
+    LOG_LEVEL = os.getenv("LOG_LEVEL_GET_SHT30", "INFO").upper()
+    LOG_FILE = os.getenv("LOG_FILE_GET_SHT30", "/var/log/getSHT30.log")
+    FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+    numeric_level = getattr(logging, LOG_LEVEL, logging.INFO)
+    logging.basicConfig(filename=LOG_FILE, level=numeric_level, format=FORMAT)
+    print(f"Logging to {LOG_FILE}")
+
+    logging.info(f"Python version: {sys.version}")
+
+    INFLUXDB_HOST = os.getenv("INFLUXDB_HOST")
+    INFLUXDB_PORT = os.getenv("INFLUXDB_PORT")
+    USERNAME = os.getenv("USERNAME")
+    PASSWORD = os.getenv("PASSWORD")
+    DATABASE = os.getenv("SENSOR_DATABASE")
+
+    startup.mark("dotenv and logging")
+
+    db_writer = DeferredInfluxWriter.from_settings(INFLUXDB_HOST,
+                                                   INFLUXDB_PORT,
+                                                   USERNAME,
+                                                   PASSWORD,
+                                                   DATABASE,
+                                                   provision=provision_enabled()).start()
+    if not fast_start_enabled():
+        db_writer.wait_connected()
+    startup.mark("InfluxDB connect")
+
+    config_listener = ConfigListener(CONFIG_FILE_NAME)
+
+    bus = smbus2.SMBus(1)
+
+    recorder = recorder_from_env("getSHT30")
+    if recorder:
+        bus = RecordingSMBus(bus, recorder)
+
+    watchdog = LoopWatchdog(CYCLE_BUDGET_SECS, PHASE_DEADLINES)
+
+    cycle_state = CycleState(HOSTNAME, db_writer, bus, CONFIG_FILE, config_listener, features={
+        "sensor_health": sensor_health_from_env("getSHT30", "SENSOR_HEALTH_NOISE_TEMPS", 1.0, slow_secs=1.5),
+    }, run_phase=watchdog.run)
+
+    try:
+        while True:
+            watchdog.cycle_start()
+
+            next_cycle_secs = 10
+            try:
+                if run_cycle(cycle_state) is None:
+                    next_cycle_secs = CONFIG_FILE_TRY_AGAIN_SECS
+                else:
+                    startup.finish("first reading")
+
+            except PhaseTimeout as e:
+                logging.error(f"{e}, skipping the rest of the cycle")
+
+            watchdog.cycle_done()
+            watchdog.idle(next_cycle_secs)
+
+    except KeyboardInterrupt:
+        logging.info("Exiting gracefully")
+        print()
+    finally:
+        watchdog.close()
+        config_listener.close()
+        bus.close()
+        if recorder:
+            recorder.close()
+        db_writer.close()
@@ -1,19 +1,31 @@
 """
 Read Adafruit 1-Wire temperature sensor data and write to InfluxDB.
-Requires .env or .env.<hostname> file for SMB, InfluxDB, and log level.
+Requires .env or .env.<hostname> file for InfluxDB and log level.
+The config file is kept up to date by config_sync.py.
 Developers: steve.a.mccluskey@gmail.com, see repo for others.
 """
 
 import os
 import logging
 import socket
-import time
 import sys
 import subprocess
-from requests.exceptions import Timeout
-from requests.exceptions import ConnectionError as RequestsConnectionError
-from influxdb.exceptions import InfluxDBServerError, InfluxDBClientError
-from common_functions import choose_dotenv, database_connect, SMBFileTransfer, load_json_file
+import time
+from alerts import alert_engine_from_env
+from collector_cycle import CycleState
+from common_functions import choose_dotenv, provision_enabled, fast_start_enabled, StartupTimer
+from config_notify import ConfigListener
+from cpu_profile import cpu_profiler_from_env
+from deadband import deadband_from_env
+from edge_api import edge_api_from_env
+from freeze_risk import freeze_risk_from_env
+from memory_profile import memory_profiler_from_env
+from quarantine import quarantine_from_env
+from recording import recorder_from_env, recording_open
+from sensor_health import sensor_health_from_env
+from sensor_registry import SensorRegistry
+from watchdog import LoopWatchdog, PhaseTimeout
+from writers import DeferredInfluxWriter
 
 TEMP_SENSOR_MODEL = "ds18b20"
 
@@ -24,78 +36,26 @@ NO_TEMP = -999.9
 
 KERNEL_MOD_W1_GPIO = "w1-gpio"
 KERNEL_MOD_W1_THERM = "w1_therm"
+SYS_MODULE_PATH = "/sys/module"
+
+# Watchdog latency budget for a cycle, and deadlines per phase, in seconds.
+# Every sensor read takes about 750 ms for the DS18B20 conversion.
+CYCLE_BUDGET_SECS = 25
+PHASE_DEADLINES = {"config": 2, "read": 20, "write": 10}
 
 CONFIG_FILE_NAME = "getTemps.json"
 CONFIG_FILE = f"config/{CONFIG_FILE_NAME}"
+REGISTRY_FILE = "config/sensor_registry.json"
 
-class GetTempSensors:
-    """Get assigned and attached temperature sensors and combine into a room/sensor map"""
-
-    def __init__(self, json_config, hostname):
-        self.json_config = json_config
-        self.hostname = hostname
-        self.rooms = {}
-        self.sensor_ids = []
-        self.unassigned_ids = []
-
-    def get_assigned_sensors(self):
-        """Get room assigned sensors for the host from the config file"""
-        if self.json_config:
-            self.rooms = self.json_config.get(self.hostname)
-
-            if self.rooms is None:
-                logging.warning(f"Hostname not found in {CONFIG_FILE_NAME}")
-            elif not self.rooms:
-                logging.warning(f"No rooms for {self.hostname} found in {CONFIG_FILE_NAME}")
-            else:
-                logging.info(f"Sensors in {CONFIG_FILE_NAME}: {len(self.rooms)}")
-
-    def get_attached_sensors(self):
-        """Get sensors attached to the host"""
-        try:
-            self.sensor_ids = os.listdir(W1_DEVICES_PATH)
-            self.sensor_ids = [sensor_id for sensor_id in self.sensor_ids if sensor_id.startswith(TEMP_SENSOR_ID_PREFIX)]
-            logging.info(f"Attached sensors: {len(self.sensor_ids)}")
-        except Exception as e:
-            logging.error(f"Cannot list {W1_DEVICES_PATH} - {e}")
-            self.sensor_ids = []
-
-    def find_unassigned_sensors(self):
-        """
-        Find sensors attached to the host that are not in the config file.
-        Log sensors in the config file that are not attached to the host.
-        """
-        if self.rooms is None:
-            self.rooms = {}
-        ids_from_config = {room['id'] for room in self.rooms.values()}
-
-        self.unassigned_ids = [sid for sid in self.sensor_ids if sid not in ids_from_config]
-        logging.info(f"Attached unassigned sensors: {len(self.unassigned_ids)}")
-        for unassigned_sensor in self.unassigned_ids:
-            logging.info(f"Attached unassigned: {unassigned_sensor}")
-
-        assigned_unattached_ids = [sid for sid in ids_from_config if sid not in self.sensor_ids]
-        logging.info(f"Assigned unattached sensors: {len(assigned_unattached_ids)}")
-        for assigned_unattached_id in assigned_unattached_ids:
-            logging.info(f"Assigned unattached sensor: {assigned_unattached_id}")
-
-    def combine_unassigned_assigned(self):
-        """
-        Add the unassigned attached sensors to the assigned sensors from the config file.
-        This adds to self.rooms
-        """
-        for idx, sid in enumerate(self.unassigned_ids, start=1):
-            key = f"Unassigned{idx}"
-            self.rooms[key] = {"id": sid, "title": "Untitled"}
-        logging.info(f"All sensors: {len(self.rooms)}")
-
-    def run(self) -> dict:
-        """Run all methods of GetTempSensors"""
-        self.get_assigned_sensors()
-        self.get_attached_sensors()
-        self.find_unassigned_sensors()
-        self.combine_unassigned_assigned()
-        return self.rooms
+def list_attached_sensors() -> list:
+    """Ids of the temperature sensors on the 1-Wire bus, [] if the bus can't be listed"""
+    try:
+        sensor_ids = [sensor_id for sensor_id in os.listdir(W1_DEVICES_PATH) if sensor_id.startswith(TEMP_SENSOR_ID_PREFIX)]
+        logging.info(f"Attached sensors: {len(sensor_ids)}")
+        return sensor_ids
+    except Exception as e:
+        logging.error(f"Cannot list {W1_DEVICES_PATH} - {e}")
+        return []
 
 class TempUtils:
     """Read temperatures from device files and construct data points"""
@@ -161,8 +121,38 @@ class TempUtils:
             }
         }
 
-def write_points_to_series(room_sensor_map, hostname) -> list[dict]:
-    """Read all devices files and construct data points"""
+def read_sensor(room_id, sensor_id, quarantine=None, health_tracker=None) -> float:
+    """
+    Read a sensor's device file, return the temperature or None.
+    A quarantined sensor isn't read until its probe is due. The reading and its read time go to the
+    QuarantineScheduler and SensorHealthTracker if given.
+    """
+
+    if quarantine and not quarantine.should_read(sensor_id):
+        logging.debug(f"Sensor {sensor_id} quarantined, not read")
+        temp, read_secs = None, None
+    else:
+        read_started = time.monotonic()
+        temp = TempUtils.read_temp(f"{W1_DEVICES_PATH}{sensor_id}/{W1_SLAVE_FILE}")
+        read_secs = time.monotonic() - read_started
+        if quarantine:
+            quarantine.add(sensor_id, bool(temp), read_secs)
+
+    if health_tracker:
+        health_tracker.add(room_id, sensor_id, temp or None, read_secs)
+    return temp
+
+def write_points_to_series(room_sensor_map, hostname, deadband_filter=None, freeze_estimator=None,
+                           health_tracker=None, alert_engine=None, reading_store=None, quarantine=None) -> list[dict]:
+    """
+    Read all devices files and construct data points.
+    If a DeadbandFilter is given, only points that changed enough or are due a heartbeat are returned.
+    If a FreezeRiskEstimator is given, every working reading is added to its line's window.
+    If a SensorHealthTracker is given, every reading and its read time is added to the sensor's stats.
+    If an AlertEngine is given, every reading is checked against the room's "alerts" rules.
+    If a ReadingStore is given, every reading is kept for the edge API, deadband or not.
+    If a QuarantineScheduler is given, quarantined sensors are only read when a probe is due, OFF otherwise.
+    """
 
     point_series = []
     working_sensor_count = 0
@@ -170,10 +160,14 @@ def write_points_to_series(room_sensor_map, hostname) -> list[dict]:
 
         status = "On"
         sensor_id = room_sensor_map.get(room_id, {}).get('id')
-        temp = TempUtils.read_temp(f"{W1_DEVICES_PATH}{sensor_id}/{W1_SLAVE_FILE}")
+        temp = read_sensor(room_id, sensor_id, quarantine, health_tracker)
+        if alert_engine:
+            alert_engine.add(room_id, temp or None, room_sensor_map.get(room_id, {}).get('alerts'))
 
         if temp:
             working_sensor_count += 1
+            if freeze_estimator:
+                freeze_estimator.add_temp(room_sensor_map.get(room_id, {}).get('line', room_id), temp, sensor_id)
         else:
             status = "OFF"
             temp = NO_TEMP
@@ -182,15 +176,83 @@ def write_points_to_series(room_sensor_map, hostname) -> list[dict]:
         if not title:
             title = "Untitled"
 
-        point = TempUtils.construct_data_point(room_id, sensor_id, title, status, hostname, temp)
-        logging.debug(f"Point: {point}")
-        point_series.append(point)
+        if reading_store:
+            reading_store.add(room_id, sensor_id, title, None if status == "OFF" else temp)
+
+        if deadband_filter and not deadband_filter.should_send(
+                (room_id, sensor_id), temp, status, room_sensor_map.get(room_id, {}).get('deadband')):
+            continue
+
+        point_series.append(TempUtils.construct_data_point(room_id, sensor_id, title, status, hostname, temp))
+        logging.debug(f"Point: {point_series[-1]}")
 
     logging.info(f"Working sensors: {working_sensor_count}")
+    if quarantine and quarantine.quarantined():
+        logging.info(f"Quarantined sensors: {len(quarantine.quarantined())}")
+    if deadband_filter:
+        logging.info(f"Points suppressed by deadband: {len(room_sensor_map) - len(point_series)}")
     return point_series
 
+def load_kernel_modules(modules, sys_module_path=SYS_MODULE_PATH) -> bool:
+    """
+    Load kernel modules that aren't in /sys/module yet. Loaded modules cost a stat, not a modprobe process.
+    Return False if any modprobe failed.
+    """
+
+    loaded = True
+    for module in modules:
+        if os.path.isdir(os.path.join(sys_module_path, module.replace("-", "_"))):
+            logging.debug(f"Kernel module already loaded: {module}")
+            continue
+
+        logging.info(f"Loading kernel module: {module}")
+        kernel_mod_load = subprocess.run(["modprobe", module], capture_output=True, text=True, check=False)
+        if kernel_mod_load.returncode != 0:
+            err_msg = (kernel_mod_load.stderr or "").strip() or "No stderr output"
+            logging.critical(f"Kernel module load failed: {err_msg}")
+            loaded = False
+
+    return loaded
+
+def run_cycle(state) -> list[dict]:
+    """
+    One getTemps cycle. Return the points written.
+    state.hardware  -> callable returning the attached sensor ids, like list_attached_sensors
+    state.features  -> registry (SensorRegistry, required), deadband, freeze_risk, sensor_health, alerts,
+                       reading_store, quarantine, memory_profiler,
+                       and forecast, (database, location) of the freeze risk forecast
+    """
+
+    features = state.features
+    registry = features["registry"]
+    if state.load_config():
+        registry.set_config(state.json_config)
+
+    room_temp_sensor_map = state.run_phase("read", lambda: registry.update(state.hardware()))
+
+    logging.info("Reading temperatures from device files...")
+    data_point_series = state.run_phase(
+        "read", write_points_to_series, room_temp_sensor_map, state.hostname, features.get("deadband"),
+        features.get("freeze_risk"), features.get("sensor_health"), features.get("alerts"),
+        features.get("reading_store"), features.get("quarantine"))
+
+    risk_estimator = features.get("freeze_risk")
+    if risk_estimator:
+        if state.writer.client:
+            state.run_phase("write", risk_estimator.refresh_forecast, state.writer.client, *features["forecast"])
+        data_point_series.extend(risk_estimator.construct_points(state.hostname))
+
+    for reporter in ("sensor_health", "memory_profiler"):
+        if features.get(reporter):
+            data_point_series.extend(features[reporter].construct_points(state.hostname))
+
+    state.write(data_point_series)
+    return data_point_series
+
 if __name__ == "__main__":
 
+    startup = StartupTimer()
+
     HOSTNAME = socket.gethostname()
     choose_dotenv(HOSTNAME)
 
@@ -209,74 +271,87 @@ if __name__ == "__main__":
     PASSWORD = os.getenv("PASSWORD")
     DATABASE = os.getenv("SENSOR_DATABASE")
 
-    SMB_SERVER_PORT = int(os.getenv("SMB_SERVER_PORT", "445"))
-
-    smb_client = SMBFileTransfer(os.getenv("SMB_SERVER_IP"),
-                                SMB_SERVER_PORT,
-                                os.getenv("SMB_SHARE_NAME"),
-                                os.getenv("SMB_CONFIG_DIR"),
-                                os.getenv("SMB_USERNAME"),
-                                os.getenv("SMB_PASSWORD"),
-                                CONFIG_FILE_NAME,
-                                CONFIG_FILE)
-    smb_client.connect()
+    startup.mark("dotenv and logging")
 
-    db_client = database_connect(INFLUXDB_HOST,
-                                 INFLUXDB_PORT,
-                                 USERNAME,
-                                 PASSWORD,
-                                 DATABASE)
+    db_writer = DeferredInfluxWriter.from_settings(INFLUXDB_HOST,
+                                                   INFLUXDB_PORT,
+                                                   USERNAME,
+                                                   PASSWORD,
+                                                   DATABASE,
+                                                   provision=provision_enabled()).start()
+    if not fast_start_enabled():
+        db_writer.wait_connected()
+    startup.mark("InfluxDB connect")
 
     logging.info("Verifying all kernel modules are loaded")
-    kernel_mod_loads = []
-    kernel_mod_loads.append(subprocess.run(
-        ["modprobe", KERNEL_MOD_W1_GPIO], capture_output=True, text=True, check=False))
-    kernel_mod_loads.append(subprocess.run(
-        ["modprobe", KERNEL_MOD_W1_THERM], capture_output=True, text=True, check=False))
+    if not load_kernel_modules([KERNEL_MOD_W1_GPIO, KERNEL_MOD_W1_THERM]):
+        logging.critical("Exiting due to kernel module load failure(s)")
+        db_writer.close()
+        sys.exit(1)
+    startup.mark("kernel modules")
 
-    kernel_mod_load_fail = False
+    config_listener = ConfigListener(CONFIG_FILE_NAME)
 
-    for kernel_mod_load in kernel_mod_loads:
-        if kernel_mod_load.returncode != 0:
-            err_msg = (kernel_mod_load.stderr or "").strip() or "No stderr output"
-            logging.critical(f"Kernel module load failed: {err_msg}", exc_info=True)
-            kernel_mod_load_fail = True
-
-    if kernel_mod_load_fail:
-        logging.critical("Exiting due to kernel module load failure(s)", exc_info=True)
-        db_client.close()
-        sys.exit(1)
+    recorder = recorder_from_env("getTemps")
+    if recorder:
+        # Shadow builtins.open inside getTemps only, like simulator/loadgen.py does with FakeW1Bus
+        globals()["open"] = recording_open(recorder)
 
-    try:
-        while True:
+    watchdog = LoopWatchdog(CYCLE_BUDGET_SECS, PHASE_DEADLINES)
 
-            logging.info(f"Updating {CONFIG_FILE_NAME} if missing or old")
-            get_json_successful = smb_client.get_json_config()
+    memory_profiler = memory_profiler_from_env("getTemps")
+    cpu_profiler = cpu_profiler_from_env("getTemps", LOG_FILE)
 
-            logging.info(f"Loading {CONFIG_FILE_NAME}")
-            loaded_json_config = load_json_file(CONFIG_FILE)
+    alerts = alert_engine_from_env("getTemps", HOSTNAME, "F")
+    edge_api = edge_api_from_env("getTemps", HOSTNAME, "F", "EDGE_API_PORT_GET_TEMPS", 8091, cycle_secs=5)
 
-            temp_sensors = GetTempSensors(loaded_json_config, HOSTNAME)
-            room_temp_sensor_map = temp_sensors.run()
+    cycle_state = CycleState(HOSTNAME, db_writer, list_attached_sensors, CONFIG_FILE, config_listener, features={
+        "registry": SensorRegistry(os.getenv("SENSOR_REGISTRY_FILE") or REGISTRY_FILE, HOSTNAME).load(),
+        "deadband": deadband_from_env("DEADBAND_TEMPS"),
+        "freeze_risk": freeze_risk_from_env("getTemps"),
+        "forecast": (os.getenv("TEMP_SENSOR_DATABASE"),
+                     os.getenv("FREEZE_RISK_FORECAST_LOCATION") or os.getenv("LOCATION")),
+        "sensor_health": sensor_health_from_env("getTemps", "SENSOR_HEALTH_NOISE_TEMPS", 1.0, slow_secs=2.0),
+        "alerts": alerts,
+        "reading_store": edge_api.store if edge_api else None,
+        "quarantine": quarantine_from_env(),
+        "memory_profiler": memory_profiler,
+    }, run_phase=watchdog.run)
 
-            logging.info("Reading temperatures from device files...")
-            data_point_series = write_points_to_series(room_temp_sensor_map, HOSTNAME)
+    try:
+        while True:
+            watchdog.cycle_start()
+            if memory_profiler:
+                memory_profiler.cycle_start()
 
             try:
-                db_client.write_points(data_point_series)
-                logging.info("Series written to InfluxDB.")
-
-            except (InfluxDBServerError, InfluxDBClientError, RequestsConnectionError, Timeout) as e:
-                logging.error(f"Failure writing to or reading from InfluxDB: {e}")
-                db_client = database_connect(INFLUXDB_HOST, INFLUXDB_PORT, USERNAME, PASSWORD, DATABASE)
+                run_cycle(cycle_state)
+                startup.finish("first reading")
 
-            if get_json_successful is False:
-                smb_client.connect()
+            except PhaseTimeout as e:
+                logging.error(f"{e}, skipping the rest of the cycle")
 
-            time.sleep(5)
+            if memory_profiler:
+                memory_profiler.cycle_end()
+            watchdog.cycle_done()
+            if cpu_profiler:
+                cpu_profiler.add_cycle(watchdog.phase_secs())
+            watchdog.idle(5)
 
     except KeyboardInterrupt:
         logging.info("Exiting gracefully")
         print()
     finally:
-        db_client.close()
+        if memory_profiler:
+            memory_profiler.stop()
+        if cpu_profiler:
+            cpu_profiler.stop()
+        watchdog.close()
+        config_listener.close()
+        if recorder:
+            recorder.close()
+        if alerts:
+            alerts.close()
+        if edge_api:
+            edge_api.close()
+        db_writer.close()
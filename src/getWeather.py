@@ -1,118 +1,197 @@
 """
 Get weather data from OpenWeather and write to InfluxDB.
+Locations come from config/getWeather.json, or LOCATION, LATITUDE and LONGITUDE in the dotenv file.
+All locations are fetched at the same time and written in one batch.
 """
 
 import os
 import logging
 import socket
 import sys
-import time
-from datetime import datetime
-from requests import get
-from requests.exceptions import Timeout
-from requests.exceptions import ConnectionError as RequestsConnectionError
-from influxdb.exceptions import InfluxDBServerError, InfluxDBClientError
-from common_functions import choose_dotenv, database_connect
+from collector_cycle import CycleState
+from common_functions import choose_dotenv, provision_enabled, fast_start_enabled, StartupTimer
+from weather_utils import (construct_weather_point, construct_forecast_points, forecast_hash, load_locations,
+                           cache_file_for, WeatherCache, WeatherFetcher, CallBudget, CACHE_MAX_AGE_SECS)
+from recording import recorder_from_env, recording_fetch
+from watchdog import LoopWatchdog, PhaseTimeout
+from writers import DeferredInfluxWriter
 
 TRY_AGAIN_SECS = 60
 GET_WEATHER_SLEEP_SECS = 600
 SLEEP_MINUTES = GET_WEATHER_SLEEP_SECS / 60
 SLEEP_MINUTES_FORMATTED = f"{SLEEP_MINUTES:.1f}".rstrip("0").rstrip(".")
 
-HOSTNAME = socket.gethostname()
-choose_dotenv(HOSTNAME)
-
-LOG_LEVEL = os.getenv("LOG_LEVEL_GET_WEATHER", "INFO").upper()
-LOG_FILE = os.getenv("LOG_FILE_GET_WEATHER", "/var/log/getWeather.log")
-FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
-numeric_level = getattr(logging, LOG_LEVEL, logging.INFO)
-logging.basicConfig(filename=LOG_FILE, level=numeric_level, format=FORMAT)
-print(f"Logging to {LOG_FILE}")
-
-logging.info(f"Python version: {sys.version}")
-
-INFLUXDB_HOST = os.getenv("INFLUXDB_HOST")
-INFLUXDB_PORT = os.getenv("INFLUXDB_PORT")
-USERNAME = os.getenv("USERNAME")
-PASSWORD = os.getenv("PASSWORD")
-DATABASE = os.getenv("TEMP_SENSOR_DATABASE")
-OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
-
-LOCATION = os.getenv("LOCATION")
-LATITUDE = os.getenv("LATITUDE")
-LONGITUDE = os.getenv("LONGITUDE")
+CONFIG_FILE_NAME = "getWeather.json"
+CONFIG_FILE = f"config/{CONFIG_FILE_NAME}"
 
 UNITS = 'imperial'
 
-OPENWEATHERMAP_URL = (
-    f"http://api.openweathermap.org/data/3.0/onecall"
-    f"?lat={LATITUDE}"
-    f"&lon={LONGITUDE}"
-    f"&exclude=minutely,hourly"
-    f"&appid={OPENWEATHERMAP_API_KEY}"
-    f"&units={UNITS}"
-)
-
-db_client = database_connect(INFLUXDB_HOST, INFLUXDB_PORT, USERNAME, PASSWORD, DATABASE)
-
-try:
-    while True:
-        try:
-            weatherData = get(OPENWEATHERMAP_URL, timeout=5).json()
-        except Exception as e:
-            logging.error(f"Failed to get weather data: {e}")
-            logging.error(f"Trying again in {TRY_AGAIN_SECS} seconds...")
-            time.sleep(TRY_AGAIN_SECS)
+# Watchdog latency budget for a cycle, and deadlines per phase, in seconds
+CYCLE_BUDGET_SECS = 45
+PHASE_DEADLINES = {"read": 30, "write": 10}
+
+def run_cycle(state):
+    """
+    One getWeather cycle, every location at once. Return the points written, None if no location was fetched.
+    state.hardware  -> WeatherFetcher
+    state.features  -> forecast_enabled, caches, {location: WeatherCache},
+                       and forecast_hashes, {location: hash of the last forecast written}, updated after writes
+    A location that wasn't fetched is written from its cache while the cached response is recent enough.
+    """
+
+    features = state.features
+    responses = state.run_phase("read", state.hardware.fetch_all)
+    fetched_at = state.clock.time()
+
+    from_cache = set()
+    for location, cache in features["caches"].items():
+        if responses.get(location) is None:
+            responses[location] = cache.fallback(fetched_at)
+            if responses[location] is not None:
+                from_cache.add(location)
+
+    series = []
+    new_forecast_hashes = {}
+
+    for location, weather_data in responses.items():
+        if weather_data is None:
             continue
 
-        series = []
-        TODAY, TOMORROW = 0, 1
-        dateTimeNow = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
         try:
-            point = {
-                "measurement": "weather",
-                "tags": {
-                    "location": LOCATION
-                },
-                "fields": {
-                    "humidity":               int(weatherData['current']['humidity']),
-                    "feelsLike":              float(weatherData['current']['feels_like']),
-                    "currentCondition":       weatherData['current']['weather'][0]['main'],
-                    "tempHigh":               float(weatherData['daily'][TODAY]['temp']['max']),
-                    "tempLow":                float(weatherData['daily'][TODAY]['temp']['min']),
-                    "dailyCondition":         weatherData['daily'][TODAY]['weather'][0]['main'],
-                    "dailyConditionTomorrow": weatherData['daily'][TOMORROW]['weather'][0]['main'],
-                    "tempHighTomorrow":       int(weatherData['daily'][TOMORROW]['temp']['max']),
-                    "tempLowTomorrow":        float(weatherData['daily'][TOMORROW]['temp']['min']),
-                    "windDirection":          int(weatherData['current']['wind_deg']),
-                    "windSpeed":              float(weatherData['current']['wind_speed']),
-                    "windGust":               float(weatherData['daily'][TODAY]['wind_gust']),
-                    "timeStamp": dateTimeNow
-                }
-            }
+            point = construct_weather_point(weather_data, location)
             logging.debug(f"Point: {point}")
             series.append(point)
-
         except Exception as e:
-            logging.error(f"Failure parsing weather data: {e}")
-            logging.error(f"Trying again in {TRY_AGAIN_SECS} seconds...")
-            time.sleep(TRY_AGAIN_SECS)
+            logging.error(f"Failure parsing weather data for {location}: {e}")
+            responses[location] = None
             continue
 
-        try:
-            db_client.write_points(series)
-            logging.info("Series written to InfluxDB.")
-
-        except (InfluxDBServerError, InfluxDBClientError, RequestsConnectionError, Timeout) as e:
-            logging.error(f"Failure writing to or reading from InfluxDB: {e}")
-            db_client = database_connect(INFLUXDB_HOST, INFLUXDB_PORT, USERNAME, PASSWORD, DATABASE)
-
-        logging.info(f"Sleeping for {SLEEP_MINUTES_FORMATTED} minutes...")
-        time.sleep(GET_WEATHER_SLEEP_SECS)
-
-except KeyboardInterrupt:
-    logging.info("Exiting gracefully")
-    print()
-finally:
-    db_client.close()
+        if features.get("forecast_enabled"):
+            new_forecast_hash = forecast_hash(weather_data)
+
+            if new_forecast_hash == features["forecast_hashes"].get(location):
+                logging.info(f"Forecast unchanged for {location}, skipping forecast write")
+                continue
+
+            try:
+                series.extend(construct_forecast_points(weather_data, location))
+                new_forecast_hashes[location] = new_forecast_hash
+            except Exception as e:
+                logging.error(f"Failure parsing forecast data for {location}: {e}")
+
+    if not series:
+        logging.error(f"No weather data, trying again in {TRY_AGAIN_SECS} seconds...")
+        return None
+
+    state.write(series, time_precision='s')
+    features["forecast_hashes"].update(new_forecast_hashes)
+
+    for location, weather_data in responses.items():
+        if weather_data is not None and location not in from_cache:
+            features["caches"][location].save(weather_data, fetched_at, features["forecast_hashes"].get(location))
+    return series
+
+if __name__ == "__main__":
+
+    startup = StartupTimer()
+
+    HOSTNAME = socket.gethostname()
+    choose_dotenv(HOSTNAME)
+
+    LOG_LEVEL = os.getenv("LOG_LEVEL_GET_WEATHER", "INFO").upper()
+    LOG_FILE = os.getenv("LOG_FILE_GET_WEATHER", "/var/log/getWeather.log")
+    FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+    numeric_level = getattr(logging, LOG_LEVEL, logging.INFO)
+    logging.basicConfig(filename=LOG_FILE, level=numeric_level, format=FORMAT)
+    print(f"Logging to {LOG_FILE}")
+
+    logging.info(f"Python version: {sys.version}")
+
+    INFLUXDB_HOST = os.getenv("INFLUXDB_HOST")
+    INFLUXDB_PORT = os.getenv("INFLUXDB_PORT")
+    USERNAME = os.getenv("USERNAME")
+    PASSWORD = os.getenv("PASSWORD")
+    DATABASE = os.getenv("TEMP_SENSOR_DATABASE")
+    OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY")
+
+    LOCATION = os.getenv("LOCATION")
+    LATITUDE = os.getenv("LATITUDE")
+    LONGITUDE = os.getenv("LONGITUDE")
+
+    FORECAST_ENABLED = os.getenv("WEATHER_FORECAST_ENABLED", "false").strip().lower() == "true"
+    WEATHER_CACHE_FILE = os.getenv("WEATHER_CACHE_FILE", "config/weather_cache.json")
+    WEATHER_CACHE_MAX_AGE_SECS = float(os.getenv("WEATHER_CACHE_MAX_AGE_SECS", str(CACHE_MAX_AGE_SECS)))
+    EXCLUDE = "minutely" if FORECAST_ENABLED else "minutely,hourly"
+    DAILY_CALL_BUDGET = int(os.getenv("WEATHER_DAILY_CALL_BUDGET", "1000"))
+
+    startup.mark("dotenv and logging")
+
+    LOCATIONS = load_locations(CONFIG_FILE, HOSTNAME, LOCATION, LATITUDE, LONGITUDE)
+
+    calls_per_day = len(LOCATIONS) * 86400 // GET_WEATHER_SLEEP_SECS
+    if calls_per_day > DAILY_CALL_BUDGET:
+        logging.warning(f"{len(LOCATIONS)} locations need {calls_per_day} API calls per day, "
+                        f"budget is {DAILY_CALL_BUDGET}. Some fetches will be skipped.")
+
+    fetcher = WeatherFetcher(OPENWEATHERMAP_API_KEY, LOCATIONS, EXCLUDE, UNITS, CallBudget(DAILY_CALL_BUDGET))
+
+    recorder = recorder_from_env("getWeather")
+    if recorder:
+        fetcher.fetch_one = recording_fetch(fetcher.fetch_one, recorder)
+
+    db_writer = DeferredInfluxWriter.from_settings(INFLUXDB_HOST, INFLUXDB_PORT, USERNAME, PASSWORD, DATABASE,
+                                                   provision=provision_enabled()).start()
+    if not fast_start_enabled():
+        db_writer.wait_connected()
+    startup.mark("InfluxDB connect")
+
+    weather_caches = {location: WeatherCache(cache_file_for(WEATHER_CACHE_FILE, location), WEATHER_CACHE_MAX_AGE_SECS)
+                      for location in LOCATIONS}
+    cached_entries = {location: cache.load() for location, cache in weather_caches.items()}
+    written_forecast_hashes = {location: entry.get("forecast_hash") for location, entry in cached_entries.items() if entry}
+
+    watchdog = LoopWatchdog(CYCLE_BUDGET_SECS, PHASE_DEADLINES)
+
+    if all(cached_entries.values()):
+        oldest_age = max(WeatherCache.age_secs(entry) for entry in cached_entries.values())
+        if oldest_age < GET_WEATHER_SLEEP_SECS:
+            wait_secs = GET_WEATHER_SLEEP_SECS - oldest_age
+            logging.info(f"Cached weather is recent, next API call in {wait_secs / 60:.1f} minutes")
+            watchdog.cycle_start()
+            watchdog.cycle_done()
+            watchdog.idle(wait_secs)
+
+    cycle_state = CycleState(HOSTNAME, db_writer, fetcher, features={
+        "forecast_enabled": FORECAST_ENABLED,
+        "caches": weather_caches,
+        "forecast_hashes": written_forecast_hashes,
+    }, run_phase=watchdog.run)
+
+    try:
+        while True:
+            watchdog.cycle_start()
+
+            next_cycle_secs = GET_WEATHER_SLEEP_SECS
+            try:
+                if run_cycle(cycle_state) is None:
+                    next_cycle_secs = TRY_AGAIN_SECS
+                else:
+                    startup.finish("first reading")
+
+            except PhaseTimeout as e:
+                logging.error(f"{e}, skipping the rest of the cycle")
+
+            watchdog.cycle_done()
+            if next_cycle_secs == GET_WEATHER_SLEEP_SECS:
+                logging.info(f"Sleeping for {SLEEP_MINUTES_FORMATTED} minutes...")
+            watchdog.idle(next_cycle_secs)
+
+    except KeyboardInterrupt:
+        logging.info("Exiting gracefully")
+        print()
+    finally:
+        watchdog.close()
+        fetcher.close()
+        if recorder:
+            recorder.close()
+        db_writer.close()
@@ -0,0 +1,176 @@
+"""
+Retention policies and continuous queries (rollups) for the SandstoneDashboard InfluxDB databases.
+Raw points are kept for a short time, 1 minute and 1 hour min/mean/max rollups are kept longer.
+"""
+
+import os
+import logging
+
+RAW_RP = "raw"
+ROLLUP_1M_RP = "rollup_1m"
+ROLLUP_1H_RP = "rollup_1h"
+
+# Retention policy name -> (env var with duration, default duration)
+RETENTION_POLICIES = {
+    RAW_RP:       ("INFLUXDB_RAW_RETENTION", "7d"),
+    ROLLUP_1M_RP: ("INFLUXDB_1M_RETENTION", "180d"),
+    ROLLUP_1H_RP: ("INFLUXDB_1H_RETENTION", "INF"),
+}
+
+# Rollup tiers: (retention policy, group by interval, source retention policy)
+# The 1 hour tier is built from the 1 minute tier.
+ROLLUP_TIERS = [
+    (ROLLUP_1M_RP, "1m", RAW_RP),
+    (ROLLUP_1H_RP, "1h", ROLLUP_1M_RP),
+]
+
+# Numeric fields rolled up per measurement
+ROLLUP_FIELDS = {
+    "temps": ["temp_flt", "humidity_flt"],
+    "pressures": ["pressure_flt", "adc_raw"],
+    "weather": ["humidity", "feelsLike", "tempHigh", "tempLow", "tempHighTomorrow",
+                "tempLowTomorrow", "windDirection", "windSpeed", "windGust"],
+}
+
+# Dotenv variable naming the database each measurement is written to
+ROLLUP_DATABASES = {
+    "temps": "SENSOR_DATABASE",
+    "pressures": "SENSOR_DATABASE",
+    "weather": "TEMP_SENSOR_DATABASE",
+}
+
+# Keep the -999.9 "sensor OFF" placeholder out of the rollups
+ROLLUP_WHERE = {
+    "temps": "temp_flt > -999",
+    "pressures": "pressure_flt > -999",
+}
+
+def retention_durations() -> dict:
+    """Return {retention policy: duration}, durations can be overridden in the dotenv file"""
+    return {rp: os.getenv(env_var) or default for rp, (env_var, default) in RETENTION_POLICIES.items()}
+
+def rollup_measurements(database) -> list:
+    """
+    Measurements rolled up in a database: those written to it, per ROLLUP_DATABASES.
+    A measurement whose database variable isn't set is rolled up in every database.
+    """
+    return [measurement for measurement in ROLLUP_FIELDS
+            if os.getenv(ROLLUP_DATABASES[measurement]) in (None, "", database)]
+
+def cq_name(measurement, interval) -> str:
+    """Continuous query name, example: cq_temps_1m"""
+    return f"cq_{measurement}_{interval}"
+
+def rollup_select(database, measurement, rollup_rp, interval, source_rp, time_range=None) -> str:
+    """
+    Build the SELECT INTO statement for one rollup tier.
+    Raw fields become <field>_min, <field>_mean and <field>_max.
+    Rollups of rollups aggregate the matching _min, _mean and _max fields.
+    time_range -> optional (start, end) RFC3339 strings, used for backfills
+    """
+
+    from_rollup = source_rp in (ROLLUP_1M_RP, ROLLUP_1H_RP)
+
+    aggregates = []
+    for field in ROLLUP_FIELDS[measurement]:
+        for func in ("min", "mean", "max"):
+            source_field = f"{field}_{func}" if from_rollup else field
+            aggregates.append(f'{func}("{source_field}") AS "{field}_{func}"')
+
+    conditions = []
+    if not from_rollup and measurement in ROLLUP_WHERE:
+        conditions.append(ROLLUP_WHERE[measurement])
+    if time_range:
+        conditions.append(f"time >= '{time_range[0]}' AND time < '{time_range[1]}'")
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    return (
+        f"SELECT {', '.join(aggregates)}"
+        f' INTO "{database}"."{rollup_rp}"."{measurement}"'
+        f' FROM "{database}"."{source_rp}"."{measurement}"'
+        f"{where}"
+        f" GROUP BY time({interval}), *"
+    )
+
+def provision_retention_policies(client, database):
+    """Create missing retention policies and fix durations. The raw policy is the default."""
+
+    durations = retention_durations()
+    existing = {rp["name"]: rp for rp in client.get_list_retention_policies(database)}
+
+    for rp, duration in durations.items():
+        default = rp == RAW_RP
+
+        if rp not in existing:
+            logging.info(f"Creating retention policy {rp} ({duration}) on {database}")
+            client.create_retention_policy(rp, duration, 1, database=database, default=default)
+        elif existing[rp].get("default") != default or not _same_duration(existing[rp].get("duration"), duration):
+            logging.info(f"Updating retention policy {rp} ({duration}) on {database}")
+            client.alter_retention_policy(rp, database=database, duration=duration, default=default)
+
+def provision_continuous_queries(client, database):
+    """
+    Create the rollup continuous queries of the database's measurements that don't exist yet,
+    recreate those missing a field added to ROLLUP_FIELDS since,
+    and drop rollup continuous queries of measurements written to another database.
+    """
+
+    existing = {}
+    for db_cqs in client.get_list_continuous_queries():
+        for cq in db_cqs.get(database, []):
+            existing[cq["name"]] = cq.get("query") or ""
+
+    measurements = rollup_measurements(database)
+    for measurement, fields in ROLLUP_FIELDS.items():
+        for rollup_rp, interval, source_rp in ROLLUP_TIERS:
+            name = cq_name(measurement, interval)
+            if measurement not in measurements:
+                if name in existing:
+                    logging.info(f"Dropping continuous query {name} on {database}, {measurement} is written to "
+                                 f"{os.getenv(ROLLUP_DATABASES[measurement])}")
+                    client.drop_continuous_query(name, database)
+                continue
+            if name in existing:
+                if not _missing_fields(existing[name], fields):
+                    continue
+                logging.info(f"Recreating continuous query {name} on {database} with {fields}")
+                client.drop_continuous_query(name, database)
+            else:
+                logging.info(f"Creating continuous query {name} on {database}")
+            client.create_continuous_query(
+                name, rollup_select(database, measurement, rollup_rp, interval, source_rp), database)
+
+def provision_schema(client, database):
+    """Provision retention policies and continuous queries, log and continue on failure"""
+
+    try:
+        provision_retention_policies(client, database)
+        provision_continuous_queries(client, database)
+        logging.info(f"Schema provisioned for {database}")
+        return True
+    except Exception as e:
+        logging.error(f"Schema provisioning failed for {database}: {e}")
+    return False
+
+def _missing_fields(query, fields) -> list:
+    """Fields an existing continuous query doesn't roll up, none if its query is unknown"""
+    return [field for field in fields if query and f"{field}_max" not in query]
+
+def _same_duration(influx_duration, duration) -> bool:
+    """Compare an InfluxDB duration (168h0m0s, 0s for INF) with a config duration (7d, INF)"""
+
+    units = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+    def to_secs(value):
+        if value in (None, "", "INF", "0s"):
+            return 0
+        secs, number = 0, ""
+        for char in value:
+            if char.isdigit():
+                number += char
+            else:
+                secs += int(number or 0) * units.get(char, 1)
+                number = ""
+        return secs
+
+    return to_secs(influx_duration) == to_secs(duration)
@@ -0,0 +1,171 @@
+"""
+Opt-in memory profiling for the long running collectors.
+Samples tracemalloc snapshots and RSS every report interval, logs the allocation sites that grew the most
+and writes a collector_memory point, so slow leaks show up long before the OOM killer.
+SIGUSR2 dumps a tracemalloc snapshot for offline analysis.
+"""
+
+import os
+import logging
+import signal
+import sys
+import time
+import tracemalloc
+
+REPORT_SECS = 600
+TOP_SITES = 10
+DUMP_DIR = "profiles"
+
+# Allocations made by the profiler itself are not interesting
+IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+def rss_bytes():
+    """Resident set size of this process from /proc, None where /proc isn't available"""
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as open_statm:
+            return int(open_statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces(IGNORED_TRACES)
+
+class MemoryProfiler:
+    """Per cycle allocation counts, periodic growth reports and snapshot dumps on SIGUSR2"""
+
+    def __init__(self, source, report_secs=REPORT_SECS, top=TOP_SITES, dump_dir=DUMP_DIR, clock=time.monotonic):
+        """
+        source      -> collector name written as a tag and used in dump file names, like getTemps
+        report_secs -> seconds between growth reports and collector_memory points
+        top         -> allocation sites logged per report
+        dump_dir    -> directory for snapshots dumped on SIGUSR2
+        clock       -> callable returning seconds
+        """
+        self.source = source
+        self.report_secs = report_secs
+        self.top = top
+        self.dump_dir = dump_dir
+        self.clock = clock
+        self.last_snapshot = None
+        self.baseline = (None, 0)  # (RSS, traced bytes) at start
+        self.window = {}
+        self.dump_requested = False
+
+    def start(self, frames=1):
+        """Start tracing with frames of traceback per allocation and install the SIGUSR2 handler"""
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.last_snapshot = _snapshot()
+        self.baseline = (rss_bytes(), tracemalloc.get_traced_memory()[0])
+        self._new_window()
+        signal.signal(signal.SIGUSR2, self._request_dump)
+        logging.info(f"Memory profiling on, {frames} frames per allocation, report every {self.report_secs} seconds")
+        return self
+
+    def _new_window(self):
+        self.window = {"started": self.clock(), "cycles": 0, "blocks": 0, "peak_sum": 0, "peak_max": 0,
+                       "cycle_blocks": 0, "cycle_bytes": 0}
+
+    def _request_dump(self, signum, frame):
+        del signum, frame
+        self.dump_requested = True
+
+    def cycle_start(self):
+        """Mark the start of a collector cycle"""
+        tracemalloc.reset_peak()
+        self.window["cycle_blocks"] = sys.getallocatedblocks()
+        self.window["cycle_bytes"] = tracemalloc.get_traced_memory()[0]
+
+    def cycle_end(self):
+        """Count the blocks and peak bytes allocated by the cycle, dump a snapshot if SIGUSR2 was received"""
+
+        current, peak = tracemalloc.get_traced_memory()
+        cycle_peak = peak - self.window["cycle_bytes"]
+        self.window["cycles"] += 1
+        self.window["blocks"] += sys.getallocatedblocks() - self.window["cycle_blocks"]
+        self.window["peak_sum"] += cycle_peak
+        self.window["peak_max"] = max(self.window["peak_max"], cycle_peak)
+        logging.debug(f"Cycle allocations: {cycle_peak / 1024:.1f} KiB peak, "
+                      f"{(current - self.window['cycle_bytes']) / 1024:+.1f} KiB retained")
+
+        if self.dump_requested:
+            self.dump_requested = False
+            self.dump()
+
+    def dump(self) -> str:
+        """Write a tracemalloc snapshot, load it with tracemalloc.Snapshot.load. Return the file path."""
+
+        os.makedirs(self.dump_dir, exist_ok=True)
+        path = os.path.join(self.dump_dir, f"{self.source}-{os.getpid()}-{int(time.time())}.tracemalloc")
+        snapshot = _snapshot()
+        snapshot.dump(path)
+        logging.info(f"Memory snapshot dumped to {path}")
+        for stat in snapshot.statistics("lineno")[:self.top]:
+            logging.info(f"Allocated: {stat}")
+        return path
+
+    def construct_points(self, hostname) -> list[dict]:
+        """Log the growth report and construct a collector_memory point once every report interval, else []"""
+
+        elapsed = self.clock() - self.window["started"]
+        if elapsed < self.report_secs or not self.window["cycles"]:
+            return []
+
+        snapshot = _snapshot()
+        for stat in snapshot.compare_to(self.last_snapshot, "lineno")[:self.top]:
+            if stat.size_diff > 0:
+                logging.info(f"Grew in the last {elapsed:.0f} seconds: {stat}")
+        self.last_snapshot = snapshot
+        rss_start, traced_start = self.baseline
+
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        cycles = self.window["cycles"]
+        fields = {
+            "traced_bytes": traced,
+            "traced_growth_bytes": traced - traced_start,
+            "traced_peak_bytes": traced_peak,
+            "cycles": cycles,
+            "cycle_blocks_mean": self.window["blocks"] / cycles,
+            "cycle_peak_kb_mean": self.window["peak_sum"] / cycles / 1024,
+            "cycle_peak_kb_max": self.window["peak_max"] / 1024,
+        }
+        rss = rss_bytes()
+        if rss is not None:
+            fields["rss_bytes"] = rss
+            if rss_start is not None:
+                fields["rss_growth_bytes"] = rss - rss_start
+        logging.info(f"Memory: RSS {(rss or 0) / 1048576:.1f} MiB, traced {traced / 1048576:.2f} MiB, "
+                     f"{fields['cycle_blocks_mean']:+.1f} blocks per cycle over {cycles} cycles")
+        self._new_window()
+
+        point = {
+            "measurement": "collector_memory",
+            "tags": {
+                "source": self.source,
+                "hostname": hostname,
+            },
+            "fields": fields,
+        }
+        logging.debug(f"Point: {point}")
+        return [point]
+
+    def stop(self):
+        """Stop tracing and restore the default SIGUSR2 handler"""
+        signal.signal(signal.SIGUSR2, signal.SIG_DFL)
+        tracemalloc.stop()
+
+def memory_profiler_from_env(source):
+    """Create and start a MemoryProfiler if MEMORY_PROFILE_ENABLED is true, otherwise return None"""
+
+    if os.getenv("MEMORY_PROFILE_ENABLED", "false").strip().lower() != "true":
+        return None
+    return MemoryProfiler(source,
+                          report_secs=float(os.getenv("MEMORY_PROFILE_REPORT_SECS", str(REPORT_SECS))),
+                          top=int(os.getenv("MEMORY_PROFILE_TOP", str(TOP_SITES))),
+                          dump_dir=os.getenv("MEMORY_PROFILE_DUMP_DIR", DUMP_DIR)
+                          ).start(frames=int(os.getenv("MEMORY_PROFILE_FRAMES", "1")))
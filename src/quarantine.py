@@ -0,0 +1,97 @@
+"""
+Quarantine for failing 1-Wire sensors.
+A DS18B20 that is disconnected or failing but still listed in /sys/bus/w1/devices can block its w1_slave read
+for the bus timeout before it fails, and every other sensor on the host waits behind it.
+After a few failed or slow reads in a row a sensor is quarantined: it isn't read, it is reported OFF, and it is
+probed again after a backoff that doubles after every failed probe. The first good probe brings it back.
+"""
+
+import logging
+import os
+import time
+
+FAILURES = 3
+SLOW_SECS = 3.0  # a DS18B20 conversion takes about 750 ms
+BACKOFF_SECS = 30
+MAX_BACKOFF_SECS = 1800
+
+class SensorBackoff:
+    """Failures in a row of one sensor and its probe schedule"""
+    __slots__ = ("failures", "backoff_secs", "next_probe")
+
+    def __init__(self):
+        self.failures = 0
+        self.backoff_secs = 0.0
+        self.next_probe = None
+
+    def quarantined(self) -> bool:
+        """True while the sensor is only read on probes"""
+        return self.next_probe is not None
+
+    def release(self):
+        """Back to being read every cycle"""
+        self.failures = 0
+        self.backoff_secs = 0.0
+        self.next_probe = None
+
+class QuarantineScheduler:
+    """Decide which sensors to read this cycle and back off from the ones that keep failing"""
+
+    def __init__(self, failures=FAILURES, slow_secs=SLOW_SECS, backoff_secs=BACKOFF_SECS,
+                 max_backoff_secs=MAX_BACKOFF_SECS, clock=time.monotonic):
+        """
+        failures         -> failed or slow reads in a row that quarantine a sensor
+        slow_secs        -> a read taking longer counts as failed even if it returned a temperature
+        backoff_secs     -> seconds to the first probe of a quarantined sensor
+        max_backoff_secs -> the backoff doubles after every failed probe up to this
+        clock            -> callable returning seconds, monotonic by default
+        """
+        self.failures = failures
+        self.slow_secs = slow_secs
+        self.backoff_secs = backoff_secs
+        self.max_backoff_secs = max_backoff_secs
+        self.clock = clock
+        self.sensors = {}
+
+    def should_read(self, sensor_id) -> bool:
+        """True unless the sensor is quarantined and its next probe isn't due"""
+        sensor = self.sensors.get(sensor_id)
+        return sensor is None or not sensor.quarantined() or self.clock() >= sensor.next_probe
+
+    def add(self, sensor_id, ok, read_secs):
+        """Add the result of a read, ok is False for a failed read"""
+
+        sensor = self.sensors.setdefault(sensor_id, SensorBackoff())
+        if ok and read_secs <= self.slow_secs:
+            if sensor.quarantined():
+                logging.info(f"Sensor {sensor_id} answered its probe, out of quarantine")
+            sensor.release()
+            return
+
+        sensor.failures += 1
+        if sensor.quarantined():
+            sensor.backoff_secs = min(sensor.backoff_secs * 2, self.max_backoff_secs)
+        elif sensor.failures >= self.failures:
+            sensor.backoff_secs = self.backoff_secs
+        else:
+            return
+        sensor.next_probe = self.clock() + sensor.backoff_secs
+        logging.warning(f"Sensor {sensor_id} quarantined after {sensor.failures} failed or slow reads, "
+                        f"next probe in {sensor.backoff_secs:g} seconds")
+
+    def quarantined(self) -> list:
+        """Ids of the quarantined sensors"""
+        return [sensor_id for sensor_id, sensor in self.sensors.items() if sensor.quarantined()]
+
+def quarantine_from_env():
+    """Create a QuarantineScheduler if W1_QUARANTINE_ENABLED is true, otherwise return None"""
+
+    if os.getenv("W1_QUARANTINE_ENABLED", "false").strip().lower() != "true":
+        return None
+    failures = int(os.getenv("W1_QUARANTINE_FAILURES", str(FAILURES)))
+    backoff_secs = float(os.getenv("W1_QUARANTINE_BACKOFF_SECS", str(BACKOFF_SECS)))
+    max_backoff_secs = float(os.getenv("W1_QUARANTINE_MAX_BACKOFF_SECS", str(MAX_BACKOFF_SECS)))
+    logging.info(f"Sensor quarantine on after {failures} failed reads, probes every {backoff_secs:g} "
+                 f"to {max_backoff_secs:g} seconds")
+    return QuarantineScheduler(failures, float(os.getenv("W1_QUARANTINE_SLOW_SECS", str(SLOW_SECS))),
+                               backoff_secs, max_backoff_secs)
@@ -0,0 +1,278 @@
+"""
+Capture raw sensor readings to a compact append-only file, for replay with simulator/replay.py.
+Records w1_slave contents, ADS1115 counts, SHT30 byte blocks and OpenWeather responses with their time and
+read latency, so a night of slow sensors, CRC errors or I2C failures can be replayed on a laptop.
+
+File: MAGIC, then records of RECORD_HEADER (kind, epoch secs, latency secs, key id, payload length) + payload.
+Keys (sensor id, channel:gain, I2C address, location) are written once per file as KIND_KEY records.
+"""
+
+import builtins
+import io
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+MAGIC = b"SDREC1\n"
+RECORD_HEADER = struct.Struct("<BdfHI")
+
+KIND_KEY = 0
+KIND_W1 = 1
+KIND_ADC = 2
+KIND_SHT30 = 3
+KIND_WEATHER = 4
+KIND_NAMES = {KIND_W1: "w1", KIND_ADC: "adc", KIND_SHT30: "sht30", KIND_WEATHER: "weather"}
+
+FLAG_ERROR = 0x80       # payload is "ExceptionName: message"
+FLAG_COMPRESSED = 0x40  # payload is zlib compressed
+FLAG_RAW_TEXT = 0x20    # w1_slave text that didn't fit the compact encoding
+KIND_MASK = 0x1F
+
+COMPRESS_MIN_BYTES = 256
+W1_SLAVE_FILE = "w1_slave"
+
+# 2b 01 4b 46 7f ff 7f 10 51 : crc=51 YES
+# 2b 01 4b 46 7f ff 7f 10 51 t=18687
+W1_SLAVE_RE = re.compile(r"((?:[0-9a-f]{2} ){9}): crc=([0-9a-f]{2}) (YES|NO)\n\1t=(-?\d+)\n")
+W1_COMPACT = struct.Struct("<9sB?i")
+ADC_VALUE = struct.Struct("<i")
+
+Reading = namedtuple("Reading", "kind timestamp latency key value error")
+
+def _encode_w1(text):
+    """15 bytes for a well formed w1_slave file, the text otherwise"""
+    match = W1_SLAVE_RE.fullmatch(text)
+    if not match:
+        return FLAG_RAW_TEXT, text.encode("utf-8")
+    data, crc, crc_ok, milli_c = match.groups()
+    return 0, W1_COMPACT.pack(bytes.fromhex(data), int(crc, 16), crc_ok == "YES", int(milli_c))
+
+def _decode_w1(flags, payload) -> str:
+    if flags & FLAG_RAW_TEXT:
+        return payload.decode("utf-8")
+    data, crc, crc_ok, milli_c = W1_COMPACT.unpack(payload)
+    hex_data = "".join(f"{byte:02x} " for byte in data)
+    return f"{hex_data}: crc={crc:02x} {'YES' if crc_ok else 'NO'}\n{hex_data}t={milli_c}\n"
+
+def _encode(kind, value):
+    if kind == KIND_W1:
+        return _encode_w1(value)
+    if kind == KIND_ADC:
+        return 0, ADC_VALUE.pack(int(value))
+    if kind == KIND_SHT30:
+        return 0, bytes(value)
+    return 0, json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+def _decode(kind, flags, payload):
+    if kind == KIND_W1:
+        return _decode_w1(flags, payload)
+    if kind == KIND_ADC:
+        return ADC_VALUE.unpack(payload)[0]
+    if kind == KIND_SHT30:
+        return list(payload)
+    return json.loads(payload)
+
+def error_from_text(text) -> Exception:
+    """Rebuild a recorded exception, OSError when the type isn't a builtin exception"""
+    name, _, message = text.partition(": ")
+    exception_type = getattr(builtins, name, None)
+    if isinstance(exception_type, type) and issubclass(exception_type, Exception):
+        return exception_type(message)
+    return OSError(text)
+
+class Recorder:
+    """Append readings to <directory>/<source>-YYYYMMDD.rec, a new file every UTC day"""
+
+    def __init__(self, directory, source, clock=time.time):
+        self.directory = directory
+        self.source = source
+        self.clock = clock
+        self.path = None
+        self.file = None
+        self.keys = {}  # key -> id in the current file
+        self.lock = threading.Lock()
+
+    def _open(self, now):
+        path = os.path.join(self.directory, f"{self.source}-{time.strftime('%Y%m%d', time.gmtime(now))}.rec")
+        if path == self.path:
+            return
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.file = open(path, "ab")  # pylint: disable=consider-using-with
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.path = path
+        self.keys = {}
+        logging.info(f"Recording raw readings to {path}")
+
+    def _key_id(self, key, now) -> int:
+        if key not in self.keys:
+            self.keys[key] = len(self.keys)
+            encoded = key.encode("utf-8")
+            self.file.write(RECORD_HEADER.pack(KIND_KEY, now, 0.0, self.keys[key], len(encoded)) + encoded)
+        return self.keys[key]
+
+    def record(self, kind, key, value, latency_secs, error=None):
+        """
+        Append one reading.
+        value -> w1_slave text, ADC count, SHT30 block or weather response, ignored when error is given
+        error -> exception raised by the read
+        """
+
+        now = self.clock()
+        if error is not None:
+            flags, payload = FLAG_ERROR, f"{type(error).__name__}: {error}".encode("utf-8")
+        else:
+            flags, payload = _encode(kind, value)
+        if len(payload) >= COMPRESS_MIN_BYTES:
+            flags, payload = flags | FLAG_COMPRESSED, zlib.compress(payload)
+
+        try:
+            with self.lock:
+                self._open(now)
+                key_id = self._key_id(str(key), now)
+                self.file.write(RECORD_HEADER.pack(kind | flags, now, latency_secs, key_id, len(payload)) + payload)
+                self.file.flush()
+        except OSError as e:
+            logging.error(f"Failure recording {KIND_NAMES.get(kind)} reading: {e}")
+
+    def close(self):
+        """Close the current file"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.path = None
+
+def read_recording(path):
+    """Yield a Reading for every record. A record cut short by a crash ends the file."""
+
+    keys = {}
+    with open(path, "rb") as recording:
+        if recording.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a recording: {path}")
+        while True:
+            header = recording.read(RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < RECORD_HEADER.size:
+                logging.warning(f"Truncated record at the end of {path}")
+                return
+            kind_flags, timestamp, latency, key_id, length = RECORD_HEADER.unpack(header)
+            payload = recording.read(length)
+            if len(payload) < length:
+                logging.warning(f"Truncated record at the end of {path}")
+                return
+
+            kind = kind_flags & KIND_MASK
+            if kind == KIND_KEY:
+                keys[key_id] = payload.decode("utf-8")
+                continue
+            if kind_flags & FLAG_COMPRESSED:
+                payload = zlib.decompress(payload)
+            if kind_flags & FLAG_ERROR:
+                yield Reading(kind, timestamp, latency, keys[key_id], None, payload.decode("utf-8"))
+            else:
+                yield Reading(kind, timestamp, latency, keys[key_id], _decode(kind, kind_flags, payload), None)
+
+def recording_open(recorder, opener=open):
+    """Drop-in for builtins.open that records every w1_slave read, other paths are opened normally"""
+
+    def open_and_record(path, *args, **kwargs):
+        path = str(path)
+        if not path.endswith(W1_SLAVE_FILE):
+            return opener(path, *args, **kwargs)
+
+        sensor_id = os.path.basename(os.path.dirname(path))
+        started = time.monotonic()
+        try:
+            with opener(path, *args, **kwargs) as device_file:
+                text = device_file.read()
+        except OSError as e:
+            recorder.record(KIND_W1, sensor_id, None, time.monotonic() - started, e)
+            raise
+        recorder.record(KIND_W1, sensor_id, text, time.monotonic() - started)
+        return io.StringIO(text)
+
+    return open_and_record
+
+class RecordingDevice:
+    """Pass everything through to the device, subclasses record the reads"""
+
+    def __init__(self, device, recorder):
+        self.device = device
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    def _read(self, kind, key, read, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            value = read(*args, **kwargs)
+        except Exception as e:
+            self.recorder.record(kind, key, None, time.monotonic() - started, e)
+            raise
+        self.recorder.record(kind, key, value, time.monotonic() - started)
+        return value
+
+    def close(self):
+        """Close the device if it can be closed"""
+        if hasattr(self.device, "close"):
+            self.device.close()
+
+class RecordingADC(RecordingDevice):
+    """Adafruit_ADS1x15.ADS1115 or ReadyPinADS1115 that records every count, keyed channel:gain"""
+
+    def __getattr__(self, name):
+        # Only an ADC with scan has one, so PressureSensorReader still reads an Adafruit ADS1115 one at a time
+        if name == "scan":
+            device_scan = self.device.scan
+            return lambda reads: self._scan(device_scan, reads)
+        return super().__getattr__(name)
+
+    def read_adc(self, channel, gain=1, data_rate=None):
+        """Read and record one channel"""
+        return self._read(KIND_ADC, f"{channel}:{gain}", self.device.read_adc, channel, gain=gain, data_rate=data_rate)
+
+    def _scan(self, device_scan, reads):
+        """Pass a scan through and record every (ADC value or the exception reading it, seconds) it yields"""
+        reads = list(reads)
+        for (channel, gain), (value, read_secs) in zip(reads, device_scan(reads)):
+            error = value if isinstance(value, Exception) else None
+            self.recorder.record(KIND_ADC, f"{channel}:{gain}", value, read_secs, error)
+            yield value, read_secs
+
+class RecordingSMBus(RecordingDevice):
+    """smbus2.SMBus that records every block read, keyed by I2C address"""
+
+    def read_i2c_block_data(self, i2c_addr, register, length):
+        """Read and record one block"""
+        return self._read(KIND_SHT30, f"{i2c_addr:#04x}", self.device.read_i2c_block_data,
+                          i2c_addr, register, length)
+
+def recording_fetch(fetch_one, recorder):
+    """Wrap WeatherFetcher.fetch_one to record every response, a failed fetch is recorded as an error"""
+
+    def fetch_and_record(location, loc_cfg):
+        started = time.monotonic()
+        weather_data = fetch_one(location, loc_cfg)
+        error = None if weather_data is not None else ConnectionError("no response")
+        recorder.record(KIND_WEATHER, location, weather_data, time.monotonic() - started, error)
+        return weather_data
+
+    return fetch_and_record
+
+def recorder_from_env(source):
+    """Create a Recorder if RECORDING_DIR is set, otherwise return None"""
+
+    directory = os.getenv("RECORDING_DIR", "").strip()
+    if not directory:
+        return None
+    logging.warning(f"Recording raw readings to {directory}, turn off with an empty RECORDING_DIR")
+    return Recorder(directory, source)
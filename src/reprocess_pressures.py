@@ -0,0 +1,222 @@
+"""
+Recompute pressure_flt history after a calibration change in getPressures.json.
+getPressures writes the raw ADC count of every reading in adc_raw. Each channel's history is read from InfluxDB
+in time chunks, PSI is recomputed from adc_raw with the channel's current ch_minADC, ch_maxADC, ch_minPSI and
+ch_maxPSI using NumPy, and written back with the same tags and timestamps, replacing pressure_flt.
+With --rollups the rollup_1m and rollup_1h history is recomputed too, from the adc_raw_min, adc_raw_mean and
+adc_raw_max rollups: the calibration is linear, so the mean of the PSI is the PSI of the mean ADC count, and the
+min and max map to the min and max (swapped when the calibration slope is negative).
+Readings written before adc_raw, and rollups written before adc_raw was rolled up, can't be recomputed.
+Requires .env or .env.<hostname> file for InfluxDB and numpy (pip install -r requirements-tools.txt).
+
+Example:
+python reprocess_pressures.py --start 2024-11-01 --end 2025-04-01 --channels cliffLine --dry-run
+python reprocess_pressures.py --start 2024-11-01 --end 2025-04-01 --channels cliffLine --rollups
+"""
+
+import argparse
+import functools
+import logging
+import os
+import socket
+import sys
+import time
+from datetime import datetime, timezone
+from backfill_rollups import time_chunks
+from common_functions import choose_dotenv, database_connect, load_json_file
+from export_parquet import quote_identifier, quote_string
+from influx_schema import ROLLUP_1H_RP, ROLLUP_1M_RP
+
+MEASUREMENT = "pressures"
+BATCH_POINTS = 10000
+RAW_FIELDS = ["adc_raw", "pressure_flt"]
+ROLLUP_FUNCS = ["min", "mean", "max"]
+ROLLUP_COLUMNS = [f"{field}_{func}" for field in RAW_FIELDS for func in ROLLUP_FUNCS]
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Recompute pressure_flt history from adc_raw")
+    parser.add_argument("--start", required=True, help="Start date, YYYY-MM-DD (UTC)")
+    parser.add_argument("--end", help="End date, YYYY-MM-DD (UTC), default now")
+    parser.add_argument("--config", default="config/getPressures.json",
+                        help="getPressures.json with the corrected calibration, default config/getPressures.json")
+    parser.add_argument("--hostnames", nargs="+", help="Hosts to reprocess, default every host in the config")
+    parser.add_argument("--channels", nargs="+", help="channel_IDs to reprocess, default every channel")
+    parser.add_argument("--chunk-hours", type=int, default=24, help="Hours of one channel per query, default 24")
+    parser.add_argument("--rp", default="raw", help="Retention policy holding the raw history, default raw")
+    parser.add_argument("--batch-points", type=int, default=BATCH_POINTS,
+                        help=f"Points per write request, default {BATCH_POINTS}")
+    parser.add_argument("--dry-run", action="store_true", help="Log what would change, write nothing")
+    parser.add_argument("--rollups", action="store_true",
+                        help=f"Recompute the {ROLLUP_1M_RP} and {ROLLUP_1H_RP} history of the range too")
+    parser.add_argument("--database", help="Database name, default SENSOR_DATABASE from the dotenv file")
+    return parser.parse_args()
+
+def load_numpy():
+    """Import numpy only when reprocessing, the collectors don't need it"""
+    import numpy  # pylint: disable=import-outside-toplevel
+    return numpy
+
+def channel_calibrations(json_config, hostnames=None, channel_ids=None) -> list:
+    """(hostname, channel config) of every channel to reprocess"""
+    return [(hostname, ch_cfg)
+            for hostname, channels in (json_config or {}).items() if not hostnames or hostname in hostnames
+            for ch_cfg in channels.values() if not channel_ids or ch_cfg.get("channel_ID") in channel_ids]
+
+def calibrate(adc, ch_cfg):
+    """PSI of an array of ADC counts, the same conversion as PressureSensorReader.read_channels"""
+    return ((adc - ch_cfg["ch_minADC"]) * (ch_cfg["ch_maxPSI"] - ch_cfg["ch_minPSI"]) /
+            (ch_cfg["ch_maxADC"] - ch_cfg["ch_minADC"]) + ch_cfg["ch_minPSI"])
+
+def calibration_slope(ch_cfg) -> float:
+    """PSI per ADC count, negative when the PSI falls as the count rises"""
+    return (ch_cfg["ch_maxPSI"] - ch_cfg["ch_minPSI"]) / (ch_cfg["ch_maxADC"] - ch_cfg["ch_minADC"])
+
+def channel_select(database, rp, hostname, ch_cfg, time_range, fields=None) -> str:
+    """SELECT of one channel's fields for a time chunk, grouped by every tag, default adc_raw and pressure_flt"""
+    return (
+        f"SELECT {', '.join(quote_identifier(field) for field in fields or RAW_FIELDS)}"
+        f" FROM {quote_identifier(database)}.{quote_identifier(rp)}.{quote_identifier(MEASUREMENT)}"
+        f' WHERE "hostname" = {quote_string(hostname)} AND "location" = {quote_string(ch_cfg["channel_ID"])}'
+        f' AND "channel" = {quote_string(str(ch_cfg["channel"]))}'
+        f" AND time >= '{time_range[0]}' AND time < '{time_range[1]}' GROUP BY *"
+    )
+
+def escape_key(text) -> str:
+    """Line protocol escaping of a measurement, tag key or tag value"""
+    return text.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+def series_prefix(series) -> str:
+    """Line protocol measurement and tags of one series of a channel_select result"""
+    tags = ",".join(f"{escape_key(key)}={escape_key(value)}"
+                    for key, value in sorted(series.get("tags", {}).items()) if value)
+    return f"{escape_key(MEASUREMENT)},{tags}" if tags else escape_key(MEASUREMENT)
+
+def series_columns(np, series) -> tuple:
+    """(timestamps, {column: float array}) of one series of a channel_select result"""
+    columns = series["columns"]
+    rows = np.array(series["values"], dtype=object)
+    times = rows[:, columns.index("time")].astype(np.int64)
+    return times, {column: np.array(rows[:, index], dtype=float)
+                   for index, column in enumerate(columns) if column != "time"}
+
+def series_lines(np, series, ch_cfg) -> tuple:
+    """
+    Line protocol lines rewriting pressure_flt of one series of a channel_select result.
+    Return (lines, largest change in PSI). Rows without adc_raw are left alone.
+    """
+
+    prefix = series_prefix(series)
+    times, fields = series_columns(np, series)
+
+    has_adc = ~np.isnan(fields["adc_raw"])
+    times, old_psi = times[has_adc], fields["pressure_flt"][has_adc]
+    psi = calibrate(fields["adc_raw"][has_adc], ch_cfg)
+    max_change = float(np.nanmax(np.abs(psi - old_psi))) if len(psi) else 0.0
+    lines = [f"{prefix} pressure_flt={value} {stamp}" for value, stamp in zip(psi.tolist(), times.tolist())]
+    return lines, max_change
+
+def rollup_series_lines(np, series, ch_cfg) -> tuple:
+    """
+    Line protocol lines rewriting pressure_flt_min, pressure_flt_mean and pressure_flt_max of one series of a
+    rollup channel_select result, from adc_raw_min, adc_raw_mean and adc_raw_max.
+    Return (lines, largest change in mean PSI). Rollup points without adc_raw are left alone.
+    """
+
+    prefix = series_prefix(series)
+    times, fields = series_columns(np, series)
+
+    has_adc = ~np.isnan(fields["adc_raw_mean"])
+    times, old_psi = times[has_adc], fields["pressure_flt_mean"][has_adc]
+    psi = {func: calibrate(fields[f"adc_raw_{func}"][has_adc], ch_cfg) for func in ROLLUP_FUNCS}
+    if calibration_slope(ch_cfg) < 0:
+        psi["min"], psi["max"] = psi["max"], psi["min"]
+
+    max_change = float(np.nanmax(np.abs(psi["mean"] - old_psi))) if len(old_psi) else 0.0
+    lines = [f"{prefix} pressure_flt_min={low},pressure_flt_mean={mean},pressure_flt_max={high} {stamp}"
+             for low, mean, high, stamp in zip(psi["min"].tolist(), psi["mean"].tolist(), psi["max"].tolist(),
+                                                times.tolist())]
+    return lines, max_change
+
+def channel_lines(np, client, database, rp, hostname, ch_cfg, time_range):
+    """
+    Yield (lines, largest change in PSI) of every series of one channel in a time chunk.
+    The rollup retention policies are recomputed from their adc_raw rollups.
+    """
+
+    rollup = rp in (ROLLUP_1M_RP, ROLLUP_1H_RP)
+    fields, to_lines = (ROLLUP_COLUMNS, rollup_series_lines) if rollup else (RAW_FIELDS, series_lines)
+    for series in client.query(channel_select(database, rp, hostname, ch_cfg, time_range, fields),
+                               database=database, epoch="ns").raw.get("series", []):
+        yield to_lines(np, series, ch_cfg)
+
+def reprocess_channel(np, client, database, rp, write, hostname, ch_cfg, time_ranges) -> tuple:
+    """Recompute one channel chunk by chunk, write is None for a dry run. Return (points, largest change in PSI)."""
+
+    points, max_change = 0, 0.0
+    for time_range in time_ranges:
+        chunk_points = 0
+        for lines, series_change in channel_lines(np, client, database, rp, hostname, ch_cfg, time_range):
+            max_change = max(max_change, series_change)
+            chunk_points += len(lines)
+            if lines and write:
+                write(lines)
+        points += chunk_points
+        logging.info(f"{hostname} {ch_cfg['channel_ID']} {rp} {time_range[0]} - {time_range[1]}: "
+                     f"{chunk_points} points")
+    return points, max_change
+
+def reprocess(client, database, rp, calibrations, start, end, chunk_hours, batch_points=BATCH_POINTS,
+              dry_run=False) -> dict:
+    """Recompute every channel, return {channel_ID: (points, largest change in PSI)}"""
+
+    np = load_numpy()
+    time_ranges = list(time_chunks(start, end, chunk_hours))
+    write = None if dry_run else functools.partial(client.write_points, time_precision="n", database=database,
+                                                   retention_policy=rp, batch_size=batch_points, protocol="line")
+    summary = {}
+    for hostname, ch_cfg in calibrations:
+        summary[ch_cfg["channel_ID"]] = reprocess_channel(np, client, database, rp, write, hostname, ch_cfg,
+                                                          time_ranges)
+        logging.info(f"{hostname} {ch_cfg['channel_ID']} {rp}: {summary[ch_cfg['channel_ID']][0]} points"
+                     f"{' would be' if dry_run else ''} recomputed, "
+                     f"largest change {summary[ch_cfg['channel_ID']][1]:.2f} PSI")
+    return summary
+
+if __name__ == "__main__":
+
+    HOSTNAME = socket.gethostname()
+    choose_dotenv(HOSTNAME)
+
+    FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format=FORMAT)
+
+    args = parse_args()
+    DATABASE = args.database or os.getenv("SENSOR_DATABASE")
+
+    START = datetime.strptime(args.start, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    END = (datetime.strptime(args.end, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+           if args.end else datetime.now(timezone.utc))
+
+    CALIBRATIONS = channel_calibrations(load_json_file(args.config), args.hostnames, args.channels)
+    if not CALIBRATIONS:
+        logging.error(f"No channels to reprocess in {args.config}")
+        sys.exit(1)
+
+    db_client = database_connect(os.getenv("INFLUXDB_HOST"),
+                                 os.getenv("INFLUXDB_PORT"),
+                                 os.getenv("USERNAME"),
+                                 os.getenv("PASSWORD"),
+                                 DATABASE)
+
+    try:
+        started = time.monotonic()
+        for RP in [args.rp] + ([ROLLUP_1M_RP, ROLLUP_1H_RP] if args.rollups else []):
+            reprocess(db_client, DATABASE, RP, CALIBRATIONS, START, END, args.chunk_hours, args.batch_points,
+                      args.dry_run)
+        logging.info(f"Reprocessing complete in {time.monotonic() - started:.0f} seconds")
+    except KeyboardInterrupt:
+        logging.info("Exiting gracefully")
+        print()
+    finally:
+        db_client.close()
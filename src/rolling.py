@@ -0,0 +1,118 @@
+"""Fixed size, array backed rolling windows for streaming sensor statistics"""
+
+from array import array
+
+class RingBuffer:
+    """Ring buffer of floats backed by array('d'). Memory use is fixed at 8 bytes per slot."""
+
+    __slots__ = ("values", "start", "count")
+
+    def __init__(self, capacity):
+        self.values = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """Iterate oldest to newest"""
+        capacity = len(self.values)
+        for i in range(self.count):
+            yield self.values[(self.start + i) % capacity]
+
+    @property
+    def capacity(self) -> int:
+        """Number of slots"""
+        return len(self.values)
+
+    def append(self, value):
+        """Add a value, overwriting the oldest when full"""
+        capacity = len(self.values)
+        if self.count < capacity:
+            self.values[(self.start + self.count) % capacity] = value
+            self.count += 1
+        else:
+            self.values[self.start] = value
+            self.start = (self.start + 1) % capacity
+
+    def newest(self) -> float:
+        """Most recent value"""
+        if not self.count:
+            raise IndexError("RingBuffer is empty")
+        return self.values[(self.start + self.count - 1) % len(self.values)]
+
+    def oldest(self) -> float:
+        """Least recent value"""
+        if not self.count:
+            raise IndexError("RingBuffer is empty")
+        return self.values[self.start]
+
+    def clear(self):
+        """Drop all values, keep the memory"""
+        self.start = 0
+        self.count = 0
+
+class TimeSeriesWindow:
+    """
+    Rolling window of (time, value) samples with a least squares slope.
+    Running sums are updated as samples are added and evicted, so slope() is O(1). Times are summed relative to
+    an origin, and the sums are recomputed from the buffers once per window of samples so rounding doesn't build up.
+    """
+
+    __slots__ = ("times", "values", "origin", "sum_t", "sum_v", "sum_tt", "sum_tv", "added")
+
+    def __init__(self, capacity):
+        self.times = RingBuffer(capacity)
+        self.values = RingBuffer(capacity)
+        self.origin = None
+        self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+        self.added = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def _sum(self, t, v, sign):
+        self.sum_t += sign * t
+        self.sum_v += sign * v
+        self.sum_tt += sign * t * t
+        self.sum_tv += sign * t * v
+
+    def _resum(self):
+        """Move the origin to the oldest sample and recompute the sums from the buffers"""
+        self.origin = self.times.oldest()
+        self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+        for t, v in zip(self.times, self.values):
+            self._sum(t - self.origin, v, 1)
+        self.added = 0
+
+    def add(self, timestamp, value):
+        """Add a sample, evicting the oldest when full"""
+        if self.origin is None:
+            self.origin = timestamp
+        if len(self.values) == self.values.capacity:
+            self._sum(self.times.oldest() - self.origin, self.values.oldest(), -1)
+        self.times.append(timestamp)
+        self.values.append(value)
+        self._sum(timestamp - self.origin, value, 1)
+
+        self.added += 1
+        if self.added >= self.values.capacity:
+            self._resum()
+
+    def latest(self) -> float:
+        """Most recent value"""
+        return self.values.newest()
+
+    def slope(self):
+        """Least squares slope in value units per second, None with fewer than 2 samples or no time span"""
+
+        n = len(self.values)
+        if n < 2:
+            return None
+
+        variance = self.sum_tt - self.sum_t * self.sum_t / n
+        # Relative to the sums, what's left of all equal times is rounding
+        if variance <= 1e-9 * self.sum_tt:
+            return None
+        return (self.sum_tv - self.sum_t * self.sum_v / n) / variance
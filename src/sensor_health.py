@@ -0,0 +1,182 @@
+"""
+Streaming sensor health for the collectors.
+Keeps fixed size rolling windows per sensor and writes a sensor_health point every report interval,
+so stuck, noisy, flapping and slow sensors can be found without querying history.
+"""
+
+import os
+import logging
+import math
+import time
+from rolling import RingBuffer, TimeSeriesWindow
+
+STUCK_SECS = 4 * 3600   # identical readings for this long is a stuck sensor
+FLAP_LIMIT = 4          # OFF/On changes in the window that count as flapping
+OFF_RATIO_LIMIT = 0.5   # share of OFF readings in the window that counts as offline
+REPORT_SECS = 300
+
+class SensorStats:
+    """Rolling readings, OFF flags and read latencies of one sensor. Memory is fixed by the window size."""
+
+    __slots__ = ("values", "off", "latencies", "run_value", "run_length", "run_started")
+
+    def __init__(self, capacity):
+        self.values = TimeSeriesWindow(capacity)
+        self.off = RingBuffer(capacity)
+        self.latencies = RingBuffer(capacity)
+        self.run_value = None
+        self.run_length = 0
+        self.run_started = None
+
+    def add(self, timestamp, value, latency_secs):
+        """Add a reading, None for an OFF reading"""
+
+        self.off.append(1.0 if value is None else 0.0)
+        if latency_secs is not None:
+            self.latencies.append(latency_secs)
+        if value is None:
+            return
+
+        self.values.add(timestamp, value)
+        if value == self.run_value:
+            self.run_length += 1
+        else:
+            self.run_value = value
+            self.run_length = 1
+            self.run_started = timestamp
+
+    def flaps(self) -> int:
+        """Number of OFF/On changes in the window"""
+        flaps = 0
+        previous = None
+        for flag in self.off:
+            if previous is not None and flag != previous:
+                flaps += 1
+            previous = flag
+        return flaps
+
+def _variance_and_noise(values):
+    """
+    Population variance of the window and the noise, estimated from successive differences.
+    A steady trend has a large variance but small differences, a noisy sensor has both.
+    """
+    n = len(values)
+    mean = sum(values) / n
+    variance = sum((value - mean) ** 2 for value in values) / n
+    if n < 2:
+        return mean, variance, 0.0
+    previous = None
+    squared_steps = 0.0
+    for value in values:
+        if previous is not None:
+            squared_steps += (value - previous) ** 2
+        previous = value
+    return mean, variance, math.sqrt(squared_steps / (n - 1) / 2)
+
+class SensorHealthTracker:
+    """Per sensor variance, noise, run of identical values, OFF ratio and read latency"""
+
+    def __init__(self, source, noise_limit, slow_secs, window_size=120, report_secs=REPORT_SECS,
+                 stuck_secs=STUCK_SECS, clock=time.time):
+        """
+        source      -> collector name written as a tag, like getTemps
+        noise_limit -> noise above this, in the sensor's units, flags the sensor as noisy
+        slow_secs   -> mean read latency above this flags the sensor as slow
+        window_size -> readings kept per sensor
+        report_secs -> seconds between sensor_health points
+        stuck_secs  -> identical readings for this long flags the sensor as stuck
+        clock       -> callable returning epoch seconds
+        """
+        self.source = source
+        self.limits = (noise_limit, slow_secs, stuck_secs)
+        self.window_size = window_size
+        self.report_secs = report_secs
+        self.clock = clock
+        self.sensors = {}  # (location, id) -> SensorStats
+        self.last_report = clock()
+
+    def add(self, location, sensor_id, value, latency_secs=None):
+        """Add a reading for a sensor, value None for an OFF reading"""
+        key = (location, sensor_id)
+        if key not in self.sensors:
+            self.sensors[key] = SensorStats(self.window_size)
+        self.sensors[key].add(self.clock(), value, latency_secs)
+
+    def health(self, location, sensor_id) -> dict:
+        """Return the sensor_health fields for a sensor, empty if it has no readings"""
+
+        stats = self.sensors.get((location, sensor_id))
+        if stats is None or not stats.off:
+            return {}
+        noise_limit, slow_secs, stuck_secs = self.limits
+
+        fields = {
+            "samples": len(stats.off),
+            "off_ratio": sum(stats.off) / len(stats.off),
+            "flaps": stats.flaps(),
+            "run_length": stats.run_length,
+        }
+
+        if len(stats.values):
+            fields["mean"], fields["variance"], fields["noise"] = _variance_and_noise(stats.values.values)
+            fields["run_secs"] = stats.values.times.newest() - stats.run_started
+            slope = stats.values.slope()
+            if slope is not None:
+                fields["slope_per_hr"] = slope * 3600
+
+        if len(stats.latencies):
+            fields["latency_ms_mean"] = sum(stats.latencies) / len(stats.latencies) * 1000
+            fields["latency_ms_max"] = max(stats.latencies) * 1000
+
+        flags = {
+            "stuck": fields.get("run_secs", 0) >= stuck_secs,
+            "noisy": fields.get("noise", 0) > noise_limit,
+            "flapping": fields["flaps"] >= FLAP_LIMIT,
+            "offline": fields["off_ratio"] >= OFF_RATIO_LIMIT,
+            "slow": fields.get("latency_ms_mean", 0) > slow_secs * 1000,
+        }
+        fields.update(flags)
+        fields["suspect"] = any(flags.values())
+        return fields
+
+    def construct_points(self, hostname) -> list[dict]:
+        """Construct a sensor_health point for every sensor once every report interval, else return []"""
+
+        now = self.clock()
+        if now - self.last_report < self.report_secs:
+            return []
+        self.last_report = now
+
+        series = []
+        for location, sensor_id in self.sensors:
+            fields = self.health(location, sensor_id)
+            if not fields:
+                continue
+            if fields["suspect"]:
+                flagged = [flag for flag in ("stuck", "noisy", "flapping", "offline", "slow") if fields[flag]]
+                logging.warning(f"Suspect sensor {location} {sensor_id}: {', '.join(flagged)}")
+            point = {
+                "measurement": "sensor_health",
+                "tags": {
+                    "location": location,
+                    "id": sensor_id,
+                    "source": self.source,
+                    "hostname": hostname,
+                },
+                "fields": fields,
+            }
+            logging.debug(f"Point: {point}")
+            series.append(point)
+        return series
+
+def sensor_health_from_env(source, noise_limit_env_var, default_noise_limit, slow_secs):
+    """Create a SensorHealthTracker if SENSOR_HEALTH_ENABLED is true, otherwise return None"""
+
+    if os.getenv("SENSOR_HEALTH_ENABLED", "false").strip().lower() != "true":
+        return None
+    window_size = int(os.getenv("SENSOR_HEALTH_WINDOW", "120"))
+    report_secs = float(os.getenv("SENSOR_HEALTH_REPORT_SECS", str(REPORT_SECS)))
+    stuck_secs = float(os.getenv("SENSOR_HEALTH_STUCK_SECS", str(STUCK_SECS)))
+    noise_limit = float(os.getenv(noise_limit_env_var) or default_noise_limit)
+    logging.info(f"Sensor health on, window {window_size} readings, report every {report_secs} seconds")
+    return SensorHealthTracker(source, noise_limit, slow_secs, window_size, report_secs, stuck_secs)
@@ -0,0 +1,158 @@
+"""
+Persistent registry of the 1-Wire temperature sensors of a host, keyed by sensor id.
+Unassigned sensors get a location derived from their id, like Unassigned_000000833db4, so adding or
+removing a sensor doesn't rename the others and start new InfluxDB series. Saved locations are kept across restarts.
+The room map handed to write_points_to_series is only rebuilt when the config or the attached sensors change.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+
+UNASSIGNED_PREFIX = "Unassigned_"
+UNTITLED = "Untitled"
+
+def unassigned_location(sensor_id) -> str:
+    """Stable location for a sensor that isn't in the config file, from its serial number"""
+    return f"{UNASSIGNED_PREFIX}{sensor_id.partition('-')[2] or sensor_id}"
+
+class SensorRecord:
+    """One sensor: where it is, its room config and when it was seen"""
+
+    __slots__ = ("sensor_id", "location", "room", "attached", "first_seen", "last_seen")
+
+    def __init__(self, sensor_id, first_seen, last_seen=None, location=None):
+        self.sensor_id = sensor_id
+        self.location = location or unassigned_location(sensor_id)
+        self.room = {"id": sensor_id, "title": UNTITLED}
+        self.attached = False
+        self.first_seen = first_seen
+        self.last_seen = last_seen if last_seen is not None else first_seen
+
+    @property
+    def assigned(self) -> bool:
+        """True if the sensor has a room in the config file"""
+        return not self.location.startswith(UNASSIGNED_PREFIX)
+
+    def to_json(self) -> dict:
+        """Persisted fields"""
+        return {"location": self.location, "first_seen": self.first_seen, "last_seen": self.last_seen}
+
+class SensorRegistry:
+    """Sensors from the config file and the bus, saved to a local json file when they change"""
+
+    def __init__(self, path, hostname, clock=time.time):
+        """
+        path     -> registry file, None to keep it in memory only
+        hostname -> top level key of the config file
+        clock    -> callable returning epoch seconds
+        """
+        self.path = path
+        self.hostname = hostname
+        self.clock = clock
+        self.records = {}  # sensor id -> SensorRecord
+        self.attached_ids = frozenset()
+        self.rooms = None  # location -> room config, None when it needs a rebuild
+
+    def load(self):
+        """Read sensors seen before a restart, a missing or unreadable file starts an empty registry"""
+
+        if self.path is None:
+            return self
+        try:
+            with open(self.path, encoding="utf-8") as registry_file:
+                saved = json.load(registry_file)
+            for sensor_id, fields in saved.items():
+                self.records[sensor_id] = SensorRecord(sensor_id, fields["first_seen"], fields["last_seen"],
+                                                       fields.get("location"))
+            logging.info(f"Sensor registry: {len(self.records)} sensors from {self.path}")
+        except FileNotFoundError:
+            logging.info(f"No sensor registry yet: {self.path}")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.error(f"Cannot read sensor registry {self.path}, starting empty: {e}")
+            self.records = {}
+        return self
+
+    def save(self):
+        """Write the registry atomically"""
+
+        if self.path is None:
+            return
+        now = self.clock()
+        for record in self.records.values():
+            if record.attached:
+                record.last_seen = now
+        registry_dir = os.path.dirname(os.path.abspath(self.path))
+        try:
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=registry_dir, delete=False) as tmp:
+                json.dump({sensor_id: record.to_json() for sensor_id, record in sorted(self.records.items())},
+                          tmp, indent=2)
+            os.replace(tmp.name, self.path)
+        except OSError as e:
+            logging.error(f"Cannot write sensor registry {self.path}: {e}")
+
+    def _record(self, sensor_id, now) -> SensorRecord:
+        if sensor_id not in self.records:
+            self.records[sensor_id] = SensorRecord(sensor_id, now)
+        return self.records[sensor_id]
+
+    def set_config(self, json_config):
+        """
+        Assign sensors to the rooms of this host in a freshly loaded config file.
+        Sensors no longer in it go back to their unassigned location, unassigned sensors keep the saved one.
+        """
+
+        rooms = (json_config or {}).get(self.hostname)
+        if rooms is None:
+            logging.warning(f"{self.hostname} not found in the config file, all sensors are unassigned")
+            rooms = {}
+
+        now = self.clock()
+        for record in self.records.values():
+            if record.assigned:
+                record.location = unassigned_location(record.sensor_id)
+            record.room = {"id": record.sensor_id, "title": UNTITLED}
+        for location, room in rooms.items():
+            record = self._record(room["id"], now)
+            if record.assigned:
+                logging.warning(f"{room['id']} is in {record.location} and {location}, using {location}")
+            record.location = location
+            record.room = room
+        # Config order first, so points are written in the order of the config file
+        self.records = {**{room["id"]: self.records[room["id"]] for room in rooms.values()}, **self.records}
+
+        logging.info(f"Sensors in the config file: {len(rooms)}")
+        self.rooms = None
+        self.save()
+
+    def update(self, attached_ids) -> dict:
+        """
+        Update from the sensor ids on the bus and return the room map, location -> room config.
+        Assigned sensors are in the map attached or not, unassigned sensors only while attached.
+        Nothing is rebuilt or written unless a sensor was attached or detached.
+        """
+
+        attached_ids = frozenset(attached_ids)
+        if attached_ids != self.attached_ids:
+            now = self.clock()
+            for sensor_id in sorted(attached_ids - self.attached_ids):
+                record = self._record(sensor_id, now)
+                record.attached = True
+                logging.info(f"Sensor attached: {sensor_id} at {record.location}")
+            for sensor_id in sorted(self.attached_ids - attached_ids):
+                record = self.records[sensor_id]
+                record.attached = False
+                record.last_seen = now
+                logging.warning(f"Sensor detached: {sensor_id} at {record.location}")
+            self.attached_ids = attached_ids
+            self.rooms = None
+            self.save()
+
+        if self.rooms is None:
+            self.rooms = {record.location: record.room for record in self.records.values()
+                          if record.assigned or record.attached}
+            logging.info(f"All sensors: {len(self.rooms)}, unassigned: "
+                         f"{sum(1 for location in self.rooms if location.startswith(UNASSIGNED_PREFIX))}")
+        return self.rooms
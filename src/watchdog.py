@@ -0,0 +1,132 @@
+"""
+systemd watchdog for the collector loops.
+Each phase of a cycle (config, read, write) runs with a deadline. READY=1 and WATCHDOG=1 are only sent
+after a cycle finishes within its latency budget, so a collector hung on a stuck I2C bus, 1-Wire file
+or HTTP write stops pinging and systemd restarts it after WatchdogSec.
+"""
+
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+class PhaseTimeout(Exception):
+    """A cycle phase ran past its deadline"""
+
+def sd_notify(state) -> bool:
+    """Send a state like READY=1 or WATCHDOG=1 to systemd, return False if not run by systemd or on error"""
+
+    address = os.getenv("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):
+        address = "\0" + address[1:]  # abstract namespace socket
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as notify_socket:
+            notify_socket.connect(address)
+            notify_socket.sendall(state.encode("utf-8"))
+        return True
+    except OSError as e:
+        logging.error(f"sd_notify {state} failed: {e}")
+    return False
+
+def watchdog_interval_secs():
+    """WatchdogSec of the unit from WATCHDOG_USEC, None if the watchdog is off"""
+    usec = os.getenv("WATCHDOG_USEC")
+    return int(usec) / 1_000_000 if usec else None
+
+class LoopWatchdog:
+    """
+    Enforce per-phase deadlines and a cycle latency budget, and ping the systemd watchdog.
+    Phases run on one worker thread. A phase that never returns keeps the worker busy,
+    so every later phase times out too and the watchdog is never pinged again.
+    """
+
+    def __init__(self, budget_secs, deadlines, notify=sd_notify, sleep=time.sleep):
+        """
+        budget_secs -> the whole cycle, without the sleep, has to finish within this
+        deadlines   -> {phase: seconds}, phases without a deadline get budget_secs
+        notify      -> callable sending a state string to systemd
+        sleep       -> callable used by idle()
+        """
+        self.budget_secs = budget_secs
+        self.deadlines = deadlines
+        self.notify = notify
+        self.sleep = sleep
+        self.interval = watchdog_interval_secs()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="phase")
+        self.cycle = {"started": None, "phases": {}}  # phases -> {phase: seconds} of the current cycle
+        self.healthy = False
+        self.ready_sent = False
+
+        if self.interval is not None and budget_secs >= self.interval:
+            logging.warning(f"Cycle budget {budget_secs}s is not below WatchdogSec {self.interval:.0f}s")
+
+    def cycle_start(self):
+        """Start timing a cycle"""
+        self.cycle = {"started": time.monotonic(), "phases": {}}
+        self.healthy = True
+
+    def run(self, phase, func, *args, **kwargs):
+        """Run func with the phase deadline, raise PhaseTimeout if it doesn't return in time"""
+
+        deadline = self.deadlines.get(phase, self.budget_secs)
+        started = time.monotonic()
+        future = self.executor.submit(func, *args, **kwargs)
+        try:
+            result = future.result(timeout=deadline)
+        except FutureTimeoutError as e:
+            self.healthy = False
+            raise PhaseTimeout(f"{phase} phase ran past its {deadline}s deadline") from e
+        finally:
+            elapsed = time.monotonic() - started
+            phases = self.cycle["phases"]
+            phases[phase] = phases.get(phase, 0.0) + elapsed
+        logging.debug(f"Phase {phase}: {elapsed * 1000:.0f} ms")
+        return result
+
+    def phase_secs(self) -> dict:
+        """Seconds spent in each phase of the current cycle, a phase run twice is summed"""
+        return dict(self.cycle["phases"])
+
+    def cycle_done(self) -> bool:
+        """Ping the watchdog if the cycle met its deadlines and budget, return True if it did"""
+
+        elapsed = time.monotonic() - self.cycle["started"]
+        if not self.healthy:
+            logging.error(f"Cycle missed a phase deadline, not pinging the watchdog ({elapsed:.2f}s)")
+            return False
+        if elapsed > self.budget_secs:
+            self.healthy = False
+            logging.error(f"Cycle took {elapsed:.2f}s, over its {self.budget_secs}s budget, not pinging the watchdog")
+            return False
+
+        if not self.ready_sent:
+            self.notify("READY=1")
+            self.ready_sent = True
+            logging.info(f"First cycle done in {elapsed:.2f}s, notified systemd READY")
+        self.notify("WATCHDOG=1")
+        return True
+
+    def idle(self, secs):
+        """
+        Sleep between cycles. After a healthy cycle the watchdog is pinged every half WatchdogSec
+        while sleeping, so sleeps longer than WatchdogSec don't get the service restarted.
+        """
+
+        if not self.healthy or not self.interval:
+            self.sleep(secs)
+            return
+
+        remaining = secs
+        while remaining > 0:
+            step = min(remaining, self.interval / 2)
+            self.sleep(step)
+            remaining -= step
+            self.notify("WATCHDOG=1")
+
+    def close(self):
+        """Stop the worker without waiting for a hung phase"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,272 @@
+"""
+Fetch OpenWeather One Call responses for one or more locations,
+construct weather points and cache responses on disk.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from common_functions import load_json_file
+
+TODAY, TOMORROW = 0, 1
+
+ONECALL_URL = "http://api.openweathermap.org/data/3.0/onecall"
+DEFAULT_TIMEOUT_SECS = 5
+CACHE_MAX_AGE_SECS = 3 * 3600
+
+def load_locations(config_file, hostname, env_location, env_latitude, env_longitude) -> dict:
+    """
+    Return {location: {"latitude": ..., "longitude": ..., "timeout": ...}}.
+    Locations come from the host's entry in the config file,
+    or the LOCATION, LATITUDE and LONGITUDE dotenv values if the file or host entry is missing.
+    """
+
+    json_config = load_json_file(config_file) if os.path.exists(config_file) else None
+    locations = json_config.get(hostname) if json_config else None
+
+    if locations:
+        logging.info(f"Weather locations from {config_file}: {', '.join(locations)}")
+        return locations
+
+    logging.info(f"Weather location from dotenv: {env_location}")
+    return {env_location: {"latitude": env_latitude, "longitude": env_longitude}}
+
+def cache_file_for(cache_file, location) -> str:
+    """Per location cache file, example: config/weather_cache.json -> config/weather_cache.Sandstone.json"""
+    root, ext = os.path.splitext(cache_file)
+    return f"{root}.{location}{ext}"
+
+def construct_weather_point(weather_data, location) -> dict:
+    """Construct the current weather point with today's and tomorrow's summary"""
+
+    return {
+        "measurement": "weather",
+        "tags": {
+            "location": location
+        },
+        "fields": {
+            "humidity":               int(weather_data['current']['humidity']),
+            "feelsLike":              float(weather_data['current']['feels_like']),
+            "currentCondition":       weather_data['current']['weather'][0]['main'],
+            "tempHigh":               float(weather_data['daily'][TODAY]['temp']['max']),
+            "tempLow":                float(weather_data['daily'][TODAY]['temp']['min']),
+            "dailyCondition":         weather_data['daily'][TODAY]['weather'][0]['main'],
+            "dailyConditionTomorrow": weather_data['daily'][TOMORROW]['weather'][0]['main'],
+            "tempHighTomorrow":       int(weather_data['daily'][TOMORROW]['temp']['max']),
+            "tempLowTomorrow":        float(weather_data['daily'][TOMORROW]['temp']['min']),
+            "windDirection":          int(weather_data['current']['wind_deg']),
+            "windSpeed":              float(weather_data['current']['wind_speed']),
+            "windGust":               float(weather_data['daily'][TODAY]['wind_gust']),
+            "timeStamp":              datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+    }
+
+def construct_forecast_points(weather_data, location) -> list[dict]:
+    """
+    Construct hourly (48 hour) and daily (8 day) forecast points.
+    Points are stamped with the forecast time in epoch seconds, write with time_precision='s'.
+    """
+
+    series = []
+
+    for hour in weather_data.get('hourly', []):
+        series.append({
+            "measurement": "weather_hourly",
+            "tags": {
+                "location": location
+            },
+            "time": int(hour['dt']),
+            "fields": {
+                "temp":        float(hour['temp']),
+                "feelsLike":   float(hour['feels_like']),
+                "humidity":    int(hour['humidity']),
+                "pop":         float(hour.get('pop', 0)),
+                "windSpeed":   float(hour['wind_speed']),
+                "windGust":    float(hour.get('wind_gust', hour['wind_speed'])),
+                "condition":   hour['weather'][0]['main'],
+            }
+        })
+
+    for day in weather_data.get('daily', []):
+        series.append({
+            "measurement": "weather_daily",
+            "tags": {
+                "location": location
+            },
+            "time": int(day['dt']),
+            "fields": {
+                "tempHigh":    float(day['temp']['max']),
+                "tempLow":     float(day['temp']['min']),
+                "humidity":    int(day['humidity']),
+                "pop":         float(day.get('pop', 0)),
+                "rain":        float(day.get('rain', 0)),
+                "snow":        float(day.get('snow', 0)),
+                "windSpeed":   float(day['wind_speed']),
+                "windGust":    float(day.get('wind_gust', day['wind_speed'])),
+                "condition":   day['weather'][0]['main'],
+            }
+        })
+
+    return series
+
+def forecast_hash(weather_data) -> str:
+    """Hash the hourly and daily forecasts, used to skip writing an unchanged forecast"""
+
+    forecast = {"hourly": weather_data.get('hourly', []), "daily": weather_data.get('daily', [])}
+    return hashlib.sha256(json.dumps(forecast, sort_keys=True).encode("utf-8")).hexdigest()
+
+class WeatherCache:
+    """Keep the last good One Call response on disk, and stand in with it when a fetch fails"""
+
+    def __init__(self, cache_file, max_age_secs=CACHE_MAX_AGE_SECS):
+        """
+        cache_file   -> json file of one location, see cache_file_for
+        max_age_secs -> oldest cached response fallback() returns
+        """
+        self.cache_file = cache_file
+        self.max_age_secs = max_age_secs
+
+    def load(self):
+        """
+        Return the cached entry or None.
+        Entry: {"fetched_at": epoch secs, "forecast_hash": str or None, "data": response json}
+        """
+        try:
+            with open(self.cache_file, encoding="utf-8") as open_cache_file:
+                entry = json.load(open_cache_file)
+            if "fetched_at" in entry and "data" in entry:
+                return entry
+            logging.warning(f"Ignoring incomplete weather cache: {self.cache_file}")
+        except FileNotFoundError:
+            logging.info(f"No weather cache: {self.cache_file}")
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Cannot read weather cache {self.cache_file}: {e}")
+        return None
+
+    def save(self, weather_data, fetched_at, written_forecast_hash=None):
+        """Write the response to the cache file atomically"""
+
+        entry = {"fetched_at": fetched_at, "forecast_hash": written_forecast_hash, "data": weather_data}
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_file))
+
+        try:
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=cache_dir, delete=False) as tmp:
+                json.dump(entry, tmp)
+            os.replace(tmp.name, self.cache_file)
+            return True
+        except OSError as e:
+            logging.error(f"Cannot write weather cache {self.cache_file}: {e}")
+        return False
+
+    @staticmethod
+    def age_secs(entry, now=None) -> float:
+        """Seconds since the cached response was fetched"""
+        return (now if now is not None else time.time()) - entry["fetched_at"]
+
+    def fallback(self, now=None):
+        """Cached response to use when a fetch failed, None if there is none or it is older than max_age_secs"""
+
+        entry = self.load()
+        if entry is None:
+            return None
+        age_secs = self.age_secs(entry, now)
+        if age_secs > self.max_age_secs:
+            logging.warning(f"Cached weather in {self.cache_file} is {age_secs / 60:.0f} minutes old, too old to use")
+            return None
+        logging.warning(f"Using cached weather from {age_secs / 60:.0f} minutes ago: {self.cache_file}")
+        return entry["data"]
+
+class CallBudget:
+    """Daily OpenWeather API call budget. OpenWeather counts calls per UTC day."""
+
+    def __init__(self, daily_calls, clock=time.time):
+        self.daily_calls = daily_calls
+        self.clock = clock
+        self.day = None
+        self.used = 0
+
+    def _roll_over(self):
+        day = datetime.fromtimestamp(self.clock(), timezone.utc).date()
+        if day != self.day:
+            self.day = day
+            self.used = 0
+
+    def try_spend(self, calls=1) -> bool:
+        """Spend calls from today's budget, return False if there aren't enough left"""
+        self._roll_over()
+        if self.used + calls > self.daily_calls:
+            return False
+        self.used += calls
+        return True
+
+    def remaining(self) -> int:
+        """Calls left today"""
+        self._roll_over()
+        return self.daily_calls - self.used
+
+class WeatherFetcher:
+    """
+    Fetch One Call responses for all locations at the same time.
+    One pooled HTTP session and one thread pool are kept for the life of the service,
+    so adding locations doesn't add connection setup or cycle time.
+    """
+
+    def __init__(self, api_key, locations, exclude, units="imperial", budget=None):
+        # Imported here so point construction and the cache don't need requests, like the simulator
+        import requests  # pylint: disable=import-outside-toplevel
+        from requests.adapters import HTTPAdapter  # pylint: disable=import-outside-toplevel
+
+        self.api_key = api_key
+        self.locations = locations
+        self.exclude = exclude
+        self.units = units
+        self.budget = budget
+
+        pool_size = max(1, len(locations))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="weather")
+
+    def fetch_one(self, location, loc_cfg):
+        """Fetch one location, return the response json or None"""
+
+        params = {
+            "lat": loc_cfg["latitude"],
+            "lon": loc_cfg["longitude"],
+            "exclude": self.exclude,
+            "appid": self.api_key,
+            "units": self.units,
+        }
+        timeout = float(loc_cfg.get("timeout", DEFAULT_TIMEOUT_SECS))
+
+        try:
+            response = self.session.get(ONECALL_URL, params=params, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logging.error(f"Failed to get weather data for {location}: {e}")
+        return None
+
+    def fetch_all(self) -> dict:
+        """Fetch all locations within the call budget, return {location: response json or None}"""
+
+        futures = {}
+        for location, loc_cfg in self.locations.items():
+            if self.budget and not self.budget.try_spend():
+                logging.warning(f"Daily API call budget used up, skipping {location}")
+                continue
+            futures[location] = self.executor.submit(self.fetch_one, location, loc_cfg)
+
+        return {location: future.result() for location, future in futures.items()}
+
+    def close(self):
+        """Close the HTTP session and thread pool"""
+        self.executor.shutdown(wait=False)
+        self.session.close()
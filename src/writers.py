@@ -0,0 +1,298 @@
+"""
+InfluxDB writers for the collectors.
+DeferredInfluxWriter connects in a background thread and buffers points until the connection is up,
+so a collector takes its first reading without waiting for imports, DNS or get_list_database().
+UDPWriter sends chosen measurements to the InfluxDB UDP listener without waiting for a response.
+"""
+
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from functools import partial
+from common_functions import database_connect
+
+MAX_BUFFERED_POINTS = 10000
+CONNECT_RETRY_SECS = 10
+HTTP_BAD_REQUEST = 400
+GATEWAY_PORT = 8087
+UDP_PORT = 8089
+UDP_PACKET_BYTES = 1400  # fits a 1500 byte Ethernet or WiFi MTU after IP and UDP headers, no fragmentation
+UDP_SEQ_FIELD = "udp_seq"
+UDP_SOURCE_TAG = "udp_source"
+NS_PER_PRECISION = {"n": 1, "u": 1000, "ms": 10**6, "s": 10**9, "m": 60 * 10**9, "h": 3600 * 10**9}
+
+class DeferredInfluxWriter:
+    """Write points through a client that is connected, and reconnected, in the background"""
+
+    def __init__(self, connect, max_buffered_points=MAX_BUFFERED_POINTS, retry_secs=CONNECT_RETRY_SECS):
+        """
+        connect             -> callable returning a connected InfluxDBClient, raises on failure
+        max_buffered_points -> oldest batches are dropped past this many buffered points
+        retry_secs          -> seconds between connection attempts
+        """
+        self.connect = connect
+        self.max_buffered_points = max_buffered_points
+        self.retry_secs = retry_secs
+        self.client = None
+        self.pending = deque()  # (series, write_points kwargs)
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def from_settings(cls, influxdb_host, influxdb_port, username, password, database, provision=False):
+        """
+        Writer connecting with database_connect.
+        If INFLUXDB_GATEWAY (host:port) is set, points go to the LAN gateway (gateway.py) with gzip instead.
+        If INFLUXDB_UDP (host:port) is set, the INFLUXDB_UDP_MEASUREMENTS are sent there by a UDPWriter instead.
+        The listener writes every datagram to its one database, so UDP is only used when INFLUXDB_UDP_DATABASE,
+        the listener's database, is the writer's database.
+        """
+
+        udp_host = influxdb_host
+        gateway = os.getenv("INFLUXDB_GATEWAY", "").strip()
+        if gateway:
+            influxdb_host, _, gateway_port = gateway.partition(":")
+            influxdb_port = int(gateway_port or GATEWAY_PORT)
+            logging.info(f"Writing through the gateway at {influxdb_host}:{influxdb_port}")
+            writer = cls(partial(database_connect, influxdb_host, influxdb_port, username, password, database,
+                                 provision, gzip=True))
+        else:
+            writer = cls(partial(database_connect, influxdb_host, influxdb_port, username, password, database, provision))
+
+        udp = os.getenv("INFLUXDB_UDP", "").strip()
+        measurements = {m.strip() for m in os.getenv("INFLUXDB_UDP_MEASUREMENTS", "").split(",") if m.strip()}
+        if not udp or not measurements:
+            return writer
+        udp_database = os.getenv("INFLUXDB_UDP_DATABASE", "").strip()
+        if udp_database != database:
+            logging.error(f"Writing {', '.join(sorted(measurements))} over HTTP, the UDP listener writes to "
+                          f"INFLUXDB_UDP_DATABASE={udp_database or '(not set)'}, not {database}")
+            return writer
+        udp_host, _, udp_port = udp.partition(":")
+        return UDPWriter(writer, udp_host or influxdb_host, int(udp_port or UDP_PORT), measurements,
+                         int(os.getenv("INFLUXDB_UDP_PACKET_BYTES", str(UDP_PACKET_BYTES))))
+
+    def start(self):
+        """Start connecting in the background, returns immediately"""
+        if self.thread is None or not self.thread.is_alive():
+            self.connected.clear()
+            self.thread = threading.Thread(target=self._connect_loop, name="influx-connect", daemon=True)
+            self.thread.start()
+        return self
+
+    @property
+    def pending_points(self) -> int:
+        """Points buffered and not yet written"""
+        return sum(len(series) for series, _ in self.pending)
+
+    def wait_connected(self, timeout=None) -> bool:
+        """Block until connected, return False on timeout"""
+        return self.connected.wait(timeout)
+
+    def _connect_loop(self):
+        started = time.monotonic()
+        while not self.stopping.is_set():
+            try:
+                client = self.connect()
+            except Exception as e:
+                logging.error(f"InfluxDB connection failed, retrying in {self.retry_secs} seconds: {e}")
+                self.stopping.wait(self.retry_secs)
+                continue
+
+            with self.lock:
+                self.client = client
+                logging.info(f"InfluxDB connected in {time.monotonic() - started:.2f} seconds, "
+                             f"{self.pending_points} buffered points to write")
+            self.connected.set()
+            return
+
+    def _buffer(self, series, kwargs):
+        """
+        Queue series for writing. Points without a time are stamped now, in the write's time_precision,
+        nanoseconds by default, so points held through fast start or an outage keep the time they were taken.
+        """
+        precision = kwargs.get("time_precision") or "n"
+        stamp = time.time_ns() // NS_PER_PRECISION[precision]
+        series = [point if "time" in point else {**point, "time": stamp} for point in series]
+        self.pending.append((series, {**kwargs, "time_precision": precision}))
+        while len(self.pending) > 1 and self.pending_points > self.max_buffered_points:
+            dropped, _ = self.pending.popleft()
+            logging.warning(f"Write buffer full, dropped {len(dropped)} points")
+
+    def write_points(self, series, **kwargs) -> bool:
+        """
+        Write buffered points then series, kwargs go to InfluxDBClient.write_points.
+        Return True if everything was written, False if series is buffered for later.
+        """
+
+        with self.lock:
+            if series:
+                self._buffer(series, kwargs)
+            if self.client is None:
+                return False
+
+            while self.pending:
+                batch, batch_kwargs = self.pending[0]
+                try:
+                    self.client.write_points(batch, **batch_kwargs)
+                except Exception as e:
+                    if getattr(e, "code", None) == HTTP_BAD_REQUEST:
+                        logging.error(f"InfluxDB rejected {len(batch)} points, dropping them: {e}")
+                    else:
+                        logging.error(f"Failure writing to InfluxDB, buffering and reconnecting: {e}")
+                        self._disconnect()
+                        return False
+                self.pending.popleft()
+
+        return True
+
+    def _disconnect(self):
+        """Drop the client and reconnect in the background. Caller holds the lock."""
+        client, self.client = self.client, None
+        try:
+            client.close()
+        except Exception as e:
+            logging.debug(f"Error closing InfluxDB client: {e}")
+        self.start()
+
+    def close(self):
+        """Stop connecting and close the client. Buffered points are lost."""
+        self.stopping.set()
+        with self.lock:
+            if self.pending_points:
+                logging.warning(f"Closing with {self.pending_points} unwritten points")
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+
+class UDPWriter:
+    """
+    Send the chosen measurements as line protocol datagrams to the InfluxDB UDP listener, everything else
+    through the HTTP writer. Datagrams are packed up to max_packet_bytes and never waited for or retried,
+    so a lost packet is lost points. Every point gets a udp_seq field, the packet's sequence number per
+    measurement, and a udp_source tag naming the collector, for estimating loss with udp_loss().
+    Other attributes are the HTTP writer's.
+    """
+
+    def __init__(self, http_writer, host, port, measurements, max_packet_bytes=UDP_PACKET_BYTES, source=None):
+        """
+        http_writer      -> DeferredInfluxWriter for the other measurements, and UDP points that can't be sent
+        host, port       -> InfluxDB UDP listener
+        measurements     -> measurements sent over UDP
+        max_packet_bytes -> datagram payload limit, a single larger line is sent alone
+        source           -> udp_source tag, default the collector's script name, like getTemps
+        """
+        self.http_writer = http_writer
+        self.address = (host, port)
+        self.measurements = set(measurements)
+        self.max_packet_bytes = max_packet_bytes
+        self.source = source or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sequences = {}  # measurement -> next packet sequence number
+        self.sent = {"packets": 0, "points": 0}
+        logging.info(f"Writing {', '.join(sorted(self.measurements))} over UDP to {host}:{port}")
+
+    def __getattr__(self, name):
+        return getattr(self.http_writer, name)
+
+    def pack(self, measurement, points, now_ns) -> list[bytes]:
+        """
+        Line protocol datagrams for points of one measurement,
+        every point stamped with its packet's udp_seq and the udp_source tag
+        """
+
+        from influxdb.line_protocol import make_lines  # pylint: disable=import-outside-toplevel
+
+        def line(point, seq):
+            stamped = {**point, "tags": {**point.get("tags", {}), UDP_SOURCE_TAG: self.source},
+                       "fields": {**point["fields"], UDP_SEQ_FIELD: seq}}
+            stamped.setdefault("time", now_ns)
+            return make_lines({"points": [stamped]}).encode("utf-8")
+
+        packets = []
+        packet = b""
+        seq = self.sequences.get(measurement, 0)
+        for point in points:
+            encoded = line(point, seq)
+            if packet and len(packet) + len(encoded) > self.max_packet_bytes:
+                packets.append(packet)
+                seq += 1
+                encoded = line(point, seq)
+                packet = b""
+            if len(encoded) > self.max_packet_bytes:
+                logging.warning(f"{measurement} point is {len(encoded)} bytes, over the {self.max_packet_bytes} byte packet size")
+            packet += encoded
+        if packet:
+            packets.append(packet)
+            seq += 1
+        self.sequences[measurement] = seq
+        return packets
+
+    def write_points(self, series, **kwargs) -> bool:
+        """
+        Send the UDP measurements, write the rest with the HTTP writer, kwargs go to its write_points.
+        Return the HTTP writer's result, it also writes points buffered while InfluxDB was down.
+        """
+
+        by_measurement = {}
+        http_series = []
+        for point in series:
+            if point["measurement"] in self.measurements:
+                by_measurement.setdefault(point["measurement"], []).append(point)
+            else:
+                http_series.append(point)
+
+        now_ns = time.time_ns()
+        for measurement, points in by_measurement.items():
+            try:
+                for packet in self.pack(measurement, points, now_ns):
+                    self.sock.sendto(packet, self.address)
+                    self.sent["packets"] += 1
+                self.sent["points"] += len(points)
+            except OSError as e:
+                logging.error(f"Failure sending {measurement} over UDP, writing over HTTP: {e}")
+                http_series.extend(points)
+
+        return self.http_writer.write_points(http_series, **kwargs)
+
+    def close(self):
+        """Close the socket and the HTTP writer"""
+        logging.info(f"Sent {self.sent['points']} points in {self.sent['packets']} UDP packets")
+        self.sock.close()
+        self.http_writer.close()
+
+def udp_loss(client, database, measurement, hours=1) -> dict:
+    """
+    Estimate UDP packet loss per host and collector from the udp_seq field of the last hours of a measurement.
+    Each collector (udp_source tag) numbers its own packets, getTemps and getSHT30 both send temps.
+    A sequence that goes back to a lower number is a collector restart and starts a new run.
+    Return {(hostname, udp_source): (packets received, packets sent, loss ratio)}.
+    """
+
+    query = (f'SELECT "{UDP_SEQ_FIELD}" FROM "{measurement}" WHERE time > now() - {int(hours)}h '
+             f'AND "{UDP_SEQ_FIELD}" >= 0 GROUP BY "hostname", "{UDP_SOURCE_TAG}"')
+    result = client.query(query, database=database)
+    losses = {}
+    for (_, tags), points in result.items():
+        received = sent = 0
+        first = last = None
+        for point in points:
+            seq = point[UDP_SEQ_FIELD]
+            if last is not None and seq < last:
+                sent += last - first + 1
+                first = None
+            if first is None:
+                first = seq
+            if seq != last:
+                received += 1
+            last = seq
+        if first is not None:
+            sent += last - first + 1
+        losses[(tags["hostname"], tags[UDP_SOURCE_TAG])] = (received, sent, 1 - received / sent if sent else 0.0)
+    return losses
@@ -0,0 +1,51 @@
+"""Synthetic fixtures for the hot path benchmarks"""
+
+from pathlib import Path
+import pytest
+from simulator import FakeW1Bus, FakeADS1115
+from src import getTemps
+
+SIZES = [10, 100, 1000]
+HOSTNAME = "BenchHost"
+BENCHMARKS_DIR = Path(__file__).parent
+
+def pytest_collection_modifyitems(config, items):
+    """Skip the benchmarks unless run with --benchmark-only, so a plain pytest run only runs the tests"""
+    if config.getoption("benchmark_only", default=False):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmark-only")
+    for item in items:
+        if BENCHMARKS_DIR in item.path.parents:
+            item.add_marker(skip)
+
+class InstantADC:
+    """ADC without conversion delay, so benchmarks measure the Python side only"""
+    def __init__(self, value=16000):
+        self.value = value
+
+    def read_adc(self, ch_num, gain=1):
+        """Return a fixed ADC count"""
+        return self.value + ch_num
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda size: f"{size}_sensors")
+def w1_bus(request, tmp_path_factory):
+    """Fake 1-Wire device tree, half the sensors assigned in the config"""
+    return FakeW1Bus(tmp_path_factory.mktemp("w1") / "devices", request.param, seed=1)
+
+@pytest.fixture
+def w1_devices(w1_bus, monkeypatch):
+    """Point getTemps at the fake device tree"""
+    monkeypatch.setattr(getTemps, "W1_DEVICES_PATH", w1_bus.devices_path)
+    return w1_bus
+
+@pytest.fixture(params=SIZES, ids=lambda size: f"{size}_channels")
+def channels(request):
+    """getPressures.json channels for one host"""
+    return FakeADS1115.channel_config(request.param)
+
+@pytest.fixture(params=SIZES, ids=lambda size: f"{size}_points")
+def points(request):
+    """Temperature points like one getTemps cycle"""
+    return [getTemps.TempUtils.construct_data_point(
+        f"room{i}", f"28-{i:012x}", f"Room {i}", "On", HOSTNAME, 30.0 + i % 20)
+        for i in range(request.param)]
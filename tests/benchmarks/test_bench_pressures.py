@@ -0,0 +1,23 @@
+"""Benchmarks for the getPressures hot paths"""
+
+import pytest
+from src.getPressures import PressureSensorReader
+from .conftest import HOSTNAME, InstantADC
+
+pytest.importorskip("pytest_benchmark")
+
+@pytest.fixture
+def reader(channels):
+    """Reader over an ADC without conversion delay"""
+    return PressureSensorReader(InstantADC(), channels, HOSTNAME, "i2c:0x48", "ADS1115")
+
+def test_read_channels(benchmark, reader):
+    """Read and scale every channel"""
+    readings = benchmark(reader.read_channels)
+    assert len(readings) == len(reader.channels)
+
+def test_construct_points(benchmark, reader):
+    """Construct points from readings"""
+    readings = reader.read_channels()
+    series = benchmark(reader.construct_points, readings)
+    assert len(series) == len(readings)
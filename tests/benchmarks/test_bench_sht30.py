@@ -0,0 +1,18 @@
+"""Benchmarks for the getSHT30 conversion"""
+
+import pytest
+from src.getSHT30 import SHT30Utils
+
+pytest.importorskip("pytest_benchmark")
+
+def test_sht30_convert(benchmark):
+    """Convert one I2C block"""
+    temp, _ = benchmark(SHT30Utils.convert, [0x66, 0x66, 0x93, 0x80, 0x00, 0xA2])
+    assert temp == pytest.approx(77.0, abs=0.01)
+
+def test_sht30_convert_and_construct(benchmark):
+    """Convert one block and construct the point, like one getSHT30 cycle"""
+    def cycle():
+        temp, humidity = SHT30Utils.convert([0x66, 0x66, 0x93, 0x80, 0x00, 0xA2])
+        return SHT30Utils.construct_data_point("shed", "i2c:0x44", "Shed", "host", temp, humidity)
+    assert benchmark(cycle)["measurement"] == "temps"
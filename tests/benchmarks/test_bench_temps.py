@@ -0,0 +1,26 @@
+"""Benchmarks for the getTemps hot paths"""
+
+import pytest
+from src.getTemps import TempUtils, list_attached_sensors, write_points_to_series
+from src.sensor_registry import SensorRegistry
+from .conftest import HOSTNAME
+
+pytest.importorskip("pytest_benchmark")
+
+def test_read_temp(benchmark, w1_devices):
+    """One w1_slave read and parse"""
+    device_file = f"{w1_devices.devices_path}{w1_devices.sensor_ids[0]}/w1_slave"
+    assert benchmark(TempUtils.read_temp, device_file) is not None
+
+def test_registry_update(benchmark, w1_devices):
+    """Device listing and the room map of an unchanged bus"""
+    registry = SensorRegistry(None, HOSTNAME)
+    registry.set_config(w1_devices.room_config(HOSTNAME, assigned=len(w1_devices.sensor_ids) // 2))
+    rooms = benchmark(lambda: registry.update(list_attached_sensors()))
+    assert len(rooms) == len(w1_devices.sensor_ids)
+
+def test_write_points_to_series(benchmark, w1_devices):
+    """Read every sensor and construct the series"""
+    rooms = w1_devices.room_config(HOSTNAME)[HOSTNAME]
+    series = benchmark(write_points_to_series, rooms, HOSTNAME)
+    assert len(series) == len(rooms)
@@ -0,0 +1,38 @@
+"""Benchmarks for point serialization and write batching"""
+
+import json
+import pytest
+from influxdb import InfluxDBClient
+from influxdb.line_protocol import make_lines
+from simulator import InfluxSink
+
+pytest.importorskip("pytest_benchmark")
+
+@pytest.fixture(scope="module")
+def sink():
+    """Local InfluxDB stand-in"""
+    with InfluxSink() as influx_sink:
+        yield influx_sink
+
+@pytest.fixture
+def client(sink):
+    """InfluxDBClient pointed at the sink"""
+    influx_client = InfluxDBClient("127.0.0.1", sink.port, database="bench")
+    yield influx_client
+    influx_client.close()
+
+def test_line_protocol_serialization(benchmark, points):
+    """Points to line protocol, what write_points does before every request"""
+    lines = benchmark(make_lines, {"points": points})
+    assert lines.count("\n") == len(points)
+
+def test_json_serialization(benchmark, points):
+    """Points to JSON, for comparison with line protocol"""
+    assert benchmark(json.dumps, points)
+
+@pytest.mark.parametrize("batch_size", [None, 10, 100])
+def test_write_batching(benchmark, client, sink, points, batch_size):
+    """One write_points call per cycle, split into HTTP requests of batch_size points"""
+    sink.reset()
+    benchmark(client.write_points, points, batch_size=batch_size)
+    assert sink.point_count() % len(points) == 0
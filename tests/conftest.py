@@ -0,0 +1,20 @@
+"""Fixtures shared by the collector feature tests"""
+
+import pytest
+
+class FakeClock:
+    """Clock that only moves when told to"""
+    def __init__(self, now=1735732800.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, secs):
+        """Move the clock forward"""
+        self.now += secs
+
+@pytest.fixture
+def clock():
+    """Fake epoch or monotonic clock"""
+    return FakeClock()
@@ -0,0 +1,135 @@
+"""Tests for ReadyPinADS1115 in ads_ready.py"""
+
+import threading
+import pytest
+from simulator import FakeADS1115
+from src.ads_ready import ReadyPinADS1115, config_word, REG_CONFIG, REG_CONVERSION
+from src.getPressures import PressureSensorReader, NO_PSI
+from src.recording import Recorder, RecordingADC, read_recording
+
+class FakeGPIO:
+    """RPi.GPIO with one pin whose falling edge callback the bus calls"""
+    BCM, IN, PUD_UP, FALLING = "BCM", "IN", "PUD_UP", "FALLING"
+
+    def __init__(self):
+        self.callbacks = {}
+        self.cleaned_up = []
+
+    def setmode(self, mode):
+        """Accept the numbering mode"""
+        del mode
+
+    def setup(self, pin, direction, pull_up_down=None):
+        """Accept the pin setup"""
+        del pin, direction, pull_up_down
+
+    def add_event_detect(self, pin, edge, callback):
+        """Keep the edge callback"""
+        del edge
+        self.callbacks[pin] = callback
+
+    def cleanup(self, pin):
+        """Forget the pin"""
+        self.cleaned_up.append(pin)
+
+class FakeADS1115Registers:
+    """smbus2.SMBus with an ADS1115 whose conversions finish after conversion_secs and pull ALERT/RDY low"""
+
+    def __init__(self, gpio, pin, values, conversion_secs=0.02, edges=True):
+        self.gpio = gpio
+        self.pin = pin
+        self.values = values
+        self.conversion_secs = conversion_secs
+        self.edges = edges
+        self.registers = {REG_CONVERSION: 0, REG_CONFIG: 0x8583}
+        self.log = []
+        self.closed = False
+
+    def write_i2c_block_data(self, i2c_addr, register, data):
+        """Write a register, writing the config with the OS bit starts a conversion"""
+        del i2c_addr
+        value = data[0] << 8 | data[1]
+        self.log.append(("write", register, value))
+        self.registers[register] = value & 0x7FFF if register == REG_CONFIG else value
+        if register == REG_CONFIG and value & 0x8000:
+            threading.Timer(self.conversion_secs, self._finish, [(value >> 12 & 0x07) - 0x04]).start()
+
+    def _finish(self, channel):
+        self.registers[REG_CONVERSION] = self.values[channel] & 0xFFFF
+        self.registers[REG_CONFIG] |= 0x8000
+        if self.edges:
+            self.gpio.callbacks[self.pin](self.pin)
+
+    def read_i2c_block_data(self, i2c_addr, register, length):
+        """Read a register"""
+        del i2c_addr, length
+        self.log.append(("read", register))
+        value = self.registers[register]
+        return [value >> 8, value & 0xFF]
+
+    def close(self):
+        """Close the bus"""
+        self.closed = True
+
+@pytest.fixture
+def gpio():
+    """Fake RPi.GPIO"""
+    return FakeGPIO()
+
+def ready_adc(gpio, values, edges=True):
+    """ReadyPinADS1115 on GPIO 17 of a fake bus"""
+    bus = FakeADS1115Registers(gpio, 17, values, edges=edges)
+    return ReadyPinADS1115(bus, 0x48, gpio, 17, data_rate=128, timeout_secs=1.0).open()
+
+def test_config_word_single_shot_channel():
+    """Single ended channel 2, gain 1, 128 SPS, comparator asserting after one conversion"""
+    assert config_word(2, 1, 128) == 0xE380
+
+def test_read_adc_waits_for_the_edge(gpio):
+    """A read returns the signed conversion and leaves the pin to the caller"""
+    adc = ready_adc(gpio, {0: 10000, 1: -5})
+    assert adc.read_adc(0, gain=1) == 10000
+    assert adc.read_adc(1, gain=1.0) == -5
+    assert adc.missed_edges == 0
+    adc.close()
+    assert gpio.cleaned_up == [17]
+    assert adc.bus.closed
+
+def test_scan_starts_next_conversion_before_reading(gpio):
+    """Each result is read after the next channel's conversion was started"""
+    adc = ready_adc(gpio, {0: 100, 1: 200, 2: 300})
+    results = list(adc.scan([(0, 1), (1, 1), (2, 1)]))
+    assert [value for value, _ in results] == [100, 200, 300]
+
+    ops = [op for op in adc.bus.log if op[1] in (REG_CONFIG, REG_CONVERSION)]
+    assert ops == [("write", REG_CONFIG, config_word(0, 1, 128)),
+                   ("write", REG_CONFIG, config_word(1, 1, 128)), ("read", REG_CONVERSION),
+                   ("write", REG_CONFIG, config_word(2, 1, 128)), ("read", REG_CONVERSION),
+                   ("read", REG_CONVERSION)]
+
+def test_missed_edge_falls_back_to_the_config_register(gpio):
+    """Without an edge a finished conversion is still read, and counted as missed"""
+    adc = ready_adc(gpio, {0: 100}, edges=False)
+    adc.timeout_secs = 0.1
+    assert adc.read_adc(0) == 100
+    assert adc.missed_edges == 1
+
+def test_unfinished_conversion_is_a_read_error(gpio):
+    """A conversion that doesn't finish in time reads as NO_PSI"""
+    adc = ready_adc(gpio, {0: 10000})
+    adc.bus.conversion_secs = 0.5
+    adc.timeout_secs = 0.05
+    reader = PressureSensorReader(adc, {"channel0": {
+        "channel_ID": "simLine0", "channel_name": "Sim Line 0", "channel": 0, "ch_gain": 1, "ch_maxPSI": 100,
+        "ch_minPSI": 0, "ch_minADC": 4000, "ch_maxADC": 32760, "ch_enabled": "Enabled"}},
+        "SimHost", "i2c:0x48", "ADS1115")
+    assert reader.read_channels() == {"channel0": NO_PSI}
+
+def test_scan_through_recording_adc(gpio, tmp_path):
+    """With RECORDING_DIR set, a ready pin scan is recorded, and an ADC without scan still reads one at a time"""
+    recorder = Recorder(str(tmp_path), "test", clock=lambda: 1735732800.0)
+    adc = RecordingADC(ready_adc(gpio, {0: 100, 1: 200}), recorder)
+    assert [value for value, _ in adc.scan([(0, 1), (1, 2)])] == [100, 200]
+    assert not hasattr(RecordingADC(FakeADS1115({0: 100}, seed=1), recorder), "scan")
+    recorder.close()
+    assert [(r.key, r.value) for r in read_recording(tmp_path / "test-20250101.rec")] == [("0:1", 100), ("1:2", 200)]
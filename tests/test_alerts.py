@@ -0,0 +1,139 @@
+"""Tests for the alert rules and webhook delivery in alerts.py"""
+
+import pytest
+from simulator import WebhookSink
+from src import alerts
+from src.alerts import AlertEngine, WebhookNotifier, format_alert
+from src.getTemps import TempUtils, write_points_to_series
+
+class MockNotifier:
+    """Keeps sent alerts"""
+
+    def __init__(self):
+        self.alerts = []
+
+    def send(self, alert):
+        """Keep the alert"""
+        self.alerts.append(alert)
+
+    def close(self):
+        """Nothing to close"""
+
+    def events(self) -> list:
+        """(event, location) of every alert"""
+        return [(alert["event"], alert["location"]) for alert in self.alerts]
+
+@pytest.fixture
+def notifier():
+    """Notifier keeping alerts in memory"""
+    return MockNotifier()
+
+@pytest.fixture
+def engine(clock, notifier):
+    """Engine for temperatures repeating alerts after an hour"""
+    return AlertEngine("getTemps", "SandstoneHost1", notifier, "F", repeat_secs=3600, clock=clock)
+
+def test_below_for_cycles_fires_once_and_resolves(engine, notifier, clock):
+    """A rule fires after the readings in a row, stays quiet while firing and sends one resolved"""
+    rules = [{"below": 34, "cycles": 3}]
+    for temp in (33.0, 33.0, 35.0, 33.0, 33.0):
+        engine.add("pumpHouse", temp, rules)
+        clock.advance(5)
+    assert not notifier.alerts
+
+    for temp in (33.0, 32.5, 32.0):
+        engine.add("pumpHouse", temp, rules)
+        clock.advance(5)
+    assert notifier.events() == [("firing", "pumpHouse")]
+    assert engine.firing() == [("pumpHouse", rules[0])]
+
+    engine.add("pumpHouse", 34.5, rules)
+    assert notifier.events() == [("firing", "pumpHouse"), ("resolved", "pumpHouse")]
+    assert "below 34 F for 3 readings, now 33.0 F" in format_alert(notifier.alerts[0])
+
+def test_firing_rule_repeats_after_repeat_secs(engine, notifier, clock):
+    """A rule still firing is sent again once an hour"""
+    for _ in range(3):
+        engine.add("pumpHouse", 30.0, [{"below": 34}])
+        clock.advance(1800)
+    assert notifier.events() == [("firing", "pumpHouse"), ("repeat", "pumpHouse")]
+
+def test_off_readings_hold_value_rules(engine, notifier):
+    """An OFF sensor doesn't resolve a firing rule, the off rule fires after its count"""
+    rules = [{"below": 34}, {"off": 2}]
+    engine.add("pumpHouse", 30.0, rules)
+    engine.add("pumpHouse", None, rules)
+    engine.add("pumpHouse", None, rules)
+    assert notifier.events() == [("firing", "pumpHouse"), ("firing", "pumpHouse")]
+    assert format_alert(notifier.alerts[1]).startswith("ALERT pumpHouse OFF for 2 readings, now OFF")
+
+def test_pressure_drop_in_window(clock, notifier):
+    """A drop is measured from the highest reading in the window, older readings fall out"""
+    engine = AlertEngine("getPressures", "SandstoneShed1", notifier, "PSI", clock=clock)
+    rules = [{"drop_pct": 20, "window_secs": 60}]
+    for psi in (60.0, 80.0, 75.0, 70.0):
+        engine.add("schoolRoomDump", psi, rules)
+        clock.advance(10)
+    assert not notifier.alerts
+
+    engine.add("schoolRoomDump", 63.0, rules)
+    assert notifier.events() == [("firing", "schoolRoomDump")]
+
+    clock.advance(120)
+    engine.add("schoolRoomDump", 62.0, rules)
+    assert notifier.events()[-1] == ("resolved", "schoolRoomDump")
+
+def test_changed_and_invalid_rules(engine, notifier):
+    """A changed rule starts over, invalid rules are skipped"""
+    engine.add("pumpHouse", 33.0, [{"below": 34, "cycles": 2}, {"below": 1, "above": 2}])
+    engine.add("pumpHouse", 33.0, [{"below": 30, "cycles": 2}])
+    engine.add("pumpHouse", 29.0, [{"below": 30, "cycles": 2}])
+    assert not notifier.alerts
+    engine.add("pumpHouse", 29.0, [{"below": 30, "cycles": 2}])
+    assert notifier.events() == [("firing", "pumpHouse")]
+
+def test_get_temps_checks_room_rules(engine, notifier, monkeypatch):
+    """Rules from the room config are checked on every reading, OFF readings included"""
+    room_sensor_map = {
+        "pumpHouse": {"id": "28-000000000001", "title": "Pump House", "alerts": [{"below": 34}]},
+        "shed": {"id": "28-000000000002", "title": "Shed", "alerts": [{"off": 1}]},
+        "office": {"id": "28-000000000003", "title": "Office"},
+    }
+    temps = {"28-000000000001": 33.1, "28-000000000002": None, "28-000000000003": 20.0}
+    monkeypatch.setattr(TempUtils, "read_temp", lambda path: temps[path.split("/")[-2]])
+    write_points_to_series(room_sensor_map, "SandstoneHost1", alert_engine=engine)
+    assert notifier.events() == [("firing", "pumpHouse"), ("firing", "shed")]
+
+def test_webhook_delivery_is_rate_limited_and_batched():
+    """Alerts past the burst wait for a token and go out together"""
+    alert = {"event": "firing", "source": "getTemps", "hostname": "h", "location": "pumpHouse",
+             "value": 30.0, "units": "F", "rule": {"below": 34}, "time": 0}
+    with WebhookSink() as sink:
+        notifier = WebhookNotifier(sink.url, "discord", rate_per_min=600, burst=1).start()
+        notifier.send(alert)
+        sink.wait_for_posts(1)
+        for _ in range(4):
+            notifier.send(alert)
+        posts = sink.wait_for_posts(2)
+        notifier.close()
+
+    assert len(posts) == 2
+    assert posts[0]["body"] == {"content": "ALERT pumpHouse below 34 F, now 30.0 F (getTemps on h)"}
+    assert posts[1]["body"]["content"].count("\n") == 3
+    assert posts[1]["received"] - posts[0]["received"] >= 0.05
+
+def test_webhook_outage_is_retried(monkeypatch):
+    """A failed post goes back on the queue and is sent when the webhook is back"""
+    monkeypatch.setattr(alerts, "RETRY_SECS", 0.05)
+    alert = {"event": "resolved", "source": "getPressures", "hostname": "h", "location": "dump",
+             "value": 60.0, "units": "PSI", "rule": {"drop_pct": 20}, "time": 0}
+    with WebhookSink() as sink:
+        sink.fail_posts = True
+        notifier = WebhookNotifier(sink.url, "json", rate_per_min=6000).start()
+        notifier.send(alert)
+        sink.wait_for_posts(1, timeout=0.08)
+        sink.fail_posts = False
+        posts = sink.wait_for_posts(1)
+        notifier.close()
+
+    assert posts[0]["body"]["alerts"] == [alert]
@@ -0,0 +1,70 @@
+"""Tests for the capacity planner in capacity_plan.py"""
+
+import json
+import os
+import shutil
+import pytest
+from src.capacity_plan import apply_scenario, load_workloads, main, plan
+
+@pytest.fixture
+def config_dir(tmp_path):
+    """Fixture getTemps.json and getPressures.json with a getSHT30.json and getWeather.json"""
+    for name in ("getTemps.json", "getPressures.json"):
+        shutil.copy(os.path.join("tests", "fixtures", name), tmp_path / name)
+    (tmp_path / "getSHT30.json").write_text(json.dumps(
+        {"SandstoneShed1": {"shedSHT30": {"id": "i2c:0x44", "title": "Shed SHT30"}}}), encoding="utf-8")
+    (tmp_path / "getWeather.json").write_text(json.dumps(
+        {"SandstoneWeather1": {"Sandstone": {}, "KHZX": {}}}), encoding="utf-8")
+    return str(tmp_path)
+
+def test_series_and_points_from_configs(config_dir):
+    """Series follow the tag sets of the collectors, points their cadence"""
+    measurements, hosts, requests_per_sec = plan(load_workloads(config_dir, forecast_enabled=False))
+
+    assert measurements["temps"]["series"] == 9 * 2 + 1  # On and OFF series per DS18B20, one SHT30
+    assert measurements["temps"]["points_per_sec"] == pytest.approx(9 / 5 + 1 / 10)
+    assert measurements["pressures"]["series"] == 4  # disabled channels are written too
+    assert measurements["weather"]["points_per_sec"] == pytest.approx(2 / 600)
+    assert set(hosts) == {"SandstoneHost1", "SandstoneHost2", "SandstoneHost3", "SandstoneShed1",
+                          "SandstoneWeather1"}
+    assert hosts["SandstoneHost1"]["requests_per_sec"] == pytest.approx(2 / 5)
+    assert requests_per_sec == pytest.approx(3 / 5 + 1 / 5 + 1 / 10 + 1 / 600)
+    assert 100 < hosts["SandstoneHost2"]["upload_bytes_per_sec"] / hosts["SandstoneHost2"]["points_per_sec"] < 200
+
+def test_forecasts_overwrite_on_disk(config_dir):
+    """Forecast points are written every fetch but a day only keeps one point per forecast hour"""
+    measurements = plan(load_workloads(config_dir, forecast_enabled=True))[0]
+    hourly = measurements["weather_hourly"]
+    assert hourly["series"] == 2
+    assert hourly["points_per_sec"] * 86400 == pytest.approx(2 * 48 * 144)
+    assert hourly["disk_bytes_per_day"] == pytest.approx(2 * 24 * 7 * 3)
+
+def test_scenarios(config_dir):
+    """Scaling, extra hosts, a faster cadence and deadband change the load as expected"""
+    workloads = load_workloads(config_dir, forecast_enabled=False)
+    planned = apply_scenario(workloads, scale={"getTemps": 2}, add_hosts={"getPressures": 1},
+                             cadence={"getTemps": 2.5})
+    measurements, hosts, _ = plan(planned)
+    assert measurements["temps"]["series"] == 9 * 2 * 2 + 1
+    assert measurements["temps"]["points_per_sec"] == pytest.approx(18 / 2.5 + 1 / 10)
+    assert measurements["pressures"]["series"] == 8
+    assert "planned-getPressures-1" in hosts
+
+    deadband = plan(apply_scenario(workloads, deadband_keep=0.0, heartbeat_secs=600))[0]
+    assert deadband["temps"]["points_per_sec"] == pytest.approx(9 / 600 + 1 / 10)  # SHT30 has no deadband
+    assert plan(workloads)[0]["temps"]["points_per_sec"] == pytest.approx(9 / 5 + 1 / 10)
+
+def test_gateway_batches_requests(config_dir):
+    """Through the gateway InfluxDB gets one request per flush, more for big flushes"""
+    workloads = load_workloads(config_dir, forecast_enabled=False)
+    assert plan(workloads, gateway_flush_secs=10)[2] == pytest.approx(1 / 10)
+    assert plan(workloads, gateway_flush_secs=10, batch_points=10)[2] == pytest.approx(3 / 10)
+
+def test_main_prints_report(config_dir, capsys):
+    """The report has a row per measurement and per host"""
+    assert main(["--config-dir", config_dir, "--forecast", "--cadence", "getTemps=10"]) == 0
+    report = capsys.readouterr().out
+    assert "weather_hourly" in report
+    assert "SandstoneWeather1" in report
+    with pytest.raises(SystemExit):
+        main(["--config-dir", config_dir, "--cadence", "getTemp=10"])
@@ -0,0 +1,140 @@
+"""Tests for the config sync agent and listener in config_sync.py"""
+
+import fnmatch
+import json
+import os
+import pytest
+from src import config_sync
+from src.config_sync import ConfigSyncAgent
+from src.config_notify import ConfigListener
+
+class FakeSMBClient:
+    """smbclient stand in backed by a local directory"""
+
+    def __init__(self, remote_dir):
+        self.remote_dir = remote_dir
+        self.sessions = 0
+        self.listings = 0
+        self.opens = []
+        self.fail = False
+
+    def register_session(self, server, port=445, username=None, password=None):
+        """Count sessions"""
+        del server, port, username, password
+        self.sessions += 1
+
+    def scandir(self, path, search_pattern="*"):
+        """List the backing directory"""
+        del path
+        if self.fail:
+            raise OSError("share unreachable")
+        self.listings += 1
+        return [entry for entry in os.scandir(self.remote_dir) if fnmatch.fnmatch(entry.name, search_pattern)]
+
+    def open_file(self, path, mode="r", encoding=None):
+        """Open a file in the backing directory"""
+        self.opens.append(os.path.basename(path))
+        return open(path, mode, encoding=encoding)
+
+    def delete_session(self, server, port=445):
+        """Nothing to drop"""
+        del server, port
+
+@pytest.fixture
+def share(tmp_path, monkeypatch):
+    """Remote dir with two valid config files and a fake smbclient"""
+    remote_dir = tmp_path / "remote"
+    remote_dir.mkdir()
+    (remote_dir / "getTemps.json").write_text(json.dumps({"host1": {}}), encoding="utf-8")
+    (remote_dir / "getPressures.json").write_text(json.dumps({"host1": {}}), encoding="utf-8")
+    (remote_dir / "notes.txt").write_text("not a config file", encoding="utf-8")
+    fake = FakeSMBClient(str(remote_dir))
+    monkeypatch.setattr(config_sync, "smbclient", fake)
+    return remote_dir, fake
+
+@pytest.fixture
+def agent(tmp_path):
+    """Agent writing to a temporary config dir"""
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+    return ConfigSyncAgent("nas", 445, "share", "config", "user", "pass",
+                           config_dir=str(config_dir), notify_dir=str(config_dir / "notify"))
+
+def test_sync_pulls_all_files_with_one_session(share, agent):
+    """First pass pulls every get*.json file, later passes only list the directory"""
+    _, fake = share
+
+    assert sorted(agent.sync_once()) == ["getPressures.json", "getTemps.json"]
+    assert agent.sync_once() == []
+    assert agent.sync_once() == []
+
+    assert fake.sessions == 1
+    assert fake.listings == 3
+    assert sorted(fake.opens) == ["getPressures.json", "getTemps.json"]
+    assert not os.path.exists(os.path.join(agent.config_dir, "notes.txt"))
+
+def test_sync_pulls_changed_file(share, agent):
+    """Only the file with a new mtime or size is pulled again"""
+    remote_dir, fake = share
+    agent.sync_once()
+
+    remote_file = remote_dir / "getTemps.json"
+    remote_file.write_text(json.dumps({"host1": {"room": {}}}), encoding="utf-8")
+    os.utime(remote_file, (remote_file.stat().st_mtime + 10, remote_file.stat().st_mtime + 10))
+
+    assert agent.sync_once() == ["getTemps.json"]
+    assert fake.opens.count("getTemps.json") == 2
+    with open(os.path.join(agent.config_dir, "getTemps.json"), encoding="utf-8") as local_file:
+        assert json.load(local_file) == {"host1": {"room": {}}}
+
+def test_sync_keeps_local_copy_on_invalid_json(share, agent):
+    """Invalid remote JSON doesn't replace the local file"""
+    remote_dir, _ = share
+    agent.sync_once()
+
+    (remote_dir / "getTemps.json").write_text("{not json", encoding="utf-8")
+
+    assert agent.sync_once() == []
+    with open(os.path.join(agent.config_dir, "getTemps.json"), encoding="utf-8") as local_file:
+        assert json.load(local_file) == {"host1": {}}
+
+def test_sync_reconnects_after_failure(share, agent):
+    """An unreachable share returns None and the next pass registers a new session"""
+    _, fake = share
+    fake.fail = True
+    assert agent.sync_once() is None
+    assert not agent.connected
+
+    fake.fail = False
+    assert len(agent.sync_once()) == 2
+    assert fake.sessions == 2
+
+def test_listener_notified_of_own_file(share, agent):
+    """Listeners only report changes to their own config file"""
+    del share
+    temps_listener = ConfigListener("getTemps.json", agent.notify_dir)
+    pressures_listener = ConfigListener("getPressures.json", agent.notify_dir)
+    try:
+        assert not temps_listener.changed()
+
+        agent.notify(["getTemps.json"])
+        assert temps_listener.changed()
+        assert not temps_listener.changed()
+        assert not pressures_listener.changed()
+
+        agent.notify(agent.sync_once())
+        assert temps_listener.changed()
+        assert pressures_listener.changed()
+    finally:
+        temps_listener.close()
+        pressures_listener.close()
+
+    assert not os.listdir(agent.notify_dir)
+
+def test_listener_falls_back_to_every_cycle(tmp_path):
+    """Without a socket the collector reloads every cycle"""
+    blocked = tmp_path / "blocked"
+    blocked.write_text("a file, not a directory", encoding="utf-8")
+    listener = ConfigListener("getTemps.json", str(blocked))
+    assert listener.changed()
+    assert listener.changed()
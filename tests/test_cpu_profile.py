@@ -0,0 +1,62 @@
+"""Tests for CpuProfiler in cpu_profile.py"""
+
+import logging
+import os
+import signal
+import threading
+import time
+import pytest
+from src.cpu_profile import CpuProfiler
+from src.watchdog import LoopWatchdog
+
+def busy_read(secs):
+    """Spin for secs, like a slow sensor read"""
+    deadline = time.monotonic() + secs
+    while time.monotonic() < deadline:
+        pass
+
+@pytest.fixture
+def profiler(tmp_path):
+    """Short profile with SIGUSR1 installed, stopped after the test"""
+    cpu_profiler = CpuProfiler("getTemps", str(tmp_path), duration_secs=0.3, interval_secs=0.005).install()
+    yield cpu_profiler
+    cpu_profiler.stop()
+
+def test_signal_profiles_phase_thread(profiler, tmp_path, caplog):
+    """SIGUSR1 samples every thread, the phase worker shows up in the collapsed stacks with its phase times"""
+    watchdog = LoopWatchdog(5, {"read": 1}, notify=lambda state: True)
+    os.kill(os.getpid(), signal.SIGUSR1)
+    assert profiler.sampling
+    assert not profiler.start()
+
+    with caplog.at_level(logging.INFO):
+        for _ in range(3):
+            watchdog.cycle_start()
+            watchdog.run("read", busy_read, 0.05)
+            watchdog.cycle_done()
+            profiler.add_cycle(watchdog.phase_secs())
+        profiler.thread.join()
+    watchdog.close()
+
+    files = list(tmp_path.glob("getTemps-*.collapsed"))
+    assert len(files) == 1
+    lines = files[0].read_text(encoding="utf-8").splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+    assert any(line.startswith("phase_0;") and "busy_read (test_cpu_profile.py:" in line for line in lines)
+    assert not any(line.startswith("cpu-profile;") for line in lines)
+    assert any(record.message.startswith("Phase read:") and "over 3 cycles" in record.message
+               for record in caplog.records)
+
+def test_stop_writes_partial_profile(profiler, tmp_path):
+    """Stopping the collector mid profile still writes what was sampled"""
+    release = threading.Event()
+    waiter = threading.Thread(target=release.wait, name="waiter", daemon=True)
+    waiter.start()
+    profiler.duration_secs = 60
+    profiler.start()
+    time.sleep(0.05)
+    profiler.stop()
+    release.set()
+    assert not profiler.sampling
+    assert "waiter;" in next(tmp_path.glob("*.collapsed")).read_text(encoding="utf-8")
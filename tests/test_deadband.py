@@ -0,0 +1,88 @@
+"""Tests for DeadbandFilter in deadband.py"""
+
+import pytest
+from src.deadband import DeadbandFilter
+from src.getTemps import TempUtils, write_points_to_series
+from src.getPressures import PressureSensorReader, NO_PSI
+
+@pytest.fixture
+def deadband(clock):
+    """Deadband filter with a 60 second heartbeat and 0.5 default delta"""
+    return DeadbandFilter(heartbeat_secs=60, default_delta=0.5, clock=clock)
+
+def test_first_reading_is_sent(deadband):
+    """A sensor without sent state is always written"""
+    assert deadband.should_send("room1", 40.0, "On")
+
+def test_small_change_is_suppressed(deadband):
+    """Changes within the delta are not written"""
+    deadband.should_send("room1", 40.0, "On")
+    assert not deadband.should_send("room1", 40.4, "On")
+    assert not deadband.should_send("room1", 39.6, "On")
+
+def test_change_is_measured_from_last_sent_value(deadband):
+    """Slow drift is written once it passes the delta from the last sent value"""
+    deadband.should_send("room1", 40.0, "On")
+    assert not deadband.should_send("room1", 40.3, "On")
+    assert deadband.should_send("room1", 40.6, "On")
+
+def test_per_sensor_delta_overrides_default(deadband):
+    """A delta passed with the reading replaces the default"""
+    deadband.should_send("room1", 40.0, "On", delta=2.0)
+    assert not deadband.should_send("room1", 41.5, "On", delta=2.0)
+    assert deadband.should_send("room1", 42.5, "On", delta=2.0)
+
+def test_status_change_is_always_sent(deadband):
+    """On/OFF changes are written even if the value is the same"""
+    deadband.should_send("room1", -999.9, "OFF")
+    assert deadband.should_send("room1", -999.9, "On")
+
+def test_heartbeat(deadband, clock):
+    """Unchanged readings are written once the heartbeat has passed"""
+    deadband.should_send("room1", 40.0, "On")
+    clock.advance(59)
+    assert not deadband.should_send("room1", 40.0, "On")
+    clock.advance(1)
+    assert deadband.should_send("room1", 40.0, "On")
+
+def test_reset(deadband):
+    """After reset every sensor is written again"""
+    deadband.should_send("room1", 40.0, "On")
+    deadband.reset()
+    assert deadband.should_send("room1", 40.0, "On")
+
+def test_write_points_to_series_deadband(monkeypatch, deadband):
+    """Unchanged temperatures are dropped from the series, status changes are kept"""
+    room_sensor_map = {
+        "room1": {"id": "28-000000000001", "title": "Room 1"},
+        "room2": {"id": "28-000000000002", "title": "Room 2", "deadband": 5.0},
+    }
+    temp_results = {"28-000000000001": 40.0, "28-000000000002": 50.0}
+    monkeypatch.setattr(TempUtils, "read_temp", lambda path: temp_results[path.split('/')[-2]])
+
+    assert len(write_points_to_series(room_sensor_map, "testhost", deadband)) == 2
+
+    temp_results["28-000000000001"] = 41.0
+    temp_results["28-000000000002"] = 54.0
+    points = write_points_to_series(room_sensor_map, "testhost", deadband)
+    assert [p["tags"]["location"] for p in points] == ["room1"]
+
+    temp_results["28-000000000002"] = None
+    points = write_points_to_series(room_sensor_map, "testhost", deadband)
+    assert [p["tags"]["status"] for p in points] == ["OFF"]
+
+def test_construct_points_deadband(deadband):
+    """Pressure channels inside the deadband are skipped"""
+    channels = {
+        "channel0": {"channel_ID": "manifold", "channel_name": "Manifold", "channel": 0},
+        "channel1": {"channel_ID": "dump", "channel_name": "Dump", "channel": 1, "ch_deadband": 3.0},
+    }
+    reader = PressureSensorReader(None, channels, "testhost", "i2c:0x48", "ADS1115")
+
+    assert len(reader.construct_points({"channel0": 50.0, "channel1": 60.0}, deadband)) == 2
+
+    series = reader.construct_points({"channel0": 50.2, "channel1": 62.0}, deadband)
+    assert series == []
+
+    series = reader.construct_points({"channel0": NO_PSI, "channel1": 62.0}, deadband)
+    assert [p["tags"]["location"] for p in series] == ["manifold"]
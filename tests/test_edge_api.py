@@ -0,0 +1,75 @@
+"""Tests for the edge HTTP API in edge_api.py"""
+
+import json
+import urllib.error
+import urllib.request
+import pytest
+from src.deadband import DeadbandFilter
+from src.edge_api import EdgeApi, ReadingStore
+from src.getTemps import TempUtils, write_points_to_series
+
+@pytest.fixture
+def store(clock):
+    """Store keeping 10 readings per sensor"""
+    return ReadingStore("getTemps", "SandstoneHost1", "F", capacity=10, clock=clock)
+
+def get(api, path):
+    """GET a path, return (status, decoded body)"""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{api.port}{path}", timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_latest_and_off_readings(store, clock):
+    """The latest reading replaces the last one, OFF readings have no value and stay out of the history"""
+    store.add("pumpHouse", "28-1", "Pump House", 40.0)
+    clock.advance(5)
+    store.add("pumpHouse", "28-1", "Pump House", None)
+    latest = json.loads(store.latest("pumpHouse"))
+    assert (latest["value"], latest["status"], latest["time"]) == (None, "OFF", clock.now)
+    assert json.loads(store.history("pumpHouse", 60))["values"] == [40.0]
+    assert store.latest("shed") is None
+
+def test_history_is_bounded_and_windowed(store, clock):
+    """Only capacity readings are kept, minutes limits what is returned"""
+    for i in range(15):
+        store.add("pumpHouse", "28-1", "Pump House", 40.0 + i)
+        clock.advance(60)
+    assert json.loads(store.history("pumpHouse", 60))["values"] == [40.0 + i for i in range(5, 15)]
+    assert json.loads(store.history("pumpHouse", 3))["values"] == [52.0, 53.0, 54.0]
+
+def test_latest_body_is_rebuilt_after_add(store):
+    """The /latest body is cached until the next reading"""
+    store.add("pumpHouse", "28-1", "Pump House", 40.0)
+    body = store.latest()
+    assert store.latest() is body
+    store.add("shed", "28-2", "Shed", 20.0)
+    assert [r["location"] for r in json.loads(store.latest())["readings"]] == ["pumpHouse", "shed"]
+
+def test_http_endpoints(store):
+    """Endpoints answer JSON, unknown locations and paths are 404s"""
+    store.add("pumpHouse", "28-1", "Pump House", 40.0)
+    api = EdgeApi(store, 0, "127.0.0.1").start()
+    try:
+        status, body = get(api, "/latest")
+        assert status == 200
+        assert body["hostname"] == "SandstoneHost1"
+        assert body["readings"][0]["value"] == 40.0
+        assert get(api, "/history?location=pumpHouse&minutes=5")[1]["values"] == [40.0]
+        assert get(api, "/health")[1]["sensors"] == 1
+        assert get(api, "/latest?location=shed")[0] == 404
+        assert get(api, "/history?location=pumpHouse&minutes=soon")[0] == 400
+        assert get(api, "/query")[0] == 404
+    finally:
+        api.close()
+
+def test_get_temps_stores_readings_suppressed_by_deadband(store, monkeypatch):
+    """The store gets every reading even when deadband doesn't write a point"""
+    room_sensor_map = {"pumpHouse": {"id": "28-000000000001", "title": "Pump House"}}
+    temps = iter([40.0, 40.1])
+    monkeypatch.setattr(TempUtils, "read_temp", lambda path: next(temps))
+    deadband = DeadbandFilter(heartbeat_secs=600, default_delta=0.5)
+    write_points_to_series(room_sensor_map, "SandstoneHost1", deadband, reading_store=store)
+    assert not write_points_to_series(room_sensor_map, "SandstoneHost1", deadband, reading_store=store)
+    assert json.loads(store.latest("pumpHouse"))["value"] == 40.1
@@ -0,0 +1,143 @@
+"""Tests for the Parquet export in export_parquet.py"""
+
+import os
+from datetime import datetime, timezone
+import pytest
+from src.export_parquet import ExportState, day_partitions, export, parse_series_key, series_select
+
+DAY_NS = 86400 * 10**9
+START_NS = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp()) * 10**9
+
+class MockResultSet:
+    """Fake ResultSet"""
+
+    def __init__(self, points):
+        self.points = points
+
+    def get_points(self):
+        """Return the points"""
+        return iter(self.points)
+
+class MockInfluxDBClient:
+    """Fake InfluxDBClient answering the export queries from a list of (tags, time ns, fields)"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def query(self, query, database=None, epoch=None):
+        """Answer SHOW TAG KEYS, SHOW FIELD KEYS, SHOW SERIES and the series SELECT"""
+        del database, epoch
+        self.queries.append(query)
+        if query.startswith("SHOW TAG KEYS"):
+            return MockResultSet([{"tagKey": "location"}, {"tagKey": "sensor"}])
+        if query.startswith("SHOW FIELD KEYS"):
+            if '"weather"' in query:
+                return MockResultSet([])
+            return MockResultSet([{"fieldKey": "temp_flt", "fieldType": "float"},
+                                  {"fieldKey": "temp", "fieldType": "string"}])
+        if query.startswith("SHOW SERIES"):
+            keys = sorted({"temps," + ",".join(f"{k}={v}" for k, v in sorted(tags.items()))
+                           for tags, _, _ in self.rows})
+            return MockResultSet([{"key": key} for key in keys])
+
+        start = self._time(query, "time >= '")
+        end = self._time(query, "time < '")
+        return MockResultSet([{"time": ts, **fields} for tags, ts, fields in self.rows
+                              if start <= ts < end and all(f"= '{v}'" in query for v in tags.values())])
+
+    @staticmethod
+    def _time(query, prefix):
+        value = query.split(prefix)[1].split("'")[0]
+        return int(datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()) * 10**9
+
+def test_parse_series_key():
+    """Escaped commas, spaces and equals signs stay in tag values"""
+    assert parse_series_key("temps,location=stage\\ wall,sensor=28\\,1") == {"location": "stage wall",
+                                                                          "sensor": "28,1"}
+    assert parse_series_key("temps,a\\=b=c=d") == {"a=b": "c=d"}
+    assert not parse_series_key("weather")
+
+def test_series_select_requires_missing_tags_empty():
+    """A series without a tag only matches points without that tag"""
+    query = series_select("db", "autogen", "temps", {"temp_flt": "float"}, {"location": "o'hare"},
+                          ["location", "sensor"], ("2025-01-01T00:00:00Z", "2025-01-02T00:00:00Z"))
+    assert query == ('SELECT "temp_flt" FROM "db"."autogen"."temps"'
+                     " WHERE \"location\" = 'o\\'hare' AND \"sensor\" = ''"
+                     " AND time >= '2025-01-01T00:00:00Z' AND time < '2025-01-02T00:00:00Z'")
+
+def test_day_partitions():
+    """Days are UTC and the end day is not included"""
+    days = list(day_partitions(datetime(2025, 1, 30, 12, tzinfo=timezone.utc),
+                               datetime(2025, 2, 2, tzinfo=timezone.utc)))
+    assert [day for day, _, _ in days] == ["2025-01-30", "2025-01-31", "2025-02-01"]
+
+def test_export_state_survives_restart(tmp_path):
+    """Finished partitions are read back by a new run"""
+    ExportState(str(tmp_path)).mark_done("temps", "2025-01-01")
+    state = ExportState(str(tmp_path))
+    assert state.is_done("temps", "2025-01-01")
+    assert not state.is_done("temps", "2025-01-02")
+
+def test_export_writes_partitions_and_resumes(tmp_path):
+    """Every day is a partition with all series, a second run only exports new days"""
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    rows = []
+    for minute in range(0, 2 * 24 * 60, 30):
+        ts = START_NS + minute * 60 * 10**9
+        rows.append(({"location": "wall", "sensor": "28-1"}, ts, {"temp_flt": 40.0 + minute, "temp": "40"}))
+        rows.append(({"sensor": "28-2"}, ts, {"temp_flt": 30.0}))
+    client = MockInfluxDBClient(rows)
+    out_dir = str(tmp_path / "archive")
+
+    export(client, "db", "autogen", ["temps"], datetime(2025, 1, 1, tzinfo=timezone.utc),
+           datetime(2025, 1, 3, tzinfo=timezone.utc), out_dir, chunk_hours=6, row_group_rows=50)
+
+    path = os.path.join(out_dir, "temps", "date=2025-01-02", "part-0.parquet")
+    table = parquet.read_table(path)
+    assert table.num_rows == 96
+    assert table.schema.names == ["time", "location", "sensor", "temp_flt", "temp"]
+    assert parquet.ParquetFile(path).num_row_groups > 1
+    second_day = table.to_pylist()
+    assert all(START_NS + DAY_NS <= int(row["time"].timestamp()) * 10**9 < START_NS + 2 * DAY_NS
+               for row in second_day)
+    assert {row["location"] for row in second_day if row["sensor"] == "28-2"} == {None}
+
+    selects = sum(query.startswith("SELECT") for query in client.queries)
+    assert selects == 2 * 2 * 4  # days x series x chunks
+
+    client.queries.clear()
+    export(client, "db", "autogen", ["temps"], datetime(2025, 1, 1, tzinfo=timezone.utc),
+           datetime(2025, 1, 4, tzinfo=timezone.utc), out_dir, chunk_hours=6, row_group_rows=50)
+    assert all("2025-01-03T" in query for query in client.queries if not query.startswith("SHOW"))
+    assert not os.path.exists(os.path.join(out_dir, "temps", "date=2025-01-03"))
+
+def test_export_retries_empty_days_of_existing_measurements(tmp_path):
+    """A day without rows is exported again next run, a measurement that doesn't exist is done"""
+    pytest.importorskip("pyarrow.parquet")
+
+    rows = [({"sensor": "28-1"}, START_NS + minute * 60 * 10**9, {"temp_flt": 30.0}) for minute in range(0, 60, 30)]
+    out_dir = str(tmp_path / "archive")
+    export(MockInfluxDBClient(rows), "db", "raw", ["temps", "weather"], datetime(2025, 1, 1, tzinfo=timezone.utc),
+           datetime(2025, 1, 3, tzinfo=timezone.utc), out_dir)
+
+    state = ExportState(out_dir)
+    assert state.is_done("temps", "2025-01-01")
+    assert not state.is_done("temps", "2025-01-02")
+    assert state.is_done("weather", "2025-01-02")
+
+def test_export_rollups_apart_from_raw(tmp_path):
+    """Rollup partitions are written under the retention policy name"""
+    parquet = pytest.importorskip("pyarrow.parquet")
+
+    client = MockInfluxDBClient([({"sensor": "28-1"}, START_NS, {"temp_flt": 30.0})])
+    out_dir = str(tmp_path / "archive")
+    export(client, "db", "rollup_1h", ["temps"], datetime(2025, 1, 1, tzinfo=timezone.utc),
+           datetime(2025, 1, 2, tzinfo=timezone.utc), out_dir)
+
+    assert all('"rollup_1h"' in query for query in client.queries if not query.startswith("SHOW SERIES"))
+    assert parquet.read_table(os.path.join(out_dir, "rollup_1h", "temps", "date=2025-01-01", "part-0.parquet")
+                              ).num_rows == 1
+    assert ExportState(out_dir).is_done("rollup_1h/temps", "2025-01-01")
+    assert not os.path.exists(os.path.join(out_dir, "temps"))
@@ -0,0 +1,146 @@
+"""Tests for FreezeRiskEstimator in freeze_risk.py"""
+
+import pytest
+from src.freeze_risk import FreezeRiskEstimator, latest_forecast_low
+
+class MockResultSet:
+    """Fake influxdb ResultSet"""
+    def __init__(self, points):
+        self.points = points
+
+    def get_points(self):
+        """Return the points"""
+        return iter(self.points)
+
+class MockInfluxDBClient:
+    """Fake client returning a forecast low"""
+    def __init__(self, points):
+        self.points = points
+        self.queries = []
+
+    def query(self, query, database=None):
+        """Record the query"""
+        self.queries.append((query, database))
+        return MockResultSet(self.points)
+
+@pytest.fixture
+def estimator(clock):
+    """Estimator with a small window"""
+    return FreezeRiskEstimator("getTemps", window_size=12, clock=clock)
+
+def test_falling_temperature_time_to_freeze(estimator, clock):
+    """A line cooling 6 F per hour at 38 F freezes in about an hour"""
+    for i in range(12):
+        estimator.add_temp("stageWall", 39.0 - i * 0.1)
+        clock.advance(60)
+    fields = estimator.estimate("stageWall")
+
+    assert fields["temp_slope_f_per_hr"] == pytest.approx(-6.0)
+    assert fields["time_to_freeze_min"] == pytest.approx((37.9 - 32) / 6 * 60, rel=0.02)
+    assert 0.4 < fields["risk"] < 0.6
+
+def test_warming_line_has_no_time_to_freeze(estimator, clock):
+    """Rising temperatures have no time to freeze and no risk"""
+    for i in range(5):
+        estimator.add_temp("stageWall", 40.0 + i)
+        clock.advance(60)
+    fields = estimator.estimate("stageWall")
+    assert "time_to_freeze_min" not in fields
+    assert fields["risk"] == 0.0
+
+def test_frozen_line(estimator, clock):
+    """At or below freezing the risk is 1"""
+    for temp in (33.0, 32.5, 31.9):
+        estimator.add_temp("stageWall", temp)
+        clock.advance(60)
+    fields = estimator.estimate("stageWall")
+    assert fields["time_to_freeze_min"] == 0.0
+    assert fields["risk"] == 1.0
+
+def test_pressure_drop(clock):
+    """A steady pressure drop raises the risk"""
+    estimator = FreezeRiskEstimator("getPressures", window_size=12, clock=clock)
+    for i in range(6):
+        estimator.add_pressure("schoolRoomDump", 50.0 - i * 1.0)
+        clock.advance(30)
+    fields = estimator.estimate("schoolRoomDump")
+    assert fields["pressure_trend_psi_per_min"] == pytest.approx(-2.0)
+    assert fields["risk"] > 0.5
+
+def test_forecast_adds_risk(estimator, clock):
+    """A cold forecast adds risk to a steady line"""
+    for _ in range(3):
+        estimator.add_temp("stageWall", 40.0)
+        clock.advance(60)
+    assert estimator.estimate("stageWall")["risk"] == 0.0
+
+    estimator.set_forecast_low(12.0)
+    fields = estimator.estimate("stageWall")
+    assert fields["forecast_low"] == 12.0
+    assert fields["risk"] == pytest.approx(0.5)
+
+def test_construct_points_skips_stale_and_short_lines(estimator, clock):
+    """Lines need two samples and a recent reading to be reported"""
+    estimator.add_temp("oneSample", 40.0)
+    for _ in range(2):
+        estimator.add_temp("stageWall", 40.0)
+        clock.advance(5)
+
+    points = estimator.construct_points("host1")
+    assert [p["tags"] for p in points] == [{"line": "stageWall", "source": "getTemps", "hostname": "host1"}]
+    assert points[0]["measurement"] == "freeze_risk"
+
+    clock.advance(3600)
+    assert estimator.construct_points("host1") == []
+
+def test_refresh_forecast_is_rate_limited(estimator, clock):
+    """The forecast is queried at most once per refresh interval"""
+    client = MockInfluxDBClient([{"min": 20.5}])
+    estimator.refresh_forecast(client, "weather", "Sandstone")
+    estimator.refresh_forecast(client, "weather", "Sandstone")
+    assert len(client.queries) == 1
+    assert estimator.forecast_low == 20.5
+
+    clock.advance(600)
+    estimator.refresh_forecast(client, "weather", "Sandstone")
+    assert len(client.queries) == 2
+
+def test_latest_forecast_low_missing():
+    """No forecast points returns None"""
+    assert latest_forecast_low(MockInfluxDBClient([]), "weather", "Sandstone") is None
+
+def test_stale_lines_are_dropped(estimator, clock):
+    """Sensors and lines without a reading in STALE_SECS are forgotten, a line coming back starts a new window"""
+    for i in range(12):
+        estimator.add_temp("stageWall", 39.0 - i * 0.1, "28-000000000001")
+        estimator.add_temp("stageWall", 40.0, "28-000000000002")
+        estimator.add_pressure("cliffLine", 60.0)
+        clock.advance(60)
+    clock.advance(300)
+    for i in range(12):
+        estimator.add_temp("stageWall", 40.0, "28-000000000002")
+        clock.advance(60)
+
+    estimator.construct_points("host1")
+    assert list(estimator.lines) == ["stageWall"]
+    assert list(estimator.lines["stageWall"][0]) == ["28-000000000002"]
+
+    estimator.add_pressure("cliffLine", 60.0)
+    assert len(estimator.lines["cliffLine"][1]["cliffLine"]) == 1
+
+def test_latest_forecast_low_quotes_location():
+    """A quote in the location can't end the string literal"""
+    client = MockInfluxDBClient([{"min": 20.5}])
+    latest_forecast_low(client, "weather", "O'Brien's Crag")
+    assert "\"location\" = 'O\\'Brien\\'s Crag' AND" in client.queries[0][0]
+
+def test_sensors_sharing_a_line_keep_their_own_windows(estimator, clock):
+    """Two sensors on one line don't mix into one slope, the line reports the one closer to freezing"""
+    for i in range(12):
+        estimator.add_temp("stageWall", 50.0 + i * 0.1, "28-000000000001")
+        estimator.add_temp("stageWall", 39.0 - i * 0.1, "28-000000000002")
+        clock.advance(60)
+    fields = estimator.estimate("stageWall")
+    assert fields["temp"] == pytest.approx(37.9)
+    assert fields["temp_slope_f_per_hr"] == pytest.approx(-6.0)
+    assert 0.4 < fields["risk"] < 0.6
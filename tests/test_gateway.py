@@ -0,0 +1,157 @@
+"""Tests for the LAN ingestion gateway in gateway.py"""
+
+import threading
+import pytest
+import requests
+from src.gateway import (parse_line, split_fields, PointBuffer, DiskSpool, UpstreamInflux, IngestGateway, serve)
+from src.common_functions import database_connect
+from simulator.influx_sink import InfluxSink
+
+RECEIVED_NS = 1_735_743_600_000_000_000
+
+def test_parse_line():
+    """Trailing integers are timestamps, unless they are inside a string field"""
+    assert parse_line("temps,id=28-1 temp_flt=40.1 1735743600") == ("temps,id=28-1 temp_flt=40.1", 1735743600)
+    assert parse_line("temps,id=28-1 temp_flt=40.1") == ("temps,id=28-1 temp_flt=40.1", None)
+    assert parse_line('weather,location=Sandstone condition="Snow 2"') == (
+        'weather,location=Sandstone condition="Snow 2"', None)
+    assert parse_line(r"temps,title=Shed\ 1 temp_flt=40.1") == (r"temps,title=Shed\ 1 temp_flt=40.1", None)
+    with pytest.raises(ValueError):
+        parse_line("temps")
+
+def test_split_fields():
+    """Commas and equals signs only split outside quoted strings and escapes"""
+    assert split_fields('temp_flt=40.1,status="a,b=c",count=3i') == {
+        "temp_flt": "40.1", "status": '"a,b=c"', "count": "3i"}
+    assert split_fields(r'a\,b\=c=1,d="say \"hi\", x"') == {r"a\,b\=c": "1", "d": r'"say \"hi\", x"'}
+
+def test_buffer_stamps_and_merges_duplicates():
+    """Points are stamped on arrival, converted to ns, and points per series and time merge their fields"""
+    point_buffer = PointBuffer(clock=lambda: RECEIVED_NS)
+    assert point_buffer.add("sensors", None, "temps,id=a temp_flt=1,status=\"ok\"\ntemps,id=b temp_flt=2\n") == 2
+    assert point_buffer.add("sensors", None, "temps,id=a temp_flt=3,adc_raw=12i") == 1
+    assert point_buffer.add("weather", "raw", "weather_hourly,location=S temp=20 1735743600", precision="s") == 1
+
+    assert len(point_buffer) == 3
+    assert point_buffer.duplicates == 1
+    assert point_buffer.drain() == {
+        ("sensors", None): [f'temps,id=a temp_flt=3,status="ok",adc_raw=12i {RECEIVED_NS}',
+                            f"temps,id=b temp_flt=2 {RECEIVED_NS}"],
+        ("weather", "raw"): [f"weather_hourly,location=S temp=20 {RECEIVED_NS}"],
+    }
+    assert len(point_buffer) == 0
+
+def test_spool_round_trip(tmp_path):
+    """Spooled batches load back with their database and retention policy, oldest first"""
+    spool = DiskSpool(str(tmp_path), max_bytes=1024 * 1024)
+    spool.save("sensor_data", None, ["a 1", "b 2"])
+    spool.save("weather", "raw", ["c 3"])
+    first, second = spool.files()
+    assert spool.load(first) == ("sensor_data", None, ["a 1", "b 2"])
+    assert spool.load(second) == ("weather", "raw", ["c 3"])
+
+def test_spool_drops_oldest_past_limit(tmp_path):
+    """The spool keeps the newest files within max_bytes"""
+    spool = DiskSpool(str(tmp_path), max_bytes=1)
+    spool.save("sensors", None, ["a 1"])
+    spool.save("sensors", None, ["b 2"])
+    assert len(spool.files()) == 1
+    assert spool.load(spool.files()[0])[2] == ["b 2"]
+
+@pytest.fixture
+def sink():
+    """Upstream InfluxDB stand in"""
+    with InfluxSink() as influx_sink:
+        yield influx_sink
+
+@pytest.fixture
+def credentials():
+    """No credentials, tests of auth override this"""
+    return None
+
+@pytest.fixture
+def gateway(sink, tmp_path, credentials):
+    """Gateway writing to the sink, served on a local port"""
+    upstream = UpstreamInflux(f"http://127.0.0.1:{sink.port}", "", "")
+    ingest_gateway = IngestGateway(upstream, DiskSpool(str(tmp_path / "spool"), 1024 * 1024), batch_points=3)
+    server = serve(ingest_gateway, 0, credentials=credentials)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield ingest_gateway, server.server_port
+    server.shutdown()
+    server.server_close()
+    upstream.close()
+
+def test_collector_writes_through_gateway(sink, gateway):
+    """A collector's InfluxDB client connects and writes through the gateway, batches go upstream gzipped"""
+    ingest_gateway, port = gateway
+    client = database_connect("127.0.0.1", port, "", "", "sensors", gzip=True)
+    assert "sensors" in sink.databases
+
+    for host in ("shed", "stagewall"):
+        client.write_points([{"measurement": "temps", "tags": {"hostname": host, "id": "a"}, "fields": {"temp_flt": 40.0}},
+                             {"measurement": "temps", "tags": {"hostname": host, "id": "b"}, "fields": {"temp_flt": 41.0}}])
+    assert not sink.writes
+
+    ingest_gateway.flush()
+    assert [(write["database"], write["precision"], len(write["lines"])) for write in sink.writes] == [
+        ("sensors", "ns", 3), ("sensors", "ns", 1)]
+    client.close()
+
+def test_outage_spools_and_replays(sink, gateway):
+    """Batches are spooled while the upstream fails and replayed in order after"""
+    ingest_gateway, _ = gateway
+    sink.fail_writes = True
+    ingest_gateway.receive("sensors", None, "temps,id=a temp_flt=1 1\ntemps,id=b temp_flt=2 2", "s")
+    ingest_gateway.flush()
+    ingest_gateway.receive("sensors", None, "temps,id=a temp_flt=3 3", "s")
+    ingest_gateway.flush()
+    assert len(ingest_gateway.spool.files()) == 2
+
+    sink.fail_writes = False
+    ingest_gateway.flush()
+    assert not ingest_gateway.spool.files()
+    assert [line.split()[-1] for write in sink.writes for line in write["lines"]] == [
+        "1000000000", "2000000000", "3000000000"]
+
+def test_failed_spool_keeps_points_buffered(sink, gateway, monkeypatch):
+    """Batches that couldn't be spooled go back in the buffer and are written by the next flush"""
+    ingest_gateway, _ = gateway
+    sink.fail_writes = True
+    ingest_gateway.receive("sensors", None, "\n".join(f"temps,id=a temp_flt={i} {i}" for i in range(1, 6)), "s")
+
+    def disk_full(database, rp, lines):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(ingest_gateway.spool, "save", disk_full)
+    with pytest.raises(OSError):
+        ingest_gateway.flush()
+    assert len(ingest_gateway.buffer) == 5
+
+    ingest_gateway.receive("sensors", None, "temps,id=a temp_flt=50,humidity_flt=20 5", "s")
+    monkeypatch.undo()
+    sink.fail_writes = False
+    ingest_gateway.flush()
+    lines = [line for write in sink.writes for line in write["lines"]]
+    assert len(lines) == 5
+    assert "temps,id=a temp_flt=50,humidity_flt=20 5000000000" in lines
+
+@pytest.mark.parametrize("credentials", [("collector", "secret")])
+def test_clients_must_send_the_credentials(sink, gateway):
+    """Writes and queries need the gateway's credentials, as basic auth or u and p, /ping doesn't"""
+    ingest_gateway, port = gateway
+    url = f"http://127.0.0.1:{port}"
+    line = "temps,id=a temp_flt=1 1"
+
+    assert requests.post(f"{url}/write", params={"db": "sensors"}, data=line, timeout=5).status_code == 401
+    assert requests.post(f"{url}/write", params={"db": "sensors"}, data=line, auth=("collector", "wrong"),
+                         timeout=5).status_code == 401
+    assert requests.get(f"{url}/query", params={"q": "SHOW DATABASES"}, timeout=5).status_code == 401
+    assert not len(ingest_gateway.buffer)
+
+    assert requests.get(f"{url}/ping", timeout=5).status_code == 204
+    assert requests.post(f"{url}/write", params={"db": "sensors"}, data=line, auth=("collector", "secret"),
+                         timeout=5).status_code == 204
+    assert requests.get(f"{url}/query", params={"q": "SHOW DATABASES", "u": "collector", "p": "secret"},
+                        timeout=5).status_code == 200
+    assert len(ingest_gateway.buffer) == 1
+    assert not sink.writes
@@ -0,0 +1,140 @@
+"""Tests for retention policy and continuous query provisioning in influx_schema.py"""
+
+import pytest
+from src.influx_schema import (provision_schema, rollup_measurements, rollup_select, cq_name, RAW_RP,
+                               ROLLUP_1M_RP, ROLLUP_1H_RP, ROLLUP_FIELDS)
+
+class MockInfluxDBClient:
+    """Fake InfluxDBClient that records schema changes"""
+    def __init__(self, retention_policies=None, continuous_queries=None):
+        self.retention_policies = retention_policies or []
+        self.continuous_queries = continuous_queries or []
+        self.created_rps = []
+        self.altered_rps = []
+        self.created_cqs = []
+        self.dropped_cqs = []
+
+    def get_list_retention_policies(self, database=None):
+        """Return existing retention policies"""
+        return self.retention_policies
+
+    def create_retention_policy(self, name, duration, replication, database=None, default=False):
+        """Record created retention policy"""
+        self.created_rps.append((name, duration, replication, database, default))
+
+    def alter_retention_policy(self, name, database=None, duration=None, default=None):
+        """Record altered retention policy"""
+        self.altered_rps.append((name, duration, default))
+
+    def get_list_continuous_queries(self):
+        """Return existing continuous queries"""
+        return self.continuous_queries
+
+    def create_continuous_query(self, name, select, database=None):
+        """Record created continuous query"""
+        self.created_cqs.append((name, select, database))
+
+    def drop_continuous_query(self, name, database=None):
+        """Record dropped continuous query"""
+        self.dropped_cqs.append((name, database))
+
+@pytest.fixture(autouse=True)
+def clear_retention_env(monkeypatch):
+    """Use the default durations, no database names"""
+    for env_var in ("INFLUXDB_RAW_RETENTION", "INFLUXDB_1M_RETENTION", "INFLUXDB_1H_RETENTION",
+                    "SENSOR_DATABASE", "TEMP_SENSOR_DATABASE"):
+        monkeypatch.delenv(env_var, raising=False)
+
+def test_rollup_select_from_raw():
+    """Raw fields are aggregated and OFF placeholders are filtered out"""
+    query = rollup_select("sensors", "pressures", ROLLUP_1M_RP, "1m", RAW_RP)
+    assert query == (
+        'SELECT min("pressure_flt") AS "pressure_flt_min", mean("pressure_flt") AS "pressure_flt_mean", '
+        'max("pressure_flt") AS "pressure_flt_max", min("adc_raw") AS "adc_raw_min", '
+        'mean("adc_raw") AS "adc_raw_mean", max("adc_raw") AS "adc_raw_max" INTO "sensors"."rollup_1m"."pressures" '
+        'FROM "sensors"."raw"."pressures" WHERE pressure_flt > -999 GROUP BY time(1m), *'
+    )
+
+def test_rollup_select_from_rollup():
+    """The hourly tier aggregates the matching minute fields"""
+    query = rollup_select("sensors", "temps", ROLLUP_1H_RP, "1h", ROLLUP_1M_RP)
+    assert 'min("temp_flt_min") AS "temp_flt_min"' in query
+    assert 'mean("temp_flt_mean") AS "temp_flt_mean"' in query
+    assert 'max("temp_flt_max") AS "temp_flt_max"' in query
+    assert "WHERE" not in query
+
+def test_rollup_select_time_range():
+    """Backfill queries are bounded by the chunk"""
+    query = rollup_select("sensors", "weather", ROLLUP_1M_RP, "1m", "autogen",
+                          ("2025-01-01T00:00:00Z", "2025-01-02T00:00:00Z"))
+    assert 'FROM "sensors"."autogen"."weather"' in query
+    assert "WHERE time >= '2025-01-01T00:00:00Z' AND time < '2025-01-02T00:00:00Z'" in query
+
+def test_provision_new_database():
+    """All retention policies and continuous queries are created, raw is the default"""
+    client = MockInfluxDBClient(retention_policies=[{"name": "autogen", "duration": "0s", "default": True}])
+    assert provision_schema(client, "sensors")
+
+    assert ("raw", "7d", 1, "sensors", True) in client.created_rps
+    assert ("rollup_1m", "180d", 1, "sensors", False) in client.created_rps
+    assert ("rollup_1h", "INF", 1, "sensors", False) in client.created_rps
+
+    assert len(client.created_cqs) == len(ROLLUP_FIELDS) * 2
+    assert {name for name, _, _ in client.created_cqs} >= {cq_name("temps", "1m"), cq_name("temps", "1h")}
+
+def test_provision_existing_schema_is_unchanged():
+    """Provisioning twice doesn't recreate anything"""
+    client = MockInfluxDBClient(
+        retention_policies=[
+            {"name": "raw", "duration": "168h0m0s", "default": True},
+            {"name": "rollup_1m", "duration": "4320h0m0s", "default": False},
+            {"name": "rollup_1h", "duration": "0s", "default": False},
+        ],
+        continuous_queries=[{"sensors": [{"name": cq_name(m, i)} for m in ROLLUP_FIELDS for i in ("1m", "1h")]}],
+    )
+    assert provision_schema(client, "sensors")
+    assert not client.created_rps
+    assert not client.altered_rps
+    assert not client.created_cqs
+
+def test_provision_recreates_continuous_query_missing_a_field():
+    """A continuous query created before adc_raw was rolled up is replaced"""
+    old_query = ('CREATE CONTINUOUS QUERY cq_pressures_1m ON sensors BEGIN SELECT min(pressure_flt) AS pressure_flt_min, '
+                 'mean(pressure_flt) AS pressure_flt_mean, max(pressure_flt) AS pressure_flt_max '
+                 'INTO sensors.rollup_1m.pressures FROM sensors.raw.pressures GROUP BY time(1m), * END')
+    client = MockInfluxDBClient(continuous_queries=[{"sensors": [
+        {"name": cq_name("pressures", "1m"), "query": old_query},
+        {"name": cq_name("temps", "1m"), "query": "SELECT max(temp_flt) AS temp_flt_max, "
+                                                  "max(humidity_flt) AS humidity_flt_max"},
+    ]}])
+    assert provision_schema(client, "sensors")
+    assert client.dropped_cqs == [(cq_name("pressures", "1m"), "sensors")]
+    created = {name: select for name, select, _ in client.created_cqs}
+    assert 'AS "adc_raw_mean"' in created[cq_name("pressures", "1m")]
+    assert cq_name("temps", "1m") not in created
+
+def test_provision_updates_changed_duration(monkeypatch):
+    """A duration changed in the dotenv file alters the retention policy"""
+    monkeypatch.setenv("INFLUXDB_RAW_RETENTION", "14d")
+    client = MockInfluxDBClient(retention_policies=[{"name": "raw", "duration": "168h0m0s", "default": True}])
+    provision_schema(client, "sensors")
+    assert ("raw", "14d", True) in client.altered_rps
+
+def test_continuous_queries_only_in_the_measurements_database(monkeypatch):
+    """Weather rollups are only in the weather database, temps and pressures only in the sensor database"""
+    monkeypatch.setenv("SENSOR_DATABASE", "sensors")
+    monkeypatch.setenv("TEMP_SENSOR_DATABASE", "weather")
+    assert rollup_measurements("sensors") == ["temps", "pressures"]
+    assert rollup_measurements("weather") == ["weather"]
+
+    client = MockInfluxDBClient(continuous_queries=[{"sensors": [{"name": cq_name("weather", "1m")}]}])
+    assert provision_schema(client, "sensors")
+    assert {name for name, _, _ in client.created_cqs} == {
+        cq_name(measurement, interval) for measurement in ("temps", "pressures") for interval in ("1m", "1h")}
+    assert all(database == "sensors" for _, _, database in client.created_cqs)
+    assert client.dropped_cqs == [(cq_name("weather", "1m"), "sensors")]
+
+    client = MockInfluxDBClient()
+    assert provision_schema(client, "weather")
+    assert {name for name, _, _ in client.created_cqs} == {cq_name("weather", "1m"), cq_name("weather", "1h")}
+    assert '"weather"."raw"."weather"' in client.created_cqs[0][1]
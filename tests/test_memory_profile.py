@@ -0,0 +1,60 @@
+"""Tests for MemoryProfiler in memory_profile.py"""
+
+import logging
+import os
+import signal
+import tracemalloc
+import pytest
+from src.memory_profile import MemoryProfiler, rss_bytes
+
+@pytest.fixture
+def profiler(clock, tmp_path):
+    """Started profiler, stopped after the test"""
+    memory_profiler = MemoryProfiler("getTemps", report_secs=60, dump_dir=str(tmp_path), clock=clock).start()
+    yield memory_profiler
+    memory_profiler.stop()
+
+def leaky_cycle(leak):
+    """Keep about 100 KiB per call"""
+    leak.append(bytearray(100 * 1024))
+
+def test_report_every_interval(profiler, clock, caplog):
+    """A point is constructed once per report interval, with the growth and the growing site logged"""
+    leak = []
+    for _ in range(5):
+        profiler.cycle_start()
+        leaky_cycle(leak)
+        profiler.cycle_end()
+        clock.advance(5)
+    assert not profiler.construct_points("host1")
+
+    clock.advance(60)
+    with caplog.at_level(logging.INFO):
+        points = profiler.construct_points("host1")
+
+    assert len(points) == 1
+    fields = points[0]["fields"]
+    assert points[0]["measurement"] == "collector_memory"
+    assert fields["cycles"] == 5
+    assert fields["traced_growth_bytes"] >= 5 * 100 * 1024
+    assert fields["cycle_peak_kb_max"] >= 100
+    assert any("test_memory_profile.py" in record.message and "Grew" in record.message
+               for record in caplog.records)
+    assert not profiler.construct_points("host1")
+
+def test_dump_on_signal(profiler, tmp_path):
+    """SIGUSR2 dumps a snapshot at the end of the cycle"""
+    profiler.cycle_start()
+    os.kill(os.getpid(), signal.SIGUSR2)
+    assert not list(tmp_path.iterdir())
+    profiler.cycle_end()
+
+    dumps = list(tmp_path.glob("getTemps-*.tracemalloc"))
+    assert len(dumps) == 1
+    assert tracemalloc.Snapshot.load(str(dumps[0])).traces
+
+def test_rss_bytes():
+    """RSS is read from /proc on Linux"""
+    if not os.path.exists("/proc/self/statm"):
+        pytest.skip("no /proc")
+    assert rss_bytes() > 0
@@ -4,6 +4,7 @@ import json
 from pathlib import Path
 import pytest
 from src.getPressures import PressureSensorReader, NO_PSI
+from src.sensor_health import SensorHealthTracker
 
 class MockADC:
     """Fake ADC device to simulate hardware behavior."""
@@ -51,3 +52,34 @@ def test_read_channels_disabled_channel(pressures_config):
 
     results = reader.read_channels()
     assert results["channel1"] == NO_PSI
+
+def test_read_channels_health_tracker(pressures_config):
+    """Enabled channels are added to the health tracker, disabled channels aren't"""
+    tracker = SensorHealthTracker("getPressures", noise_limit=2.0, slow_secs=0.5)
+    reader = PressureSensorReader(
+        adc=MockADC({0: 10000}),
+        channels=pressures_config,
+        hostname="SandstoneHost1",
+        sensor_id="i2c:0x48",
+        sensor_type="pressure"
+    )
+
+    results = reader.read_channels(tracker)
+
+    enabled = [cfg["channel_ID"] for cfg in pressures_config.values() if cfg.get("ch_enabled") == "Enabled"]
+    assert sorted(location for location, _ in tracker.sensors) == sorted(enabled)
+    assert tracker.health(pressures_config["channel0"]["channel_ID"], "i2c:0x48")["mean"] == results["channel0"]
+
+def test_construct_points_adc_raw(pressures_config):
+    """Channels read keep their raw ADC count next to the PSI, disabled channels have none"""
+    reader = PressureSensorReader(
+        adc=MockADC({0: 10000}),
+        channels=pressures_config,
+        hostname="SandstoneHost1",
+        sensor_id="i2c:0x48",
+        sensor_type="pressure"
+    )
+
+    points = {p["tags"]["channel"]: p["fields"] for p in reader.construct_points(reader.read_channels())}
+    assert points[0]["adc_raw"] == 10000
+    assert points[1] == {"pressure_flt": NO_PSI}
@@ -0,0 +1,70 @@
+"""Tests for the failing sensor quarantine in quarantine.py"""
+
+import pytest
+from simulator import FakeW1Bus
+from src import getTemps
+from src.getTemps import write_points_to_series
+from src.quarantine import QuarantineScheduler, quarantine_from_env
+
+@pytest.fixture
+def quarantine(clock):
+    """Quarantine after 3 failures, probes after 30 seconds doubling to 100"""
+    return QuarantineScheduler(failures=3, slow_secs=1.5, backoff_secs=30, max_backoff_secs=100, clock=clock)
+
+def test_quarantine_is_opt_in(monkeypatch):
+    """Off unless W1_QUARANTINE_ENABLED is true, slow reads are well above a DS18B20 conversion"""
+    monkeypatch.delenv("W1_QUARANTINE_ENABLED", raising=False)
+    assert quarantine_from_env() is None
+    monkeypatch.setenv("W1_QUARANTINE_ENABLED", "true")
+    assert quarantine_from_env().slow_secs == 3.0
+
+def test_quarantine_after_failures_in_a_row(quarantine):
+    """A good read resets the count, three failures in a row quarantine"""
+    for ok in (False, False, True, False, False):
+        quarantine.add("28-000000000001", ok, 0.8)
+    assert quarantine.should_read("28-000000000001")
+
+    quarantine.add("28-000000000001", False, 0.8)
+    assert not quarantine.should_read("28-000000000001")
+    assert quarantine.quarantined() == ["28-000000000001"]
+
+def test_slow_reads_count_as_failures(quarantine):
+    """A read that blocks for the bus timeout quarantines even if it returned a temperature"""
+    for _ in range(3):
+        quarantine.add("28-000000000001", True, 2.5)
+    assert quarantine.quarantined() == ["28-000000000001"]
+
+def test_backoff_doubles_to_the_limit(quarantine, clock):
+    """Probes are due after 30, 60, then 100 seconds, a good probe ends the quarantine"""
+    for _ in range(3):
+        quarantine.add("28-000000000001", False, 0.8)
+
+    for backoff_secs in (30, 60, 100, 100):
+        clock.advance(backoff_secs - 1)
+        assert not quarantine.should_read("28-000000000001")
+        clock.advance(1)
+        assert quarantine.should_read("28-000000000001")
+        quarantine.add("28-000000000001", False, 0.8)
+
+    clock.advance(100)
+    quarantine.add("28-000000000001", True, 0.8)
+    assert quarantine.should_read("28-000000000001")
+    assert not quarantine.quarantined()
+
+def test_quarantined_sensor_is_not_read(tmp_path, monkeypatch, quarantine, clock):
+    """A disconnected sensor is reported OFF without being read, and comes back after a good probe"""
+    bus = FakeW1Bus(tmp_path / "devices", 3, seed=1)
+    monkeypatch.setattr(getTemps, "W1_DEVICES_PATH", bus.devices_path)
+    monkeypatch.setattr(getTemps, "open", bus.open, raising=False)
+    rooms = bus.room_config("SimHost")["SimHost"]
+    saved_temp = bus.temps_milli_c.pop(bus.sensor_ids[0])
+
+    for _ in range(5):
+        points = write_points_to_series(rooms, "SimHost", quarantine=quarantine)
+        assert [p["tags"]["status"] for p in points] == ["OFF", "On", "On"]
+    assert bus.reads == 3 * 3 + 2 * 2
+
+    bus.temps_milli_c[bus.sensor_ids[0]] = saved_temp
+    clock.advance(30)
+    points = write_points_to_series(rooms, "SimHost", quarantine=quarantine)
+    assert [p["tags"]["status"] for p in points] == ["On", "On", "On"]
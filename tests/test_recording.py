@@ -0,0 +1,102 @@
+"""Tests for raw reading capture in recording.py and replay in simulator/replay.py"""
+
+import os
+from simulator import FakeW1Bus, FakeADS1115, FakeSMBus
+from simulator.replay import Replayer
+from src.recording import (KIND_ADC, KIND_SHT30, KIND_W1, KIND_WEATHER, Recorder, RecordingADC, RecordingSMBus,
+                           error_from_text, read_recording, recording_open)
+from .conftest import FakeClock
+
+RECORDED_AT = 1736899200.0  # 2025-01-15
+
+def test_recorder_round_trip(tmp_path):
+    """Every kind comes back as recorded, errors as text"""
+    recorder = Recorder(str(tmp_path), "test", clock=FakeClock(RECORDED_AT))
+    w1_text = FakeW1Bus.w1_slave_text(18687)
+    weather = {"main": {"temp": 20.5}, "list": [{"dt": i, "main": {"temp": 20.0 + i}} for i in range(40)]}
+
+    recorder.record(KIND_W1, "28-000000000001", w1_text, 0.75)
+    recorder.record(KIND_W1, "28-000000000002", "garbage\n", 0.1)
+    recorder.record(KIND_ADC, "0:1", 10000, 0.002)
+    recorder.record(KIND_SHT30, "0x44", [99, 20, 51, 204, 204, 134], 0.02)
+    recorder.record(KIND_WEATHER, "sandstone", weather, 0.4)
+    recorder.record(KIND_W1, "28-000000000001", None, 0.01, FileNotFoundError("No such file"))
+    recorder.close()
+
+    readings = list(read_recording(tmp_path / "test-20250115.rec"))
+    assert [(r.kind, r.key, r.value) for r in readings[:5]] == [
+        (KIND_W1, "28-000000000001", w1_text),
+        (KIND_W1, "28-000000000002", "garbage\n"),
+        (KIND_ADC, "0:1", 10000),
+        (KIND_SHT30, "0x44", [99, 20, 51, 204, 204, 134]),
+        (KIND_WEATHER, "sandstone", weather),
+    ]
+    assert readings[0].latency == 0.75
+    assert readings[0].timestamp == RECORDED_AT
+    assert readings[5].error == "FileNotFoundError: No such file"
+    assert isinstance(error_from_text(readings[5].error), FileNotFoundError)
+
+def test_recording_is_compact_and_rolls_daily(tmp_path):
+    """A well formed w1_slave reading takes the header and 15 bytes, a new UTC day opens a new file"""
+    clock = FakeClock(RECORDED_AT)
+    recorder = Recorder(str(tmp_path), "getTemps", clock=clock)
+    recorder.record(KIND_W1, "28-000000000001", FakeW1Bus.w1_slave_text(18687), 0.75)
+    size = os.path.getsize(tmp_path / "getTemps-20250115.rec")
+    recorder.record(KIND_W1, "28-000000000001", FakeW1Bus.w1_slave_text(18750), 0.75)
+    assert os.path.getsize(tmp_path / "getTemps-20250115.rec") - size == 34
+
+    clock.advance(86400)
+    recorder.record(KIND_W1, "28-000000000001", FakeW1Bus.w1_slave_text(18750), 0.75)
+    recorder.close()
+    assert [r.key for r in read_recording(tmp_path / "getTemps-20250116.rec")] == ["28-000000000001"]
+
+def test_truncated_recording_ends_cleanly(tmp_path):
+    """A record cut short by a crash or power cut is dropped, the ones before it are read"""
+    recorder = Recorder(str(tmp_path), "test", clock=FakeClock(RECORDED_AT))
+    for count in (100, 200, 300):
+        recorder.record(KIND_ADC, "0:1", count, 0.002)
+    recorder.close()
+
+    path = tmp_path / "test-20250115.rec"
+    with open(path, "r+b") as recording:
+        recording.truncate(os.path.getsize(path) - 3)
+    assert [r.value for r in read_recording(path)] == [100, 200]
+
+def test_recording_proxies(tmp_path):
+    """w1_slave reads, ADC counts and SHT30 blocks pass through unchanged and are recorded"""
+    bus = FakeW1Bus(tmp_path / "devices", 1, seed=1)
+    recorder = Recorder(str(tmp_path / "rec"), "test", clock=FakeClock(RECORDED_AT))
+    path = f"{bus.devices_path}{bus.sensor_ids[0]}/w1_slave"
+
+    with recording_open(recorder)(path, "r", encoding="utf-8") as w1_slave:
+        assert w1_slave.read() == FakeW1Bus.w1_slave_text(bus.temps_milli_c[bus.sensor_ids[0]])
+    adc = RecordingADC(FakeADS1115({0: 10000}, seed=1), recorder)
+    count = adc.read_adc(0, gain=2)
+    assert adc.reads == 1
+    block = RecordingSMBus(FakeSMBus(), recorder).read_i2c_block_data(0x44, 0x00, 6)
+    recorder.close()
+
+    readings = list(read_recording(tmp_path / "rec" / "test-20250115.rec"))
+    assert [(r.key, r.value) for r in readings[1:]] == [("0:2", count), ("0x44", block)]
+    assert readings[0].key == bus.sensor_ids[0]
+
+def test_replay_through_collector_parsers(tmp_path):
+    """Recorded w1 and ADC readings replay into the same points the collectors write"""
+    recorder = Recorder(str(tmp_path), "test", clock=FakeClock(RECORDED_AT))
+    recorder.record(KIND_W1, "28-000000000001", FakeW1Bus.w1_slave_text(18687), 0.75)
+    recorder.record(KIND_W1, "28-000000000002", "garbage\n", 0.75)
+    for _ in range(2):
+        recorder.record(KIND_ADC, "0:1", 10000, 0.002)
+        recorder.record(KIND_ADC, "1:1", None, 0.002, OSError("Remote I/O error"))
+    recorder.close()
+
+    sleeps = []
+    replayer = Replayer(speed=0, collect_points=True, sleep=sleeps.append)
+    results = {result["kind"]: result for result in replayer.run(tmp_path / "test-20250115.rec")}
+
+    assert not sleeps
+    assert (results["w1"]["readings"], results["w1"]["failed"]) == (2, 1)
+    assert (results["adc"]["readings"], results["adc"]["errors"], results["adc"]["failed"]) == (4, 2, 0)
+    temps = [p["fields"]["temp_flt"] for p in replayer.points if p["measurement"] == "temps"]
+    assert temps[0] == round(18.687 * 1.8 + 32, 1)
+    assert sum(p["measurement"] == "pressures" for p in replayer.points) == 4  # a point per channel per cycle
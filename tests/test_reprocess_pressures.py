@@ -0,0 +1,120 @@
+"""Tests for recomputing pressure history in reprocess_pressures.py"""
+
+from datetime import datetime, timezone
+import pytest
+from src.reprocess_pressures import ROLLUP_COLUMNS, channel_calibrations, channel_select, reprocess
+
+pytest.importorskip("numpy")
+
+CONFIG = {"SandstoneHost1": {
+    "channel0": {"channel_ID": "cliffLine", "channel_name": "Cliff Line", "channel": 0,
+                 "ch_minADC": 4000, "ch_maxADC": 32000, "ch_minPSI": 0, "ch_maxPSI": 140},
+    "channel1": {"channel_ID": "manifold", "channel_name": "Manifold", "channel": 1,
+                 "ch_minADC": 4000, "ch_maxADC": 32760, "ch_minPSI": 0, "ch_maxPSI": 100},
+}}
+RAW_SERIES = {"columns": ["time", "adc_raw", "pressure_flt"],
+              "values": [[1735732800000000001, 4000, 0.0],
+                         [1735732805000000002, None, -999.9],
+                         [1735732810000000003, 18000, 50.0]]}
+ROLLUP_SERIES = {"columns": ["time", "adc_raw_min", "adc_raw_mean", "adc_raw_max",
+                             "pressure_flt_min", "pressure_flt_mean", "pressure_flt_max"],
+                 "values": [[1735732800000000000, 4000, 11000, 18000, 0.0, 25.0, 50.0],
+                            [1735732860000000000, None, None, None, 1.0, 2.0, 3.0]]}
+TAGS = {"channel": "0", "hostname": "SandstoneHost1", "id": "i2c:0x48", "location": "cliffLine",
+        "title": "Cliff Line Pressure", "type": "ADS1115", "extra": ""}
+
+class FakeResult:
+    """ResultSet with the raw JSON of a query"""
+    def __init__(self, raw):
+        self.raw = raw
+
+class FakeClient:
+    """InfluxDBClient returning one series for the first chunk, recording writes"""
+    def __init__(self, series=None):
+        self.series = series or RAW_SERIES
+        self.queries = []
+        self.writes = []
+
+    def query(self, query, database=None, epoch=None):
+        """Return the cliffLine series for the first query"""
+        del database, epoch
+        self.queries.append(query)
+        if len(self.queries) > 1:
+            return FakeResult({})
+        return FakeResult({"series": [{"name": "pressures", "tags": TAGS, **self.series}]})
+
+    def write_points(self, points, **kwargs):
+        """Record the write"""
+        self.writes.append((points, kwargs))
+
+def test_channel_calibrations_filter():
+    """Only the chosen channels of the chosen hosts"""
+    assert channel_calibrations(CONFIG, channel_ids=["manifold"]) == [
+        ("SandstoneHost1", CONFIG["SandstoneHost1"]["channel1"])]
+    assert not channel_calibrations(CONFIG, hostnames=["OtherHost"])
+
+def test_channel_select():
+    """One channel of one host, grouped by every tag so series are written back as they are"""
+    assert channel_select("sensors", "autogen", "SandstoneHost1", CONFIG["SandstoneHost1"]["channel0"],
+                          ("2025-01-01T00:00:00Z", "2025-01-02T00:00:00Z")) == (
+        'SELECT "adc_raw", "pressure_flt" FROM "sensors"."autogen"."pressures" '
+        "WHERE \"hostname\" = 'SandstoneHost1' AND \"location\" = 'cliffLine' AND \"channel\" = '0' "
+        "AND time >= '2025-01-01T00:00:00Z' AND time < '2025-01-02T00:00:00Z' GROUP BY *")
+
+def test_reprocess_rewrites_pressure_flt():
+    """Readings with adc_raw get the new PSI at the same time and tags, OFF readings are left alone"""
+    client = FakeClient()
+    calibrations = channel_calibrations(CONFIG, channel_ids=["cliffLine"])
+    summary = reprocess(client, "sensors", "autogen", calibrations, datetime(2025, 1, 1, tzinfo=timezone.utc),
+                        datetime(2025, 1, 3, tzinfo=timezone.utc), chunk_hours=24)
+
+    assert len(client.queries) == 2
+    lines, kwargs = client.writes[0]
+    prefix = ("pressures,channel=0,hostname=SandstoneHost1,id=i2c:0x48,location=cliffLine,"
+              "title=Cliff\\ Line\\ Pressure,type=ADS1115")
+    assert lines == [f"{prefix} pressure_flt=0.0 1735732800000000001",
+                     f"{prefix} pressure_flt=70.0 1735732810000000003"]
+    assert kwargs["time_precision"] == "n"
+    assert kwargs["retention_policy"] == "autogen"
+    assert summary == {"cliffLine": (2, 20.0)}
+
+def test_reprocess_dry_run_writes_nothing():
+    """A dry run only reports"""
+    client = FakeClient()
+    summary = reprocess(client, "sensors", "autogen", channel_calibrations(CONFIG, channel_ids=["cliffLine"]),
+                        datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 2, tzinfo=timezone.utc),
+                        chunk_hours=24, dry_run=True)
+    assert not client.writes
+    assert summary == {"cliffLine": (2, 20.0)}
+
+def test_channel_select_rollup_fields():
+    """Rollups are read as their min, mean and max fields"""
+    query = channel_select("sensors", "rollup_1m", "SandstoneHost1", CONFIG["SandstoneHost1"]["channel0"],
+                           ("2025-01-01T00:00:00Z", "2025-01-02T00:00:00Z"), ROLLUP_COLUMNS)
+    assert query.startswith('SELECT "adc_raw_min", "adc_raw_mean", "adc_raw_max", "pressure_flt_min", '
+                            '"pressure_flt_mean", "pressure_flt_max" FROM "sensors"."rollup_1m"."pressures" ')
+
+@pytest.mark.parametrize("rp", ["rollup_1m", "rollup_1h"])
+def test_reprocess_rollups_from_adc_rollups(rp):
+    """pressure_flt_min, _mean and _max are recomputed from the adc_raw rollups, points without them are left alone"""
+    client = FakeClient(ROLLUP_SERIES)
+    summary = reprocess(client, "sensors", rp, channel_calibrations(CONFIG, channel_ids=["cliffLine"]),
+                        datetime(2025, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 2, tzinfo=timezone.utc),
+                        chunk_hours=24)
+
+    assert '"adc_raw_mean"' in client.queries[0]
+    lines, kwargs = client.writes[0]
+    assert lines == [("pressures,channel=0,hostname=SandstoneHost1,id=i2c:0x48,location=cliffLine,"
+                      "title=Cliff\\ Line\\ Pressure,type=ADS1115 "
+                      "pressure_flt_min=0.0,pressure_flt_mean=35.0,pressure_flt_max=70.0 1735732800000000000")]
+    assert kwargs["retention_policy"] == rp
+    assert summary == {"cliffLine": (1, 10.0)}
+
+def test_reprocess_rollups_negative_slope_swaps_min_max():
+    """With a falling calibration the lowest ADC count is the highest PSI"""
+    ch_cfg = dict(CONFIG["SandstoneHost1"]["channel0"], ch_minPSI=140, ch_maxPSI=0)
+    client = FakeClient(ROLLUP_SERIES)
+    reprocess(client, "sensors", "rollup_1m", [("SandstoneHost1", ch_cfg)], datetime(2025, 1, 1, tzinfo=timezone.utc),
+              datetime(2025, 1, 2, tzinfo=timezone.utc), chunk_hours=24)
+    assert client.writes[0][0][0].endswith("pressure_flt_min=70.0,pressure_flt_mean=105.0,pressure_flt_max=140.0 "
+                                           "1735732800000000000")
@@ -0,0 +1,47 @@
+"""Tests for RingBuffer and TimeSeriesWindow in rolling.py"""
+
+import pytest
+from src.rolling import RingBuffer, TimeSeriesWindow
+
+def test_ring_buffer_wraps():
+    """Oldest values are overwritten once the buffer is full"""
+    ring = RingBuffer(3)
+    for value in (1, 2, 3, 4, 5):
+        ring.append(value)
+    assert list(ring) == [3.0, 4.0, 5.0]
+    assert ring.oldest() == 3.0
+    assert ring.newest() == 5.0
+    assert len(ring) == 3
+    assert ring.capacity == 3
+
+def test_ring_buffer_empty():
+    """Empty buffers raise on newest/oldest"""
+    ring = RingBuffer(2)
+    with pytest.raises(IndexError):
+        ring.newest()
+    ring.append(1)
+    ring.clear()
+    assert not list(ring)
+
+def test_slope():
+    """Slope is in value units per second"""
+    window = TimeSeriesWindow(10)
+    for t in range(5):
+        window.add(1000.0 + t * 5, 40.0 - t * 0.5)
+    assert window.slope() == pytest.approx(-0.1)
+    assert window.latest() == 38.0
+
+def test_slope_needs_two_samples():
+    """No slope with a single sample or no time span"""
+    window = TimeSeriesWindow(10)
+    window.add(1000.0, 40.0)
+    assert window.slope() is None
+    window.add(1000.0, 41.0)
+    assert window.slope() is None
+
+def test_slope_of_a_full_window_matches_the_last_samples():
+    """Evicted samples leave the running sums, the slope is of what the window holds"""
+    window = TimeSeriesWindow(4)
+    for t in range(25):
+        window.add(1735732800.0 + t * 30, 40.0 + (t * t if t < 20 else -t * 0.3))
+    assert window.slope() == pytest.approx(-0.01)
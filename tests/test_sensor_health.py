@@ -0,0 +1,78 @@
+"""Tests for SensorHealthTracker in sensor_health.py"""
+
+import random
+import pytest
+from src.sensor_health import SensorHealthTracker
+
+@pytest.fixture
+def tracker(clock):
+    """Tracker with a small window, reporting every minute"""
+    return SensorHealthTracker("getTemps", noise_limit=1.0, slow_secs=2.0, window_size=20,
+                               report_secs=60, stuck_secs=3600, clock=clock)
+
+def feed(tracker, clock, values, latency_secs=0.75, every_secs=5):
+    """Add readings for one sensor"""
+    for value in values:
+        tracker.add("stageWall", "28-1", value, latency_secs)
+        clock.advance(every_secs)
+
+def test_healthy_sensor(tracker, clock):
+    """A slowly cooling sensor isn't flagged"""
+    feed(tracker, clock, [40.0 - i * 0.1 for i in range(30)])
+    fields = tracker.health("stageWall", "28-1")
+
+    assert fields["samples"] == 20
+    assert fields["off_ratio"] == 0
+    assert fields["slope_per_hr"] == pytest.approx(-72.0)
+    assert fields["noise"] < 0.1
+    assert fields["latency_ms_mean"] == pytest.approx(750)
+    assert not fields["suspect"]
+
+def test_stuck_sensor(tracker, clock):
+    """The same reading for longer than stuck_secs is flagged, however small the window"""
+    feed(tracker, clock, [40.0] + [41.5] * 800)
+    fields = tracker.health("stageWall", "28-1")
+
+    assert fields["run_length"] == 800
+    assert fields["run_secs"] == pytest.approx(799 * 5)
+    assert fields["variance"] == 0
+    assert fields["stuck"] and fields["suspect"]
+
+def test_noisy_sensor(tracker, clock):
+    """Jumping readings are noisy, a steady ramp with the same spread isn't"""
+    rng = random.Random(1)
+    feed(tracker, clock, [40.0 + rng.uniform(-5, 5) for _ in range(20)])
+    assert tracker.health("stageWall", "28-1")["noisy"]
+
+    tracker.add("ramp", "28-2", 0.0)
+    for i in range(20):
+        tracker.add("ramp", "28-2", i * 0.5)
+    fields = tracker.health("ramp", "28-2")
+    assert fields["variance"] > 1.0
+    assert not fields["noisy"]
+
+def test_flapping_and_offline(tracker, clock):
+    """OFF readings count towards the OFF ratio and flaps"""
+    feed(tracker, clock, [40.0, None] * 10)
+    fields = tracker.health("stageWall", "28-1")
+
+    assert fields["off_ratio"] == 0.5
+    assert fields["flaps"] == 19
+    assert fields["flapping"] and fields["offline"]
+
+def test_slow_reads(tracker, clock):
+    """Mean read latency above slow_secs is flagged"""
+    feed(tracker, clock, [40.0, 40.1] * 5, latency_secs=2.5)
+    assert tracker.health("stageWall", "28-1")["slow"]
+
+def test_points_every_report_interval(tracker, clock):
+    """sensor_health points are only constructed once per report interval"""
+    feed(tracker, clock, [40.0, 40.1] * 5, every_secs=1)
+    assert not tracker.construct_points("host1")
+
+    clock.advance(60)
+    points = tracker.construct_points("host1")
+    assert len(points) == 1
+    assert points[0]["measurement"] == "sensor_health"
+    assert points[0]["tags"] == {"location": "stageWall", "id": "28-1", "source": "getTemps", "hostname": "host1"}
+    assert not tracker.construct_points("host1")
@@ -0,0 +1,137 @@
+"""Tests for the persistent sensor registry in sensor_registry.py"""
+
+import json
+import os
+import pytest
+from src import getTemps
+from src.sensor_registry import SensorRegistry, unassigned_location
+
+CONFIG = {"SandstoneHost1": {
+    "pumpHouse": {"id": "28-000000000001", "title": "Pump House"},
+    "shed": {"id": "28-000000000002", "title": "Shed"},
+}}
+
+@pytest.fixture
+def sample_config():
+    """Open test getTemps.json"""
+    with open(os.path.join("tests", "fixtures", "getTemps.json"), encoding="utf-8") as config_file:
+        return json.load(config_file)
+
+@pytest.fixture
+def registry_path(tmp_path):
+    """Registry file in a temporary directory"""
+    return str(tmp_path / "sensor_registry.json")
+
+@pytest.fixture
+def registry(registry_path, clock):
+    """Registry of SandstoneHost1 with the config loaded"""
+    registry = SensorRegistry(registry_path, "SandstoneHost1", clock).load()
+    registry.set_config(CONFIG)
+    return registry
+
+def test_unassigned_location_uses_serial_number():
+    """The family code is dropped, the serial number stays"""
+    assert unassigned_location("28-000000833db4") == "Unassigned_000000833db4"
+
+def test_unassigned_keys_are_stable(registry):
+    """Adding or removing a sensor doesn't rename the others"""
+    rooms = registry.update(["28-000000000001", "28-000000000011", "28-000000000012"])
+    assert list(rooms) == ["pumpHouse", "shed", "Unassigned_000000000011", "Unassigned_000000000012"]
+
+    rooms = registry.update(["28-000000000001", "28-000000000012", "28-000000000010"])
+    assert list(rooms) == ["pumpHouse", "shed", "Unassigned_000000000012", "Unassigned_000000000010"]
+    assert rooms["Unassigned_000000000010"] == {"id": "28-000000000010", "title": "Untitled"}
+
+def test_map_is_only_rebuilt_on_change(registry, registry_path, clock):
+    """The same map comes back and nothing is written while the bus doesn't change"""
+    rooms = registry.update(["28-000000000001", "28-000000000011"])
+    with open(registry_path, encoding="utf-8") as registry_file:
+        saved = registry_file.read()
+    clock.advance(60)
+    assert registry.update(["28-000000000011", "28-000000000001"]) is rooms
+    with open(registry_path, encoding="utf-8") as registry_file:
+        assert registry_file.read() == saved
+    assert registry.update(["28-000000000001"]) is not rooms
+
+def test_detached_sensor_last_seen(registry, registry_path, clock):
+    """A detached sensor keeps its record with the time it was last seen"""
+    registry.update(["28-000000000001", "28-000000000011"])
+    clock.advance(60)
+    registry.update(["28-000000000001"])
+    with open(registry_path, encoding="utf-8") as registry_file:
+        saved = json.load(registry_file)
+    assert saved["28-000000000011"] == {"location": "Unassigned_000000000011",
+                                        "first_seen": 1735732800.0, "last_seen": 1735732860.0}
+    assert saved["28-000000000001"]["last_seen"] == 1735732860.0
+
+def test_registry_survives_restart(registry, registry_path, clock):
+    """A new registry loads first seen times from the file"""
+    registry.update(["28-000000000011"])
+    clock.advance(3600)
+    restarted = SensorRegistry(registry_path, "SandstoneHost1", clock).load()
+    restarted.set_config(CONFIG)
+    restarted.update(["28-000000000011"])
+    assert restarted.records["28-000000000011"].first_seen == 1735732800.0
+
+def test_saved_location_is_kept(registry_path, clock):
+    """A sensor in the registry file keeps its saved location, only new sensors get one from their id"""
+    with open(registry_path, "w", encoding="utf-8") as registry_file:
+        json.dump({"28-000000000011": {"location": "Unassigned_3", "first_seen": 1.0, "last_seen": 2.0},
+                   "28-000000000001": {"location": "pumpHouse", "first_seen": 1.0, "last_seen": 2.0}}, registry_file)
+    registry = SensorRegistry(registry_path, "SandstoneHost1", clock).load()
+    assert registry.records["28-000000000001"].location == "pumpHouse"
+
+    registry.set_config(CONFIG)
+    rooms = registry.update(["28-000000000011", "28-000000000012"])
+    assert rooms["Unassigned_3"] == {"id": "28-000000000011", "title": "Untitled"}
+    assert rooms["Unassigned_000000000012"] == {"id": "28-000000000012", "title": "Untitled"}
+    assert rooms["pumpHouse"] == CONFIG["SandstoneHost1"]["pumpHouse"]
+
+def test_config_change_reassigns(registry):
+    """A sensor added to the config file moves from its unassigned location to its room"""
+    registry.update(["28-000000000001", "28-000000000011"])
+    config = json.loads(json.dumps(CONFIG))
+    config["SandstoneHost1"]["office"] = {"id": "28-000000000011", "title": "Office"}
+    del config["SandstoneHost1"]["shed"]
+    registry.set_config(config)
+    rooms = registry.update(["28-000000000001", "28-000000000011", "28-000000000002"])
+    assert rooms == {"pumpHouse": CONFIG["SandstoneHost1"]["pumpHouse"],
+                     "office": {"id": "28-000000000011", "title": "Office"},
+                     "Unassigned_000000000002": {"id": "28-000000000002", "title": "Untitled"}}
+
+def test_unreadable_file_starts_empty(registry_path, clock):
+    """A corrupt registry file is not fatal"""
+    with open(registry_path, "w", encoding="utf-8") as registry_file:
+        registry_file.write("{not json")
+    registry = SensorRegistry(registry_path, "SandstoneHost1", clock).load()
+    assert not registry.records
+
+def test_config_file_assigned_sensors_only(sample_config, clock):
+    """With nothing on the bus the map is this host's rooms from getTemps.json"""
+    registry = SensorRegistry(None, "SandstoneHost3", clock)
+    registry.set_config(sample_config)
+    rooms = registry.update([])
+    assert {room["id"] for room in rooms.values()} == {"28-000000000007", "28-000000000008", "28-000000000009"}
+    assert {room["title"] for room in rooms.values()} == {"Room 7", "Room 8", "Room 9"}
+
+def test_list_attached_sensors_filters_prefix(monkeypatch):
+    """Only temperature sensor ids are listed from the bus"""
+    monkeypatch.setattr(os, "listdir", lambda path: ["28-000000000008", "w1_bus_master1", "28-000000000010",
+                                                     "3b-000000000001"])
+    assert getTemps.list_attached_sensors() == ["28-000000000008", "28-000000000010"]
+
+def test_config_file_rooms_and_attached_sensors(sample_config, clock):
+    """
+    Only this host's rooms from getTemps.json, plus its attached sensors that aren't in it.
+    Assigned sensors missing from the bus stay in the map.
+    """
+    registry = SensorRegistry(None, "SandstoneHost3", clock)
+    registry.set_config(sample_config)
+    rooms = registry.update(["28-000000000008", "28-000000000009", "28-000000000010", "28-000000000011"])
+    assert {location: room["title"] for location, room in rooms.items()} == {
+        "room7": "Room 7", "room8": "Room 8", "room9": "Room 9",
+        "Unassigned_000000000010": "Untitled", "Unassigned_000000000011": "Untitled"}
+    assert rooms["room7"]["id"] == "28-000000000007"
+    assert not registry.records["28-000000000007"].attached
+    for sensor_id in ("28-000000000010", "28-000000000011"):
+        assert rooms[unassigned_location(sensor_id)] == {"id": sensor_id, "title": "Untitled"}
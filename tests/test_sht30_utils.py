@@ -0,0 +1,30 @@
+"""Tests for SHT30Utils in getSHT30.py"""
+
+import pytest
+from src.getSHT30 import SHT30Utils, SENSOR_TYPE
+
+def test_convert():
+    """Block data converts to Fahrenheit and relative humidity"""
+    # raw temp 0x6666 -> 25.0 C -> 77.0 F, raw humidity 0x8000 -> 50.0 %
+    temp, humidity = SHT30Utils.convert([0x66, 0x66, 0x93, 0x80, 0x00, 0xA2])
+    assert temp == pytest.approx(77.0, abs=0.01)
+    assert humidity == pytest.approx(50.0, abs=0.01)
+
+def test_convert_extremes():
+    """Raw 0 and 0xFFFF map to the ends of the sensor range"""
+    temp, humidity = SHT30Utils.convert([0x00, 0x00, 0x81, 0x00, 0x00, 0x81])
+    assert temp == pytest.approx(-49.0)
+    assert humidity == 0.0
+
+    temp, humidity = SHT30Utils.convert([0xFF, 0xFF, 0xAC, 0xFF, 0xFF, 0xAC])
+    assert temp == pytest.approx(266.0)
+    assert humidity == pytest.approx(100.0)
+
+def test_construct_data_point():
+    """Returns a temps point with humidity"""
+    point = SHT30Utils.construct_data_point("shedSHT30", "i2c:0x44", "Shed SHT30", "host1", 30.5, 75.0)
+    assert point["measurement"] == "temps"
+    assert point["tags"]["type"] == SENSOR_TYPE
+    assert point["tags"]["location"] == "shedSHT30"
+    assert point["tags"]["status"] == "ON"
+    assert point["fields"] == {"temp_flt": 30.5, "humidity_flt": 75.0}
@@ -0,0 +1,129 @@
+"""Tests for the hardware and InfluxDB simulators"""
+
+import pytest
+from influxdb import InfluxDBClient
+from simulator import FakeW1Bus, FakeADS1115, FakeSMBus, InfluxSink
+from simulator import loadgen, soak
+from src import getTemps, getSHT30, getWeather
+from src.getTemps import TempUtils, list_attached_sensors, write_points_to_series
+from src.sensor_registry import SensorRegistry
+
+@pytest.fixture
+def w1_bus(tmp_path, monkeypatch):
+    """Fake 1-Wire bus with 5 sensors, wired into getTemps"""
+    bus = FakeW1Bus(tmp_path / "devices", 5, seed=1)
+    monkeypatch.setattr(getTemps, "W1_DEVICES_PATH", bus.devices_path)
+    return bus
+
+def test_fake_w1_tree_is_readable(w1_bus):
+    """w1_slave files on disk parse with TempUtils"""
+    sensor_id = w1_bus.sensor_ids[0]
+    temp = TempUtils.read_temp(f"{w1_bus.devices_path}{sensor_id}/w1_slave")
+    assert temp == round(w1_bus.temps_milli_c[sensor_id] / 1000 * 1.8 + 32, 1)
+
+def test_fake_w1_sensors_are_discovered(w1_bus):
+    """The sensor registry finds the simulated sensors as unassigned"""
+    registry = SensorRegistry(None, "SimHost")
+    registry.set_config(w1_bus.room_config("SimHost", assigned=2))
+    rooms = registry.update(list_attached_sensors())
+    assert len(rooms) == 5
+    assert sum(1 for key in rooms if key.startswith("Unassigned")) == 3
+
+def test_fake_w1_fault_injection(w1_bus, monkeypatch):
+    """Missing files turn into OFF points, 85 C resets come through as readings"""
+    w1_bus.missing_rate = 1.0
+    monkeypatch.setattr(getTemps, "open", w1_bus.open, raising=False)
+    points = write_points_to_series(w1_bus.room_config("SimHost")["SimHost"], "SimHost")
+    assert {p["tags"]["status"] for p in points} == {"OFF"}
+
+    w1_bus.missing_rate = 0.0
+    w1_bus.reset_rate = 1.0
+    points = write_points_to_series(w1_bus.room_config("SimHost")["SimHost"], "SimHost")
+    assert {p["fields"]["temp_flt"] for p in points} == {185.0}
+
+def test_fake_ads1115():
+    """Reads return values near the configured count"""
+    adc = FakeADS1115({0: 10000}, data_rate=860, seed=1)
+    assert abs(adc.read_adc(0, gain=1) - 10000) <= 20
+    assert adc.reads == 1
+
+def test_fake_smbus_sht30_block():
+    """SHT30 block converts back to the simulated temperature and humidity"""
+    bus = FakeSMBus(temp_c=2.0, humidity=80.0)
+    block = bus.read_i2c_block_data(0x44, 0x00, 6)
+    raw_temp = block[0] << 8 | block[1]
+    raw_hum = block[3] << 8 | block[4]
+    assert -45 + 175 * raw_temp / 65535 == pytest.approx(2.0, abs=0.01)
+    assert 100 * raw_hum / 65535 == pytest.approx(80.0, abs=0.01)
+
+def test_influx_sink_records_writes():
+    """InfluxDBClient writes land in the sink"""
+    with InfluxSink() as sink:
+        client = InfluxDBClient("127.0.0.1", sink.port, database="sim")
+        client.create_database("sim")
+        assert {"name": "sim"} in client.get_list_database()
+        client.write_points([{"measurement": "temps", "tags": {"location": "a"}, "fields": {"temp_flt": 1.0}}])
+        client.close()
+
+        assert sink.point_count() == 1
+        assert sink.writes[0]["database"] == "sim"
+        assert sink.writes[0]["lines"][0].startswith("temps,location=a temp_flt=1.0")
+
+def test_loadgen_runs():
+    """The load generator runs both collectors and reports every size"""
+    results = loadgen.main(["--sensors", "3", "6", "--cycles", "2"])
+    assert [(r["collector"], r["sensors"]) for r in results] == [
+        ("getTemps", 3), ("getTemps", 6), ("getPressures", 3), ("getPressures", 6)]
+    assert all(r["points_per_sec"] > 0 for r in results)
+
+@pytest.mark.parametrize("collector, hours", [("getTemps", 1), ("getPressures", 1), ("getSHT30", 1),
+                                              ("getWeather", 24)])
+def test_soak_runs_every_collector(collector, hours):
+    """Simulated hours of cycles write points without growing memory after warm up"""
+    result = soak.soak(collector, days=hours / 24, sensors=4)
+    assert result["cycles"] == hours * 3600 // soak.COLLECTORS[collector][1]
+    assert result["points"] > 0
+    assert result["memory_growth"] < 1000
+
+def test_soak_clock_runs_the_cycle(tmp_path):
+    """run_cycle reads through the simulated clock, the SHT30 measurement wait costs no wall time"""
+    clock = soak.SimClock()
+    writer = soak.MemoryWriter()
+    with soak.sht30_cycle(clock, writer, tmp_path, 1, 1) as (state, _):
+        series = getSHT30.run_cycle(state)
+    assert clock.now > soak.START
+    assert writer.last_series == series
+    assert series[0]["tags"]["location"] == "simSHT30"
+
+class BrokenSMBus:
+    """SMBus failing with an error the collector doesn't expect"""
+    def write_i2c_block_data(self, *args):
+        """Fail"""
+        raise RuntimeError("bus driver bug")
+
+    def read_i2c_block_data(self, *args):
+        """Fail"""
+        raise RuntimeError("bus driver bug")
+
+def test_sht30_cycle_survives_unexpected_errors(tmp_path):
+    """An unexpected read error is logged and the collector keeps sampling"""
+    clock = soak.SimClock()
+    with soak.sht30_cycle(clock, soak.MemoryWriter(), tmp_path, 1, 1) as (state, _):
+        state.hardware = BrokenSMBus()
+        assert getSHT30.run_cycle(state) == []
+
+def test_weather_cycle_falls_back_to_the_cache(tmp_path, monkeypatch):
+    """Failed fetches are written from the cached response until it is too old"""
+    clock = soak.SimClock()
+    writer = soak.MemoryWriter()
+    with soak.weather_cycle(clock, writer, tmp_path, 1, 1) as (state, _):
+        fetched = getWeather.run_cycle(state)
+        monkeypatch.setattr(state.hardware, "fetch_all", lambda: {"SimLocation1": None})
+
+        clock.sleep(3600)
+        series = getWeather.run_cycle(state)
+        assert [point["measurement"] for point in series] == ["weather"]
+        assert series[0]["fields"]["humidity"] == fetched[0]["fields"]["humidity"]
+
+        clock.sleep(3 * 3600)
+        assert getWeather.run_cycle(state) is None
@@ -0,0 +1,91 @@
+"""Tests for the systemd watchdog helpers in watchdog.py"""
+
+import socket
+import threading
+import pytest
+from src.watchdog import LoopWatchdog, PhaseTimeout, sd_notify
+
+class MockNotify:
+    """Record sd_notify states"""
+
+    def __init__(self):
+        self.states = []
+
+    def __call__(self, state):
+        self.states.append(state)
+        return True
+
+@pytest.fixture
+def notify():
+    """Recorded notifications"""
+    return MockNotify()
+
+def test_sd_notify_sends_to_socket(tmp_path, monkeypatch):
+    """States are sent as datagrams to NOTIFY_SOCKET"""
+    socket_path = str(tmp_path / "notify.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as systemd_socket:
+        systemd_socket.bind(socket_path)
+        monkeypatch.setenv("NOTIFY_SOCKET", socket_path)
+        assert sd_notify("READY=1")
+        assert systemd_socket.recv(64) == b"READY=1"
+
+def test_sd_notify_without_systemd(monkeypatch):
+    """Without NOTIFY_SOCKET nothing is sent"""
+    monkeypatch.delenv("NOTIFY_SOCKET", raising=False)
+    assert not sd_notify("WATCHDOG=1")
+
+def test_healthy_cycle_pings(notify):
+    """READY is sent once, WATCHDOG after every healthy cycle"""
+    watchdog = LoopWatchdog(5, {"read": 1}, notify=notify)
+    for _ in range(2):
+        watchdog.cycle_start()
+        assert watchdog.run("read", lambda x: x * 2, 21) == 42
+        assert watchdog.cycle_done()
+    watchdog.close()
+    assert notify.states == ["READY=1", "WATCHDOG=1", "WATCHDOG=1"]
+
+def test_hung_phase_stops_pings(notify):
+    """A phase past its deadline raises, and the cycle doesn't ping"""
+    release = threading.Event()
+    watchdog = LoopWatchdog(5, {"read": 0.05, "write": 0.05}, notify=notify)
+
+    watchdog.cycle_start()
+    with pytest.raises(PhaseTimeout):
+        watchdog.run("read", release.wait, 5)
+    assert not watchdog.cycle_done()
+
+    watchdog.cycle_start()
+    with pytest.raises(PhaseTimeout):
+        watchdog.run("write", lambda: True)  # the worker is still stuck on the read
+    assert not watchdog.cycle_done()
+
+    release.set()
+    watchdog.close()
+    assert not notify.states
+
+def test_over_budget_cycle_does_not_ping(notify):
+    """Phases within their deadlines can still add up to more than the budget"""
+    watchdog = LoopWatchdog(0.01, {"read": 1}, notify=notify)
+    watchdog.cycle_start()
+    watchdog.run("read", threading.Event().wait, 0.05)
+    assert not watchdog.cycle_done()
+    watchdog.close()
+    assert not notify.states
+
+def test_idle_pings_after_healthy_cycle(notify, monkeypatch):
+    """Long sleeps are split at half WatchdogSec with a ping after each"""
+    monkeypatch.setenv("WATCHDOG_USEC", "10000000")
+    slept = []
+    watchdog = LoopWatchdog(5, {}, notify=notify, sleep=slept.append)
+
+    watchdog.cycle_start()
+    watchdog.cycle_done()
+    watchdog.idle(12)
+    assert slept == [5, 5, 2]
+    assert notify.states == ["READY=1", "WATCHDOG=1", "WATCHDOG=1", "WATCHDOG=1", "WATCHDOG=1"]
+
+    watchdog.healthy = False
+    slept.clear()
+    watchdog.idle(12)
+    assert slept == [12]
+    watchdog.close()
@@ -0,0 +1,181 @@
+"""Tests for weather point construction and caching in weather_utils.py"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from src import weather_utils
+from src.weather_utils import (construct_weather_point, construct_forecast_points, forecast_hash,
+                               load_locations, cache_file_for, WeatherCache, WeatherFetcher, CallBudget)
+
+def weather(main):
+    """Weather condition list"""
+    return [{"main": main}]
+
+@pytest.fixture
+def one_call_response():
+    """Trimmed One Call 3.0 response with 2 hours and 2 days of forecast"""
+    return {
+        "current": {"humidity": 80, "feels_like": 20.5, "wind_deg": 270, "wind_speed": 8.1,
+                    "weather": weather("Snow")},
+        "hourly": [
+            {"dt": 1735743600, "temp": 25.0, "feels_like": 18.2, "humidity": 85, "pop": 0.4,
+             "wind_speed": 9.0, "wind_gust": 15.0, "weather": weather("Snow")},
+            {"dt": 1735747200, "temp": 24.1, "feels_like": 17.0, "humidity": 86,
+             "wind_speed": 7.0, "weather": weather("Clouds")},
+        ],
+        "daily": [
+            {"dt": 1735754400, "temp": {"min": 10.0, "max": 26.0}, "humidity": 80, "pop": 0.6, "snow": 2.5,
+             "wind_speed": 10.0, "wind_gust": 20.0, "weather": weather("Snow")},
+            {"dt": 1735840800, "temp": {"min": 5.0, "max": 15.2}, "humidity": 70,
+             "wind_speed": 6.0, "weather": weather("Clear")},
+        ],
+    }
+
+def test_construct_weather_point(one_call_response):
+    """Current point keeps today's and tomorrow's summary"""
+    point = construct_weather_point(one_call_response, "Sandstone")
+    assert point["measurement"] == "weather"
+    assert point["tags"] == {"location": "Sandstone"}
+    assert point["fields"]["tempHigh"] == 26.0
+    assert point["fields"]["tempHighTomorrow"] == 15
+    assert point["fields"]["dailyConditionTomorrow"] == "Clear"
+
+def test_construct_forecast_points(one_call_response):
+    """Hourly and daily forecasts are stamped with the forecast time"""
+    series = construct_forecast_points(one_call_response, "Sandstone")
+    hourly = [p for p in series if p["measurement"] == "weather_hourly"]
+    daily = [p for p in series if p["measurement"] == "weather_daily"]
+
+    assert [p["time"] for p in hourly] == [1735743600, 1735747200]
+    assert [p["time"] for p in daily] == [1735754400, 1735840800]
+
+    # Missing optional values get defaults
+    assert hourly[1]["fields"]["pop"] == 0.0
+    assert hourly[1]["fields"]["windGust"] == 7.0
+    assert daily[0]["fields"]["snow"] == 2.5
+    assert daily[1]["fields"]["snow"] == 0.0
+
+def test_forecast_hash_ignores_current(one_call_response):
+    """Only the forecast changes the hash"""
+    first = forecast_hash(one_call_response)
+    one_call_response["current"]["humidity"] = 50
+    assert forecast_hash(one_call_response) == first
+
+    one_call_response["hourly"][0]["temp"] = 30.0
+    assert forecast_hash(one_call_response) != first
+
+def test_weather_cache_round_trip(tmp_path, one_call_response):
+    """Saved responses are loaded back with their fetch time and hash"""
+    cache = WeatherCache(str(tmp_path / "weather_cache.json"))
+    assert cache.load() is None
+
+    assert cache.save(one_call_response, 1000.0, "abc")
+    entry = cache.load()
+    assert entry["data"] == one_call_response
+    assert entry["forecast_hash"] == "abc"
+    assert WeatherCache.age_secs(entry, now=1600.0) == 600.0
+
+def test_weather_cache_fallback_up_to_max_age(tmp_path, one_call_response):
+    """A failed fetch gets the cached response until it is older than max_age_secs"""
+    cache = WeatherCache(str(tmp_path / "weather_cache.json"), max_age_secs=3600)
+    assert cache.fallback(now=1000.0) is None
+
+    cache.save(one_call_response, 1000.0)
+    assert cache.fallback(now=4600.0) == one_call_response
+    assert cache.fallback(now=4601.0) is None
+
+def test_weather_cache_invalid_file(tmp_path):
+    """A corrupt cache file is ignored"""
+    cache_file = tmp_path / "weather_cache.json"
+    cache_file.write_text("{not json")
+    assert WeatherCache(str(cache_file)).load() is None
+
+    cache_file.write_text(json.dumps({"data": {}}))
+    assert WeatherCache(str(cache_file)).load() is None
+
+def test_cache_file_for():
+    """Each location gets its own cache file"""
+    assert cache_file_for("config/weather_cache.json", "Sandstone") == "config/weather_cache.Sandstone.json"
+
+def test_load_locations_from_config(tmp_path):
+    """Locations for the host come from getWeather.json"""
+    config_file = tmp_path / "getWeather.json"
+    config_file.write_text(json.dumps({
+        "SandstoneHost1": {
+            "Sandstone": {"latitude": 46.13, "longitude": -92.86},
+            "PumpHouse": {"latitude": 46.12, "longitude": -92.87, "timeout": 3},
+        }
+    }))
+    locations = load_locations(str(config_file), "SandstoneHost1", "EnvLocation", "1", "2")
+    assert list(locations) == ["Sandstone", "PumpHouse"]
+
+def test_load_locations_falls_back_to_dotenv(tmp_path):
+    """Without a config file entry the dotenv location is used"""
+    locations = load_locations(str(tmp_path / "missing.json"), "SandstoneHost1", "Sandstone", "46.1", "-92.8")
+    assert locations == {"Sandstone": {"latitude": "46.1", "longitude": "-92.8"}}
+
+def test_call_budget_resets_each_utc_day():
+    """Calls beyond the daily budget are refused until midnight UTC"""
+    now = [1735732800.0]  # 2025-01-01 12:00 UTC
+    budget = CallBudget(2, clock=lambda: now[0])
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    assert budget.remaining() == 0
+
+    now[0] += 12 * 3600
+    assert budget.remaining() == 2
+
+class SlowOneCallHandler(BaseHTTPRequestHandler):
+    """One Call stand-in that takes 0.3 seconds per request"""
+
+    def do_GET(self):
+        """Return the requested latitude"""
+        time.sleep(0.3)
+        lat = parse_qs(urlparse(self.path).query)["lat"][0]
+        body = json.dumps({"lat": lat}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keep test output quiet"""
+
+@pytest.fixture
+def one_call_server(monkeypatch):
+    """Local One Call stand-in"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowOneCallHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(weather_utils, "ONECALL_URL", f"http://127.0.0.1:{server.server_port}/onecall")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_fetch_all_runs_concurrently(one_call_server):
+    """Three slow locations take about as long as one"""
+    locations = {name: {"latitude": lat, "longitude": 0} for name, lat in (("a", 1), ("b", 2), ("c", 3))}
+    fetcher = WeatherFetcher("key", locations, "minutely,hourly")
+    try:
+        start = time.monotonic()
+        responses = fetcher.fetch_all()
+        elapsed = time.monotonic() - start
+    finally:
+        fetcher.close()
+
+    assert {location: data["lat"] for location, data in responses.items()} == {"a": "1", "b": "2", "c": "3"}
+    assert elapsed < 0.8
+
+def test_fetch_all_respects_budget(one_call_server):
+    """Locations beyond the budget are skipped"""
+    locations = {name: {"latitude": 1, "longitude": 0} for name in ("a", "b", "c")}
+    fetcher = WeatherFetcher("key", locations, "minutely,hourly", budget=CallBudget(2))
+    try:
+        assert list(fetcher.fetch_all()) == ["a", "b"]
+    finally:
+        fetcher.close()
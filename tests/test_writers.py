@@ -0,0 +1,219 @@
+"""Tests for the deferred InfluxDB writer in writers.py"""
+
+import socket
+import threading
+from src.writers import DeferredInfluxWriter, UDPWriter, udp_loss
+
+class MockInfluxDBClient:
+    """Fake InfluxDBClient that records writes"""
+
+    def __init__(self, fail_with=None):
+        self.writes = []
+        self.fail_with = fail_with
+        self.closed = False
+
+    def write_points(self, points, **kwargs):
+        """Record or fail"""
+        if self.fail_with:
+            raise self.fail_with
+        self.writes.append((points, kwargs))
+
+    def close(self):
+        """Mark closed"""
+        self.closed = True
+
+class WriteError(Exception):
+    """InfluxDB error with an HTTP status code"""
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+def point(value):
+    """Minimal point"""
+    return {"measurement": "temps", "fields": {"temp_flt": float(value)}}
+
+def test_buffers_until_connected():
+    """Writes before the connection is up are buffered and flushed in order"""
+    release = threading.Event()
+    client = MockInfluxDBClient()
+
+    def connect():
+        release.wait(5)
+        return client
+
+    writer = DeferredInfluxWriter(connect).start()
+    assert not writer.write_points([point(1)])
+    assert not writer.write_points([point(2)], time_precision="s")
+    assert writer.pending_points == 2
+
+    release.set()
+    assert writer.wait_connected(5)
+    assert writer.write_points([point(3)])
+
+    assert [(batch[0]["fields"], kwargs) for batch, kwargs in client.writes] == [
+        (point(1)["fields"], {"time_precision": "n"}), (point(2)["fields"], {"time_precision": "s"}),
+        (point(3)["fields"], {"time_precision": "n"})]
+    assert writer.pending_points == 0
+    writer.close()
+    assert client.closed
+
+def test_buffered_points_keep_their_time(monkeypatch):
+    """Points are stamped when buffered, not when the connection comes up, and their own times are kept"""
+    client = MockInfluxDBClient()
+    writer = DeferredInfluxWriter(lambda: client)
+    monkeypatch.setattr("src.writers.time.time_ns", lambda: 1735732800123456789)
+    writer.write_points([point(1), {**point(2), "time": 1735732700}], time_precision="s")
+    monkeypatch.setattr("src.writers.time.time_ns", lambda: 1735732860000000001)
+    writer.write_points([point(3)])
+
+    writer.start()
+    assert writer.wait_connected(5)
+    assert writer.write_points([])
+    assert [[p["time"] for p in batch] for batch, _ in client.writes] == [
+        [1735732800, 1735732700], [1735732860000000001]]
+    writer.close()
+
+def test_retries_connection():
+    """Failed connection attempts are retried"""
+    attempts = []
+    client = MockInfluxDBClient()
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("refused")
+        return client
+
+    writer = DeferredInfluxWriter(connect, retry_secs=0.01).start()
+    assert writer.wait_connected(5)
+    assert len(attempts) == 3
+    writer.close()
+
+def test_write_failure_buffers_and_reconnects():
+    """A failed write keeps the points and opens a new client"""
+    clients = [MockInfluxDBClient(fail_with=ConnectionError("reset")), MockInfluxDBClient()]
+    writer = DeferredInfluxWriter(lambda: clients.pop(0)).start()
+    assert writer.wait_connected(5)
+    failed_client = writer.client
+
+    assert not writer.write_points([point(1)])
+    assert failed_client.closed
+    assert writer.wait_connected(5)
+    assert writer.write_points([])
+    assert [(batch[0]["fields"], kwargs) for batch, kwargs in writer.client.writes] == [
+        (point(1)["fields"], {"time_precision": "n"})]
+    writer.close()
+
+def test_bad_request_is_dropped():
+    """Points InfluxDB rejects with 400 are dropped instead of blocking the buffer"""
+    client = MockInfluxDBClient(fail_with=WriteError(400))
+    writer = DeferredInfluxWriter(lambda: client).start()
+    assert writer.wait_connected(5)
+    assert writer.write_points([point(1)])
+    assert writer.pending_points == 0
+    writer.close()
+
+def test_buffer_drops_oldest():
+    """Past max_buffered_points the oldest batches are dropped"""
+    writer = DeferredInfluxWriter(lambda: MockInfluxDBClient(), max_buffered_points=3)
+    for value in range(5):
+        writer.write_points([point(value)])
+    assert writer.pending_points == 3
+    assert [series[0]["fields"]["temp_flt"] for series, _ in writer.pending] == [2.0, 3.0, 4.0]
+
+class MockResultSet:
+    """Fake ResultSet with one series per (hostname, udp_source)"""
+
+    def __init__(self, series):
+        self.series = series
+
+    def items(self):
+        """((measurement, tags), points) per series"""
+        return [(("temps", {"hostname": host, "udp_source": source}), iter(points))
+                for (host, source), points in self.series.items()]
+
+class MockQueryClient:
+    """Fake InfluxDBClient answering every query with the same result"""
+
+    def __init__(self, result):
+        self.result = result
+        self.queries = []
+
+    def query(self, query, database=None):
+        """Record the query and return the result"""
+        self.queries.append((query, database))
+        return self.result
+
+def pressure(value, host="SandstoneShed1"):
+    """Pressure point with a tag"""
+    return {"measurement": "pressures", "tags": {"hostname": host}, "fields": {"pressure_flt": float(value)}}
+
+def udp_listener():
+    """Socket standing in for the InfluxDB UDP listener"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.settimeout(5)
+    return listener
+
+def test_udp_measurements_are_packed_and_sequenced():
+    """UDP measurements go out in packets under the size limit, each with its own udp_seq, the rest over HTTP"""
+    listener = udp_listener()
+    http_writer = DeferredInfluxWriter(lambda: MockInfluxDBClient())
+    writer = UDPWriter(http_writer, "127.0.0.1", listener.getsockname()[1], {"pressures"}, max_packet_bytes=250,
+                       source="getPressures")
+
+    writer.write_points([pressure(i) for i in range(6)] + [point(1)])
+    packets = [listener.recv(65536).decode("utf-8") for _ in range(3)]
+
+    assert all(len(packet) <= 250 for packet in packets)
+    lines = [line for packet in packets for line in packet.splitlines()]
+    assert len(lines) == 6
+    assert all(line.startswith("pressures,hostname=SandstoneShed1,udp_source=getPressures ") for line in lines)
+    assert [packet.count("udp_seq=") for packet in packets] == [2, 2, 2]
+    assert [packet.splitlines()[0].split("udp_seq=")[1].split(" ")[0] for packet in packets] == ["0i", "1i", "2i"]
+    assert http_writer.pending_points == 1
+    assert writer.pending_points == 1
+
+    writer.write_points([pressure(7)])
+    assert "udp_seq=3i" in listener.recv(65536).decode("utf-8")
+    writer.close()
+    listener.close()
+
+def test_udp_send_failure_falls_back_to_http():
+    """Points that can't be sent are written over HTTP"""
+    http_writer = DeferredInfluxWriter(lambda: MockInfluxDBClient())
+    writer = UDPWriter(http_writer, "127.0.0.1", 8089, {"pressures"})
+    writer.sock.close()
+    writer.write_points([pressure(1)])
+    assert http_writer.pending_points == 1
+
+def test_udp_loss_counts_gaps_and_restarts():
+    """Missing sequence numbers are loss, a sequence going back to 0 is a restart, not loss"""
+    seqs = [0, 0, 1, 3, 4, 0, 1, 2]
+    client = MockQueryClient(MockResultSet({("SandstoneShed1", "getTemps"): [{"udp_seq": seq} for seq in seqs]}))
+    assert udp_loss(client, "db", "temps") == {("SandstoneShed1", "getTemps"): (7, 8, 0.125)}
+
+def test_udp_loss_per_collector():
+    """Two collectors sending the same measurement from one host have their own sequences"""
+    client = MockQueryClient(MockResultSet({
+        ("SandstoneShed1", "getTemps"): [{"udp_seq": seq} for seq in range(10)],
+        ("SandstoneShed1", "getSHT30"): [{"udp_seq": seq} for seq in (0, 1, 3)],
+    }))
+    assert udp_loss(client, "db", "temps") == {("SandstoneShed1", "getTemps"): (10, 10, 0.0),
+                                               ("SandstoneShed1", "getSHT30"): (3, 4, 0.25)}
+    assert 'GROUP BY "hostname", "udp_source"' in client.queries[0][0]
+
+def test_udp_only_for_the_listeners_database(monkeypatch):
+    """A writer for a database other than the UDP listener's keeps every measurement on HTTP"""
+    monkeypatch.delenv("INFLUXDB_GATEWAY", raising=False)
+    monkeypatch.setenv("INFLUXDB_UDP", "127.0.0.1:8089")
+    monkeypatch.setenv("INFLUXDB_UDP_MEASUREMENTS", "pressures,temps")
+    monkeypatch.delenv("INFLUXDB_UDP_DATABASE", raising=False)
+    assert isinstance(DeferredInfluxWriter.from_settings("localhost", 8086, "u", "p", "sensors"), DeferredInfluxWriter)
+
+    monkeypatch.setenv("INFLUXDB_UDP_DATABASE", "sensors")
+    writer = DeferredInfluxWriter.from_settings("localhost", 8086, "u", "p", "sensors")
+    assert isinstance(writer, UDPWriter)
+    writer.sock.close()
+    assert isinstance(DeferredInfluxWriter.from_settings("localhost", 8086, "u", "p", "weather"), DeferredInfluxWriter)